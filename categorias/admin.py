@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Categoria, Subcategoria
+from sisbar_config.cache import invalidar
 
 @admin.register(Categoria)
 class CategoriaAdmin(admin.ModelAdmin):
@@ -30,11 +31,13 @@ class CategoriaAdmin(admin.ModelAdmin):
     
     def activar_categorias(self, request, queryset):
         count = queryset.update(activa=True)
+        invalidar('categorias')
         self.message_user(request, f'{count} categoría(s) activada(s).')
     activar_categorias.short_description = "✅ Activar categorías"
     
     def desactivar_categorias(self, request, queryset):
         count = queryset.update(activa=False)
+        invalidar('categorias')
         self.message_user(request, f'{count} categoría(s) desactivada(s).')
     desactivar_categorias.short_description = "🚫 Desactivar categorías"
 
@@ -4,4 +4,11 @@ from django.apps import AppConfig
 class CategoriasConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = "categorias"
-    verbose_name = "Categorías"
\ No newline at end of file
+    verbose_name = "Categorías"
+
+    def ready(self):
+        from sisbar_config.cache import invalidar_al_cambiar
+        from .models import Categoria, Subcategoria
+
+        invalidar_al_cambiar(Categoria, 'categorias')
+        invalidar_al_cambiar(Subcategoria, 'categorias')
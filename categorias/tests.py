@@ -1,3 +1,55 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from sisbar_config.pruebas import RendimientoTestCase
+from .models import Categoria
+
+
+class CategoriasRendimientoTests(RendimientoTestCase):
+    """Presupuesto de consultas y tiempos de categorías"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.categoria = Categoria.objects.order_by('id').first()
+
+    def test_listar(self):
+        self.medir_vista('listar', reverse('categorias:listar'), 2)
+
+    def test_crear_get(self):
+        self.medir_vista('crear_get', reverse('categorias:crear'), 0)
+
+    def test_crear_post(self):
+        contador = iter(range(100))
+        self.medir_vista(
+            'crear_post', reverse('categorias:crear'), 3, metodo='post',
+            datos=lambda: {'nombre': f'Nueva {next(contador)}', 'icono': '🍹', 'color': '#123456'},
+        )
+
+    def test_editar_get(self):
+        url = reverse('categorias:editar', args=[self.categoria.id])
+        self.medir_vista('editar_get', url, 1)
+
+    def test_editar_post(self):
+        url = reverse('categorias:editar', args=[self.categoria.id])
+        datos = {'nombre': self.categoria.nombre, 'icono': '🍺', 'color': '#F59E0B', 'descripcion': 'Editada'}
+        self.medir_vista('editar_post', url, 3, metodo='post', datos=datos)
+
+    def test_eliminar_get(self):
+        url = reverse('categorias:eliminar', args=[self.categoria.id])
+        self.medir_vista('eliminar_get', url, 2)
+
+    def test_eliminar_post(self):
+        url = reverse('categorias:eliminar', args=[self.categoria.id])
+        self.medir_vista('eliminar_post', url, 3, metodo='post')
+
+    def test_crear_subcategoria_get(self):
+        url = reverse('categorias:crear_subcategoria', args=[self.categoria.id])
+        self.medir_vista('crear_subcategoria_get', url, 1)
+
+    def test_crear_subcategoria_post(self):
+        url = reverse('categorias:crear_subcategoria', args=[self.categoria.id])
+        contador = iter(range(100))
+        self.medir_vista(
+            'crear_subcategoria_post', url, 3, metodo='post',
+            datos=lambda: {'nombre': f'Sub {next(contador)}'},
+        )
@@ -1,21 +1,33 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Count, Q
 from .models import Categoria, Subcategoria
-from usuarios.views import registrar_actividad
+from usuarios.actividad import registrar_actividad
+from sisbar_config import cache as cache_sisbar
 
 
 @login_required
 def listar_categorias_view(request):
     """Lista todas las categorías con sus subcategorías"""
-    categorias = Categoria.objects.filter(activa=True).prefetch_related('subcategorias')
-    
     context = {
-        'categorias': categorias,
+        'categorias': categorias_activas(),
     }
     return render(request, 'categorias/listar.html', context)
 
 
+def categorias_activas(refrescar=False):
+    """Categorías activas con subcategorías y conteo de productos, cacheadas"""
+    categorias = Categoria.objects.filter(activa=True).prefetch_related('subcategorias').annotate(
+        num_productos=Count('productos', filter=Q(productos__activo=True))
+    )
+    return cache_sisbar.lista(
+        'categorias:activas', categorias,
+        espacios=('categorias', 'inventario'),
+        refrescar=refrescar,
+    )
+
+
 @login_required
 def crear_categoria_view(request):
     if not request.user.puede_gestionar_inventario():
@@ -0,0 +1,70 @@
+"""
+Audita cuánto cuesta arrancar un worker (imports y primera petición)
+
+Uso:
+    python manage.py auditar_imports
+    python manage.py auditar_imports --top 30 --json arranque.json
+    python manage.py auditar_imports --check --url /dashboard/
+
+Arranca un proceso nuevo con `python -X importtime` que carga la aplicación
+WSGI y atiende una petición, igual que un worker de gunicorn al despertar
+el servicio (ver sisbar_config/arranque.py). Muestra el tiempo de cada
+etapa, los paquetes que más tardan en importarse y qué módulo del proyecto
+los trae. Con --check mide además `manage.py check` completo.
+"""
+
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.shortcuts import resolve_url
+
+from sisbar_config import arranque
+
+
+class Command(BaseCommand):
+    help = 'Mide el arranque de un worker: tiempo de import por paquete y primera petición'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='', help='Primera petición (por defecto la página de login)')
+        parser.add_argument('--top', type=int, default=15, help='Paquetes y módulos a mostrar')
+        parser.add_argument('--check', action='store_true', help='Medir también `manage.py check`')
+        parser.add_argument('--json', default='', help='Guardar el resultado en este archivo')
+
+    def handle(self, *args, **options):
+        url = options['url'] or resolve_url(settings.LOGIN_URL)
+        self.stdout.write(f'⏱️  Arrancando un worker nuevo (GET {url})...')
+        try:
+            resultado = arranque.medir(url, options['top'])
+        except RuntimeError as e:
+            raise CommandError(f'El proceso de medición falló: {e}')
+        if options['check']:
+            resultado['check_ms'] = arranque.medir_check()
+
+        self.stdout.write(
+            f'   Aplicación (django.setup + middleware): {resultado["aplicacion_ms"]:>8} ms\n'
+            f'   Primera petición (estado {resultado["estado"]}):       {resultado["primera_peticion_ms"]:>8} ms\n'
+            f'   Imports: {resultado["imports_ms"]} ms en {resultado["modulos"]} módulos'
+        )
+        if 'check_ms' in resultado:
+            self.stdout.write(f'   manage.py check: {resultado["check_ms"]} ms')
+
+        self.stdout.write('📦 Paquetes más caros (tiempo propio de sus módulos):')
+        for paquete in resultado['paquetes'][:options['top']]:
+            origen = f'  ← {paquete["importado_por"]}' if paquete['importado_por'] else ''
+            if paquete['via'] and paquete['via'] != paquete['importado_por']:
+                origen += f' (vía {paquete["via"]})'
+            self.stdout.write(
+                f'   {paquete["paquete"]:<22} {paquete["ms"]:>8} ms {paquete["modulos"]:>5} módulos{origen}'
+            )
+
+        self.stdout.write('🐢 Módulos más caros (con lo que importan):')
+        for modulo in resultado['modulos_caros'][:options['top']]:
+            self.stdout.write(f'   {modulo["modulo"]:<45} {modulo["ms"]:>8} ms')
+
+        if options['json']:
+            Path(options['json']).write_text(
+                json.dumps(resultado, indent=2, ensure_ascii=False) + '\n', encoding='utf-8'
+            )
+            self.stdout.write(f'💾 Resultado guardado en {options["json"]}')
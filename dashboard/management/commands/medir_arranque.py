@@ -0,0 +1,113 @@
+"""
+Mide el tiempo hasta el primer byte de un gunicorn recién arrancado
+
+Uso:
+    python manage.py medir_arranque
+    python manage.py medir_arranque --usuario admin --url /dashboard/ --url /inventario/
+    python manage.py medir_arranque --comparar --repetir 5 --inactivo 30 --json ttfb.json
+
+Arranca gunicorn con la configuración de producción (sisbar_config/servidor.py),
+igual que Render al despertar el servicio, y mide cuándo acepta conexiones,
+cuándo llega el primer byte de la primera petición y cuánto tarda cada URL
+en su primera visita. Con --inactivo repite las URLs después de esa pausa
+sin tráfico. Con --comparar mide también sin el modo de arranque rápido
+(SISBAR_ARRANQUE_RAPIDO=False). Con --usuario las peticiones van con una
+sesión de ese usuario, creada en la base de datos que usa gunicorn.
+"""
+
+import importlib.util
+import json
+import statistics
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.shortcuts import resolve_url
+from django.test import Client
+
+from sisbar_config import arranque
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo hasta el primer byte de gunicorn al arrancar (con y sin arranque rápido)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', action='append', default=[],
+                            help='URL a pedir (se puede repetir; por defecto la página de login)')
+        parser.add_argument('--usuario', default='', help='Pedir las URLs con la sesión de este usuario')
+        parser.add_argument('--workers', type=int, default=0, help='Workers (por defecto los de servidor.py)')
+        parser.add_argument('--inactivo', type=float, default=0,
+                            help='Segundos sin tráfico antes de repetir las URLs')
+        parser.add_argument('--repetir', type=int, default=3, help='Arranques a medir (se informa la mediana)')
+        parser.add_argument('--comparar', action='store_true', help='Medir también sin arranque rápido')
+        parser.add_argument('--json', default='', help='Guardar el resultado en este archivo')
+
+    def handle(self, *args, **options):
+        if importlib.util.find_spec('gunicorn') is None:
+            raise CommandError('gunicorn no está instalado en este entorno.')
+        urls = options['url'] or [resolve_url(settings.LOGIN_URL)]
+        cookie = self.sesion(options['usuario']) if options['usuario'] else ''
+
+        resultado = {}
+        for rapido in ((False, True) if options['comparar'] else (True,)):
+            modo = 'rapido' if rapido else 'normal'
+            self.stdout.write(f'⏱️  Arrancando gunicorn ({modo}) {options["repetir"]} veces...')
+            try:
+                arranques = [
+                    arranque.medir_servidor(urls, rapido, options['inactivo'], cookie, options['workers'])
+                    for _ in range(max(1, options['repetir']))
+                ]
+            except RuntimeError as e:
+                raise CommandError(f'La medición falló: {e}')
+            resultado[modo] = self.resumir(arranques)
+            self.reportar(resultado[modo])
+
+        if options['json']:
+            Path(options['json']).write_text(
+                json.dumps(resultado, indent=2, ensure_ascii=False) + '\n', encoding='utf-8'
+            )
+            self.stdout.write(f'💾 Resultado guardado en {options["json"]}')
+
+    def sesion(self, username):
+        usuario = get_user_model().objects.filter(username=username).first()
+        if usuario is None:
+            raise CommandError(f'No existe el usuario "{username}"')
+        cliente = Client()
+        cliente.force_login(usuario)
+        return f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    @staticmethod
+    def resumir(arranques):
+        """Mediana de cada medición entre los arranques"""
+        def mediana(valores):
+            return round(statistics.median(valores), 1)
+
+        primero = arranques[0]
+        urls = []
+        for i, datos in enumerate(primero['urls']):
+            url = {
+                'url': datos['url'],
+                'estado': datos['estado'],
+                'primera_ms': mediana([a['urls'][i]['primera_ms'] for a in arranques]),
+            }
+            if 'tras_inactividad_ms' in datos:
+                url['tras_inactividad_ms'] = mediana([a['urls'][i]['tras_inactividad_ms'] for a in arranques])
+            urls.append(url)
+        return {
+            'arranques': len(arranques),
+            'acepta_ms': mediana([a['acepta_ms'] for a in arranques]),
+            'primer_byte_ms': mediana([a['primer_byte_ms'] for a in arranques]),
+            'urls': urls,
+        }
+
+    def reportar(self, r):
+        self.stdout.write(
+            f'   Acepta conexiones:           {r["acepta_ms"]:>8} ms\n'
+            f'   Primer byte desde el inicio: {r["primer_byte_ms"]:>8} ms'
+        )
+        for url in r['urls']:
+            linea = f'   {url["url"]:<28} {url["estado"]} primera visita {url["primera_ms"]:>8} ms'
+            if 'tras_inactividad_ms' in url:
+                linea += f' | tras inactividad {url["tras_inactividad_ms"]:>8} ms'
+            self.stdout.write(linea)
@@ -0,0 +1,56 @@
+"""
+Precalcula la caché después de un despliegue
+
+Uso:
+    python manage.py warm_caches
+
+Con CACHE_BACKEND=memoria la caché vive en cada proceso: lo calculado
+aquí se pierde al terminar el comando, así que falla (código distinto de
+0) salvo con --en-proceso. Solo sirve con los backends compartidos
+(archivo o bd).
+"""
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from categorias.views import categorias_activas
+from dashboard.views import estadisticas_inventario, estadisticas_usuarios
+from reportes.views import estadisticas_reportes
+from sisbar_config.cache import compartida
+
+
+# (descripción, función que calcula y guarda el valor)
+CALENTADORES = (
+    ('Dashboard: inventario', estadisticas_inventario),
+    ('Dashboard: usuarios', estadisticas_usuarios),
+    ('Reportes', estadisticas_reportes),
+    ('Categorías activas', categorias_activas),
+)
+
+
+class Command(BaseCommand):
+    help = 'Precalcula las estadísticas del dashboard, reportes y categorías en la caché'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--en-proceso', action='store_true',
+                            help='Calentar aunque la caché sea por proceso (solo la usa este proceso)')
+
+    def handle(self, *args, **options):
+        backend = settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]
+        if not compartida() and not options['en_proceso']:
+            raise CommandError(
+                f'La caché ({backend}) no se comparte con los workers del servidor: '
+                'usa CACHE_BACKEND=archivo o bd.'
+            )
+
+        inicio = time.perf_counter()
+        for descripcion, calentar in CALENTADORES:
+            parcial = time.perf_counter()
+            calentar(refrescar=True)
+            self.stdout.write(f'   {descripcion}: {(time.perf_counter() - parcial) * 1000:.0f} ms')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Caché precalculada ({backend}) en {time.perf_counter() - inicio:.2f}s'
+        ))
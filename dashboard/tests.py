@@ -1,3 +1,151 @@
-from django.test import TestCase
+import importlib.util
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.template import engines
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sisbar_config import arranque, servidor
+from sisbar_config.pruebas import FuncionalTestCase, MINIMO, RendimientoTestCase
+from categorias.views import categorias_activas
+from inventario.models import Producto
+from reportes.views import estadisticas_reportes
+from .views import estadisticas_inventario
+
+
+class DashboardRendimientoTests(RendimientoTestCase):
+    """Presupuesto de consultas y tiempos del dashboard"""
+
+    def test_home(self):
+        self.medir_vista('home', reverse('dashboard:home'), 11)
+
+    def test_datos(self):
+        respuesta = self.medir_vista('datos_dashboard', reverse('dashboard:datos'), 6)
+        datos = respuesta.json()
+        self.assertEqual(datos['total_productos'], Producto.objects.filter(activo=True).count())
+        self.assertEqual(len(datos['categorias_labels']), len(datos['categorias_data']))
+
+
+class DashboardCacheTests(FuncionalTestCase):
+    """Las estadísticas globales se cachean y se invalidan al cambiar datos"""
+
+    datos = MINIMO
+
+    def test_segunda_carga_usa_cache(self):
+        url = reverse('dashboard:home')
+        with CaptureQueriesContext(connection) as fria:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as caliente:
+            self.client.get(url)
+        self.assertLess(len(caliente), len(fria))
+
+    def test_guardar_producto_invalida(self):
+        antes = estadisticas_inventario()['total_productos']
+        producto = Producto.objects.filter(activo=True).first()
+        producto.activo = False
+        producto.save()
+        self.assertEqual(estadisticas_inventario()['total_productos'], antes - 1)
+
+    def test_datos_async_usa_cache(self):
+        url = reverse('dashboard:datos')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        Producto.objects.filter(activo=True).first().save()
+        with CaptureQueriesContext(connection) as despues:
+            self.client.get(url)
+        self.assertGreater(len(despues), 0)
+
+    def test_warm_caches(self):
+        # La caché de las pruebas es por proceso
+        with self.assertRaises(CommandError):
+            call_command('warm_caches', stdout=StringIO())
+        call_command('warm_caches', en_proceso=True, stdout=StringIO())
+        with self.assertNumQueries(0):
+            estadisticas_inventario()
+            estadisticas_reportes()
+            categorias_activas()
+
+
+class AuditarImportsTests(SimpleTestCase):
+    """Arranque de un worker: las bibliotecas pesadas no se cargan hasta usarlas"""
+
+    def test_arbol_de_imports(self):
+        salida = [
+            'import time: self [us] | cumulative | imported package',
+            'import time:       100 |        100 |       openpyxl.styles',
+            'import time:       300 |        400 |     openpyxl',
+            'import time:        50 |        450 |   reportes.views',
+            'import time:        20 |         20 |   django.urls',
+            'import time:        10 |        480 | sisbar_config.urls',
+        ]
+        nodos = arranque.arbol(salida)
+        self.assertEqual([n['padre'] for n in nodos], [1, 2, 4, 4, None])
+        paquetes = {p['paquete']: p for p in arranque.resumir(nodos, {'reportes', 'sisbar_config'})['paquetes']}
+        self.assertEqual(paquetes['openpyxl']['ms'], 0.4)
+        self.assertEqual(paquetes['openpyxl']['importado_por'], 'reportes.views')
+        self.assertEqual(paquetes['django']['importado_por'], 'sisbar_config.urls')
+
+    def test_primera_peticion_sin_exportadores(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = Path(directorio) / 'arranque.json'
+            call_command('auditar_imports', json=str(archivo), stdout=StringIO())
+            resultado = json.loads(archivo.read_text(encoding='utf-8'))
+
+        self.assertEqual(resultado['estado'], 200)
+        cargados = {p['paquete'] for p in resultado['paquetes']}
+        self.assertIn('django', cargados)
+        self.assertFalse(cargados & {'openpyxl', 'reportlab', 'numpy', 'PIL'})
+
+
+class ArranqueRapidoTests(SimpleTestCase):
+    """Configuración de gunicorn y calentamiento de los workers"""
+
+    def test_cpus_de_la_cuota_del_contenedor(self):
+        with tempfile.TemporaryDirectory() as directorio:
+            cgroup = Path(directorio) / 'cpu.max'
+            cgroup.write_text('50000 100000\n')
+            self.assertEqual(servidor.cpus_disponibles(str(cgroup)), 1)
+            cgroup.write_text('max 100000\n')
+            self.assertGreaterEqual(servidor.cpus_disponibles(str(cgroup)), 1)
+        self.assertEqual(servidor.calcular_workers(1, 4), 3)
+        self.assertEqual(servidor.calcular_workers(8, 4), 4)
+
+    def test_compila_todas_las_plantillas(self):
+        motor = engines['django']
+        compiladas, errores = arranque.compilar_plantillas()
+        self.assertEqual(errores, [])
+        self.assertEqual(compiladas, len(list(Path(motor.dirs[0]).rglob('*.html'))))
+        cache = motor.engine.template_loaders[0].get_template_cache
+        self.assertIn('base.html', cache)
+        self.assertIn('dashboard/home.html', cache)
+
+    def test_una_conexion_por_hilo(self):
+        hilos = set()
+
+        def abrir():
+            hilos.add(threading.get_ident())
+            return 1
+
+        with ThreadPoolExecutor(max_workers=3) as pool, \
+                mock.patch.object(arranque, 'abrir_conexiones', abrir):
+            self.assertEqual(servidor.calentar_hilos(pool, 3), 3)
+        self.assertEqual(len(hilos), 3)
+
+    def test_sin_conexiones_persistentes_no_abre(self):
+        self.assertEqual(arranque.abrir_conexiones(), 0)
+
+    @skipUnless(importlib.util.find_spec('gunicorn'), 'gunicorn no está instalado')
+    def test_primer_byte_con_gunicorn(self):
+        resultado = arranque.medir_servidor([reverse('usuarios:login')], workers=1)
+        self.assertEqual(resultado['urls'][0]['estado'], 200)
+        self.assertGreaterEqual(resultado['primer_byte_ms'], resultado['acepta_ms'])
@@ -5,4 +5,5 @@ app_name = 'dashboard'
 
 urlpatterns = [
     path('', views.home_view, name='home'),
+    path('datos/', views.datos_dashboard_view, name='datos'),
 ]
\ No newline at end of file
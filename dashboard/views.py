@@ -1,57 +1,92 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
+from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Sum, Q
+from django.db.models import Count, Q
 from django.utils import timezone
 from datetime import timedelta
 from inventario.models import Producto
+from inventario.valoracion import avalor_total, valor_total
 from categorias.models import Categoria
 from movimientos.models import Movimiento, AlertaInventario
 from usuarios.models import HistorialActividad, Usuario
+from sisbar_config import cache as cache_sisbar
+from sisbar_config import eventos
+from sisbar_config.asincrono import login_requerido
+from sisbar_config.replicas import lectura_replica
 
 
-@login_required
-def home_view(request):
+def estadisticas_inventario(refrescar=False):
     """
-    Dashboard principal con estadísticas en tiempo real
+    Estadísticas globales del dashboard (iguales para todos los usuarios).
+    Se cachean por día y se invalidan al cambiar inventario, movimientos
+    o categorías.
     """
-    
-    # Estadísticas de productos
-    total_productos = Producto.objects.filter(activo=True).count()
-    productos_disponibles = Producto.objects.filter(activo=True, estado='DISPONIBLE').count()
-    productos_por_agotar = Producto.objects.filter(activo=True, estado='POR_AGOTAR').count()
-    productos_agotados = Producto.objects.filter(activo=True, estado='AGOTADO').count()
-    
-    # Valor total del inventario
-    valor_total = Producto.objects.filter(activo=True).aggregate(
-        total=Sum('precio_compra')
-    )['total'] or 0
+    hoy = timezone.now().date()
+    return cache_sisbar.obtener(
+        'dashboard:inventario',
+        _calcular_estadisticas_inventario,
+        espacios=('inventario', 'movimientos', 'categorias'),
+        partes=(hoy.isoformat(),),
+        refrescar=refrescar,
+    )
+
+
+def _catalogo():
+    # NumPy se carga con la primera foto, no al importar las vistas
+    from inventario import catalogo
+    return catalogo.actual()
+
+
+def _resumen_inventario(foto):
+    """Conteos por estado desde la foto del catálogo (inventario/catalogo.py)"""
+    estados = foto.por_estado()
+    return {
+        'total_productos': foto.contar(),
+        'productos_disponibles': estados['DISPONIBLE'],
+        'productos_por_agotar': estados['POR_AGOTAR'],
+        'productos_agotados': estados['AGOTADO'],
+    }
+
+
+def _categorias_principales(foto, categorias, limite=5):
+    """Categorías activas ordenadas por cantidad de productos activos"""
+    conteos = foto.por_categoria()
+    for categoria in categorias:
+        categoria.total = conteos.get(categoria.id, 0)
+    return sorted(categorias, key=lambda c: -c.total)[:limite]
+
+
+def _ids_stock_bajo(foto, limite=5):
+    """Productos con 5 unidades o menos, de menor a mayor cantidad"""
+    return foto.filtrar(cantidad__lte=5).top('cantidad', limite, mayores=False)
+
+
+def _calcular_estadisticas_inventario():
+    foto = _catalogo()
+    # Conteos por estado, sin consultar
+    resumen = _resumen_inventario(foto)
+    # Valor del stock: total acumulado por categoría (inventario/valoracion.py)
+    resumen['valor_total'] = valor_total()
     
     # Productos por categoría
-    productos_por_categoria = Categoria.objects.filter(activa=True).annotate(
-        total=Count('productos', filter=Q(productos__activo=True))
-    ).order_by('-total')[:5]
+    productos_por_categoria = _categorias_principales(foto, list(Categoria.objects.filter(activa=True)))
     
     # Productos con stock bajo
-    productos_stock_bajo = Producto.objects.filter(
-        activo=True,
-        cantidad__lte=5
-    ).order_by('cantidad')[:5]
+    ids = _ids_stock_bajo(foto)
+    encontrados = Producto.objects.in_bulk(ids)
+    productos_stock_bajo = [encontrados[i] for i in ids if i in encontrados]
     
     # Últimos movimientos (últimos 7 días)
     hace_7_dias = timezone.now() - timedelta(days=7)
-    ultimos_movimientos = Movimiento.objects.filter(
+    ultimos_movimientos = list(Movimiento.objects.filter(
         fecha__gte=hace_7_dias
-    ).select_related('producto', 'usuario').order_by('-fecha')[:10]
-    
-    # Actividad reciente del usuario
-    actividad_reciente = HistorialActividad.objects.filter(
-        usuario=request.user
-    ).order_by('-fecha')[:5]
+    ).select_related('producto', 'usuario').order_by('-fecha')[:10])
     
     # Alertas pendientes
-    alertas_pendientes = AlertaInventario.objects.filter(
+    alertas_pendientes = list(AlertaInventario.objects.filter(
         resuelta=False
-    ).select_related('producto').order_by('-fecha_generada')[:5]
+    ).select_related('producto').order_by('-fecha_generada')[:5])
     
     # Movimientos de hoy
     hoy = timezone.now().date()
@@ -61,12 +96,12 @@ def home_view(request):
     
     # Productos más movidos (últimos 30 días)
     hace_30_dias = timezone.now() - timedelta(days=30)
-    productos_mas_movidos = Producto.objects.filter(
+    productos_mas_movidos = list(Producto.objects.filter(
         activo=True,
         movimientos__fecha__gte=hace_30_dias
     ).annotate(
         total_movimientos=Count('movimientos')
-    ).order_by('-total_movimientos')[:5]
+    ).order_by('-total_movimientos')[:5])
     
     # Datos para gráfica de categorías (formato JSON para Chart.js)
     categorias_labels = []
@@ -78,39 +113,109 @@ def home_view(request):
         categorias_data.append(cat.total)
         categorias_colors.append(cat.color)
     
-    # Estadísticas de usuarios (solo para admins)
-    stats_usuarios = None
-    if request.user.puede_aprobar():
-        stats_usuarios = {
-            'total': Usuario.objects.count(),
-            'activos': Usuario.objects.filter(is_active=True).count(),
-            'pendientes': Usuario.objects.filter(aprobado=False).count(),
-        }
-    
-    context = {
-        # Estadísticas principales
-        'total_productos': total_productos,
-        'productos_disponibles': productos_disponibles,
-        'productos_por_agotar': productos_por_agotar,
-        'productos_agotados': productos_agotados,
-        'valor_total': valor_total,
+    return {
+        **resumen,
         'movimientos_hoy': movimientos_hoy,
-        
-        # Listas
         'productos_por_categoria': productos_por_categoria,
         'productos_stock_bajo': productos_stock_bajo,
         'ultimos_movimientos': ultimos_movimientos,
-        'actividad_reciente': actividad_reciente,
         'alertas_pendientes': alertas_pendientes,
         'productos_mas_movidos': productos_mas_movidos,
-        
-        # Datos para gráficas
         'categorias_labels': categorias_labels,
         'categorias_data': categorias_data,
         'categorias_colors': categorias_colors,
+    }
+
+
+def estadisticas_usuarios(refrescar=False):
+    """Totales de usuarios para administradores, en una sola consulta"""
+    return cache_sisbar.obtener(
+        'dashboard:usuarios',
+        lambda: Usuario.objects.aggregate(
+            total=Count('id'),
+            activos=Count('id', filter=Q(is_active=True)),
+            pendientes=Count('id', filter=Q(aprobado=False)),
+        ),
+        espacios=('usuarios',),
+        refrescar=refrescar,
+    )
+
+
+async def datos_panel():
+    """
+    Datos del dashboard en JSON con el ORM async: contadores, gráfica de
+    categorías y stock bajo. Misma caché y mismos espacios que
+    estadisticas_inventario().
+    """
+    hoy = timezone.now().date()
+    return await cache_sisbar.aobtener(
+        'dashboard:datos',
+        _calcular_datos_panel,
+        espacios=('inventario', 'movimientos', 'categorias'),
+        partes=(hoy.isoformat(),),
+    )
+
+
+async def _calcular_datos_panel():
+    foto = await sync_to_async(_catalogo)()
+    resumen = _resumen_inventario(foto)
+    resumen['valor_total'] = await avalor_total()
+    
+    categorias = _categorias_principales(foto, [c async for c in Categoria.objects.filter(activa=True)])
+    ids = _ids_stock_bajo(foto)
+    encontrados = {
+        p['id']: p async for p in Producto.objects.filter(id__in=ids).values('id', 'codigo', 'nombre', 'cantidad')
+    }
+    stock_bajo = [encontrados[i] for i in ids if i in encontrados]
+    
+    return {
+        **resumen,
+        'movimientos_hoy': await Movimiento.objects.filter(fecha__date=timezone.now().date()).acount(),
+        'alertas_pendientes': await AlertaInventario.objects.filter(resuelta=False).acount(),
+        'categorias_labels': [f"{c.icono} {c.nombre}" for c in categorias],
+        'categorias_data': [c.total for c in categorias],
+        'categorias_colors': [c.color for c in categorias],
+        'productos_stock_bajo': stock_bajo,
+    }
+
+
+@login_required
+@lectura_replica
+def home_view(request):
+    """
+    Dashboard principal con estadísticas en tiempo real
+    """
+    
+    # Actividad reciente del usuario
+    actividad_reciente = HistorialActividad.objects.filter(
+        usuario=request.user
+    ).order_by('-fecha')[:5]
+    
+    # Estadísticas de usuarios (solo para admins)
+    stats_usuarios = None
+    if request.user.puede_aprobar():
+        stats_usuarios = estadisticas_usuarios()
+    
+    context = {
+        # Estadísticas principales, listas y datos para gráficas
+        **estadisticas_inventario(),
+        'actividad_reciente': actividad_reciente,
         
         # Estadísticas de usuarios
         'stats_usuarios': stats_usuarios,
+        
+        # Cambios en vivo desde este punto (movimientos:eventos)
+        'eventos_desde': eventos.ultimo(),
     }
     
     return render(request, 'dashboard/home.html', context)
+
+
+@login_requerido
+@lectura_replica
+async def datos_dashboard_view(request):
+    """
+    Datos del dashboard para refrescar el panel (async): peticiones cortas
+    que con workers ASGI no esperan detrás de las exportaciones
+    """
+    return JsonResponse(await datos_panel())
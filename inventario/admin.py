@@ -1,6 +1,12 @@
 from django.contrib import admin
 from django.utils.html import format_html
+from .fracciones import consolidado, fraccionar
 from .models import Producto
+from .valoracion import recalcular
+from sisbar_config.cache import invalidar
+
+# Fracciones para los productos que todos los cajeros escanean a la vez
+FRACCIONES_POR_DEFECTO = 8
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
@@ -42,7 +48,10 @@ class ProductoAdmin(admin.ModelAdmin):
         'creado_por',
         'fecha_creacion',
         'ultima_actualizacion',
-        'ultima_salida'
+        'ultima_salida',
+        'costo_promedio',
+        'valor_stock',
+        'fracciones'
     )
     
     ordering = ('-fecha_creacion',)
@@ -64,11 +73,12 @@ class ProductoAdmin(admin.ModelAdmin):
                 'cantidad',
                 'cantidad_minima',
                 'unidad_medida',
-                'ubicacion'
+                'ubicacion',
+                'fracciones'
             )
         }),
         ('Precio', {
-            'fields': ('precio_compra',)
+            'fields': ('precio_compra', 'costo_promedio', 'valor_stock')
         }),
         ('Proveedor', {
             'fields': ('proveedor',)
@@ -90,7 +100,8 @@ class ProductoAdmin(admin.ModelAdmin):
     actions = [
         'activar_productos',
         'desactivar_productos',
-        'marcar_disponible',
+        'fraccionar_stock',
+        'quitar_fracciones',
         'exportar_excel'
     ]
     
@@ -118,19 +129,36 @@ class ProductoAdmin(admin.ModelAdmin):
         """Guarda el usuario que creó el producto"""
         if not change:  # Si es un nuevo producto
             obj.creado_por = request.user
-        super().save_model(request, obj, form, change)
+        # Productos fraccionados: los descuentos pendientes primero
+        with consolidado(obj, conservar=form.changed_data):
+            super().save_model(request, obj, form, change)
     
     def activar_productos(self, request, queryset):
+        categorias = set(queryset.values_list('categoria_id', flat=True))
         count = queryset.update(activo=True)
+        recalcular(categorias)
+        invalidar('inventario')
         self.message_user(request, f'{count} producto(s) activado(s).')
     activar_productos.short_description = "✅ Activar productos"
     
     def desactivar_productos(self, request, queryset):
+        categorias = set(queryset.values_list('categoria_id', flat=True))
         count = queryset.update(activo=False)
+        recalcular(categorias)
+        invalidar('inventario')
         self.message_user(request, f'{count} producto(s) desactivado(s).')
     desactivar_productos.short_description = "🚫 Desactivar productos"
     
-    def marcar_disponible(self, request, queryset):
-        count = queryset.update(estado='DISPONIBLE')
-        self.message_user(request, f'{count} producto(s) marcado(s) como disponible.')
-    marcar_disponible.short_description = "🟢 Marcar como disponible"
\ No newline at end of file
+    def fraccionar_stock(self, request, queryset):
+        for producto in queryset:
+            fraccionar(producto, FRACCIONES_POR_DEFECTO)
+        self.message_user(
+            request, f'{queryset.count()} producto(s) con el stock en {FRACCIONES_POR_DEFECTO} fracciones.'
+        )
+    fraccionar_stock.short_description = f"🍺 Fraccionar stock ({FRACCIONES_POR_DEFECTO}, productos muy vendidos)"
+    
+    def quitar_fracciones(self, request, queryset):
+        for producto in queryset.filter(fracciones__gt=0):
+            fraccionar(producto, 0)
+        self.message_user(request, f'{queryset.count()} producto(s) sin fracciones.')
+    quitar_fracciones.short_description = "🧮 Quitar fracciones de stock"
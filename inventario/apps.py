@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class InventarioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventario'
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+        from sisbar_config.cache import invalidar_al_cambiar
+        from sisbar_config.imagenes import procesar_al_guardar
+        from .models import Producto
+        from .valoracion import al_borrar
+
+        invalidar_al_cambiar(Producto, 'inventario')
+        procesar_al_guardar(Producto, 'imagen', 'imagen_versiones')
+        post_delete.connect(al_borrar, sender=Producto, dispatch_uid='valoracion:producto')
@@ -0,0 +1,306 @@
+"""
+Foto del catálogo en memoria para los cálculos sobre todo el inventario
+
+Los conteos por estado, los productos por categoría, el stock bajo y las
+estadísticas de la lista de productos recorren los mismos productos
+activos con unas pocas columnas, y cada uno volvía a consultarlos. La foto
+los guarda una vez por proceso en arrays de NumPy paralelos ordenados por
+id (una sola pasada de values_list) y responde en microsegundos:
+
+    from inventario import catalogo
+
+    foto = catalogo.actual()
+    foto.por_estado()                                # {'DISPONIBLE': 120, ...}
+    foto.filtrar(cantidad__lte=5).top('cantidad', 5, mayores=False)   # ids
+    foto.filtrar(bajo_minimo=True).por_categoria()   # {categoria_id: n}
+    foto.filtrar(categoria__in=[1, 2]).suma('valor')
+
+Columnas: cantidad, cantidad_minima, precio (precio_compra), valor
+(cantidad × precio, calculada), categoria y estado. Filtros: columna,
+columna__lt/lte/gt/gte/in y bajo_minimo (cantidad <= cantidad_minima).
+
+Vigencia:
+
+- Producto.save() y delete() actualizan la foto del proceso al confirmarse
+  la transacción (sin volver a leer todo), solo si su incremento de la
+  versión de 'inventario' es el único desde que se armó la foto; si hubo
+  otros cambios la foto se descarta. Si la transacción se revierte la foto
+  queda atrasada y se reconstruye en la siguiente lectura.
+- Las escrituras que no pasan por save() ya invalidan el espacio
+  'inventario' de la caché (sisbar_config/cache.py), igual que los otros
+  workers al guardar: cada CATALOGO_REVISAR segundos se compara esa
+  versión con la de la foto y, si cambió, se reconstruye.
+- Además la foto se reconstruye entera cada CATALOGO_VIGENCIA segundos.
+
+Cantidad es el stock consolidado: los descuentos pendientes de los
+productos fraccionados no cuentan (igual que en las consultas que
+reemplaza). El precio es float: para valorar al centavo está
+inventario/valoracion.py.
+
+NumPy se importa recién al usar la foto, no al cargar las vistas.
+"""
+
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+
+from sisbar_config import cache as cache_sisbar
+from .models import Producto
+
+
+ESTADOS = tuple(clave for clave, _ in Producto.ESTADOS)
+_CODIGO_ESTADO = {estado: codigo for codigo, estado in enumerate(ESTADOS)}
+
+# Columna de la foto -> campo de Producto
+CAMPOS = {
+    'cantidad': 'cantidad',
+    'cantidad_minima': 'cantidad_minima',
+    'precio': 'precio_compra',
+    'categoria': 'categoria_id',
+    'estado': 'estado',
+}
+TIPOS = {
+    'cantidad': np.int64,
+    'cantidad_minima': np.int64,
+    'precio': np.float64,
+    'categoria': np.int64,
+    'estado': np.int8,
+}
+
+OPERADORES = {
+    'lt': np.less,
+    'lte': np.less_equal,
+    'gt': np.greater,
+    'gte': np.greater_equal,
+}
+
+
+def _valores(producto):
+    """Valores de las columnas de la foto para una instancia"""
+    return (
+        producto.cantidad,
+        producto.cantidad_minima,
+        float(producto.precio_compra or 0),
+        producto.categoria_id,
+        _CODIGO_ESTADO.get(producto.estado, -1),
+    )
+
+
+# ========== CONSULTAS ==========
+class Seleccion:
+    """Productos elegidos de una foto: índices sobre sus arrays (None = todos)"""
+
+    __slots__ = ('columnas', 'indices')
+
+    def __init__(self, columnas, indices=None):
+        self.columnas = columnas
+        self.indices = indices
+
+    def _posiciones(self, elegidas):
+        """Posiciones en los arrays de la foto de las filas `elegidas` de la selección"""
+        return elegidas if self.indices is None else self.indices[elegidas]
+
+    def columna(self, nombre):
+        if nombre == 'valor':
+            return self.columna('cantidad') * self.columna('precio')
+        datos = self.columnas[nombre]
+        return datos if self.indices is None else datos[self.indices]
+
+    def filtrar(self, **condiciones):
+        mascara = None
+        for condicion, valor in condiciones.items():
+            cumple = self._condicion(condicion, valor)
+            mascara = cumple if mascara is None else mascara & cumple
+        if mascara is None:
+            return self
+        return Seleccion(self.columnas, self._posiciones(np.flatnonzero(mascara)))
+
+    def _condicion(self, condicion, valor):
+        if condicion == 'bajo_minimo':
+            return (self.columna('cantidad') <= self.columna('cantidad_minima')) == bool(valor)
+        nombre, _, operador = condicion.partition('__')
+        if nombre == 'estado':
+            valor = [_CODIGO_ESTADO.get(v, -1) for v in valor] if operador == 'in' else _CODIGO_ESTADO.get(valor, -1)
+        datos = self.columna(nombre)
+        if not operador:
+            return datos == valor
+        if operador == 'in':
+            return np.isin(datos, list(valor))
+        if operador not in OPERADORES:
+            raise ValueError(f'Filtro no soportado: {condicion}')
+        return OPERADORES[operador](datos, valor)
+
+    def contar(self):
+        return len(self.columnas['id']) if self.indices is None else len(self.indices)
+
+    def ids(self):
+        return self.columna('id').tolist()
+
+    def suma(self, nombre):
+        return self.columna(nombre).sum().item()
+
+    def por_estado(self):
+        """Conteo por estado (todos los estados, aunque sea 0)"""
+        # +1: el código -1 (estado desconocido) cae en la posición 0 y se descarta
+        conteos = np.bincount(self.columna('estado') + 1, minlength=len(ESTADOS) + 1)[1:]
+        return dict(zip(ESTADOS, conteos.tolist()))
+
+    def por_categoria(self, nombre=None):
+        """{categoria_id: conteo} o, con `nombre`, la suma de esa columna"""
+        # Los ids de categoría son pocos y chicos: se cuentan por posición
+        categorias = self.columna('categoria')
+        conteos = np.bincount(categorias)
+        presentes = np.flatnonzero(conteos)
+        if nombre is None:
+            totales = conteos[presentes]
+        else:
+            totales = np.bincount(categorias, weights=self.columna(nombre))[presentes]
+        return dict(zip(presentes.tolist(), totales.tolist()))
+
+    def top(self, nombre, k, mayores=True):
+        """Ids de los k productos con mayor (o menor) valor; empates por id"""
+        valores = self.columna(nombre)
+        if not mayores:
+            valores = -valores
+        k = min(k, len(valores))
+        if k <= 0:
+            return []
+        # Todos los que igualan al k-ésimo entran como candidatos: el empate
+        # en el borde también se decide por id
+        umbral = np.partition(valores, len(valores) - k)[len(valores) - k]
+        candidatos = np.flatnonzero(valores >= umbral)
+        ids = self.columnas['id'][self._posiciones(candidatos)]
+        orden = np.lexsort((ids, -valores[candidatos]))[:k]
+        return ids[orden].tolist()
+
+
+class Catalogo(Seleccion):
+    """Foto de los productos activos; `columnas` se reemplaza entera al cambiar de tamaño"""
+
+    __slots__ = ('version', 'creada')
+
+    def __init__(self, columnas, version):
+        super().__init__(columnas)
+        self.version = version
+        self.creada = time.monotonic()
+
+    @classmethod
+    def construir(cls):
+        version = _version()
+        # Siempre de la base principal: la foto la comparten todas las
+        # peticiones del proceso, también las que leen de la réplica
+        filas = list(
+            Producto.objects.using(DEFAULT_DB_ALIAS).filter(activo=True).order_by('id')
+            .values_list('id', *CAMPOS.values())
+        )
+        columnas = {'id': np.fromiter((f[0] for f in filas), dtype=np.int64, count=len(filas))}
+        for posicion, nombre in enumerate(CAMPOS, start=1):
+            if nombre == 'estado':
+                datos = (_CODIGO_ESTADO.get(f[posicion], -1) for f in filas)
+            elif nombre == 'precio':
+                datos = (float(f[posicion] or 0) for f in filas)
+            else:
+                datos = (f[posicion] for f in filas)
+            columnas[nombre] = np.fromiter(datos, dtype=TIPOS[nombre], count=len(filas))
+        return cls(columnas, version)
+
+    def aplicar(self, producto_id, valores):
+        """Actualiza, agrega o (con valores=None) quita un producto"""
+        ids = self.columnas['id']
+        posicion = int(np.searchsorted(ids, producto_id))
+        existe = posicion < len(ids) and ids[posicion] == producto_id
+        if existe and valores is not None:
+            for nombre, valor in zip(CAMPOS, valores):
+                self.columnas[nombre][posicion] = valor
+            return
+        if existe:
+            columnas = {nombre: np.delete(datos, posicion) for nombre, datos in self.columnas.items()}
+        elif valores is not None:
+            columnas = {'id': np.insert(ids, posicion, producto_id)}
+            for nombre, valor in zip(CAMPOS, valores):
+                columnas[nombre] = np.insert(self.columnas[nombre], posicion, valor)
+        else:
+            return
+        # Las selecciones ya hechas conservan los arrays anteriores
+        self.columnas = columnas
+
+
+# ========== FOTO DEL PROCESO ==========
+_foto = None
+_revisada = 0.0
+_lock = threading.Lock()
+
+
+def _version():
+    return cache_sisbar.versiones(('inventario',))[0]
+
+
+def actual():
+    """La foto vigente del proceso (la construye o reconstruye si hace falta)"""
+    global _foto, _revisada
+    foto = _foto
+    ahora = time.monotonic()
+    if foto is not None and ahora - foto.creada < getattr(settings, 'CATALOGO_VIGENCIA', 300):
+        if ahora - _revisada < getattr(settings, 'CATALOGO_REVISAR', 1):
+            return foto
+        _revisada = ahora
+        if _version() == foto.version:
+            return foto
+
+    with _lock:
+        if _foto is foto:
+            _conectar()
+            _foto = Catalogo.construir()
+            _revisada = time.monotonic()
+        return _foto
+
+
+def descartar():
+    """La próxima lectura reconstruye la foto"""
+    global _foto
+    _foto = None
+
+
+# ========== SEÑALES ==========
+def _aplicar(producto_id, valores, version):
+    """
+    `version`: la del espacio 'inventario' después del incremento del propio
+    guardado. La foto avanza solo si ese incremento es el único desde que se
+    construyó; si hubo otros (update() masivos, otro worker) le faltan esos
+    cambios y se descarta.
+    """
+    foto = _foto
+    if foto is None:
+        return
+    with _lock:
+        if _foto is not foto:
+            return
+        if foto.version + 1 != version or _version() != version:
+            descartar()
+            return
+        foto.aplicar(producto_id, valores)
+        foto.version = version
+
+
+def _al_guardar(sender, instance, **kwargs):
+    valores = _valores(instance) if instance.activo else None
+    # Los receptores de la caché ya incrementaron la versión (ver _conectar)
+    version = _version()
+    transaction.on_commit(lambda: _aplicar(instance.pk, valores, version))
+
+
+def _al_eliminar(sender, instance, **kwargs):
+    producto_id = instance.pk
+    version = _version()
+    transaction.on_commit(lambda: _aplicar(producto_id, None, version))
+
+
+def _conectar():
+    # Al construir la primera foto (después de los receptores de la caché,
+    # que incrementan la versión antes de que se lea aquí)
+    post_save.connect(_al_guardar, sender=Producto, dispatch_uid='catalogo:guardar')
+    post_delete.connect(_al_eliminar, sender=Producto, dispatch_uid='catalogo:eliminar')
@@ -0,0 +1,240 @@
+"""
+Conciliación del libro de stock
+
+Cada movimiento guarda la cantidad antes y después de aplicarse, así que
+los movimientos de un producto forman una cadena:
+
+    cantidad_anterior[i] == cantidad_nueva[i - 1]
+
+y la última cantidad_nueva tiene que coincidir con Producto.cantidad. Nada
+lo verificaba, y hay caminos que no pasan por Producto.save() (update()
+masivos, bulk_update). Este módulo revisa:
+
+- cadena:    el movimiento no parte de donde terminó el anterior
+- operacion: cantidad_nueva no es cantidad_anterior ± cantidad según el tipo
+- saldo:     el último movimiento no deja la cantidad que tiene el producto
+- estado:    el estado del producto no corresponde a su cantidad (lo
+             calcula la base con una columna generada: queda como
+             control de que la regla coincide con estado_para())
+
+Los descuentos de productos fraccionados que todavía no se consolidaron
+(inventario/fracciones.py) no cuentan: Producto.cantidad aún no los
+incluye.
+
+Los movimientos se leen ordenados por (producto, fecha, id) en bloques y
+cada bloque se revisa con NumPy de una vez (sin recorrer fila por fila en
+Python). El comando `conciliar_stock` reparte los productos en rangos de
+ids y revisa cada rango en un proceso distinto.
+
+Se importa antes de django.setup() en los procesos hijos, por eso los
+modelos se importan dentro de las funciones.
+"""
+
+from collections import Counter
+from itertools import islice
+
+import numpy as np
+
+
+TAMANO_BLOQUE = 200_000
+
+# Detalles que devuelve cada partición (los conteos siempre son completos)
+MAXIMO_DETALLES = 1000
+
+TIPOS_DISCREPANCIA = ('cadena', 'operacion', 'saldo', 'estado')
+
+# Códigos numéricos para comparar estados con NumPy
+ESTADOS = ('DISPONIBLE', 'POR_AGOTAR', 'AGOTADO')
+NOMBRES_ESTADO = np.array([*ESTADOS, None], dtype=object)   # -1 = estado desconocido
+
+
+def iniciar_proceso():
+    """Inicializador de los procesos hijos (arrancan limpios con spawn)"""
+    import django
+    django.setup()
+
+
+# ========== PARTICIONES ==========
+def particiones(cantidad):
+    """
+    Reparte los ids de producto en `cantidad` rangos (desde, hasta) con más
+    o menos los mismos productos cada uno
+    """
+    from .models import Producto
+
+    ids = np.fromiter(Producto._base_manager.order_by('id').values_list('id', flat=True), dtype=np.int64)
+    if not len(ids):
+        return []
+    return [
+        (int(grupo[0]), int(grupo[-1]))
+        for grupo in np.array_split(ids, min(max(cantidad, 1), len(ids)))
+    ]
+
+
+# ========== LECTURA ==========
+def _bloques(desde, hasta, tamano):
+    """
+    Movimientos de los productos desde..hasta en orden de la cadena, en
+    arrays de filas (producto, signo, cantidad, anterior, nueva, id). El
+    signo es +1 para entradas y devoluciones, -1 para salidas y 0 para
+    ajustes (que pueden ir en cualquier sentido).
+    """
+    from django.db.models import Case, IntegerField, Value, When
+    from movimientos.models import Movimiento
+
+    filas = Movimiento.objects.filter(
+        producto_id__gte=desde, producto_id__lte=hasta, consolidado=True
+    ).annotate(signo=Case(
+        When(tipo__in=('ENTRADA', 'DEVOLUCION'), then=Value(1)),
+        When(tipo='SALIDA', then=Value(-1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )).order_by('producto_id', 'fecha', 'id').values_list(
+        'producto_id', 'signo', 'cantidad', 'cantidad_anterior', 'cantidad_nueva', 'id'
+    ).iterator(chunk_size=tamano)
+
+    while True:
+        bloque = list(islice(filas, tamano))
+        if not bloque:
+            return
+        yield np.array(bloque, dtype=np.int64)
+
+
+def _productos(desde, hasta):
+    """(ids, cantidades, estados actuales, estados esperados) de los productos del rango"""
+    from django.db.models import Case, IntegerField, Value, When
+    from .models import Producto
+
+    filas = Producto._base_manager.filter(id__gte=desde, id__lte=hasta).annotate(
+        codigo_estado=Case(
+            *(When(estado=estado, then=Value(i)) for i, estado in enumerate(ESTADOS)),
+            default=Value(-1),
+            output_field=IntegerField(),
+        )
+    ).order_by('id').values_list('id', 'cantidad', 'cantidad_minima', 'codigo_estado')
+    datos = np.array(list(filas), dtype=np.int64).reshape(-1, 4)
+    ids, cantidades, minimas, estados = datos.T
+    # Misma regla que Producto.estado_para()
+    esperados = np.where(cantidades == 0, 2, np.where(cantidades <= minimas, 1, 0))
+    return ids, cantidades, estados, esperados
+
+
+# ========== REVISIÓN ==========
+class _Reporte:
+    """Acumula conteos y los primeros detalles de una partición"""
+
+    def __init__(self):
+        self.conteo = Counter()
+        self.detalles = []
+
+    def anotar(self, tipo, productos, movimientos, esperados, encontrados):
+        if not len(productos):
+            return
+        self.conteo[tipo] += len(productos)
+        if movimientos is None:
+            movimientos = np.full(len(productos), None, dtype=object)
+        libres = max(MAXIMO_DETALLES - len(self.detalles), 0)
+        for producto, movimiento, esperado, encontrado in islice(
+            zip(productos.tolist(), movimientos.tolist(), esperados.tolist(), encontrados.tolist()), libres
+        ):
+            self.detalles.append({
+                'tipo': tipo,
+                'producto_id': producto,
+                'movimiento_id': movimiento,
+                'esperado': esperado,
+                'encontrado': encontrado,
+            })
+
+
+def revisar_particion(desde, hasta, tamano=TAMANO_BLOQUE):
+    """
+    Revisa los productos desde..hasta (ids inclusive). Devuelve un dict con
+    el rango, los totales revisados, el conteo por tipo de discrepancia y
+    hasta MAXIMO_DETALLES detalles. Se puede correr en un proceso hijo.
+    """
+    reporte = _Reporte()
+    movimientos = 0
+    finales = []        # arrays (producto, cantidad_nueva, id) del último movimiento de cada producto
+    previo = None       # última fila del bloque anterior
+
+    for bloque in _bloques(desde, hasta, tamano):
+        producto, signo, cantidad, anterior, nueva, ids = bloque.T
+        movimientos += len(bloque)
+
+        # Operación: la diferencia tiene que ser la cantidad con el signo del tipo
+        delta = nueva - anterior
+        esperada = anterior + signo * cantidad
+        mala = np.where(signo != 0, delta != signo * cantidad, np.abs(delta) != cantidad)
+        reporte.anotar('operacion', producto[mala], ids[mala], esperada[mala], nueva[mala])
+
+        # Cadena dentro del bloque
+        rotos = np.flatnonzero((producto[1:] == producto[:-1]) & (anterior[1:] != nueva[:-1])) + 1
+        reporte.anotar('cadena', producto[rotos], ids[rotos], nueva[rotos - 1], anterior[rotos])
+
+        # Cadena entre bloques: la primera fila sigue a la última del anterior
+        if previo is not None:
+            if previo[0] == producto[0]:
+                if previo[4] != anterior[0]:
+                    reporte.anotar('cadena', producto[:1], ids[:1], previo[4:5], anterior[:1])
+            else:
+                finales.append(previo[None, [0, 4, 5]])
+
+        # Último movimiento de cada producto que termina dentro del bloque
+        cierres = np.flatnonzero(producto[1:] != producto[:-1])
+        finales.append(bloque[cierres][:, [0, 4, 5]])
+        previo = bloque[-1]
+
+    if previo is not None:
+        finales.append(previo[None, [0, 4, 5]])
+
+    ids_producto, cantidades, estados, esperados = _productos(desde, hasta)
+
+    # Saldo: solo los productos con movimientos (los demás no tienen con qué compararse)
+    if finales:
+        producto, nueva, ids = np.concatenate(finales).T
+        posicion = np.searchsorted(ids_producto, producto)
+        existe = posicion < len(ids_producto)
+        existe[existe] = ids_producto[posicion[existe]] == producto[existe]
+        producto, nueva, ids, posicion = producto[existe], nueva[existe], ids[existe], posicion[existe]
+        distinto = cantidades[posicion] != nueva
+        reporte.anotar('saldo', producto[distinto], ids[distinto], nueva[distinto], cantidades[posicion][distinto])
+
+    # Estado: el que corresponde a la cantidad actual
+    malos = estados != esperados
+    reporte.anotar('estado', ids_producto[malos], None, NOMBRES_ESTADO[esperados[malos]], NOMBRES_ESTADO[estados[malos]])
+
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'productos': len(ids_producto),
+        'movimientos': movimientos,
+        'conteo': dict(reporte.conteo),
+        'detalles': reporte.detalles,
+    }
+
+
+def combinar(resultados):
+    """Junta los resultados de varias particiones en un solo reporte"""
+    conteo = Counter()
+    detalles = []
+    productos = movimientos = 0
+    for resultado in resultados:
+        productos += resultado['productos']
+        movimientos += resultado['movimientos']
+        conteo.update(resultado['conteo'])
+        detalles.extend(resultado['detalles'])
+    detalles.sort(key=lambda d: (d['producto_id'], d['movimiento_id'] or 0, d['tipo']))
+    return {
+        'productos': productos,
+        'movimientos': movimientos,
+        'conteo': {tipo: conteo.get(tipo, 0) for tipo in TIPOS_DISCREPANCIA},
+        'discrepancias': sum(conteo.values()),
+        'detalles': detalles,
+    }
+
+
+def conciliar(rangos=None, tamano=TAMANO_BLOQUE):
+    """Revisa todo el inventario en este proceso (para pruebas y scripts)"""
+    if rangos is None:
+        rangos = particiones(1)
+    return combinar(revisar_particion(desde, hasta, tamano) for desde, hasta in rangos)
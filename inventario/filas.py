@@ -0,0 +1,79 @@
+"""
+Filas livianas de la lista de productos (ver sisbar_config/filas.py)
+
+Solo las columnas que muestra inventario/listar_productos.html, con los
+mismos nombres y métodos que usa la plantilla en un Producto.
+"""
+
+from django.db.models.fields.files import FieldFile
+from django.db.models.functions import Substr
+
+from sisbar_config.filas import Fila
+from .models import COLORES_ESTADO, ICONOS_ESTADO, Producto
+
+
+ETIQUETAS_ESTADO = dict(Producto.ESTADOS)
+ETIQUETAS_UNIDAD = dict(Producto.UNIDADES_MEDIDA)
+
+# La lista muestra la descripción con truncatewords:8: no hace falta traer
+# el texto completo
+LARGO_DESCRIPCION = 200
+
+
+class CategoriaFila(Fila):
+    __slots__ = ('id', 'nombre', 'icono', 'color')
+    columnas = ('id', 'nombre', 'icono', 'color')
+
+
+class SubcategoriaFila(Fila):
+    __slots__ = ('id', 'nombre')
+    columnas = ('id', 'nombre')
+
+
+class ProveedorProductoFila(Fila):
+    __slots__ = ('id', 'nombre')
+    columnas = ('id', 'nombre')
+
+
+class EstadoFila(Fila):
+    """Producto reducido al estado, para las filas que lo referencian (alertas)"""
+
+    __slots__ = ('id', 'nombre', 'estado')
+    columnas = ('id', 'nombre', 'estado')
+
+    def get_estado_color(self):
+        return COLORES_ESTADO.get(self.estado, 'secondary')
+
+    def get_estado_icono(self):
+        return ICONOS_ESTADO.get(self.estado, '⚪')
+
+    def get_estado_display(self):
+        return ETIQUETAS_ESTADO.get(self.estado, self.estado)
+
+
+class ProductoFila(EstadoFila):
+    __slots__ = (
+        'codigo', 'codigo_barras', 'descripcion', 'cantidad', 'cantidad_minima',
+        'unidad_medida', 'precio_compra', '_imagen', 'imagen_versiones',
+        'categoria', 'subcategoria', 'proveedor',
+    )
+    columnas = (
+        'id', 'codigo', 'codigo_barras', 'nombre', ('descripcion', Substr('descripcion', 1, LARGO_DESCRIPCION)),
+        'cantidad', 'cantidad_minima', 'unidad_medida', 'estado', 'precio_compra',
+        ('_imagen', 'imagen'), 'imagen_versiones',
+    )
+    relaciones = {
+        'categoria': CategoriaFila,
+        'subcategoria': SubcategoriaFila,
+        'proveedor': ProveedorProductoFila,
+    }
+
+    # Para la etiqueta {% imagen %} (sisbar_config/imagenes.py)
+    _meta = Producto._meta
+
+    @property
+    def imagen(self):
+        return FieldFile(None, Producto._meta.get_field('imagen'), self._imagen)
+
+    def get_unidad_medida_display(self):
+        return ETIQUETAS_UNIDAD.get(self.unidad_medida, self.unidad_medida)
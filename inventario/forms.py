@@ -86,6 +86,8 @@ class ProductoForm(forms.ModelForm):
         # Filtrar solo categorías y proveedores activos
         self.fields['categoria'].queryset = Categoria.objects.filter(activa=True)
         self.fields['proveedor'].queryset = Proveedor.objects.filter(activo=True)
+        # Subcategoria.__str__ muestra la categoría: traerla en la misma consulta
+        self.fields['subcategoria'].queryset = Subcategoria.objects.select_related('categoria')
         
         # Si hay una categoría seleccionada, filtrar subcategorías
         if 'categoria' in self.data:
@@ -94,13 +96,13 @@ class ProductoForm(forms.ModelForm):
                 self.fields['subcategoria'].queryset = Subcategoria.objects.filter(
                     categoria_id=categoria_id,
                     activa=True
-                )
+                ).select_related('categoria')
             except (ValueError, TypeError):
                 pass
         elif self.instance.pk:
             self.fields['subcategoria'].queryset = self.instance.categoria.subcategorias.filter(
                 activa=True
-            )
+            ).select_related('categoria')
 
 
 class DescontarProductoForm(forms.Form):
@@ -0,0 +1,269 @@
+"""
+Stock fraccionado para los productos más vendidos
+
+En la hora pico todos los cajeros escanean los mismos pocos productos
+(cerveza de barril, ron de la casa) y cada descuento actualiza la misma
+fila de Producto: en PostgreSQL los UPDATE sobre una fila esperan uno
+detrás de otro. Con `fraccionar(producto, n)` el stock del producto se
+reparte en n filas de FraccionStock y cada escaneo descuenta de una de
+ellas (elegida al azar) con
+
+    UPDATE ... SET disponible = disponible - x, descontado = descontado + x
+    WHERE producto = p AND numero = k AND disponible >= x
+
+así los cajeros rara vez esperan por la misma fila. Reglas:
+
+- Stock nunca negativo: las fracciones solo reparten stock que existe
+  (la suma de `disponible` nunca supera Producto.cantidad) y ninguna
+  baja de cero. Si la fracción elegida no alcanza se prueban las demás;
+  si ninguna alcanza el descuento se hace directo sobre el producto, con
+  lo pendiente consolidado, y el resto se vuelve a repartir.
+- Producto.cantidad es el stock consolidado; el actual es cantidad menos
+  lo descontado en las fracciones (Producto.stock_actual()).
+- Cada escaneo crea su Movimiento al momento (usuario, motivo, fecha y
+  costo exactos) con consolidado=False y la cantidad anterior/nueva
+  estimadas. La consolidación los encadena en orden de fecha, los valora,
+  pasa el total a Producto.cantidad y vuelve a repartir el stock.
+- Cualquier otra escritura del stock de un producto fraccionado (entradas,
+  edición, sincronización del escáner) consolida primero dentro de su
+  transacción (`consolidado()`), así la cadena de movimientos no se cruza.
+
+La consolidación corre sola FRACCIONES_CONSOLIDAR_CADA segundos después
+del primer descuento pendiente (como tarea en segundo plano) y también con
+`python manage.py consolidar_stock`.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from copy import copy
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, transaction
+from django.db.models import F, Max, Sum
+
+from sisbar_config import eventos, tareas
+from sisbar_config.sqlite import escritura
+from .models import CENTAVO, FraccionStock, Producto
+
+
+# Reintentos de la consolidación en segundo plano si la base está ocupada
+REINTENTOS = 3
+PAUSA_REINTENTO = 0.5
+
+
+# ========== LECTURA ==========
+def pendiente(producto_id):
+    """Unidades descontadas en las fracciones que todavía no se consolidaron"""
+    return FraccionStock.objects.filter(producto_id=producto_id).aggregate(
+        total=Sum('descontado')
+    )['total'] or 0
+
+
+def _stock_estimado(producto_id):
+    totales = FraccionStock.objects.filter(producto_id=producto_id).aggregate(
+        cantidad=Max('producto__cantidad'), descontado=Sum('descontado')
+    )
+    return (totales['cantidad'] or 0) - (totales['descontado'] or 0)
+
+
+# ========== DESCUENTO ==========
+def _tomar(producto, cantidad):
+    """Descuenta de la primera fracción que alcance, empezando por una al azar"""
+    inicio = random.randrange(producto.fracciones)
+    for i in range(producto.fracciones):
+        if FraccionStock.objects.filter(
+            producto_id=producto.pk, numero=(inicio + i) % producto.fracciones, disponible__gte=cantidad
+        ).update(disponible=F('disponible') - cantidad, descontado=F('descontado') + cantidad):
+            return True
+    return False
+
+
+def descontar(producto, cantidad, usuario=None, motivo=''):
+    """
+    Descuenta desde una fracción y registra el movimiento pendiente.
+    Devuelve el stock actual estimado; ValueError si no alcanza.
+    """
+    from movimientos.models import Movimiento
+
+    with escritura():
+        if _tomar(producto, cantidad):
+            restante = _stock_estimado(producto.pk)
+            costo = producto.costo_vigente()
+            Movimiento.objects.create(
+                producto=producto,
+                tipo='SALIDA',
+                cantidad=cantidad,
+                usuario=usuario,
+                cantidad_anterior=restante + cantidad,
+                cantidad_nueva=restante,
+                motivo=motivo,
+                costo_unitario=costo,
+                valor=(cantidad * costo).quantize(CENTAVO),
+                consolidado=False,
+            )
+            estimado = copy(producto)
+            estimado.cantidad = restante
+            estimado.estado = producto.estado_para(restante)
+            eventos.publicar('stock', estimado.datos_evento())
+            transaction.on_commit(lambda: programar_consolidacion(producto.pk))
+            return restante
+
+    # Ninguna fracción alcanza (el stock quedó repartido o el descuento es
+    # más grande que una fracción): directo sobre el producto, con lo
+    # pendiente consolidado y las fracciones bloqueadas
+    with consolidado(producto):
+        producto.registrar_salida(cantidad, usuario, motivo)
+    return producto.cantidad
+
+
+def _clave_consolidacion(producto_id):
+    return f'fracciones:consolidar:{producto_id}'
+
+
+def programar_consolidacion(producto_id):
+    """Agenda una consolidación en segundo plano (una por producto cada tanto)"""
+    cada = getattr(settings, 'FRACCIONES_CONSOLIDAR_CADA', 30)
+    if cada > 0 and cache.add(_clave_consolidacion(producto_id), True, cada):
+        tareas.encolar('Consolidar stock fraccionado', _tarea_consolidar, producto_id)
+
+
+def _tarea_consolidar(progreso, producto_id):
+    producto = Producto.objects.filter(pk=producto_id).first()
+    if producto is None:
+        return
+    for intento in range(REINTENTOS):
+        try:
+            progreso.terminar(f'{consolidar(producto)} movimientos consolidados')
+            return
+        except OperationalError:
+            # SQLite: otra escritura tenía la base bloqueada
+            if intento == REINTENTOS - 1:
+                # El próximo descuento vuelve a programarla
+                cache.delete(_clave_consolidacion(producto_id))
+                raise
+            time.sleep(PAUSA_REINTENTO * (intento + 1))
+
+
+# ========== CONSOLIDACIÓN ==========
+def _copiar(origen, destino):
+    """Pasa a `destino` los valores guardados de `origen` (mismo producto)"""
+    for campo in Producto._meta.concrete_fields:
+        setattr(destino, campo.attname, getattr(origen, campo.attname))
+    destino._valor_guardado = origen._valor_guardado
+    destino._marcar_bloqueada()
+
+
+def plegar(producto):
+    """
+    Encadena y valora los movimientos pendientes de `producto` (ya bloqueado
+    con select_for_update) y los pasa a su cantidad. Deja bloqueadas las
+    fracciones hasta el final de la transacción y las devuelve.
+    """
+    from movimientos.models import Movimiento
+
+    fracciones = list(FraccionStock.objects.select_for_update().filter(producto=producto).order_by('numero'))
+    pendientes = list(Movimiento.objects.filter(producto=producto, consolidado=False).order_by('fecha', 'id'))
+    if not pendientes:
+        return fracciones, 0
+
+    estado_anterior = producto.estado
+    for movimiento in pendientes:
+        anterior = producto.cantidad
+        valoracion = producto.valorar(anterior - movimiento.cantidad)
+        movimiento.cantidad_anterior = anterior
+        movimiento.cantidad_nueva = producto.cantidad
+        movimiento.valor_stock = valoracion['valor_stock']
+        movimiento.consolidado = True
+    Movimiento.objects.bulk_update(
+        pendientes, ['cantidad_anterior', 'cantidad_nueva', 'valor_stock', 'consolidado']
+    )
+    producto.ultima_salida = pendientes[-1].fecha
+    producto.save()
+
+    if producto.estado != estado_anterior and producto.estado != 'DISPONIBLE':
+        from movimientos.models import AlertaInventario
+        transaction.on_commit(AlertaInventario.generar_alertas)
+    return fracciones, len(pendientes)
+
+
+def repartir(producto, fracciones):
+    """Reparte Producto.cantidad entre las fracciones (bloqueadas)"""
+    if not fracciones:
+        return
+    base, resto = divmod(max(producto.cantidad, 0), len(fracciones))
+    for fraccion in fracciones:
+        fraccion.disponible = base + (1 if fraccion.numero < resto else 0)
+        fraccion.descontado = 0
+    FraccionStock.objects.bulk_update(fracciones, ['disponible', 'descontado'])
+
+
+def consolidar(producto):
+    """
+    Consolida un producto fraccionado y actualiza la instancia. Devuelve
+    cuántos movimientos consolidó.
+    """
+    with escritura():
+        actual = Producto.objects.select_for_update().get(pk=producto.pk)
+        actual._marcar_bloqueada()
+        fracciones, consolidados = plegar(actual)
+        repartir(actual, fracciones)
+    _copiar(actual, producto)
+    return consolidados
+
+
+def consolidar_todos():
+    """Consolida los productos con descuentos pendientes; devuelve (productos, movimientos)"""
+    ids = FraccionStock.objects.filter(descontado__gt=0).values_list('producto_id', flat=True).distinct()
+    productos = movimientos = 0
+    for producto in Producto.objects.filter(pk__in=list(ids)).order_by('id'):
+        movimientos += consolidar(producto)
+        productos += 1
+    return productos, movimientos
+
+
+@contextmanager
+def consolidado(producto, conservar=()):
+    """
+    Para escribir el stock de un producto fraccionado por otro camino:
+    consolida antes (la instancia recibe los valores guardados, salvo los
+    campos de `conservar`, por ejemplo los que cambió un formulario) y al
+    salir reparte la cantidad que quedó. Todo en una transacción.
+
+        with consolidado(producto):
+            producto.cantidad += 10
+            producto.save()
+
+    Con productos sin fraccionar no hace nada.
+    """
+    if not producto.fracciones or producto.pk is None:
+        yield producto
+        return
+    with escritura():
+        actual = Producto.objects.select_for_update().get(pk=producto.pk)
+        actual._marcar_bloqueada()
+        fracciones, _ = plegar(actual)
+        conservados = {campo: getattr(producto, campo) for campo in conservar}
+        _copiar(actual, producto)
+        for campo, valor in conservados.items():
+            setattr(producto, campo, valor)
+        yield producto
+        repartir(producto, fracciones)
+
+
+# ========== CONFIGURACIÓN ==========
+def fraccionar(producto, cantidad):
+    """Reparte el stock del producto en `cantidad` fracciones (0 = volver a una sola fila)"""
+    with escritura():
+        actual = Producto.objects.select_for_update().get(pk=producto.pk)
+        actual._marcar_bloqueada()
+        plegar(actual)
+        FraccionStock.objects.filter(producto=actual).delete()
+        fracciones = FraccionStock.objects.bulk_create(
+            FraccionStock(producto=actual, numero=numero) for numero in range(cantidad)
+        )
+        repartir(actual, fracciones)
+        actual.fracciones = cantidad
+        actual.save(update_fields=['fracciones'])
+    _copiar(actual, producto)
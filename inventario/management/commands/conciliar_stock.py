@@ -0,0 +1,108 @@
+"""
+Concilia el stock de cada producto con su historial de movimientos
+
+Uso:
+    python manage.py conciliar_stock
+    python manage.py conciliar_stock --procesos 8 --json conciliacion.json
+    python manage.py conciliar_stock --procesos 0 --fallar
+
+Revisa que los movimientos de cada producto formen una cadena continua
+(cada uno parte de la cantidad en que terminó el anterior), que cada uno
+cuadre con su tipo y cantidad, que el último deje la cantidad que tiene el
+producto y que el estado corresponda a esa cantidad. Ver
+inventario/conciliacion.py.
+
+Los productos se reparten en rangos de ids (por defecto cuatro por
+proceso, para que un rango con muchos movimientos no deje a los demás
+esperando) y cada proceso lee y revisa los movimientos de su rango. Con
+--fallar el comando termina con error si encuentra discrepancias (para
+correrlo en cron o en el despliegue).
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import conciliacion
+
+
+# Detalles que se muestran en la consola (el JSON los trae todos)
+MOSTRAR = 20
+
+
+class Command(BaseCommand):
+    help = 'Verifica que la cantidad de cada producto coincida con su cadena de movimientos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                            help='Procesos en paralelo (0 = en este mismo proceso)')
+        parser.add_argument('--particiones', type=int, default=0,
+                            help='Rangos de productos (por defecto 4 por proceso)')
+        parser.add_argument('--bloque', type=int, default=conciliacion.TAMANO_BLOQUE,
+                            help='Movimientos leídos por consulta')
+        parser.add_argument('--json', default='', help='Guardar el reporte en este archivo')
+        parser.add_argument('--fallar', action='store_true',
+                            help='Terminar con error si hay discrepancias')
+
+    def handle(self, *args, **options):
+        procesos = options['procesos']
+        rangos = conciliacion.particiones(options['particiones'] or max(procesos, 1) * 4)
+        if not rangos:
+            self.stdout.write(self.style.SUCCESS('✅ No hay productos para conciliar'))
+            return
+
+        self.stdout.write(f'🔎 Conciliando {len(rangos)} rangos de productos con {procesos} procesos...')
+        inicio = time.perf_counter()
+        reporte = conciliacion.combinar(self._revisar(rangos, procesos, options['bloque']))
+        segundos = time.perf_counter() - inicio
+        reporte['segundos'] = round(segundos, 2)
+
+        self.stdout.write(
+            f'   {reporte["productos"]} productos, {reporte["movimientos"]} movimientos en {segundos:.1f}s '
+            f'({reporte["movimientos"] / max(segundos, 1e-9):,.0f} movimientos/s)'
+        )
+        for tipo, cantidad in reporte['conteo'].items():
+            if cantidad:
+                self.stdout.write(f'   ⚠️  {tipo}: {cantidad}')
+        for detalle in reporte['detalles'][:MOSTRAR]:
+            movimiento = f' movimiento #{detalle["movimiento_id"]}' if detalle['movimiento_id'] else ''
+            self.stdout.write(
+                f'   ❌ producto #{detalle["producto_id"]}{movimiento} ({detalle["tipo"]}): '
+                f'esperado {detalle["esperado"]}, encontrado {detalle["encontrado"]}'
+            )
+        if len(reporte['detalles']) > MOSTRAR:
+            self.stdout.write(f'   ... y {len(reporte["detalles"]) - MOSTRAR} más')
+
+        if options['json']:
+            Path(options['json']).write_text(
+                json.dumps(reporte, indent=2, ensure_ascii=False) + '\n', encoding='utf-8'
+            )
+            self.stdout.write(f'💾 Reporte guardado en {options["json"]}')
+
+        if not reporte['discrepancias']:
+            self.stdout.write(self.style.SUCCESS('✅ El stock coincide con los movimientos'))
+        elif options['fallar']:
+            raise CommandError(f'{reporte["discrepancias"]} discrepancias en el stock')
+        else:
+            self.stdout.write(self.style.WARNING(f'⚠️ {reporte["discrepancias"]} discrepancias en el stock'))
+
+    def _revisar(self, rangos, procesos, bloque):
+        """Genera el resultado de cada rango a medida que terminan"""
+        if procesos <= 0:
+            for desde, hasta in rangos:
+                yield conciliacion.revisar_particion(desde, hasta, bloque)
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=min(procesos, len(rangos)),
+            mp_context=get_context('spawn'),
+            initializer=conciliacion.iniciar_proceso,
+        ) as pool:
+            futuros = [pool.submit(conciliacion.revisar_particion, desde, hasta, bloque) for desde, hasta in rangos]
+            for futuro in as_completed(futuros):
+                yield futuro.result()
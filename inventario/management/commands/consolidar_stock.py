@@ -0,0 +1,65 @@
+"""
+Consolida los descuentos pendientes de los productos con stock fraccionado
+
+Uso:
+    python manage.py consolidar_stock
+    python manage.py consolidar_stock --cada 10
+    python manage.py consolidar_stock --fraccionar CERV-001 RON-003 --fracciones 8
+    python manage.py consolidar_stock --fraccionar CERV-001 --fracciones 0
+
+Los escaneos de un producto fraccionado descuentan de sus fracciones y
+dejan el movimiento pendiente; consolidar los encadena, pasa el total a
+Producto.cantidad y vuelve a repartir el stock (ver inventario/fracciones.py).
+Además de la consolidación automática (FRACCIONES_CONSOLIDAR_CADA), este
+comando se puede correr en cron o, con --cada, como proceso aparte.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from inventario.fracciones import consolidar_todos, fraccionar
+from inventario.models import Producto
+
+
+class Command(BaseCommand):
+    help = 'Consolida el stock fraccionado de los productos más vendidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, default=0,
+                            help='Repetir cada estos segundos hasta Ctrl+C (0 = una sola vez)')
+        parser.add_argument('--fraccionar', nargs='+', default=[], metavar='CODIGO',
+                            help='Productos (código o código de barras) a los que cambiar las fracciones')
+        parser.add_argument('--fracciones', type=int, default=8,
+                            help='Fracciones para --fraccionar (0 = quitar el fraccionamiento)')
+
+    def handle(self, *args, **options):
+        if options['fraccionar']:
+            self.fraccionar(options['fraccionar'], options['fracciones'])
+            return
+
+        while True:
+            inicio = time.perf_counter()
+            productos, movimientos = consolidar_todos()
+            if productos or not options['cada']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'✅ {movimientos} movimientos de {productos} productos consolidados '
+                    f'en {(time.perf_counter() - inicio) * 1000:.0f} ms'
+                ))
+            if not options['cada']:
+                return
+            time.sleep(options['cada'])
+
+    def fraccionar(self, codigos, fracciones):
+        if fracciones < 0:
+            raise CommandError('--fracciones no puede ser negativo')
+        productos = list(Producto.objects.filter(Q(codigo__in=codigos) | Q(codigo_barras__in=codigos)))
+        encontrados = {p.codigo for p in productos} | {p.codigo_barras for p in productos}
+        faltantes = [c for c in codigos if c not in encontrados]
+        if faltantes:
+            raise CommandError(f'No se encontraron los productos: {", ".join(faltantes)}')
+        for producto in productos:
+            fraccionar(producto, fracciones)
+            self.stdout.write(f'   🍺 {producto.codigo} - {producto.nombre}: {fracciones} fracciones')
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(productos)} productos actualizados'))
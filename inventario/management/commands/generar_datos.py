@@ -0,0 +1,577 @@
+"""
+Generador de datos sintéticos para pruebas de escala
+
+Uso:
+    python manage.py generar_datos --productos 2000 --movimientos 1000000 --semilla 42
+
+Los registros generados llevan la etiqueta <prefijo><semilla> (S42-0000001,
+s42_admin_1, "Bavaria S42-0001", documento y NIT S42-000001): con otro
+prefijo la misma semilla se puede volver a generar; --limpiar borra solo los que tienen el
+prefijo. Las categorías y subcategorías se comparten con el catálogo real y
+no se borran. Crea usuarios con una contraseña conocida: fuera de DEBUG
+hay que pedirlo con --forzar.
+"""
+
+import random
+import re
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from categorias.models import Categoria, Subcategoria
+from inventario.models import Producto
+from inventario.valoracion import recalcular
+from movimientos.models import Movimiento, AlertaInventario
+from proveedores.models import Proveedor
+from sisbar_config.cache import invalidar
+from usuarios.models import Usuario, HistorialActividad
+
+
+# Catálogo base de un bar: (categoría, icono, color, subcategorías, marcas,
+# presentaciones, unidad de medida, rango de precio de compra)
+CATALOGO = (
+    ('Cervezas', '🍺', '#F59E0B',
+     ('Nacionales', 'Importadas', 'Artesanales', 'Barril'),
+     ('Águila', 'Club Colombia', 'Poker', 'Costeña', 'Corona', 'Heineken', 'Stella Artois', 'BBC Cajicá'),
+     ('Botella 330ml', 'Lata 355ml', 'Litro', 'Six pack'),
+     'UNIDAD', (1800, 9000)),
+    ('Licores', '🥃', '#B45309',
+     ('Aguardiente', 'Ron', 'Whisky', 'Tequila', 'Vodka'),
+     ('Antioqueño', 'Néctar', 'Medellín', 'Viejo de Caldas', 'Old Parr', "Buchanan's", 'José Cuervo', 'Absolut'),
+     ('Botella 750ml', 'Media 375ml', 'Garrafa 1750ml'),
+     'UNIDAD', (28000, 160000)),
+    ('Vinos', '🍷', '#7F1D1D',
+     ('Tintos', 'Blancos', 'Espumosos'),
+     ('Casillero del Diablo', 'Gato Negro', 'Santa Rita', 'Frontera'),
+     ('Botella 750ml', 'Botella 375ml'),
+     'UNIDAD', (25000, 90000)),
+    ('Bebidas sin Alcohol', '🥤', '#0EA5E9',
+     ('Gaseosas', 'Aguas', 'Jugos', 'Energizantes'),
+     ('Coca-Cola', 'Postobón', 'Cristal', 'Hit', 'Red Bull', 'Gatorade'),
+     ('Botella 400ml', 'Lata 355ml', 'Litro y medio'),
+     'UNIDAD', (1200, 7000)),
+    ('Snacks', '🍿', '#84CC16',
+     ('Paquetes', 'Frutos Secos', 'Picadas'),
+     ('Margarita', 'De Todito', 'Manimoto', 'Choclitos'),
+     ('Personal', 'Familiar'),
+     'PAQUETE', (1000, 8000)),
+    ('Coctelería', '🍸', '#EC4899',
+     ('Siropes', 'Frutas', 'Hielo'),
+     ('Monin', 'Limón Tahití', 'Hierbabuena', 'Hielo en Cubos'),
+     ('Unidad', 'Bolsa 2kg', 'Botella 700ml'),
+     'UNIDAD', (2000, 45000)),
+    ('Cigarrillos', '🚬', '#6B7280',
+     ('Cajetillas', 'Encendedores'),
+     ('Marlboro', 'Lucky Strike', 'Boston', 'Bic'),
+     ('Cajetilla x20', 'Unidad'),
+     'UNIDAD', (1500, 12000)),
+)
+
+PROVEEDORES_BASE = (
+    'Bavaria', 'Postobón', 'Distribuidora La Rebaja', 'Licorera Central',
+    'Dislicores', 'Alpina', 'Frito Lay', 'Importadora Andina',
+)
+
+CIUDADES = ('Bogotá', 'Medellín', 'Cali', 'Barranquilla', 'Bucaramanga', 'Pereira')
+
+NOMBRES = ('Ana', 'Carlos', 'Luisa', 'Andrés', 'Camila', 'Julián', 'Valentina', 'Mateo', 'Sofía', 'Santiago')
+APELLIDOS = ('Gómez', 'Rodríguez', 'Martínez', 'López', 'García', 'Restrepo', 'Vargas', 'Castro')
+
+# Distribución de roles para los usuarios generados
+ROLES = (('SUPER_ADMIN', 1), ('ADMIN', 2), ('AUDITOR', 1), ('EMPLEADO', 8))
+
+# Peso relativo de ventas por hora del día (0h..23h): un bar vende de noche
+PESOS_HORA = (
+    6, 4, 2, 1, 0.2, 0.1, 0.1, 0.1, 0.2, 0.3, 0.6, 1,
+    2, 2, 1.5, 1.5, 2, 3, 5, 8, 11, 13, 14, 10,
+)
+
+# Peso relativo de ventas por día de la semana (lunes..domingo)
+PESOS_DIA_SEMANA = (0.6, 0.6, 0.8, 1.0, 1.6, 1.9, 0.9)
+
+# Documento y NIT generados: <etiqueta>-<6 dígitos> en los 20 caracteres
+# del campo; los códigos de barras tienen 6 dígitos para el número de producto
+LARGO_ETIQUETA = 13
+MAXIMO_POR_TIPO = 999_999
+
+MOTIVOS = {'SALIDA': 'Venta', 'AJUSTE': 'Merma', 'DEVOLUCION': 'Devolución de cliente'}
+
+# Orden de columnas de las filas que se insertan con insertar_filas()
+CAMPOS_MOVIMIENTO = (
+    'producto', 'tipo', 'cantidad', 'cantidad_anterior', 'cantidad_nueva',
+    'motivo', 'observaciones', 'usuario', 'fecha',
+    'costo_unitario', 'valor', 'valor_stock', 'consolidado',
+)
+CAMPOS_HISTORIAL = ('usuario', 'tipo', 'descripcion', 'fecha', 'ip_address')
+
+
+@contextmanager
+def fechas_manuales(*campos):
+    """
+    Desactiva temporalmente auto_now / auto_now_add para poder guardar
+    fechas históricas con bulk_create
+    """
+    originales = [(campo, campo.auto_now, campo.auto_now_add) for campo in campos]
+    for campo in campos:
+        campo.auto_now = False
+        campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in originales:
+            campo.auto_now = auto_now
+            campo.auto_now_add = auto_now_add
+
+
+def insertar_filas(modelo, campos, filas):
+    """
+    Inserta tuplas ya preparadas con el mismo INSERT multi-fila que usa
+    bulk_create, pero sin pasar cada valor por el compilador del ORM
+    (que es lo que domina el tiempo con millones de filas)
+    """
+    opts = modelo._meta
+    fields = [opts.get_field(campo) for campo in campos]
+    columnas = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+    fechas = [i for i, f in enumerate(fields) if f.get_internal_type() == 'DateTimeField']
+    adaptar = connection.ops.adapt_datetimefield_value
+
+    maximo = connection.features.max_query_params
+    por_lote = len(filas) if maximo is None else max(1, maximo // len(fields))
+    marcador = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    sql = f'INSERT INTO {connection.ops.quote_name(opts.db_table)} ({columnas}) VALUES '
+
+    with connection.cursor() as envoltorio:
+        # Cursor del backend directamente: con DEBUG=True el envoltorio de
+        # depuración formatea y guarda en memoria cada uno de los INSERT
+        cursor = envoltorio.cursor
+        for desde in range(0, len(filas), por_lote):
+            bloque = filas[desde:desde + por_lote]
+            parametros = []
+            for fila in bloque:
+                if fechas:
+                    fila = list(fila)
+                    for i in fechas:
+                        fila[i] = adaptar(fila[i])
+                parametros.extend(fila)
+            cursor.execute(sql + ', '.join([marcador] * len(bloque)), parametros)
+
+
+def calcular_estado(cantidad, cantidad_minima):
+    """Misma regla que la columna generada Producto.estado"""
+    if cantidad == 0:
+        return 'AGOTADO'
+    if cantidad <= cantidad_minima:
+        return 'POR_AGOTAR'
+    return 'DISPONIBLE'
+
+
+def codigo_ean13(base12):
+    """Agrega el dígito de control EAN-13 a una base de 12 dígitos"""
+    suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(base12))
+    return base12 + str((10 - suma % 10) % 10)
+
+
+def acumular(pesos):
+    """Pesos acumulados para random.choices(cum_weights=...)"""
+    total = 0
+    acumulados = []
+    for peso in pesos:
+        total += peso
+        acumulados.append(total)
+    return acumulados
+
+
+class Command(BaseCommand):
+    help = 'Genera inventario sintético de bar a escala configurable (categorías, productos, movimientos, alertas...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=500, help='Cantidad de productos a generar')
+        parser.add_argument('--movimientos', type=int, default=20000, help='Cantidad de movimientos a generar')
+        parser.add_argument('--proveedores', type=int, default=20, help='Cantidad de proveedores')
+        parser.add_argument('--usuarios', type=int, default=12, help='Cantidad de usuarios (con roles)')
+        parser.add_argument('--dias', type=int, default=90, help='Días de historia de movimientos')
+        parser.add_argument('--semilla', type=int, default=42, help='Semilla para resultados reproducibles')
+        parser.add_argument('--lote', type=int, default=5000, help='Filas por lote de inserción')
+        parser.add_argument('--password', default='sisbar12345', help='Contraseña de los usuarios generados')
+        parser.add_argument(
+            '--prefijo', default='S',
+            help='Letras con que empiezan los códigos, usuarios y proveedores generados (antes de la semilla)'
+        )
+        parser.add_argument(
+            '--limpiar',
+            action='store_true',
+            help='Elimina antes de generar los productos, proveedores y usuarios generados con el prefijo '
+                 '(con sus movimientos, alertas e historial)'
+        )
+        parser.add_argument(
+            '--forzar',
+            action='store_true',
+            help='Permite ejecutarlo con DEBUG=False (por ejemplo, sobre la base de producción)'
+        )
+
+    def handle(self, *args, **options):
+        if options['productos'] < 1:
+            raise CommandError('Se necesita al menos un producto.')
+        if not settings.DEBUG and not options['forzar']:
+            raise CommandError(
+                'DEBUG está desactivado: esta base puede ser la de producción. '
+                'Usa --forzar si de verdad quieres generar datos aquí.'
+            )
+        if not re.fullmatch(r'[A-Za-z]+', options['prefijo']):
+            raise CommandError('El prefijo debe tener solo letras.')
+        if len(f"{options['prefijo']}{options['semilla']}") > LARGO_ETIQUETA:
+            raise CommandError(
+                f'El prefijo y la semilla juntos no pueden pasar de {LARGO_ETIQUETA} caracteres '
+                '(van en el documento de los usuarios y el NIT de los proveedores).'
+            )
+        for opcion in ('productos', 'usuarios', 'proveedores'):
+            if options[opcion] > MAXIMO_POR_TIPO:
+                raise CommandError(f'Se pueden generar hasta {MAXIMO_POR_TIPO} {opcion} por semilla.')
+
+        self.rng = random.Random(options['semilla'])
+        self.semilla = options['semilla']
+        self.prefijo = options['prefijo']
+        # Etiqueta de los registros de esta semilla: S42 -> S42-0000001, s42_admin_1
+        self.etiqueta = f'{self.prefijo}{self.semilla}'
+        self.lote = options['lote']
+        self.verbosity = options['verbosity']
+        self.ahora = timezone.localtime()
+        inicio = time.perf_counter()
+
+        if options['limpiar']:
+            self.limpiar()
+
+        if Producto.objects.filter(codigo__startswith=f'{self.etiqueta}-').exists():
+            raise CommandError(
+                f'Ya existen productos generados con la etiqueta {self.etiqueta}. '
+                'Usa --limpiar o cambia la semilla o el prefijo.'
+            )
+
+        with transaction.atomic():
+            usuarios = self.crear_usuarios(options['usuarios'], options['password'])
+            subcategorias = self.crear_categorias()
+            proveedores = self.crear_proveedores(options['proveedores'])
+            productos = self.crear_productos(options['productos'], subcategorias, proveedores, usuarios, options['dias'])
+            total_mov = self.crear_movimientos(productos, usuarios, options['movimientos'], options['dias'])
+            total_alertas = self.crear_alertas(productos)
+            total_actividad = self.crear_historial(usuarios, options['movimientos'] // 10, options['dias'])
+
+        # Las inserciones masivas no envían señales
+        invalidar()
+
+        duracion = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Datos generados en {duracion:.1f}s: {len(usuarios)} usuarios, '
+            f'{len(subcategorias)} subcategorías, {len(proveedores)} proveedores, '
+            f'{len(productos)} productos, {total_mov} movimientos, '
+            f'{total_alertas} alertas, {total_actividad} actividades.'
+        ))
+
+    def log(self, mensaje):
+        if self.verbosity >= 2:
+            self.stdout.write(mensaje)
+
+    # ========== LIMPIEZA ==========
+    def limpiar(self):
+        """
+        Elimina lo generado antes con el mismo prefijo, cualquiera sea la
+        semilla (tablas hijas primero). No toca las categorías: se reutilizan
+        por nombre y pueden tener productos reales.
+        """
+        prefijo = re.escape(self.prefijo)
+        productos = Producto.objects.filter(codigo__regex=rf'^{prefijo}[0-9]+-')
+        usuarios = Usuario.objects.filter(username__regex=rf'^{prefijo.lower()}[0-9]+_')
+        self.stdout.write(self.style.WARNING(f'🧹 Eliminando los datos generados con el prefijo {self.prefijo}...'))
+        Movimiento.objects.filter(producto__in=productos).delete()
+        AlertaInventario.objects.filter(producto__in=productos).delete()
+        HistorialActividad.objects.filter(usuario__in=usuarios).delete()
+        productos.delete()
+        Proveedor.objects.filter(nombre__regex=rf' {prefijo}[0-9]+-[0-9]{{4}}$').delete()
+        usuarios.delete()
+
+    # ========== CATÁLOGOS ==========
+    def crear_usuarios(self, cantidad, password):
+        password_hash = make_password(password)
+        roles = [rol for rol, peso in ROLES for _ in range(peso)]
+        usuarios = []
+        for i in range(cantidad):
+            rol = roles[i % len(roles)]
+            nombre = self.rng.choice(NOMBRES)
+            apellido = self.rng.choice(APELLIDOS)
+            username = f'{self.etiqueta.lower()}_{rol.lower()}_{i}'
+            usuarios.append(Usuario(
+                username=username,
+                password=password_hash,
+                first_name=nombre,
+                last_name=apellido,
+                email=f'{username}@sisbar.test',
+                documento=f'{self.etiqueta}-{i:06d}',
+                rol=rol,
+                aprobado=True,
+                notificado_aprobacion=True,
+                fecha_aprobacion=self.ahora,
+                is_staff=rol == 'SUPER_ADMIN',
+                is_superuser=rol == 'SUPER_ADMIN',
+            ))
+        usuarios = Usuario.objects.bulk_create(usuarios, batch_size=self.lote)
+        self.log(f'👤 {len(usuarios)} usuarios')
+        return usuarios
+
+    def crear_categorias(self):
+        """Reutiliza las categorías existentes por nombre y crea las que falten"""
+        existentes = {c.nombre: c for c in Categoria.objects.filter(nombre__in=[c[0] for c in CATALOGO])}
+        nuevas = [
+            Categoria(nombre=nombre, slug=f'{nombre.lower().replace(" ", "-")}', icono=icono, color=color)
+            for nombre, icono, color, *_ in CATALOGO
+            if nombre not in existentes
+        ]
+        for categoria in Categoria.objects.bulk_create(nuevas):
+            existentes[categoria.nombre] = categoria
+
+        subcategorias = []
+        for nombre, _icono, _color, subs, marcas, presentaciones, unidad, precios in CATALOGO:
+            categoria = existentes[nombre]
+            actuales = {s.nombre: s for s in categoria.subcategorias.all()}
+            faltantes = Subcategoria.objects.bulk_create([
+                Subcategoria(categoria=categoria, nombre=sub, slug=sub.lower().replace(' ', '-'))
+                for sub in subs if sub not in actuales
+            ])
+            for sub in list(actuales.values()) + faltantes:
+                sub.catalogo = (marcas, presentaciones, unidad, precios)
+                subcategorias.append(sub)
+        self.log(f'🏷️ {len(existentes)} categorías, {len(subcategorias)} subcategorías')
+        return subcategorias
+
+    def crear_proveedores(self, cantidad):
+        proveedores = [
+            Proveedor(
+                nombre=f'{PROVEEDORES_BASE[i % len(PROVEEDORES_BASE)]} {self.etiqueta}-{i:04d}',
+                nit=f'{self.etiqueta}-{i:06d}',
+                contacto=f'{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}',
+                telefono=f'3{self.rng.randint(100000000, 199999999)}',
+                email=f'ventas{i}@proveedor.test',
+                ciudad=self.rng.choice(CIUDADES),
+                calificacion=self.rng.randint(2, 5),
+            )
+            for i in range(cantidad)
+        ]
+        proveedores = Proveedor.objects.bulk_create(proveedores, batch_size=self.lote)
+        self.log(f'🚚 {len(proveedores)} proveedores')
+        return proveedores
+
+    def crear_productos(self, cantidad, subcategorias, proveedores, usuarios, dias):
+        administradores = [u for u in usuarios if u.rol in ('SUPER_ADMIN', 'ADMIN')] or usuarios or [None]
+        inicio_historia = self.ahora - timedelta(days=dias)
+        productos = []
+        for i in range(cantidad):
+            sub = self.rng.choice(subcategorias)
+            marcas, presentaciones, unidad, (precio_min, precio_max) = sub.catalogo
+            marca = self.rng.choice(marcas)
+            presentacion = self.rng.choice(presentaciones)
+            precio = Decimal(self.rng.randrange(precio_min, precio_max, 50))
+            productos.append(Producto(
+                codigo=f'{self.etiqueta}-{i:07d}',
+                codigo_barras=codigo_ean13(f'770{self.semilla % 1000:03d}{i:06d}'),
+                nombre=f'{marca} {sub.nombre} {presentacion}',
+                categoria_id=sub.categoria_id,
+                subcategoria=sub,
+                cantidad=0,
+                cantidad_minima=self.rng.choice((3, 5, 5, 6, 10, 12)),
+                unidad_medida=unidad,
+                precio_compra=precio,
+                costo_promedio=precio,
+                proveedor=self.rng.choice(proveedores) if proveedores and self.rng.random() < 0.9 else None,
+                ubicacion=f'Estante {self.rng.randint(1, 20)} - Nivel {self.rng.randint(1, 4)}',
+                creado_por=self.rng.choice(administradores),
+                fecha_creacion=inicio_historia - timedelta(days=self.rng.randint(1, 30)),
+            ))
+
+        with fechas_manuales(Producto._meta.get_field('fecha_creacion')):
+            productos = Producto.objects.bulk_create(productos, batch_size=self.lote)
+        self.log(f'📦 {len(productos)} productos')
+        return productos
+
+    # ========== MOVIMIENTOS ==========
+    def crear_movimientos(self, productos, usuarios, cantidad, dias):
+        """
+        Reparte los movimientos entre productos con una distribución tipo Zipf
+        (pocos productos muy vendidos) y horarios de bar. Cada producto forma
+        una cadena consistente cantidad_anterior -> cantidad_nueva cuyo saldo
+        final queda en Producto.cantidad.
+        """
+        rng = self.rng
+        empleados = [u for u in usuarios if u.rol in ('EMPLEADO', 'ADMIN')] or usuarios or [None]
+
+        # Popularidad por producto (Zipf) y reparto de movimientos
+        orden = list(range(len(productos)))
+        rng.shuffle(orden)
+        pesos = [0.0] * len(productos)
+        for rango, indice in enumerate(orden, start=1):
+            pesos[indice] = 1 / rango ** 1.1
+        conteos = [0] * len(productos)
+        for indice in rng.choices(range(len(productos)), weights=pesos, k=cantidad):
+            conteos[indice] += 1
+
+        # Calendario: cada día pesa según el día de la semana
+        inicio = self.ahora.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dias - 1)
+        dias_calendario = [inicio + timedelta(days=d) for d in range(dias)]
+        acum_dias = acumular([PESOS_DIA_SEMANA[d.weekday()] for d in dias_calendario])
+        acum_horas = acumular(PESOS_HORA)
+        horas = range(24)
+
+        pendientes = []
+        total = 0
+
+        for producto, k in zip(productos, conteos):
+            if k == 0:
+                continue
+            fechas = sorted(
+                dia + timedelta(hours=hora, seconds=rng.randrange(3600))
+                for dia, hora in zip(
+                    rng.choices(dias_calendario, cum_weights=acum_dias, k=k),
+                    rng.choices(horas, cum_weights=acum_horas, k=k),
+                )
+            )
+            # Futuro no permitido (el día de hoy puede tener horas por venir)
+            fechas = [min(f, self.ahora) for f in fechas]
+
+            minimo = producto.cantidad_minima
+            # Todas las entradas al precio de compra: el promedio no cambia
+            precio = producto.precio_compra
+            stock = 0
+            ultima_salida = None
+            for fecha in fechas:
+                azar = rng.random()
+                if stock == 0 or stock <= minimo and azar < 0.35:
+                    tipo = 'ENTRADA'
+                    mov = rng.randint(minimo * 3, minimo * 8) + 12
+                elif azar < 0.97:
+                    tipo = 'SALIDA'
+                    mov = min(stock, rng.choice((1, 1, 1, 2, 2, 3, 6)))
+                elif azar < 0.99:
+                    tipo = 'AJUSTE'
+                    mov = 1
+                else:
+                    tipo = 'DEVOLUCION'
+                    mov = rng.randint(1, 2)
+
+                anterior = stock
+                stock = stock - mov if tipo in ('SALIDA', 'AJUSTE') else stock + mov
+                if tipo == 'SALIDA':
+                    ultima_salida = fecha
+
+                usuario = rng.choice(empleados)
+                pendientes.append((
+                    producto.id,
+                    tipo,
+                    mov,
+                    anterior,
+                    stock,
+                    MOTIVOS.get(tipo, ''),
+                    '',
+                    usuario.id if usuario else None,
+                    fecha,
+                    precio,
+                    mov * precio,
+                    stock * precio,
+                    True,
+                ))
+
+            producto.cantidad = stock
+            # En memoria para las alertas; en la base lo calcula la columna generada
+            producto.estado = calcular_estado(stock, minimo)
+            producto.costo_promedio = precio
+            producto.valor_stock = stock * precio
+            producto.ultima_salida = ultima_salida
+
+            if len(pendientes) >= self.lote:
+                total += self._guardar_movimientos(pendientes)
+                pendientes = []
+
+        if pendientes:
+            total += self._guardar_movimientos(pendientes)
+
+        Producto.objects.bulk_update(
+            productos, ['cantidad', 'ultima_salida', 'costo_promedio', 'valor_stock'],
+            batch_size=min(self.lote, 500)
+        )
+        # bulk_update no pasa por save(): totales por categoría desde cero
+        recalcular()
+        return total
+
+    def _guardar_movimientos(self, filas):
+        insertar_filas(Movimiento, CAMPOS_MOVIMIENTO, filas)
+        self.log(f'📈 {len(filas)} movimientos guardados')
+        return len(filas)
+
+    # ========== ALERTAS E HISTORIAL ==========
+    def crear_alertas(self, productos):
+        campo_fecha = AlertaInventario._meta.get_field('fecha_generada')
+        alertas = []
+        for producto in productos:
+            fecha = producto.ultima_salida or self.ahora
+            if producto.estado == 'AGOTADO':
+                alertas.append(AlertaInventario(
+                    producto_id=producto.id,
+                    tipo='AGOTADO',
+                    mensaje=f'El producto {producto.nombre} se ha agotado completamente.',
+                    fecha_generada=fecha,
+                ))
+            elif producto.estado == 'POR_AGOTAR':
+                alertas.append(AlertaInventario(
+                    producto_id=producto.id,
+                    tipo='POR_AGOTAR',
+                    mensaje=f'El producto {producto.nombre} está por agotarse. Stock actual: {producto.cantidad}',
+                    fecha_generada=fecha,
+                ))
+            # Alertas históricas ya atendidas
+            if self.rng.random() < 0.2:
+                alertas.append(AlertaInventario(
+                    producto_id=producto.id,
+                    tipo=self.rng.choice(('POR_AGOTAR', 'REABASTECIMIENTO')),
+                    mensaje=f'El producto {producto.nombre} necesitó reabastecimiento.',
+                    fecha_generada=fecha - timedelta(days=self.rng.randint(1, 30)),
+                    leida=True,
+                    fecha_lectura=fecha,
+                    resuelta=True,
+                ))
+        with fechas_manuales(campo_fecha):
+            AlertaInventario.objects.bulk_create(alertas, batch_size=self.lote)
+        self.log(f'🔔 {len(alertas)} alertas')
+        return len(alertas)
+
+    def crear_historial(self, usuarios, cantidad, dias):
+        if not usuarios:
+            return 0
+        tipos = ('LOGIN', 'LOGIN', 'LOGOUT', 'DESCONTAR', 'DESCONTAR', 'DESCONTAR', 'CREAR', 'EDITAR', 'EXPORTAR')
+        acum_horas = acumular(PESOS_HORA)
+        inicio = self.ahora.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=dias)
+        total = 0
+        for desde in range(0, cantidad, self.lote):
+            filas = []
+            for _ in range(min(self.lote, cantidad - desde)):
+                usuario = self.rng.choice(usuarios)
+                tipo = self.rng.choice(tipos)
+                fecha = inicio + timedelta(
+                    days=self.rng.randrange(dias),
+                    hours=self.rng.choices(range(24), cum_weights=acum_horas)[0],
+                    seconds=self.rng.randrange(3600),
+                )
+                filas.append((
+                    usuario.id,
+                    tipo,
+                    f'{usuario.username}: {tipo.lower()} (generado)',
+                    min(fecha, self.ahora),
+                    f'192.168.{self.rng.randint(0, 3)}.{self.rng.randint(2, 254)}',
+                ))
+            insertar_filas(HistorialActividad, CAMPOS_HISTORIAL, filas)
+            total += len(filas)
+        self.log(f'📝 {total} actividades')
+        return total
@@ -0,0 +1,104 @@
+"""
+Genera las versiones redimensionadas de las imágenes ya subidas
+
+Uso:
+    python manage.py procesar_imagenes
+    python manage.py procesar_imagenes --procesos 8 --forzar
+    python manage.py procesar_imagenes --modelo productos --procesos 0
+
+Decodificar y redimensionar es trabajo de CPU, así que las imágenes se
+reparten en un pool de procesos (por defecto uno por núcleo). Los procesos
+hijos solo leen y escriben archivos; el proceso principal guarda los
+resultados en la base de datos.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventario.models import Producto
+from sisbar_config import imagenes
+from usuarios.models import Usuario
+
+
+MODELOS = {
+    'productos': Producto,
+    'usuarios': Usuario,
+}
+
+
+class Command(BaseCommand):
+    help = 'Genera miniaturas y versiones WebP de las imágenes de productos y fotos de perfil'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', choices=['todos', *MODELOS], default='todos')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                            help='Procesos en paralelo (0 = en este mismo proceso)')
+        parser.add_argument('--forzar', action='store_true',
+                            help='Regenerar también las imágenes que ya tienen versiones')
+
+    def handle(self, *args, **options):
+        modelos = MODELOS.values() if options['modelo'] == 'todos' else [MODELOS[options['modelo']]]
+
+        # Objetos con imagen cuya versión falta o no corresponde
+        objetos = {}
+        for modelo in modelos:
+            campo, campo_versiones = imagenes.campos_de(modelo)
+            for objeto in modelo._base_manager.exclude(**{campo: ''}).exclude(**{f'{campo}__isnull': True}) \
+                    .only('pk', campo, campo_versiones).order_by('pk'):
+                if options['forzar'] or imagenes.pendiente(objeto):
+                    objetos[(modelo._meta.label, objeto.pk)] = objeto
+
+        if not objetos:
+            self.stdout.write(self.style.SUCCESS('✅ Todas las imágenes ya tienen sus versiones'))
+            return
+
+        self.stdout.write(f'🖼️  Procesando {len(objetos)} imágenes con {options["procesos"]} procesos...')
+        inicio = time.perf_counter()
+        hechas, errores = 0, 0
+
+        for clave, resultado in self._procesar(objetos, options['procesos']):
+            objeto = objetos[clave]
+            if isinstance(resultado, Exception):
+                errores += 1
+                self.stderr.write(f'   ❌ {clave[0]} #{clave[1]}: {resultado}')
+                continue
+            imagenes.actualizar_versiones(objeto, resultado)
+            hechas += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {hechas} imágenes procesadas en {time.perf_counter() - inicio:.1f}s'
+            + (f' ({errores} con error)' if errores else '')
+        ))
+
+    def _procesar(self, objetos, procesos):
+        """Genera (clave, versiones o excepción) a medida que terminan"""
+        nombres = {
+            clave: getattr(objeto, imagenes.campos_de(objeto)[0]).name
+            for clave, objeto in objetos.items()
+        }
+
+        if procesos <= 0:
+            for clave, nombre in nombres.items():
+                try:
+                    yield clave, imagenes.generar_versiones(nombre)
+                except Exception as e:
+                    yield clave, e
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=get_context('spawn'),
+            initializer=imagenes.iniciar_proceso,
+            initargs=(str(settings.MEDIA_ROOT),),
+        ) as pool:
+            futuros = {pool.submit(imagenes.generar_versiones, nombre): clave for clave, nombre in nombres.items()}
+            for futuro in as_completed(futuros):
+                try:
+                    yield futuros[futuro], futuro.result()
+                except Exception as e:
+                    yield futuros[futuro], e
@@ -0,0 +1,37 @@
+"""
+Reconstruye el valor del stock por categoría
+
+Uso:
+    python manage.py recalcular_valoracion
+
+Los totales se mantienen solos al guardar productos (ver
+inventario/valoracion.py). Este comando solo hace falta si la tabla de
+productos se modificó por fuera del ORM (SQL a mano, restauración de un
+respaldo parcial).
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from inventario.models import Producto
+from inventario.valoracion import recalcular, valor_total
+from sisbar_config.cache import invalidar
+
+
+class Command(BaseCommand):
+    help = 'Recalcula Producto.valor_stock y el valor del stock por categoría'
+
+    def handle(self, *args, **options):
+        antes = valor_total()
+
+        # valor_stock = cantidad x costo promedio (precio de compra si aún no tiene)
+        Producto.objects.filter(costo_promedio__isnull=True).update(costo_promedio=F('precio_compra'))
+        Producto.objects.update(valor_stock=F('cantidad') * F('costo_promedio'))
+        totales = recalcular()
+        invalidar('inventario')
+
+        despues = valor_total()
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {len(totales)} categorías recalculadas. Valor total: ${despues:,.2f} '
+            f'(antes ${antes:,.2f}, diferencia ${despues - antes:,.2f})'
+        ))
@@ -0,0 +1,499 @@
+"""
+Simulador de carga para la hora pico del bar
+
+Reproduce una mezcla realista de peticiones concurrentes: escaneos en el
+panel de descontar, búsquedas AJAX por código de barras, cargas del
+dashboard y alguna exportación. Reporta throughput, latencias p50/p95/p99
+y la espera de la base de datos por bloqueos.
+
+Uso:
+    python manage.py simular_carga --hilos 16 --duracion 30
+    python manage.py simular_carga --modo gunicorn --trabajadores 4 --json resultado.json
+
+Comparar WSGI y ASGI con la misma memoria (mismos workers; el reporte
+incluye el pico de memoria del servidor para confirmarlo):
+
+    python manage.py simular_carga --modo gunicorn --trabajadores 2 --hilos 32 --json wsgi.json
+    python manage.py simular_carga --modo asgi --trabajadores 2 --hilos 32 --json asgi.json
+
+En modo asgi las búsquedas, los descuentos y el dashboard usan las vistas
+async (escaner_buscar, escaner_descontar, dashboard:datos); --vistas permite
+elegirlas en cualquier modo.
+
+Comparar el escaneo de los productos más vendidos con y sin stock
+fraccionado (inventario/fracciones.py); --fracciones reparte el stock de
+los --calientes productos más escaneados solo durante la simulación:
+
+    python manage.py simular_carga --modo gunicorn --trabajadores 4 --hilos 32 --json sin.json
+    python manage.py simular_carga --modo gunicorn --trabajadores 4 --hilos 32 --fracciones 8 --json con.json
+
+Comparar SQLite con y sin el perfil para varios cajeros (WAL, BEGIN
+IMMEDIATE; ver sisbar_config/sqlite). El reporte incluye los bloqueos
+("database is locked") y el journal_mode del archivo. WAL queda grabado en
+el archivo: para medir sin perfil, usar una copia que nunca lo tuvo o
+volver antes con `sqlite3 db.sqlite3 "PRAGMA journal_mode=DELETE"`:
+
+    SQLITE_PERFIL=False python manage.py simular_carga --hilos 16 --json sin_perfil.json
+    python manage.py simular_carga --hilos 16 --json con_perfil.json
+
+Los descuentos que la vista rechaza (sin stock, código inexistente) se
+cuentan aparte: no son errores, pero tampoco descuentos hechos.
+
+Trabaja sobre la base de datos configurada: los escaneos descuentan stock
+de verdad, así que conviene usarlo sobre datos de `generar_datos`.
+"""
+
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from http.cookiejar import CookieJar
+from itertools import accumulate
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from inventario.fracciones import consolidar_todos, fraccionar
+from inventario.models import Producto
+from sisbar_config.carga import MedidorBD, MuestreoMemoria, percentil
+from usuarios.models import Usuario
+
+
+# Mezcla de peticiones en hora pico: (operación, peso)
+MEZCLA = (
+    ('descontar', 45),
+    ('buscar', 35),
+    ('dashboard', 17),
+    ('exportar', 3),
+)
+
+
+def clasificar(operacion, estado, cuerpo):
+    """
+    'ok', 'rechazada' (sin stock o código inexistente: el descuento no se
+    hizo, pero la vista respondió bien) o 'error'
+
+    Los descuentos se juzgan por la respuesta y no solo por el código HTTP:
+    el panel síncrono responde 200 también cuando rechaza el descuento (con
+    un mensaje de error) y el escáner async responde {"ok": false, ...}.
+    """
+    if estado >= 500:
+        return 'error'
+    if operacion != 'descontar':
+        return 'ok' if estado < 400 else 'error'
+    if cuerpo.lstrip().startswith(b'{'):
+        try:
+            datos = json.loads(cuerpo)
+        except ValueError:
+            return 'error'
+        if datos.get('ok'):
+            return 'ok'
+        return 'rechazada' if estado in (404, 409) else 'error'
+    # Panel síncrono: el mensaje de Django messages (un 302 es que el usuario
+    # no puede descontar)
+    if estado != 200:
+        return 'error'
+    if b'alert alert-success alert-dismissible' in cuerpo:
+        return 'ok'
+    if b'alert alert-danger alert-dismissible' in cuerpo and b'Error al descontar' not in cuerpo:
+        return 'rechazada'
+    return 'error'
+
+
+class Resultados:
+    """Latencias por operación, compartidas entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencias = {operacion: [] for operacion, _ in MEZCLA}
+        self.errores = {operacion: 0 for operacion, _ in MEZCLA}
+        self.rechazadas = {operacion: 0 for operacion, _ in MEZCLA}
+
+    def registrar(self, operacion, ms, resultado):
+        with self._lock:
+            self.latencias[operacion].append(ms)
+            if resultado == 'error':
+                self.errores[operacion] += 1
+            elif resultado == 'rechazada':
+                self.rechazadas[operacion] += 1
+
+    def resumen(self, segundos):
+        todas = sorted(ms for valores in self.latencias.values() for ms in valores)
+        operaciones = {}
+        for operacion, valores in self.latencias.items():
+            valores = sorted(valores)
+            operaciones[operacion] = {
+                'peticiones': len(valores),
+                'errores': self.errores[operacion],
+                'rechazadas': self.rechazadas[operacion],
+                **resumir_latencias(valores),
+            }
+        return {
+            'peticiones': len(todas),
+            'errores': sum(self.errores.values()),
+            'rechazadas': sum(self.rechazadas.values()),
+            'segundos': round(segundos, 2),
+            'throughput': round(len(todas) / segundos, 2) if segundos else 0.0,
+            **resumir_latencias(todas),
+            'operaciones': operaciones,
+        }
+
+
+def resumir_latencias(valores):
+    return {
+        'p50_ms': round(percentil(valores, 50), 2),
+        'p95_ms': round(percentil(valores, 95), 2),
+        'p99_ms': round(percentil(valores, 99), 2),
+        'max_ms': round(valores[-1], 2) if valores else 0.0,
+    }
+
+
+# ========== CLIENTES ==========
+class ClienteDjango:
+    """Peticiones en proceso con el cliente de pruebas de Django"""
+
+    def __init__(self, usuario):
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        self.client = Client(HTTP_HOST=host)
+        self.client.force_login(usuario)
+
+    def get(self, url):
+        respuesta = self.client.get(url)
+        return respuesta.status_code, respuesta.content
+
+    def post(self, url, datos):
+        respuesta = self.client.post(url, datos)
+        return respuesta.status_code, respuesta.content
+
+
+class ClienteHTTP:
+    """Peticiones HTTP reales contra un gunicorn local"""
+
+    def __init__(self, base, sesion):
+        self.base = base
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+        self.cabeceras = {'Cookie': f'{settings.SESSION_COOKIE_NAME}={sesion}'}
+        self.csrf = ''
+
+    def _abrir(self, peticion):
+        try:
+            with self.opener.open(peticion, timeout=60) as respuesta:
+                return respuesta.status, respuesta.read()
+        except HTTPError as e:
+            return e.code, e.read()
+
+    def get(self, url):
+        respuesta = self._abrir(Request(self.base + url, headers=self.cabeceras))
+        if not self.csrf:
+            self.csrf = next((c.value for c in self.cookies if c.name == settings.CSRF_COOKIE_NAME), '')
+        return respuesta
+
+    def post(self, url, datos):
+        cabeceras = dict(self.cabeceras, **{'X-CSRFToken': self.csrf, 'Referer': self.base + url})
+        if self.csrf:
+            cabeceras['Cookie'] += f'; {settings.CSRF_COOKIE_NAME}={self.csrf}'
+        cuerpo = urlencode(datos).encode()
+        return self._abrir(Request(self.base + url, data=cuerpo, headers=cabeceras))
+
+
+class Command(BaseCommand):
+    help = 'Simula la hora pico del bar y mide throughput, latencias y bloqueos de la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modo', choices=('cliente', 'gunicorn', 'asgi'), default='cliente',
+                            help='cliente: test client en proceso; gunicorn: servidor HTTP local; '
+                                 'asgi: gunicorn con workers uvicorn')
+        parser.add_argument('--vistas', choices=('sync', 'async'), default=None,
+                            help='Vistas del escáner y del dashboard (por defecto async solo en modo asgi)')
+        parser.add_argument('--hilos', type=int, default=8, help='Cajeros concurrentes')
+        parser.add_argument('--duracion', type=float, default=20, help='Segundos de simulación')
+        parser.add_argument('--peticiones', type=int, default=0,
+                            help='Detener tras este total de peticiones (0 = usar --duracion)')
+        parser.add_argument('--pausa', type=float, default=0,
+                            help='Milisegundos entre peticiones de un mismo hilo')
+        parser.add_argument('--usuario', default='', help='Usuario que hace los escaneos')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--trabajadores', type=int, default=2, help='Workers de gunicorn')
+        parser.add_argument('--puerto', type=int, default=0, help='Puerto de gunicorn (0 = libre)')
+        parser.add_argument('--fracciones', type=int, default=0,
+                            help='Fraccionar el stock de los productos más escaneados (0 = no)')
+        parser.add_argument('--calientes', type=int, default=3,
+                            help='Cuántos productos fraccionar con --fracciones')
+        parser.add_argument('--json', default='', help='Guardar el resultado en este archivo')
+
+    def handle(self, *args, **opciones):
+        usuario = self.obtener_usuario(opciones['usuario'])
+        codigos, pesos = self.productos_calientes()
+        vistas = opciones['vistas'] or ('async' if opciones['modo'] == 'asgi' else 'sync')
+        self.url_panel = reverse('inventario:descontar_producto')
+        if vistas == 'async':
+            self.urls = {
+                'descontar': reverse('inventario:escaner_descontar'),
+                'buscar': reverse('inventario:escaner_buscar'),
+                'dashboard': reverse('dashboard:datos'),
+            }
+        else:
+            self.urls = {
+                'descontar': self.url_panel,
+                'buscar': reverse('inventario:buscar_producto_ajax'),
+                'dashboard': reverse('dashboard:home'),
+            }
+        self.urls['exportar'] = reverse('reportes:exportar_productos_excel')
+        self.codigos = codigos
+        self.pesos_acumulados = list(accumulate(pesos))
+        self.pesos_mezcla = list(accumulate(peso for _, peso in MEZCLA))
+
+        self.stdout.write(
+            f'🍻 Simulando hora pico ({opciones["modo"]}, vistas {vistas}): {opciones["hilos"]} hilos, '
+            f'{len(codigos)} productos escaneables'
+        )
+
+        fraccionados = self.fraccionar_calientes(codigos[:opciones['calientes']], opciones['fracciones'])
+        try:
+            if opciones['modo'] in ('gunicorn', 'asgi'):
+                resultado = self.con_gunicorn(usuario, opciones)
+            else:
+                medidor = MedidorBD()
+                clientes = [ClienteDjango(usuario) for _ in range(opciones['hilos'])]
+                resultado = self.ejecutar(clientes, opciones, medidor)
+                resultado['bd'] = medidor.resumen()
+        finally:
+            # Los productos vuelven a como estaban, con los descuentos consolidados
+            consolidar_todos()
+            for producto, fracciones in fraccionados:
+                fraccionar(producto, fracciones)
+
+        resultado['fracciones'] = opciones['fracciones']
+        resultado['calientes'] = [p.codigo for p, _ in fraccionados]
+        resultado['modo'] = opciones['modo']
+        resultado['vistas'] = vistas
+        resultado['hilos'] = opciones['hilos']
+        resultado['motor_bd'] = connection.vendor
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode')
+                resultado['journal_sqlite'] = cursor.fetchone()[0]
+        self.reportar(resultado)
+
+        if opciones['json']:
+            Path(opciones['json']).write_text(
+                json.dumps(resultado, indent=2, ensure_ascii=False) + '\n', encoding='utf-8'
+            )
+            self.stdout.write(f'💾 Resultado guardado en {opciones["json"]}')
+
+    def obtener_usuario(self, username):
+        if username:
+            usuario = Usuario.objects.filter(username=username, is_active=True).first()
+        else:
+            usuario = Usuario.objects.filter(
+                is_active=True, rol__in=('SUPER_ADMIN', 'ADMIN')
+            ).order_by('-is_superuser', 'id').first()
+        if not usuario or not usuario.puede_gestionar_inventario():
+            raise CommandError('Se necesita un usuario activo con permisos de inventario (--usuario).')
+        return usuario
+
+    def productos_calientes(self):
+        """Productos con stock, con popularidad tipo Zipf: pocos concentran los escaneos"""
+        productos = list(
+            Producto.objects.filter(activo=True, cantidad__gt=0)
+            .exclude(codigo_barras__isnull=True).exclude(codigo_barras='')
+            .order_by('id').values_list('codigo_barras', flat=True)
+        )
+        if not productos:
+            raise CommandError('No hay productos con stock y código de barras. Ejecuta generar_datos primero.')
+        random.Random(0).shuffle(productos)
+        return productos, [1 / (rango + 1) for rango in range(len(productos))]
+
+    def fraccionar_calientes(self, codigos, fracciones):
+        """Fracciona los productos más escaneados; devuelve [(producto, fracciones originales)]"""
+        if fracciones <= 0:
+            return []
+        originales = []
+        for producto in Producto.objects.filter(codigo_barras__in=codigos, activo=True):
+            originales.append((producto, producto.fracciones))
+            fraccionar(producto, fracciones)
+        self.stdout.write(f'   🍺 {len(originales)} productos con el stock en {fracciones} fracciones')
+        return originales
+
+    # ========== EJECUCIÓN ==========
+    def ejecutar(self, clientes, opciones, medidor=None):
+        resultados = Resultados()
+        limite = opciones['peticiones']
+        emitidas = iter(range(limite)) if limite else None
+        fin = time.perf_counter() + opciones['duracion']
+        pausa = opciones['pausa'] / 1000
+        lock = threading.Lock()
+
+        def quedan_peticiones():
+            if emitidas is None:
+                return time.perf_counter() < fin
+            with lock:
+                return next(emitidas, None) is not None
+
+        def cajero(cliente, semilla):
+            azar = random.Random(semilla)
+            try:
+                if medidor is not None:
+                    with connection.execute_wrapper(medidor):
+                        self.atender(cliente, azar, resultados, quedan_peticiones, pausa)
+                else:
+                    self.atender(cliente, azar, resultados, quedan_peticiones, pausa)
+            finally:
+                connection.close()
+
+        hilos = [
+            threading.Thread(target=cajero, args=(cliente, opciones['semilla'] + i), daemon=True)
+            for i, cliente in enumerate(clientes)
+        ]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultados.resumen(time.perf_counter() - inicio)
+
+    def atender(self, cliente, azar, resultados, quedan_peticiones, pausa):
+        # Abrir el panel de descontar como lo haría el cajero (obtiene el token CSRF)
+        cliente.get(self.url_panel)
+        while quedan_peticiones():
+            operacion = azar.choices(MEZCLA, cum_weights=self.pesos_mezcla)[0][0]
+            codigo = azar.choices(self.codigos, cum_weights=self.pesos_acumulados)[0]
+            inicio = time.perf_counter()
+            try:
+                resultado = clasificar(operacion, *self.peticion(cliente, operacion, codigo))
+            except Exception:
+                # Un error en una petición no debe detener al cajero
+                resultado = 'error'
+            resultados.registrar(operacion, (time.perf_counter() - inicio) * 1000, resultado)
+            if pausa:
+                time.sleep(pausa)
+
+    def peticion(self, cliente, operacion, codigo):
+        url = self.urls[operacion]
+        if operacion == 'descontar':
+            return cliente.post(url, {'codigo': codigo, 'cantidad': 1, 'motivo': 'Venta hora pico'})
+        if operacion == 'buscar':
+            return cliente.get(f'{url}?{urlencode({"codigo": codigo})}')
+        return cliente.get(url)
+
+    # ========== MODO GUNICORN ==========
+    def con_gunicorn(self, usuario, opciones):
+        if not shutil.which('gunicorn'):
+            raise CommandError('gunicorn no está instalado en este entorno.')
+        if opciones['modo'] == 'asgi':
+            try:
+                import uvicorn  # noqa: F401
+            except ImportError:
+                raise CommandError('uvicorn no está instalado en este entorno (requerido por --modo asgi).')
+            aplicacion = ['sisbar_config.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker']
+        else:
+            aplicacion = ['sisbar_config.wsgi:application']
+
+        puerto = opciones['puerto'] or self.puerto_libre()
+        directorio = tempfile.mkdtemp(prefix='sisbar-carga-')
+        entorno = dict(os.environ, SISBAR_CARGA_DIR=directorio)
+        if opciones['modo'] == 'asgi':
+            entorno['SISBAR_SERVIDOR'] = 'asgi'
+        servidor = subprocess.Popen(
+            [
+                'gunicorn', *aplicacion,
+                '--bind', f'127.0.0.1:{puerto}',
+                '--workers', str(opciones['trabajadores']),
+                '--config', 'python:sisbar_config.carga',
+                '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR, env=entorno,
+        )
+        base = f'http://127.0.0.1:{puerto}'
+        memoria = MuestreoMemoria(servidor.pid)
+        try:
+            self.esperar_servidor(base, servidor)
+            memoria.start()
+            clientes = [ClienteHTTP(base, self.crear_sesion(usuario)) for _ in range(opciones['hilos'])]
+            resultado = self.ejecutar(clientes, opciones)
+        finally:
+            pico = memoria.detener() if memoria.is_alive() else None
+            servidor.send_signal(signal.SIGTERM)
+            servidor.wait(timeout=30)
+
+        medidor = MedidorBD()
+        for archivo in Path(directorio).glob('bd-*.json'):
+            medidor.combinar(json.loads(archivo.read_text(encoding='utf-8')))
+        shutil.rmtree(directorio, ignore_errors=True)
+        resultado['bd'] = medidor.resumen()
+        resultado['trabajadores'] = opciones['trabajadores']
+        resultado['memoria_pico_mb'] = pico
+        return resultado
+
+    def puerto_libre(self):
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            return s.getsockname()[1]
+
+    def esperar_servidor(self, base, servidor):
+        limite = time.perf_counter() + 30
+        while time.perf_counter() < limite:
+            if servidor.poll() is not None:
+                raise CommandError('gunicorn terminó antes de aceptar conexiones.')
+            try:
+                with socket.create_connection(tuple(base[7:].split(':')), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError('gunicorn no respondió a tiempo.')
+
+    def crear_sesion(self, usuario):
+        """Una sesión por cajero, creada en la base de datos compartida con gunicorn"""
+        cliente = Client()
+        cliente.force_login(usuario)
+        return cliente.cookies[settings.SESSION_COOKIE_NAME].value
+
+    # ========== REPORTE ==========
+    def reportar(self, r):
+        bd = r['bd']
+        espera = bd['espera_escritura_ms']
+        motor = r['motor_bd'] + (f', journal {r["journal_sqlite"]}' if r.get('journal_sqlite') else '')
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {r["peticiones"]} peticiones en {r["segundos"]}s → {r["throughput"]} req/s '
+            f'({r["errores"]} errores, {r["rechazadas"]} descuentos rechazados)'
+        ))
+        self.stdout.write(
+            f'   Latencia: p50 {r["p50_ms"]} ms | p95 {r["p95_ms"]} ms | '
+            f'p99 {r["p99_ms"]} ms | máx {r["max_ms"]} ms'
+        )
+        for operacion, datos in r['operaciones'].items():
+            self.stdout.write(
+                f'   {operacion:<10} {datos["peticiones"]:>7} pet. {datos["errores"]:>5} err. '
+                f'{datos["rechazadas"]:>5} rech. | '
+                f'p50 {datos["p50_ms"]:>8} | p95 {datos["p95_ms"]:>8} | p99 {datos["p99_ms"]:>8} ms'
+            )
+        self.stdout.write(
+            f'   BD ({motor}): {bd["consultas"]} consultas, {bd["escrituras"]} escrituras, '
+            f'{bd["bloqueos"]} bloqueos | espera escritura p50 {espera["p50"]} ms, '
+            f'p95 {espera["p95"]} ms, p99 {espera["p99"]} ms, máx {espera["max"]} ms'
+        )
+        if r.get('memoria_pico_mb') is not None:
+            self.stdout.write(
+                f'   Servidor: {r["trabajadores"]} workers ({r["modo"]}), '
+                f'memoria pico {r["memoria_pico_mb"]} MB'
+            )
+        if r.get('fracciones'):
+            descontar = r['operaciones']['descontar']
+            self.stdout.write(
+                f'   Stock fraccionado: {len(r["calientes"])} productos en {r["fracciones"]} fracciones | '
+                f'descuentos {descontar["peticiones"] / r["segundos"] if r["segundos"] else 0:.1f}/s'
+            )
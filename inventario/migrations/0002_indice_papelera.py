@@ -0,0 +1,21 @@
+# Generated by Django 5.0 on 2026-10-18 23:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categorias', '0001_initial'),
+        ('inventario', '0001_initial'),
+        ('proveedores', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('activo', False)), fields=['-fecha_creacion', '-id'], name='producto_papelera_idx'),
+        ),
+    ]
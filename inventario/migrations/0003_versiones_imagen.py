@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0002_indice_papelera'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_versiones',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Versiones de la Imagen'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0 on 2026-10-19 00:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def valorar_existentes(apps, schema_editor):
+    """Stock actual al precio de compra y totales por categoría"""
+    Producto = apps.get_model('inventario', 'Producto')
+    ValorCategoria = apps.get_model('inventario', 'ValorCategoria')
+    Producto.objects.update(
+        costo_promedio=models.F('precio_compra'),
+        valor_stock=models.ExpressionWrapper(
+            models.F('cantidad') * models.F('precio_compra'), output_field=models.DecimalField()
+        ),
+    )
+    totales = Producto.objects.filter(activo=True).values('categoria_id').annotate(total=models.Sum('valor_stock'))
+    ValorCategoria.objects.bulk_create(
+        ValorCategoria(categoria_id=t['categoria_id'], valor=t['total']) for t in totales
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('categorias', '0001_initial'),
+        ('inventario', '0003_versiones_imagen'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValorCategoria',
+            fields=[
+                ('categoria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='valoracion', serialize=False, to='categorias.categoria', verbose_name='Categoría')),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Valor en Stock')),
+            ],
+            options={
+                'verbose_name': 'Valor por Categoría',
+                'verbose_name_plural': 'Valores por Categoría',
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='costo_promedio',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, help_text='Costo promedio ponderado de las unidades en stock', max_digits=12, null=True, verbose_name='Costo Promedio'),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='valor_stock',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14, verbose_name='Valor en Stock'),
+        ),
+        migrations.RunPython(valorar_existentes, migrations.RunPython.noop),
+    ]
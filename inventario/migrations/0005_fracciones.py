@@ -0,0 +1,37 @@
+# Generated by Django 5.0 on 2026-10-19 00:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_valoracion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='fracciones',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, help_text='0 = sin fraccionar', verbose_name='Fracciones de Stock'),
+        ),
+        migrations.CreateModel(
+            name='FraccionStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveSmallIntegerField(verbose_name='Número')),
+                ('disponible', models.PositiveIntegerField(default=0, verbose_name='Disponible')),
+                ('descontado', models.PositiveIntegerField(default=0, verbose_name='Descontado')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fracciones_stock', to='inventario.producto', verbose_name='Producto')),
+            ],
+            options={
+                'verbose_name': 'Fracción de Stock',
+                'verbose_name_plural': 'Fracciones de Stock',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='fraccionstock',
+            constraint=models.UniqueConstraint(fields=('producto', 'numero'), name='fraccion_stock_unica'),
+        ),
+    ]
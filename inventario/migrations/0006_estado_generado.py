@@ -0,0 +1,35 @@
+# Generated by Django 5.0 on 2026-10-19 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Producto.estado pasa a ser una columna generada. Una columna existente
+    no se puede convertir: se quita (con su índice) y se vuelve a crear, y
+    la base calcula el estado de todas las filas al agregarla.
+    """
+
+    dependencies = [
+        ('inventario', '0005_fracciones'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='producto',
+            name='inventario__estado_7e7e86_idx',
+        ),
+        migrations.RemoveField(
+            model_name='producto',
+            name='estado',
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='estado',
+            field=models.GeneratedField(choices=[('DISPONIBLE', '🟢 Disponible'), ('POR_AGOTAR', '🟡 Por Agotarse'), ('AGOTADO', '🔴 Agotado')], db_persist=True, expression=models.Case(models.When(cantidad=0, then=models.Value('AGOTADO')), models.When(cantidad__lte=models.F('cantidad_minima'), then=models.Value('POR_AGOTAR')), default=models.Value('DISPONIBLE')), output_field=models.CharField(max_length=20), verbose_name='Estado del Producto'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['estado'], name='inventario__estado_7e7e86_idx'),
+        ),
+    ]
@@ -3,8 +3,36 @@ from django.core.validators import MinValueValidator
 from categorias.models import Categoria, Subcategoria
 from proveedores.models import Proveedor
 from usuarios.models import Usuario
+from decimal import Decimal
 import uuid
 
+CENTAVO = Decimal('0.01')
+DIEZMILESIMA = Decimal('0.0001')
+
+# Campos que cambian el valor del stock de una categoría
+CAMPOS_VALOR = {'cantidad', 'activo', 'categoria', 'costo_promedio', 'valor_stock'}
+
+# Campos de los que depende el estado (columna generada)
+CAMPOS_ESTADO = {'cantidad', 'cantidad_minima'}
+
+# Lo que registrar_salida y agregar_cantidad releen de la fila bloqueada
+CAMPOS_RELEIDOS = (
+    'cantidad', 'cantidad_minima', 'costo_promedio', 'valor_stock', 'precio_compra',
+    'activo', 'categoria_id', 'estado',
+)
+
+# Color (Bootstrap) e icono de cada estado (también los usa inventario/filas.py)
+COLORES_ESTADO = {
+    'DISPONIBLE': 'success',
+    'POR_AGOTAR': 'warning',
+    'AGOTADO': 'danger'
+}
+ICONOS_ESTADO = {
+    'DISPONIBLE': '🟢',
+    'POR_AGOTAR': '🟡',
+    'AGOTADO': '🔴'
+}
+
 class Producto(models.Model):
     """
     Modelo principal de productos en inventario
@@ -87,6 +115,15 @@ class Producto(models.Model):
         help_text='Alerta cuando llegue a este nivel'
     )
     
+    # Productos muy vendidos: el stock se reparte en fracciones para que los
+    # escaneos simultáneos no se bloqueen entre sí (ver inventario/fracciones.py)
+    fracciones = models.PositiveSmallIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Fracciones de Stock',
+        help_text='0 = sin fraccionar'
+    )
+    
     unidad_medida = models.CharField(
         max_length=20,
         choices=UNIDADES_MEDIDA,
@@ -104,6 +141,25 @@ class Producto(models.Model):
         help_text='Precio al que se compra el producto'
     )
     
+    # Valoración con costo promedio ponderado (ver inventario/valoracion.py)
+    costo_promedio = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Costo Promedio',
+        help_text='Costo promedio ponderado de las unidades en stock'
+    )
+    
+    valor_stock = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name='Valor en Stock'
+    )
+    
     # Proveedor
     proveedor = models.ForeignKey(
         Proveedor,
@@ -114,11 +170,17 @@ class Producto(models.Model):
         verbose_name='Proveedor'
     )
     
-    # Estado
-    estado = models.CharField(
-        max_length=20,
+    # Estado: lo calcula la base de datos a partir de la cantidad (columna
+    # generada), así también queda bien después de update() y bulk_update()
+    estado = models.GeneratedField(
+        expression=models.Case(
+            models.When(cantidad=0, then=models.Value('AGOTADO')),
+            models.When(cantidad__lte=models.F('cantidad_minima'), then=models.Value('POR_AGOTAR')),
+            default=models.Value('DISPONIBLE'),
+        ),
+        output_field=models.CharField(max_length=20),
+        db_persist=True,
         choices=ESTADOS,
-        default='DISPONIBLE',
         verbose_name='Estado del Producto'
     )
     
@@ -136,6 +198,14 @@ class Producto(models.Model):
         verbose_name='Imagen del Producto'
     )
     
+    # Versiones redimensionadas de la imagen (sisbar_config/imagenes.py)
+    imagen_versiones = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Versiones de la Imagen'
+    )
+    
     # Ubicación
     ubicacion = models.CharField(
         max_length=100,
@@ -177,76 +247,318 @@ class Producto(models.Model):
             models.Index(fields=['codigo']),
             models.Index(fields=['codigo_barras']),
             models.Index(fields=['estado']),
+            # Papelera: solo los inactivos, en el orden del cursor
+            models.Index(
+                fields=['-fecha_creacion', '-id'],
+                name='producto_papelera_idx',
+                condition=models.Q(activo=False),
+            ),
         ]
     
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
     
-    def save(self, *args, **kwargs):
-        # Actualizar estado automáticamente basado en cantidad
-        if self.cantidad == 0:
-            self.estado = 'AGOTADO'
-        elif self.cantidad <= self.cantidad_minima:
-            self.estado = 'POR_AGOTAR'
+    def estado_para(self, cantidad):
+        """Estado que corresponde a una cantidad (la misma regla que la columna generada)"""
+        if cantidad == 0:
+            return 'AGOTADO'
+        if cantidad <= self.cantidad_minima:
+            return 'POR_AGOTAR'
+        return 'DISPONIBLE'
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._valor_guardado = instancia._valor_categoria()
+        return instancia
+    
+    def _valor_categoria(self):
+        """(categoría, valor que aporta a ella), o None si hay campos diferidos"""
+        if not {'categoria_id', 'activo', 'valor_stock'} <= self.__dict__.keys():
+            return None
+        return (self.categoria_id, self.valor_stock if self.activo else Decimal(0))
+    
+    def costo_vigente(self):
+        """Costo promedio; el precio de compra mientras no haya entradas valoradas"""
+        if self.costo_promedio is not None:
+            return self.costo_promedio
+        return Decimal(str(self.precio_compra or 0))
+    
+    def valor_para(self, cantidad):
+        """Valor de `cantidad` unidades al costo promedio"""
+        return (cantidad * self.costo_vigente()).quantize(CENTAVO)
+    
+    def valorar(self, nueva, costo_unitario=None):
+        """
+        Pasa el producto a `nueva` unidades (en memoria) y devuelve la
+        valoración del movimiento: costo_unitario, valor y valor_stock.
+        
+        Las entradas con costo recalculan el costo promedio ponderado; las
+        salidas, ajustes y devoluciones se valoran al promedio vigente.
+        """
+        anterior = self.cantidad
+        promedio = self.costo_vigente()
+        if nueva > anterior and costo_unitario is not None:
+            costo_unitario = Decimal(str(costo_unitario))
+            promedio = (
+                (anterior * promedio + (nueva - anterior) * costo_unitario) / nueva
+            ).quantize(DIEZMILESIMA)
         else:
-            self.estado = 'DISPONIBLE'
+            costo_unitario = promedio
         
-        super().save(*args, **kwargs)
+        self.cantidad = nueva
+        self.costo_promedio = promedio
+        self.valor_stock = self.valor_para(nueva)
+        return {
+            'costo_unitario': costo_unitario,
+            'valor': (abs(nueva - anterior) * costo_unitario).quantize(CENTAVO),
+            'valor_stock': self.valor_stock,
+        }
     
-    def descontar_cantidad(self, cantidad, usuario=None):
+    def save(self, *args, **kwargs):
+        # El valor del stock siempre es cantidad x costo promedio
+        self.costo_promedio = self.costo_vigente()
+        self.valor_stock = self.valor_para(self.cantidad)
+        campos = kwargs.get('update_fields')
+        if campos is not None and 'cantidad' in campos:
+            kwargs['update_fields'] = {*campos, 'costo_promedio', 'valor_stock'}
+        
+        # La base calcula el estado (columna generada). Si se escriben la
+        # cantidad y el mínimo, la instancia aplica la misma regla a los
+        # mismos valores y no hace falta releerlo (Django 5.0 además exige
+        # que un producto nuevo lo tenga cargado). Si se escribe solo uno, la
+        # base usa el otro tal como está guardado: el estado queda diferido
+        # y se relee al usarlo (por ejemplo, en las señales post_save).
+        if campos is None or CAMPOS_ESTADO <= set(campos):
+            self.estado = self.estado_para(self.cantidad)
+        elif CAMPOS_ESTADO & set(campos):
+            self.__dict__.pop('estado', None)
+        
+        if campos is not None and not CAMPOS_VALOR & set(campos):
+            super().save(*args, **kwargs)
+            return
+        
+        from .valoracion import trasladar
+        from sisbar_config.sqlite import escritura
+        
+        if self._state.adding or self._bloqueada():
+            # Sin fila guardada no hay nada que pueda cambiar entre medio; si
+            # se leyó con select_for_update en esta transacción, el valor
+            # guardado de la instancia es el de la fila
+            super().save(*args, **kwargs)
+            trasladar(getattr(self, '_valor_guardado', (None, Decimal(0))), self._valor_categoria())
+        else:
+            # La diferencia para el total de la categoría se calcula contra la
+            # fila guardada, bloqueada hasta el commit: la instancia pudo
+            # cargarse antes de un descuento o de otra edición
+            with escritura():
+                anterior = self._valor_en_base()
+                super().save(*args, **kwargs)
+                trasladar(anterior, self._valor_categoria())
+        self._valor_guardado = self._valor_categoria()
+    
+    def _valor_en_base(self):
+        """(categoría, valor que aporta) según la fila guardada, bloqueándola"""
+        fila = Producto.objects.select_for_update().filter(pk=self.pk).values_list(
+            'categoria_id', 'activo', 'valor_stock'
+        ).first()
+        if fila is None:
+            return (None, Decimal(0))
+        categoria_id, activo, valor_stock = fila
+        return (categoria_id, valor_stock if activo else Decimal(0))
+    
+    def _marcar_bloqueada(self):
+        """
+        Para instancias leídas con select_for_update dentro de escritura():
+        mientras ese bloque siga vigente (sin confirmar ni deshacer), save()
+        usa su valor guardado sin releer la fila.
+        """
+        from sisbar_config.sqlite import bloque_actual
+        self._fila_bloqueada = bloque_actual()
+    
+    def _bloqueada(self):
+        """
+        ¿La marca de _marcar_bloqueada() sigue valiendo? El commit y el
+        rollback (de la transacción o del savepoint de la escritura() donde
+        se bloqueó la fila) la terminan. Fuera de escritura() nunca vale:
+        save() relee la fila.
+        """
+        bloque = getattr(self, '_fila_bloqueada', None)
+        return bloque is not None and bloque.vigente()
+    
+    def stock_actual(self):
+        """Cantidad menos los descuentos de las fracciones que aún no se consolidan"""
+        if not self.fracciones:
+            return self.cantidad
+        from .fracciones import pendiente
+        return self.cantidad - pendiente(self.pk)
+    
+    def descontar_cantidad(self, cantidad, usuario=None, motivo=''):
         """
         Descuenta cantidad del producto
         """
-        if cantidad > self.cantidad:
-            raise ValueError(f"No hay suficiente stock. Disponible: {self.cantidad}")
-        
-        self.cantidad -= cantidad
-        self.save()
-        
-        # Registrar el movimiento
-        from movimientos.models import Movimiento
-        Movimiento.objects.create(
-            producto=self,
-            tipo='SALIDA',
-            cantidad=cantidad,
-            usuario=usuario,
-            cantidad_anterior=self.cantidad + cantidad,
-            cantidad_nueva=self.cantidad
-        )
-    
-    def agregar_cantidad(self, cantidad, usuario=None):
+        if self.fracciones:
+            from .fracciones import descontar
+            descontar(self, cantidad, usuario, motivo)
+            return
+        self.registrar_salida(cantidad, usuario, motivo)
+    
+    def _bloquear_stock(self):
+        """
+        Dentro de escritura(): vuelve a leer la fila con select_for_update (en
+        SQLite la protege el BEGIN IMMEDIATE) y pasa a la instancia el stock
+        y la valoración guardados. La instancia se cargó antes de la
+        transacción: otro descuento pudo entrar entre medio.
+        """
+        actual = Producto.objects.select_for_update().get(pk=self.pk)
+        for campo in CAMPOS_RELEIDOS:
+            setattr(self, campo, getattr(actual, campo))
+        self._valor_guardado = actual._valor_guardado
+        self._marcar_bloqueada()
+    
+    def registrar_salida(self, cantidad, usuario=None, motivo=''):
         """
-        Agrega cantidad al producto
+        Descuenta directamente sobre la fila del producto (sin fracciones)
         """
-        cantidad_anterior = self.cantidad
-        self.cantidad += cantidad
-        self.save()
+        from movimientos.models import Movimiento
+        from sisbar_config.sqlite import escritura
         
-        # Registrar el movimiento
+        # Producto y movimiento en una sola transacción (y un solo commit)
+        with escritura():
+            self._bloquear_stock()
+            if cantidad > self.cantidad:
+                raise ValueError(f"No hay suficiente stock. Disponible: {self.cantidad}")
+            valoracion = self.valorar(self.cantidad - cantidad)
+            # Solo el stock: el resto de la instancia puede estar viejo. El
+            # mínimo va tal como se leyó bloqueado, así el estado no se relee
+            self.save(update_fields=['cantidad', 'cantidad_minima', 'ultima_actualizacion'])
+            
+            # Registrar el movimiento
+            Movimiento.objects.create(
+                producto=self,
+                tipo='SALIDA',
+                cantidad=cantidad,
+                usuario=usuario,
+                cantidad_anterior=self.cantidad + cantidad,
+                cantidad_nueva=self.cantidad,
+                motivo=motivo,
+                **valoracion
+            )
+    
+    def agregar_cantidad(self, cantidad, usuario=None, costo_unitario=None):
+        """
+        Agrega cantidad al producto (por defecto al precio de compra)
+        """
+        from .fracciones import consolidado
         from movimientos.models import Movimiento
-        Movimiento.objects.create(
-            producto=self,
-            tipo='ENTRADA',
-            cantidad=cantidad,
-            usuario=usuario,
-            cantidad_anterior=cantidad_anterior,
-            cantidad_nueva=self.cantidad
-        )
+        from sisbar_config.sqlite import escritura
+        
+        with escritura(), consolidado(self):
+            self._bloquear_stock()
+            cantidad_anterior = self.cantidad
+            if costo_unitario is None:
+                costo_unitario = self.precio_compra
+            valoracion = self.valorar(cantidad_anterior + cantidad, costo_unitario)
+            self.save(update_fields=['cantidad', 'cantidad_minima', 'ultima_actualizacion'])
+            
+            # Registrar el movimiento
+            Movimiento.objects.create(
+                producto=self,
+                tipo='ENTRADA',
+                cantidad=cantidad,
+                usuario=usuario,
+                cantidad_anterior=cantidad_anterior,
+                cantidad_nueva=self.cantidad,
+                **valoracion
+            )
     
     def get_estado_color(self):
         """Retorna el color según el estado"""
-        colores = {
-            'DISPONIBLE': 'success',
-            'POR_AGOTAR': 'warning',
-            'AGOTADO': 'danger'
-        }
-        return colores.get(self.estado, 'secondary')
+        return COLORES_ESTADO.get(self.estado, 'secondary')
     
     def get_estado_icono(self):
         """Retorna el icono según el estado"""
-        iconos = {
-            'DISPONIBLE': '🟢',
-            'POR_AGOTAR': '🟡',
-            'AGOTADO': '🔴'
+        return ICONOS_ESTADO.get(self.estado, '⚪')
+    
+    def datos_evento(self):
+        """Datos del evento 'stock' en vivo (sin consultas)"""
+        return {
+            'id': self.id,
+            'codigo': self.codigo,
+            'nombre': self.nombre,
+            'cantidad': self.cantidad,
+            'estado': self.estado,
+            'estado_display': self.get_estado_display(),
+            'estado_color': self.get_estado_color(),
+            'activo': self.activo,
         }
-        return iconos.get(self.estado, '⚪')
\ No newline at end of file
+
+
+class ValorCategoria(models.Model):
+    """
+    Valor del stock activo de cada categoría. Se mantiene al guardar
+    productos (ver inventario/valoracion.py), así el total se lee sin
+    recorrer el inventario.
+    """
+    
+    categoria = models.OneToOneField(
+        Categoria,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='valoracion',
+        verbose_name='Categoría'
+    )
+    
+    valor = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        verbose_name='Valor en Stock'
+    )
+    
+    class Meta:
+        verbose_name = 'Valor por Categoría'
+        verbose_name_plural = 'Valores por Categoría'
+    
+    def __str__(self):
+        return f"{self.categoria_id}: {self.valor}"
+
+
+class FraccionStock(models.Model):
+    """
+    Parte del stock de un producto fraccionado. Los escaneos descuentan de
+    una fracción cualquiera con un UPDATE condicionado, sin tocar la fila
+    del producto; la consolidación (inventario/fracciones.py) pasa lo
+    descontado a Producto.cantidad y vuelve a repartir el stock.
+    """
+    
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='fracciones_stock',
+        verbose_name='Producto'
+    )
+    
+    numero = models.PositiveSmallIntegerField(verbose_name='Número')
+    
+    # Stock reservado para esta fracción: nunca baja de cero
+    disponible = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Disponible'
+    )
+    
+    # Descontado desde la última consolidación
+    descontado = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Descontado'
+    )
+    
+    class Meta:
+        verbose_name = 'Fracción de Stock'
+        verbose_name_plural = 'Fracciones de Stock'
+        constraints = [
+            models.UniqueConstraint(fields=['producto', 'numero'], name='fraccion_stock_unica'),
+        ]
+    
+    def __str__(self):
+        return f"{self.producto_id}/{self.numero}: {self.disponible}"
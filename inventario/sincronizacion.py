@@ -0,0 +1,238 @@
+"""
+Sincronización del escáner sin conexión
+
+El wifi del bar se cae en plena hora pico y cada POST fallido era una
+venta perdida o, al reintentar, contada dos veces. El escáner ahora guarda
+cada movimiento en una cola local con un UUID generado en el dispositivo
+y sube la cola en lotes a inventario:escaner_sincronizar.
+
+El servidor:
+- ignora los UUID que ya conoce (Movimiento.id_cliente es único), así que
+  reenviar un lote después de un corte nunca duplica una venta;
+- aplica los movimientos de cada producto en el orden en que se
+  registraron (fecha del escáner y luego posición en el lote), con la
+  valoración de inventario/valoracion.py (las entradas pueden traer
+  `costo`; si no, se valoran al precio de compra);
+- responde un resultado por ítem: aplicado, duplicado, conflicto (sin
+  stock suficiente o producto inexistente) o invalido.
+
+El lote se aplica en una transacción con los productos bloqueados
+(select_for_update, en orden de id para no cruzarse con otro lote). Los
+productos fraccionados se consolidan antes y se reparten al final
+(inventario/fracciones.py).
+"""
+
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from movimientos.models import AlertaInventario, Movimiento
+from sisbar_config import eventos
+from sisbar_config.cache import invalidar
+from sisbar_config.sqlite import escritura
+from .fracciones import plegar, repartir
+from .models import Producto
+
+
+# Ítems por lote: el escáner parte colas más largas
+MAXIMO_LOTE = 500
+
+TIPOS = ('SALIDA', 'ENTRADA')
+
+
+def _resultado(id_cliente, estado, mensaje='', **extra):
+    return {'id': str(id_cliente) if id_cliente is not None else None, 'estado': estado, 'mensaje': mensaje, **extra}
+
+
+def _validar(item):
+    """(datos limpios, None) o (None, mensaje de error)"""
+    if not isinstance(item, dict):
+        return None, 'Formato inválido'
+    try:
+        id_cliente = uuid.UUID(str(item.get('id')))
+    except ValueError:
+        return None, 'ID inválido'
+
+    cantidad = item.get('cantidad')
+    if isinstance(cantidad, bool) or not isinstance(cantidad, int) or cantidad < 1:
+        return None, 'La cantidad debe ser un entero mayor que 0'
+
+    tipo = item.get('tipo') or 'SALIDA'
+    if tipo not in TIPOS:
+        return None, f'Tipo no permitido: {tipo}'
+
+    codigo = str(item.get('codigo') or '').strip()
+    if not codigo:
+        return None, 'Falta el código del producto'
+
+    costo = None
+    if item.get('costo') is not None:
+        try:
+            costo = Decimal(str(item['costo']))
+        except InvalidOperation:
+            return None, 'Costo inválido'
+        if not costo.is_finite() or costo < 0:
+            return None, 'Costo inválido'
+
+    fecha = None
+    if item.get('fecha'):
+        fecha = parse_datetime(str(item['fecha']))
+        if fecha is None:
+            return None, 'Fecha inválida'
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+
+    return {
+        'id': id_cliente,
+        'codigo': codigo,
+        'cantidad': cantidad,
+        'tipo': tipo,
+        'motivo': str(item.get('motivo') or '')[:200],
+        'costo': costo,
+        'fecha': fecha,
+    }, None
+
+
+def aplicar_lote(items, usuario):
+    """
+    Aplica una lista de movimientos del escáner y devuelve
+    {'resultados': [...], 'aplicados': n, 'duplicados': n, 'conflictos': n, 'invalidos': n}
+    con un resultado por ítem, en el mismo orden en que llegaron.
+    """
+    resultados = [None] * len(items)
+    validos, vistos = [], set()
+    for posicion, item in enumerate(items):
+        datos, error = _validar(item)
+        if error:
+            resultados[posicion] = _resultado(item.get('id') if isinstance(item, dict) else None, 'invalido', error)
+        elif datos['id'] in vistos:
+            resultados[posicion] = _resultado(datos['id'], 'duplicado', 'Repetido en el mismo lote')
+        else:
+            vistos.add(datos['id'])
+            validos.append((posicion, datos))
+
+    for intento in range(2):
+        try:
+            with escritura():
+                tocados = _aplicar(validos, resultados, usuario)
+            break
+        except IntegrityError:
+            # Otro envío del mismo lote entró a la vez: al repetir, sus UUID
+            # ya figuran como duplicados
+            if intento:
+                raise
+
+    if any(p.estado != 'DISPONIBLE' for p in tocados):
+        AlertaInventario.generar_alertas()
+
+    resumen = {'resultados': resultados}
+    for estado, clave in (('aplicado', 'aplicados'), ('duplicado', 'duplicados'),
+                          ('conflicto', 'conflictos'), ('invalido', 'invalidos')):
+        resumen[clave] = sum(1 for r in resultados if r['estado'] == estado)
+    return resumen
+
+
+def _aplicar(validos, resultados, usuario):
+    """Aplica los ítems válidos dentro de la transacción; devuelve los productos modificados"""
+    existentes = set(
+        Movimiento.objects.filter(id_cliente__in=[d['id'] for _, d in validos])
+        .values_list('id_cliente', flat=True)
+    )
+    pendientes = []
+    for posicion, datos in validos:
+        if datos['id'] in existentes:
+            resultados[posicion] = _resultado(datos['id'], 'duplicado', 'Ya estaba registrado')
+        else:
+            pendientes.append((posicion, datos))
+    if not pendientes:
+        return []
+
+    codigos = {d['codigo'] for _, d in pendientes}
+    por_codigo = {}
+    for producto in Producto.objects.select_for_update().filter(
+        Q(codigo__in=codigos) | Q(codigo_barras__in=codigos), activo=True
+    ).order_by('id'):
+        producto._marcar_bloqueada()
+        # El código interno tiene prioridad sobre el código de barras
+        por_codigo[producto.codigo] = producto
+        if producto.codigo_barras:
+            por_codigo.setdefault(producto.codigo_barras, producto)
+
+    # Los descuentos pendientes de las fracciones van antes que el lote
+    fraccionados = {
+        producto: plegar(producto)[0]
+        for producto in {p.pk: p for p in por_codigo.values()}.values() if producto.fracciones
+    }
+
+    # Orden en que se registraron en el escáner (los sin fecha, por posición)
+    ahora = timezone.now()
+    pendientes.sort(key=lambda p: (p[1]['fecha'] or ahora, p[0]))
+
+    nuevos, tocados, con_salida = [], {}, set()
+    for posicion, datos in pendientes:
+        producto = por_codigo.get(datos['codigo'])
+        if producto is None:
+            resultados[posicion] = _resultado(
+                datos['id'], 'conflicto', f'No se encontró un producto con el código: {datos["codigo"]}'
+            )
+            continue
+
+        anterior = producto.cantidad
+        if datos['tipo'] == 'SALIDA':
+            if datos['cantidad'] > anterior:
+                resultados[posicion] = _resultado(
+                    datos['id'], 'conflicto', f'No hay suficiente stock. Disponible: {anterior}',
+                    producto_id=producto.pk, disponible=anterior,
+                )
+                continue
+            nueva = anterior - datos['cantidad']
+            con_salida.add(producto.pk)
+            costo = None
+        else:
+            nueva = anterior + datos['cantidad']
+            costo = datos['costo'] if datos['costo'] is not None else producto.precio_compra
+
+        valoracion = producto.valorar(nueva, costo)
+        tocados[producto.pk] = producto
+        nuevos.append(Movimiento(
+            producto=producto,
+            tipo=datos['tipo'],
+            cantidad=datos['cantidad'],
+            usuario=usuario,
+            cantidad_anterior=anterior,
+            cantidad_nueva=nueva,
+            motivo=datos['motivo'],
+            observaciones=(
+                f'Registrado en el escáner el {timezone.localtime(datos["fecha"]):%d/%m/%Y %H:%M}'
+                if datos['fecha'] else ''
+            ),
+            id_cliente=datos['id'],
+            **valoracion,
+        ))
+        resultados[posicion] = _resultado(
+            datos['id'], 'aplicado', producto_id=producto.pk, cantidad_nueva=nueva
+        )
+
+    Movimiento.objects.bulk_create(nuevos)
+    for producto in tocados.values():
+        # El mínimo se escribe tal como se leyó (fila bloqueada): con la
+        # cantidad y el mínimo, save() calcula el estado igual que la columna
+        # generada sin releerlo, y avisa a la caché y a los eventos en vivo
+        campos = ['cantidad', 'cantidad_minima', 'ultima_actualizacion']
+        if producto.pk in con_salida:
+            producto.ultima_salida = ahora
+            campos.append('ultima_salida')
+        producto.save(update_fields=campos)
+    for producto, fracciones in fraccionados.items():
+        repartir(producto, fracciones)
+
+    # bulk_create no envía señales
+    if nuevos:
+        invalidar('movimientos')
+        for movimiento in nuevos:
+            eventos.publicar('movimiento', movimiento.datos_evento())
+    return list(tocados.values())
@@ -1,3 +1,1517 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import uuid
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.db.models import F, Sum
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from sisbar_config.pruebas import FuncionalTestCase, MINIMO, RendimientoTestCase, sembrar
+from categorias.models import Categoria
+from proveedores.models import Proveedor
+from usuarios.models import Usuario
+from . import catalogo
+from .filas import LARGO_DESCRIPCION, ProductoFila
+from .forms import ProductoForm
+from .models import Producto
+
+
+class InventarioRendimientoTests(RendimientoTestCase):
+    """Presupuesto de consultas y tiempos de las vistas de inventario"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.producto = Producto.objects.order_by('id').first()
+
+    def datos_producto(self, codigo):
+        categoria = Categoria.objects.order_by('id').first()
+        return {
+            'codigo': codigo,
+            'nombre': 'Producto de prueba',
+            'categoria': categoria.id,
+            'cantidad': 20,
+            'cantidad_minima': 5,
+            'unidad_medida': 'UNIDAD',
+            'precio_compra': '1000',
+        }
+
+    def test_listar_productos(self):
+        self.medir_vista('listar_productos', reverse('inventario:listar_productos'), 6)
+
+    def test_listar_productos_filtrado(self):
+        url = reverse('inventario:listar_productos') + '?estado=DISPONIBLE&q=a'
+        self.medir_vista('listar_productos_filtrado', url, 6)
+
+    def test_crear_producto_get(self):
+        self.medir_vista('crear_producto_get', reverse('inventario:crear_producto'), 3)
+
+    def test_crear_producto_post(self):
+        contador = iter(range(100))
+        self.medir_vista(
+            'crear_producto_post', reverse('inventario:crear_producto'), 7, metodo='post',
+            datos=lambda: self.datos_producto(f'PRUEBA-{next(contador)}'),
+        )
+
+    def test_editar_producto_get(self):
+        url = reverse('inventario:editar_producto', args=[self.producto.id])
+        self.medir_vista('editar_producto_get', url, 5)
+
+    def test_editar_producto_post(self):
+        url = reverse('inventario:editar_producto', args=[self.producto.id])
+        # Total de la categoría contra la fila bloqueada: +3 (SAVEPOINT, SELECT ... FOR UPDATE, RELEASE)
+        self.medir_vista(
+            'editar_producto_post', url, 12, metodo='post',
+            datos=lambda: self.datos_producto(self.producto.codigo),
+        )
+
+    def test_ver_producto(self):
+        url = reverse('inventario:ver_producto', args=[self.producto.id])
+        self.medir_vista('ver_producto', url, 2)
+
+    def test_eliminar_producto_get(self):
+        url = reverse('inventario:eliminar_producto', args=[self.producto.id])
+        self.medir_vista('eliminar_producto_get', url, 2)
+
+    def test_eliminar_producto_post(self):
+        url = reverse('inventario:eliminar_producto', args=[self.producto.id])
+        # Total de la categoría contra la fila bloqueada: +3 (SAVEPOINT, SELECT ... FOR UPDATE, RELEASE)
+        self.medir_vista('eliminar_producto_post', url, 7, metodo='post')
+
+    def test_descontar_producto_get(self):
+        self.medir_vista('descontar_producto_get', reverse('inventario:descontar_producto'), 1)
+
+    def test_descontar_producto_post(self):
+        # Incluye releer el producto con SELECT ... FOR UPDATE antes de descontar
+        self.medir_vista(
+            'descontar_producto_post', reverse('inventario:descontar_producto'), 11, metodo='post',
+            # Con clave de idempotencia: no agrega consultas (vive en la caché)
+            datos=lambda: {'codigo': self.producto.codigo, 'cantidad': 1, 'motivo': 'Venta',
+                           'clave_idempotencia': str(uuid.uuid4())},
+        )
+
+    def test_descontar_fraccionado(self):
+        from .fracciones import fraccionar
+        producto = Producto.objects.filter(activo=True, cantidad__gte=20).order_by('id').first()
+        fraccionar(producto, 4)
+        self.medir_vista(
+            'descontar_fraccionado', reverse('inventario:descontar_producto'), 30, metodo='post',
+            datos={'codigo': producto.codigo, 'cantidad': 1, 'motivo': 'Venta'},
+        )
+
+    def test_buscar_producto_ajax(self):
+        url = reverse('inventario:buscar_producto_ajax') + f'?codigo={self.producto.codigo_barras}'
+        respuesta = self.medir_vista('buscar_producto_ajax', url, 1)
+        self.assertTrue(respuesta.json()['encontrado'])
+
+    def test_escaner_buscar(self):
+        url = reverse('inventario:escaner_buscar') + f'?codigo={self.producto.codigo_barras}'
+        respuesta = self.medir_vista('escaner_buscar', url, 1)
+        self.assertTrue(respuesta.json()['encontrado'])
+
+    def test_escaner_descontar(self):
+        # UPDATE y movimiento en una transacción: +2 (BEGIN/COMMIT, aquí SAVEPOINT/RELEASE);
+        # número del evento 'stock': +3 (la misma transacción con UPDATE ... RETURNING)
+        self.medir_vista(
+            'escaner_descontar', reverse('inventario:escaner_descontar'), 10, metodo='post',
+            datos={'codigo': self.producto.codigo, 'cantidad': 1, 'motivo': 'Venta'}, estados=(200,),
+        )
+
+    def test_escaner_sincronizar(self):
+        # Lote de 20 salidas del mismo producto con UUID nuevos en cada medición
+        self.medir_vista(
+            'escaner_sincronizar', reverse('inventario:escaner_sincronizar'), 8, metodo='post',
+            datos=lambda: json.dumps({'movimientos': [
+                {'id': str(uuid.uuid4()), 'codigo': self.producto.codigo, 'cantidad': 1}
+                for _ in range(20)
+            ]}),
+            preparar=lambda: Producto.objects.filter(pk=self.producto.pk).update(cantidad=1000),
+            content_type='application/json', estados=(200,),
+        )
+
+
+class EscanerAsyncTests(FuncionalTestCase):
+    """Vistas async del escáner: mismas reglas que las síncronas"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.filter(activo=True).order_by('id').first()
+        Producto.objects.filter(pk=self.producto.pk).update(cantidad=10, cantidad_minima=3)
+        self.url = reverse('inventario:escaner_descontar')
+
+    def descontar(self, cantidad, codigo=None):
+        return self.client.post(self.url, {
+            'codigo': codigo or self.producto.codigo_barras, 'cantidad': cantidad, 'motivo': 'Venta barra',
+        })
+
+    def test_descuenta_y_registra_movimiento(self):
+        from dashboard.views import estadisticas_inventario
+        from movimientos.models import Movimiento
+        estadisticas_inventario()
+
+        respuesta = self.descontar(8)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['producto']['cantidad'], 2)
+
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.cantidad, self.producto.estado), (2, 'POR_AGOTAR'))
+        self.assertIsNotNone(self.producto.ultima_salida)
+        movimiento = Movimiento.objects.filter(producto=self.producto).latest('fecha')
+        self.assertEqual(
+            (movimiento.tipo, movimiento.cantidad_anterior, movimiento.cantidad_nueva, movimiento.motivo),
+            ('SALIDA', 10, 2, 'Venta barra'),
+        )
+        # update() no envía señales: la caché se invalida igual
+        self.assertEqual(
+            estadisticas_inventario()['productos_por_agotar'],
+            Producto.objects.filter(activo=True, estado='POR_AGOTAR').count(),
+        )
+        self.assertTrue(self.producto.alertas.filter(tipo='POR_AGOTAR', resuelta=False).exists())
+
+    def test_sin_movimiento_no_descuenta(self):
+        from inventario.valoracion import valor_total
+        from movimientos.models import Movimiento
+        valor = valor_total()
+        movimientos = Movimiento.objects.count()
+        # Si el movimiento no se guarda, el UPDATE del stock tampoco queda
+        with mock.patch.object(Movimiento.objects, 'create', side_effect=DatabaseError('caída')):
+            with self.assertRaises(DatabaseError):
+                self.descontar(4)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+        self.assertEqual(Movimiento.objects.count(), movimientos)
+        self.assertEqual(valor_total(), valor)
+
+    def test_no_pisa_fracciones_ni_revaloraciones(self):
+        from inventario.fracciones import fraccionar
+        from inventario.views import _aplicar_descuento
+
+        def aplicar(producto):
+            anterior, costo = producto.cantidad, producto.costo_promedio
+            valor = producto.valor_stock
+            valoracion = producto.valorar(anterior - 1)
+            return _aplicar_descuento(producto, anterior, costo, 1, self.admin, '', valoracion, valor)
+
+        # Revalorado entre la lectura y el UPDATE, sin cambiar la cantidad
+        leido = Producto.objects.get(pk=self.producto.pk)
+        Producto.objects.filter(pk=leido.pk).update(costo_promedio=F('costo_promedio') + 1)
+        self.assertFalse(aplicar(leido))
+
+        # Fraccionado entre la lectura y el UPDATE
+        leido = Producto.objects.get(pk=self.producto.pk)
+        fraccionar(Producto.objects.get(pk=leido.pk), 2)
+        self.assertFalse(aplicar(leido))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+
+        # El escáner vuelve a leer y descuenta de una fracción
+        self.assertEqual(self.descontar(1).status_code, 200)
+        self.assertEqual(self.producto.fracciones_stock.aggregate(total=Sum('descontado'))['total'], 1)
+
+    def test_errores(self):
+        self.assertEqual(self.descontar(11).status_code, 409)
+        self.assertEqual(self.descontar(1, codigo='NO-EXISTE').status_code, 404)
+        self.assertEqual(self.descontar(0).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+
+    def test_permisos(self):
+        auditor = Usuario.objects.create_user(
+            'auditor_escaner', 'auditor@sisbar.test', 'clave-segura-123', rol='AUDITOR', aprobado=True,
+        )
+        self.client.force_login(auditor)
+        self.assertEqual(self.descontar(1).status_code, 403)
+
+        self.client.logout()
+        respuesta = self.client.get(reverse('inventario:escaner_buscar'), {'codigo': 'x'})
+        self.assertEqual(respuesta.status_code, 302)
+
+    async def test_por_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        respuesta = await self.async_client.get(
+            reverse('inventario:escaner_buscar'), {'codigo': self.producto.codigo_barras}
+        )
+        self.assertEqual(respuesta.json()['producto']['id'], self.producto.pk)
+
+        # El panel de descontar servido por ASGI consulta la vista async
+        respuesta = await self.async_client.get(reverse('inventario:descontar_producto'))
+        self.assertEqual(respuesta.context['url_buscar'], reverse('inventario:escaner_buscar'))
+
+
+class SincronizarEscanerTests(FuncionalTestCase):
+    """Cola sin conexión del escáner: idempotente y en orden por producto"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        productos = Producto.objects.filter(activo=True).order_by('id')[:2]
+        self.producto, self.otro = productos
+        Producto.objects.filter(pk__in=[self.producto.pk, self.otro.pk]).update(
+            cantidad=10, cantidad_minima=3
+        )
+        self.url = reverse('inventario:escaner_sincronizar')
+
+    def movimiento(self, cantidad, producto=None, **extra):
+        return {'id': str(uuid.uuid4()), 'codigo': (producto or self.producto).codigo_barras,
+                'cantidad': cantidad, **extra}
+
+    def sincronizar(self, movimientos):
+        return self.client.post(self.url, json.dumps({'movimientos': movimientos}),
+                                content_type='application/json')
+
+    def test_cola_por_usuario(self):
+        # La página guarda la cola bajo el usuario de la sesión: otro cajero
+        # en el mismo equipo no sube lo pendiente del anterior
+        respuesta = self.client.get(reverse('inventario:descontar_producto'))
+        self.assertContains(respuesta, f'data-usuario="{self.admin.pk}"')
+        self.assertContains(respuesta, 'sisbar:escaner:cola:${formDescontar.dataset.usuario}')
+
+    def test_reenvio_no_duplica(self):
+        from movimientos.models import Movimiento
+        lote = [self.movimiento(3, motivo='Venta barra'), self.movimiento(2, producto=self.otro)]
+
+        respuesta = self.sincronizar(lote)
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual((datos['aplicados'], datos['duplicados']), (2, 0))
+        self.assertEqual([r['cantidad_nueva'] for r in datos['resultados']], [7, 8])
+
+        # El mismo lote otra vez (se cortó la conexión antes de la respuesta)
+        datos = self.sincronizar(lote + [lote[0]]).json()
+        self.assertEqual((datos['aplicados'], datos['duplicados']), (0, 3))
+        self.producto.refresh_from_db()
+        self.otro.refresh_from_db()
+        self.assertEqual((self.producto.cantidad, self.otro.cantidad), (7, 8))
+
+        movimiento = Movimiento.objects.get(id_cliente=lote[0]['id'])
+        self.assertEqual(
+            (movimiento.tipo, movimiento.cantidad_anterior, movimiento.cantidad_nueva, movimiento.motivo),
+            ('SALIDA', 10, 7, 'Venta barra'),
+        )
+
+    def test_orden_y_conflictos(self):
+        # Llegan desordenados: se aplican por la hora en que se escanearon
+        lote = [
+            self.movimiento(9, fecha='2026-01-10T22:05:00-05:00'),
+            self.movimiento(5, tipo='ENTRADA', fecha='2026-01-10T22:00:00-05:00'),
+            self.movimiento(8, fecha='2026-01-10T22:10:00-05:00'),
+            self.movimiento(1, codigo='NO-EXISTE'),
+            self.movimiento(0),
+            {'id': 'no-es-uuid', 'codigo': 'x', 'cantidad': 1},
+        ]
+        datos = self.sincronizar(lote).json()
+        self.assertEqual(
+            [r['estado'] for r in datos['resultados']],
+            ['aplicado', 'aplicado', 'conflicto', 'conflicto', 'invalido', 'invalido'],
+        )
+        self.assertEqual(datos['resultados'][0]['cantidad_nueva'], 6)
+        self.assertEqual(datos['resultados'][2]['disponible'], 6)
+
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.cantidad, self.producto.estado), (6, 'DISPONIBLE'))
+
+        # El conflicto se puede reenviar corregido con otro UUID
+        datos = self.sincronizar([self.movimiento(4)]).json()
+        self.assertEqual(datos['resultados'][0]['cantidad_nueva'], 2)
+        self.assertTrue(self.producto.alertas.filter(tipo='POR_AGOTAR', resuelta=False).exists())
+
+    def test_errores_y_permisos(self):
+        self.assertEqual(self.client.post(self.url, 'no es json', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, '{}', content_type='application/json').status_code, 400)
+        self.assertEqual(self.sincronizar([self.movimiento(1)] * 501).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+        auditor = Usuario.objects.create_user(
+            'auditor_cola', 'cola@sisbar.test', 'clave-segura-123', rol='AUDITOR', aprobado=True,
+        )
+        self.client.force_login(auditor)
+        self.assertEqual(self.sincronizar([self.movimiento(1)]).status_code, 403)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+
+
+class IdempotenciaTests(FuncionalTestCase):
+    """Repetir un POST con la misma clave devuelve la respuesta guardada"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.filter(activo=True).order_by('id').first()
+        Producto.objects.filter(pk=self.producto.pk).update(cantidad=10, cantidad_minima=3)
+        self.url = reverse('inventario:descontar_producto')
+
+    def descontar(self, clave, cantidad=2):
+        return self.client.post(self.url, {
+            'codigo': self.producto.codigo, 'cantidad': cantidad, 'motivo': 'Venta',
+            'clave_idempotencia': clave,
+        })
+
+    def test_formulario_trae_clave(self):
+        respuesta = self.client.get(self.url)
+        self.assertContains(respuesta, 'name="clave_idempotencia"')
+        self.assertNotEqual(
+            respuesta.content, self.client.get(self.url).content, 'cada formulario lleva una clave nueva'
+        )
+
+    def test_doble_envio_descuenta_una_vez(self):
+        primera = self.descontar('clave-1')
+        segunda = self.descontar('clave-1')
+        self.assertEqual(segunda.status_code, primera.status_code)
+        self.assertEqual(segunda.content, primera.content)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertFalse(primera.has_header('Idempotent-Replayed'))
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 8)
+        self.assertEqual(self.producto.movimientos.filter(cantidad_anterior=10).count(), 1)
+
+        # Otra clave es otra operación; otros datos con la misma clave, un
+        # aviso en la misma página (el formulario no ve JSON)
+        self.descontar('clave-2')
+        respuesta = self.descontar('clave-1', cantidad=5)
+        self.assertRedirects(respuesta, self.url, fetch_redirect_response=False)
+        self.assertContains(self.client.get(self.url), 'ya se había enviado con otros datos')
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 6)
+
+        # Un cliente JSON con la misma clave recibe el 422
+        respuesta = self.client.post(
+            self.url, {'codigo': self.producto.codigo, 'cantidad': 5}, headers={'Idempotency-Key': 'clave-1'},
+        )
+        self.assertEqual(respuesta.status_code, 422)
+        self.assertFalse(respuesta.json()['ok'])
+
+    def test_crear_producto_redirige_igual(self):
+        categoria = Categoria.objects.order_by('id').first()
+        datos = {
+            'codigo': 'IDEMP-1', 'nombre': 'Producto idempotente', 'categoria': categoria.id,
+            'cantidad': 20, 'cantidad_minima': 5, 'unidad_medida': 'UNIDAD', 'precio_compra': '1000',
+            'clave_idempotencia': 'crear-1',
+        }
+        url = reverse('inventario:crear_producto')
+        primera = self.client.post(url, datos)
+        segunda = self.client.post(url, datos, follow=True)
+        self.assertRedirects(primera, reverse('inventario:listar_productos'))
+        self.assertRedirects(segunda, reverse('inventario:listar_productos'))
+        self.assertContains(segunda, 'ya se había procesado')
+        self.assertEqual(Producto.objects.filter(codigo='IDEMP-1').count(), 1)
+
+    def test_claves_por_usuario(self):
+        self.descontar('compartida')
+        otro = Usuario.objects.create_user(
+            'cajero_idemp', 'cajero@sisbar.test', 'clave-segura-123', rol='SUPER_ADMIN', aprobado=True,
+        )
+        self.client.force_login(otro)
+        self.assertFalse(self.descontar('compartida').has_header('Idempotent-Replayed'))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 6)
+
+    def test_en_curso(self):
+        from unittest import mock
+        from sisbar_config import idempotencia
+
+        # Otra petición con la misma clave sigue procesándose: el formulario
+        # vuelve a la página con el aviso y el cliente JSON recibe un 409
+        with mock.patch.object(idempotencia.cache, 'add', return_value=False):
+            respuesta = self.descontar('en-curso')
+            self.assertRedirects(respuesta, self.url, fetch_redirect_response=False)
+            respuesta = self.client.post(
+                self.url, {'codigo': self.producto.codigo, 'cantidad': 2},
+                headers={'Idempotency-Key': 'en-curso', 'Sec-Fetch-Mode': 'cors'},
+            )
+            self.assertEqual(respuesta.status_code, 409)
+        self.assertContains(self.client.get(self.url), 'todavía se está procesando')
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 10)
+
+    def test_no_guarda_respuestas_transitorias(self):
+        from django.http import JsonResponse
+        from django.test import RequestFactory
+        from sisbar_config.idempotencia import idempotente
+
+        estados = iter([409, 200, 404])
+
+        @idempotente
+        def vista(request):
+            return JsonResponse({}, status=next(estados))
+
+        def enviar():
+            request = RequestFactory().post('/', {'clave_idempotencia': 'reintento'})
+            request.user = self.admin
+            return vista(request)
+
+        # "El stock cambió, intenta de nuevo": el reintento vuelve a ejecutar la vista
+        self.assertEqual(enviar().status_code, 409)
+        self.assertEqual(enviar().status_code, 200)
+        self.assertEqual(enviar()['Idempotent-Replayed'], 'true')
+
+    async def test_escaner_async_con_cabecera(self):
+        from asgiref.sync import sync_to_async
+        from movimientos.models import Movimiento
+
+        await self.async_client.aforce_login(self.admin)
+        url = reverse('inventario:escaner_descontar')
+        datos = {'codigo': self.producto.codigo, 'cantidad': 3, 'motivo': 'Venta'}
+        cabeceras = {'Idempotency-Key': str(uuid.uuid4())}
+        primera = await self.async_client.post(url, datos, headers=cabeceras)
+        segunda = await self.async_client.post(url, datos, headers=cabeceras)
+        self.assertEqual(primera.json(), segunda.json())
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(await Movimiento.objects.filter(producto_id=self.producto.pk, cantidad_anterior=10).acount(), 1)
+        await sync_to_async(self.producto.refresh_from_db)()
+        self.assertEqual(self.producto.cantidad, 7)
+
+
+class ValoracionTests(FuncionalTestCase):
+    """Costo promedio ponderado y totales por categoría mantenidos al guardar"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.filter(activo=True).order_by('id').first()
+        self.producto.cantidad = 10
+        self.producto.precio_compra = Decimal('1000')
+        self.producto.costo_promedio = Decimal('1000')
+        self.producto.save()
+
+    def assertTotalesAlDia(self):
+        from django.db.models import Sum
+        from .models import ValorCategoria
+        esperados = dict(
+            Producto.objects.filter(activo=True).values('categoria_id')
+            .annotate(total=Sum('valor_stock')).values_list('categoria_id', 'total')
+        )
+        guardados = dict(ValorCategoria.objects.exclude(valor=0).values_list('categoria_id', 'valor'))
+        self.assertEqual(guardados, {c: v for c, v in esperados.items() if v})
+
+    def test_instancias_viejas_releen_el_stock(self):
+        # Dos cajeros cargaron el producto con 10 unidades antes de descontar
+        primera = Producto.objects.get(pk=self.producto.pk)
+        segunda = Producto.objects.get(pk=self.producto.pk)
+        primera.registrar_salida(6, self.admin, 'Venta')
+        with self.assertRaisesMessage(ValueError, 'Disponible: 4'):
+            segunda.registrar_salida(6, self.admin, 'Venta')
+        segunda.registrar_salida(3, self.admin, 'Venta')
+        primera.agregar_cantidad(5, self.admin, costo_unitario=1000)
+
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 6)
+        cadena = list(self.producto.movimientos.order_by('id').values_list('cantidad_anterior', 'cantidad_nueva'))
+        self.assertEqual(cadena[-3:], [(10, 4), (4, 1), (1, 6)])
+        self.assertEqual(self.producto.valor_stock, Decimal('6000'))
+        self.assertTotalesAlDia()
+
+    def test_guardar_instancia_vieja_mantiene_los_totales(self):
+        # Un formulario cargó el producto antes de un descuento y lo guarda
+        # completo, cambiándolo de categoría: la diferencia sale de la fila
+        vieja = Producto.objects.get(pk=self.producto.pk)
+        Producto.objects.get(pk=self.producto.pk).registrar_salida(4, self.admin, 'Venta')
+        vieja.categoria = Categoria.objects.exclude(pk=vieja.categoria_id).first()
+        vieja.save()
+        self.assertTotalesAlDia()
+
+        vieja = Producto.objects.get(pk=self.producto.pk)
+        Producto.objects.get(pk=self.producto.pk).agregar_cantidad(5, self.admin, costo_unitario=1000)
+        vieja.activo = False
+        vieja.save()
+        self.assertTotalesAlDia()
+
+    def test_rollback_no_deja_la_fila_marcada(self):
+        # El descuento falla y su bloque se deshace; la instancia ya no
+        # tiene la fila bloqueada aunque haya llegado a marcarla
+        vieja = Producto.objects.get(pk=self.producto.pk)
+        with self.assertRaises(ValueError):
+            vieja.registrar_salida(100, self.admin, 'Venta')
+        self.assertFalse(vieja._bloqueada())
+
+        Producto.objects.get(pk=self.producto.pk).registrar_salida(4, self.admin, 'Venta')
+        vieja.categoria = Categoria.objects.exclude(pk=vieja.categoria_id).first()
+        vieja.save()
+        self.assertTotalesAlDia()
+
+    def test_marca_sigue_a_la_escritura(self):
+        from sisbar_config.sqlite import escritura
+
+        def leer_bloqueado():
+            producto = Producto.objects.select_for_update().get(pk=self.producto.pk)
+            producto._marcar_bloqueada()
+            return producto
+
+        # La escritura anidada que termina bien vale lo que la exterior
+        with escritura():
+            with escritura():
+                producto = leer_bloqueado()
+            self.assertTrue(producto._bloqueada())
+        self.assertFalse(producto._bloqueada())
+
+        # Si la exterior se deshace, la marca no revive en la escritura siguiente
+        with self.assertRaises(ValueError):
+            with escritura():
+                with escritura():
+                    producto = leer_bloqueado()
+                raise ValueError
+        with escritura():
+            self.assertFalse(producto._bloqueada())
+
+        # Fuera de escritura() no hay marca: save() relee la fila
+        producto._marcar_bloqueada()
+        self.assertFalse(producto._bloqueada())
+
+    def test_promedio_ponderado(self):
+        from .valoracion import valor_total
+        antes = valor_total()
+
+        self.producto.agregar_cantidad(10, self.admin, costo_unitario=2000)
+        self.assertEqual(self.producto.costo_promedio, Decimal('1500'))
+        self.assertEqual(self.producto.valor_stock, Decimal('30000'))
+        entrada = self.producto.movimientos.latest('id')
+        self.assertEqual(
+            (entrada.costo_unitario, entrada.valor, entrada.valor_stock),
+            (Decimal('2000'), Decimal('20000'), Decimal('30000')),
+        )
+
+        # Las salidas salen al promedio y no lo cambian
+        self.producto.descontar_cantidad(5, self.admin)
+        salida = self.producto.movimientos.latest('id')
+        self.assertEqual(
+            (salida.costo_unitario, salida.valor, salida.valor_stock),
+            (Decimal('1500'), Decimal('7500'), Decimal('22500')),
+        )
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.costo_promedio, self.producto.valor_stock), (Decimal('1500'), Decimal('22500')))
+        self.assertEqual(valor_total() - antes, Decimal('12500'))
+        self.assertTotalesAlDia()
+
+    def test_totales_por_categoria(self):
+        from dashboard.views import estadisticas_inventario
+        otra = Categoria.objects.exclude(pk=self.producto.categoria_id).order_by('id').first()
+
+        self.producto.categoria = otra
+        self.producto.save()
+        self.assertTotalesAlDia()
+
+        self.producto.activo = False
+        self.producto.save()
+        self.assertTotalesAlDia()
+
+        activo = Producto.objects.filter(activo=True).order_by('id').first()
+        activo.delete()
+        self.assertTotalesAlDia()
+
+        # Edición de cantidad desde el formulario: ajuste al costo promedio
+        editado = Producto.objects.filter(activo=True).order_by('id').first()
+        editado.cantidad += 7
+        editado.save(update_fields=['cantidad'])
+        self.assertTotalesAlDia()
+
+        from .valoracion import valor_total
+        self.assertEqual(estadisticas_inventario(refrescar=True)['valor_total'], valor_total())
+
+    def test_escaner_y_sincronizacion(self):
+        self.client.post(reverse('inventario:escaner_descontar'), {'codigo': self.producto.codigo, 'cantidad': 4})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.valor_stock, Decimal('6000'))
+        self.assertEqual(self.producto.movimientos.latest('id').valor, Decimal('4000'))
+        self.assertTotalesAlDia()
+
+        self.client.post(reverse('inventario:escaner_sincronizar'), json.dumps({'movimientos': [
+            {'id': str(uuid.uuid4()), 'codigo': self.producto.codigo, 'cantidad': 4, 'tipo': 'ENTRADA', 'costo': 3000},
+        ]}), content_type='application/json')
+        self.producto.refresh_from_db()
+        # (6 x 1000 + 4 x 3000) / 10
+        self.assertEqual(self.producto.costo_promedio, Decimal('1800'))
+        self.assertEqual(self.producto.valor_stock, Decimal('18000'))
+        self.assertTotalesAlDia()
+
+    def test_valor_historico(self):
+        from django.utils import timezone
+        from datetime import timedelta
+        from movimientos.models import Movimiento
+        from .valoracion import valor_en
+
+        self.producto.agregar_cantidad(10, self.admin, costo_unitario=1000)
+        primera = self.producto.movimientos.latest('id')
+        self.producto.descontar_cantidad(15, self.admin)
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        Movimiento.objects.filter(pk=primera.pk).update(fecha=hace_una_hora)
+
+        categoria = self.producto.categoria
+        historico = valor_en(hace_una_hora, categoria=categoria)
+        actual = valor_en(timezone.now(), categoria=categoria)
+        self.assertEqual(historico - actual, Decimal('20000') - Decimal('5000'))
+
+    def test_recalcular(self):
+        from .models import ValorCategoria
+        ValorCategoria.objects.update(valor=1)
+        Producto.objects.filter(pk=self.producto.pk).update(valor_stock=0)
+        call_command('recalcular_valoracion', stdout=StringIO())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.valor_stock, Decimal('10000'))
+        self.assertTotalesAlDia()
+
+
+@override_settings(FRACCIONES_CONSOLIDAR_CADA=0)
+class FraccionesTests(FuncionalTestCase):
+    """Stock fraccionado: descuentos sin tocar la fila del producto"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        from .fracciones import fraccionar
+        self.producto = Producto.objects.filter(
+            activo=True, cantidad__gte=20, movimientos__isnull=False
+        ).exclude(codigo_barras='').exclude(codigo_barras__isnull=True).distinct().order_by('id').first()
+        self.cantidad = self.producto.cantidad
+        fraccionar(self.producto, 4)
+
+    def fracciones(self):
+        return list(self.producto.fracciones_stock.order_by('numero').values_list('disponible', 'descontado'))
+
+    def assertConciliado(self):
+        from .conciliacion import conciliar
+        reporte = conciliar()
+        self.assertEqual(reporte['discrepancias'], 0, reporte['detalles'][:5])
+
+    def test_reparte_el_stock(self):
+        base, resto = divmod(self.cantidad, 4)
+        self.assertEqual(self.fracciones(), [(base + (i < resto), 0) for i in range(4)])
+        self.assertEqual(self.producto.fracciones, 4)
+
+    def test_descuentos_pendientes_y_consolidacion(self):
+        from movimientos.models import Movimiento
+        from .fracciones import consolidar_todos
+        for _ in range(3):
+            self.producto.descontar_cantidad(2, self.admin, 'Venta barra')
+
+        # La fila del producto no cambió: el stock actual se calcula
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).cantidad, self.cantidad)
+        self.assertEqual(self.producto.stock_actual(), self.cantidad - 6)
+        self.assertEqual(sum(d for d, _ in self.fracciones()), self.cantidad - 6)
+        pendientes = Movimiento.objects.filter(producto=self.producto, consolidado=False)
+        self.assertEqual(pendientes.count(), 3)
+        self.assertConciliado()
+
+        self.assertEqual(consolidar_todos(), (1, 3))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, self.cantidad - 6)
+        self.assertFalse(pendientes.exists())
+        self.assertEqual(
+            list(Movimiento.objects.filter(producto=self.producto).order_by('-id')
+                 .values_list('cantidad_anterior', 'cantidad_nueva', 'motivo')[:3]),
+            [(self.cantidad - 4, self.cantidad - 6, 'Venta barra'),
+             (self.cantidad - 2, self.cantidad - 4, 'Venta barra'),
+             (self.cantidad, self.cantidad - 2, 'Venta barra')],
+        )
+        self.assertEqual(sum(d for d, _ in self.fracciones()), self.cantidad - 6)
+        self.assertConciliado()
+
+    def test_nunca_negativo(self):
+        from .fracciones import consolidar_todos
+        # Más que una fracción: se descuenta directo sobre el producto
+        self.producto.descontar_cantidad(self.cantidad - 3, self.admin)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, 3)
+        for _ in range(3):
+            self.producto.descontar_cantidad(1, self.admin)
+        with self.assertRaisesMessage(ValueError, 'Disponible: 0'):
+            self.producto.descontar_cantidad(1, self.admin)
+
+        consolidar_todos()
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.cantidad, self.producto.estado), (0, 'AGOTADO'))
+        self.assertEqual(self.fracciones(), [(0, 0)] * 4)
+        self.assertConciliado()
+
+    def test_otras_escrituras_consolidan_primero(self):
+        self.producto.descontar_cantidad(5, self.admin)
+        self.producto.agregar_cantidad(10, self.admin)
+        self.assertEqual(self.producto.cantidad, self.cantidad + 5)
+        self.assertEqual(sum(d for d, _ in self.fracciones()), self.cantidad + 5)
+
+        respuesta = self.client.post(
+            reverse('inventario:escaner_sincronizar'),
+            json.dumps({'movimientos': [
+                {'id': str(uuid.uuid4()), 'codigo': self.producto.codigo, 'cantidad': 1, 'tipo': 'SALIDA'},
+            ]}),
+            content_type='application/json',
+        )
+        self.assertEqual(respuesta.json()['aplicados'], 1)
+        self.producto.descontar_cantidad(2, self.admin)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock_actual(), self.cantidad + 2)
+        self.assertConciliado()
+
+    def test_escaner_async(self):
+        from .valoracion import valor_total
+        antes = valor_total()
+        respuesta = self.client.post(reverse('inventario:escaner_descontar'), {
+            'codigo': self.producto.codigo_barras, 'cantidad': 3, 'motivo': 'Venta barra',
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['producto']['cantidad'], self.cantidad - 3)
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).cantidad, self.cantidad)
+
+        respuesta = self.client.post(reverse('inventario:escaner_descontar'), {
+            'codigo': self.producto.codigo_barras, 'cantidad': self.cantidad, 'motivo': 'Venta barra',
+        })
+        self.assertEqual(respuesta.status_code, 409)
+
+        # La consolidación lleva el valor a los totales por categoría
+        from .fracciones import consolidar_todos
+        self.assertEqual(valor_total(), antes)
+        self.assertEqual(consolidar_todos(), (1, 1))
+        self.producto.refresh_from_db()
+        self.assertEqual(valor_total() - antes, -self.producto.valor_para(3))
+
+    def test_consolidacion_automatica(self):
+        with self.settings(FRACCIONES_CONSOLIDAR_CADA=30), self.captureOnCommitCallbacks(execute=True):
+            self.producto.descontar_cantidad(2, self.admin)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, self.cantidad - 2)
+        self.assertEqual(self.producto.stock_actual(), self.cantidad - 2)
+
+    def test_comando_y_edicion(self):
+        self.producto.descontar_cantidad(4, self.admin)
+        # Editar consolida primero y conserva lo que cambió el formulario
+        datos = {
+            campo: valor for campo, valor in ProductoForm(instance=self.producto).initial.items()
+            if valor is not None and campo != 'imagen'
+        }
+        datos['nombre'] = 'Cerveza de barril'
+        respuesta = self.client.post(reverse('inventario:editar_producto', args=[self.producto.pk]), datos)
+        self.assertEqual(respuesta.status_code, 302)
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.nombre, self.producto.cantidad), ('Cerveza de barril', self.cantidad - 4))
+        self.assertEqual(sum(d for d, _ in self.fracciones()), self.cantidad - 4)
+
+        salida = StringIO()
+        call_command('consolidar_stock', fraccionar=[self.producto.codigo], fracciones=0, stdout=salida)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.fracciones, 0)
+        self.assertFalse(self.producto.fracciones_stock.exists())
+        call_command('consolidar_stock', stdout=salida)
+        self.assertIn('0 movimientos de 0 productos', salida.getvalue())
+
+
+class ConciliacionTests(FuncionalTestCase):
+    """Conciliación de Producto.cantidad con la cadena de movimientos"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        from movimientos.models import Movimiento
+        self.movimientos = Movimiento.objects.order_by('producto_id', 'fecha', 'id')
+
+    def descuadrar(self):
+        """Rompe dos saldos, una cadena y una operación por fuera de save()"""
+        productos = list(Producto.objects.filter(movimientos__isnull=False).distinct().order_by('id')[:4])
+        Producto.objects.filter(pk=productos[0].pk).update(cantidad=productos[0].cantidad + 7)
+
+        roto = self.movimientos.filter(producto=productos[1])[1]
+        self.movimientos.filter(pk=roto.pk).update(
+            cantidad_anterior=roto.cantidad_anterior + 1, cantidad_nueva=roto.cantidad_nueva + 1
+        )
+
+        mal_sumado = self.movimientos.filter(producto=productos[2], tipo='SALIDA').first()
+        self.movimientos.filter(pk=mal_sumado.pk).update(cantidad=mal_sumado.cantidad + 2)
+
+        # El estado lo recalcula la base: no queda descuadrado
+        Producto.objects.filter(pk=productos[3].pk).update(cantidad=0)
+        return productos, roto, mal_sumado
+
+    def test_datos_sembrados_cuadran(self):
+        from .conciliacion import conciliar
+        producto = Producto.objects.filter(movimientos__isnull=False, cantidad__gt=5).order_by('id').first()
+        producto.descontar_cantidad(3, self.admin)
+        producto.agregar_cantidad(4, self.admin, costo_unitario=500)
+
+        reporte = conciliar()
+        self.assertEqual(reporte['discrepancias'], 0, reporte['detalles'][:5])
+        self.assertEqual(reporte['movimientos'], self.movimientos.count())
+        self.assertEqual(reporte['productos'], Producto.objects.count())
+
+    def test_detecta_discrepancias(self):
+        from .conciliacion import conciliar
+        productos, roto, mal_sumado = self.descuadrar()
+
+        reporte = conciliar()
+        # La cadena se rompe al entrar y al salir del movimiento alterado
+        self.assertEqual(reporte['conteo'], {'cadena': 2, 'operacion': 1, 'saldo': 2, 'estado': 0})
+        detalles = {(d['tipo'], d['producto_id'], d['movimiento_id']) for d in reporte['detalles']}
+        self.assertIn(('saldo', productos[0].pk, self.movimientos.filter(producto=productos[0]).last().pk), detalles)
+        self.assertIn(('cadena', productos[1].pk, roto.pk), detalles)
+        self.assertIn(('operacion', productos[2].pk, mal_sumado.pk), detalles)
+        self.assertIn(('saldo', productos[3].pk, self.movimientos.filter(producto=productos[3]).last().pk), detalles)
+        self.assertEqual(Producto.objects.get(pk=productos[3].pk).estado, 'AGOTADO')
+
+    def test_bloques_y_particiones_no_cambian_el_resultado(self):
+        from .conciliacion import conciliar, particiones
+        self.descuadrar()
+        completo = conciliar()
+        partido = conciliar(particiones(7), tamano=13)
+        self.assertEqual(partido['conteo'], completo['conteo'])
+        self.assertEqual(partido['detalles'], completo['detalles'])
+        self.assertEqual(partido['movimientos'], completo['movimientos'])
+
+    def test_comando(self):
+        from django.core.management.base import CommandError
+        salida = StringIO()
+        call_command('conciliar_stock', procesos=0, stdout=salida)
+        self.assertIn('coincide con los movimientos', salida.getvalue())
+
+        self.descuadrar()
+        with tempfile.TemporaryDirectory() as carpeta:
+            archivo = Path(carpeta, 'conciliacion.json')
+            with self.assertRaises(CommandError):
+                call_command('conciliar_stock', procesos=0, json=str(archivo), fallar=True, stdout=StringIO())
+            reporte = json.loads(archivo.read_text(encoding='utf-8'))
+        self.assertEqual(reporte['discrepancias'], 5)
+        self.assertEqual(len(reporte['detalles']), 5)
+
+
+class GenerarDatosTests(FuncionalTestCase):
+    """generar_datos solo borra lo que generó y no corre en producción sin pedirlo"""
+
+    datos = MINIMO
+
+    def generar(self, **opciones):
+        call_command('generar_datos', dias=5, forzar=True, stdout=StringIO(), **MINIMO, **opciones)
+
+    def test_limpiar_borra_solo_lo_generado_con_el_prefijo(self):
+        real = Producto.objects.create(
+            codigo='CERV-001', nombre='Cerveza de la casa', categoria=Categoria.objects.first(),
+            cantidad=5, precio_compra=Decimal('2000'),
+        )
+        self.generar(semilla=2, prefijo='Demo')
+        self.assertTrue(Producto.objects.filter(codigo__startswith='Demo2-').exists())
+        self.assertTrue(Usuario.objects.filter(username__startswith='demo2_').exists())
+
+        self.generar(semilla=3, prefijo='Demo', limpiar=True)
+        self.assertFalse(Producto.objects.filter(codigo__startswith='Demo2-').exists())
+        self.assertFalse(Usuario.objects.filter(username__startswith='demo2_').exists())
+        self.assertTrue(Producto.objects.filter(codigo__startswith='Demo3-').exists())
+        # Lo sembrado con el prefijo por defecto, el administrador y los productos reales siguen
+        self.assertTrue(Producto.objects.filter(codigo__startswith='S1-').exists())
+        self.assertTrue(Usuario.objects.filter(pk=self.admin.pk).exists())
+        self.assertTrue(Producto.objects.filter(pk=real.pk).exists())
+
+    def test_misma_semilla_con_otro_prefijo(self):
+        # La clase ya sembró la semilla 1 con el prefijo por defecto
+        self.generar(semilla=1, prefijo='T')
+        self.assertTrue(Producto.objects.filter(codigo__startswith='T1-').exists())
+        self.assertTrue(Usuario.objects.filter(documento__startswith='T1-').exists())
+        self.assertTrue(Proveedor.objects.filter(nit__startswith='T1-').exists())
+
+    def test_rechaza_etiquetas_y_tamanos_que_no_caben(self):
+        from django.core.management.base import CommandError
+        with self.assertRaisesMessage(CommandError, 'caracteres'):
+            self.generar(semilla=1, prefijo='Demasiadolargo')
+        with self.assertRaisesMessage(CommandError, 'productos'):
+            call_command('generar_datos', productos=1_000_000, forzar=True, stdout=StringIO())
+
+    def test_sin_debug_exige_forzar(self):
+        from django.core.management.base import CommandError
+        with self.assertRaisesMessage(CommandError, '--forzar'):
+            call_command('generar_datos', semilla=4, limpiar=True, stdout=StringIO())
+        self.assertTrue(Producto.objects.filter(codigo__startswith='S1-').exists())
+
+
+class SimularCargaTests(TransactionTestCase):
+    """El simulador de carga ejecuta la mezcla con hilos concurrentes"""
+
+    def test_mezcla_con_hilos(self):
+        sembrar(1, MINIMO)
+        Usuario.objects.create_superuser(
+            'cajero_carga', 'carga@sisbar.test', 'clave-segura-123',
+            rol='SUPER_ADMIN', aprobado=True, notificado_aprobacion=True,
+        )
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = Path(directorio) / 'carga.json'
+            call_command('simular_carga', hilos=2, peticiones=20, json=str(archivo), stdout=StringIO())
+            resultado = json.loads(archivo.read_text(encoding='utf-8'))
+
+        self.assertEqual(resultado['peticiones'], 20)
+        self.assertEqual(resultado['errores'], 0)
+        self.assertLessEqual(resultado['p50_ms'], resultado['p99_ms'])
+        self.assertGreater(resultado['bd']['consultas'], 0)
+
+    def test_vistas_async(self):
+        sembrar(1, MINIMO)
+        Usuario.objects.create_superuser(
+            'cajero_carga', 'carga@sisbar.test', 'clave-segura-123',
+            rol='SUPER_ADMIN', aprobado=True, notificado_aprobacion=True,
+        )
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = Path(directorio) / 'carga.json'
+            # La BD de pruebas es un archivo con el perfil de SQLite (WAL, BEGIN
+            # IMMEDIATE): los escritores esperan su turno en vez de fallar
+            call_command('simular_carga', hilos=2, peticiones=20, vistas='async',
+                         json=str(archivo), stdout=StringIO())
+            resultado = json.loads(archivo.read_text(encoding='utf-8'))
+
+        self.assertEqual(resultado['vistas'], 'async')
+        self.assertEqual(resultado['errores'], 0)
+
+    def test_descuentos_rechazados_no_son_exitos(self):
+        from .management.commands.simular_carga import clasificar
+        sembrar(1, MINIMO)
+        cliente = self.client
+        cliente.force_login(Usuario.objects.create_superuser(
+            'cajero_carga', 'carga@sisbar.test', 'clave-segura-123',
+            rol='SUPER_ADMIN', aprobado=True, notificado_aprobacion=True,
+        ))
+        producto = Producto.objects.filter(activo=True, cantidad__gt=0).order_by('id').first()
+        for url in (reverse('inventario:descontar_producto'), reverse('inventario:escaner_descontar')):
+            for cantidad, esperado in ((1, 'ok'), (producto.cantidad + 100, 'rechazada')):
+                respuesta = cliente.post(url, {'codigo': producto.codigo, 'cantidad': cantidad, 'motivo': 'Venta'})
+                self.assertEqual(
+                    clasificar('descontar', respuesta.status_code, respuesta.content), esperado, (url, cantidad)
+                )
+            respuesta = cliente.post(url, {'codigo': 'NO-EXISTE', 'cantidad': 1, 'motivo': 'Venta'})
+            self.assertEqual(clasificar('descontar', respuesta.status_code, respuesta.content), 'rechazada')
+        self.assertEqual(clasificar('descontar', 302, b''), 'error')
+        self.assertEqual(clasificar('buscar', 500, b''), 'error')
+
+    def test_memoria_del_servidor(self):
+        from sisbar_config.carga import memoria_arbol
+        memoria = memoria_arbol(os.getpid())
+        if memoria is None:
+            self.skipTest('Sin /proc en este sistema')
+        self.assertGreater(memoria, 0)
+
+
+class PerfilSQLiteTests(TransactionTestCase):
+    """WAL, BEGIN IMMEDIATE y escritores concurrentes (sisbar_config/sqlite)"""
+
+    def setUp(self):
+        from django.db import connection
+        if not hasattr(connection, 'inmediata'):
+            self.skipTest('La base no usa el backend sisbar_config.sqlite')
+
+    def test_pragmas(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)   # NORMAL
+
+    def test_begin_immediate(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from sisbar_config.sqlite import escritura
+
+        with CaptureQueriesContext(connection) as capturadas:
+            with escritura():
+                with escritura():
+                    pass
+            with transaction.atomic():
+                pass
+        # La anidada es un savepoint; la transacción siguiente vuelve a ser diferida
+        consultas = [consulta['sql'].split(' "')[0] for consulta in capturadas.captured_queries]
+        self.assertEqual(consultas, ['BEGIN IMMEDIATE', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'COMMIT', 'BEGIN', 'COMMIT'])
+
+    def test_escritores_concurrentes(self):
+        import threading
+        from django.db import OperationalError, connections
+        from sisbar_config.sqlite import escritura
+
+        sembrar(1, MINIMO)
+        producto = Producto.objects.filter(activo=True).order_by('id').first()
+        errores = []
+
+        def cajero():
+            try:
+                for _ in range(10):
+                    # Lee y después escribe: con un BEGIN diferido la segunda
+                    # parte falla con "database is locked" si otro escribió
+                    with escritura():
+                        cantidad = Producto.objects.values_list('cantidad', flat=True).get(pk=producto.pk)
+                        Producto.objects.filter(pk=producto.pk).update(cantidad=cantidad + 1)
+            except OperationalError as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=cajero) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        # Además, ninguna actualización se pisó con otra
+        self.assertEqual(Producto.objects.get(pk=producto.pk).cantidad, producto.cantidad + 40)
+
+
+class ImagenesProductoTests(FuncionalTestCase):
+    """Versiones redimensionadas, sin metadatos y con nombre por contenido"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.ajustes = self.settings(MEDIA_ROOT=self.media.name)
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.media.cleanup()
+        super().tearDown()
+
+    def foto(self, ancho=1200, alto=900, nombre='foto.jpg'):
+        """JPEG de prueba con EXIF (cámara y rotación de 90°)"""
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+        imagen = Image.new('RGB', (ancho, alto), (200, 40, 40))
+        exif = Image.Exif()
+        exif[0x010F] = 'Camara de prueba'
+        exif[0x0112] = 6
+        salida = BytesIO()
+        imagen.save(salida, 'JPEG', exif=exif)
+        return SimpleUploadedFile(nombre, salida.getvalue(), content_type='image/jpeg')
+
+    def producto_con_foto(self, **extra):
+        producto = Producto.objects.order_by('id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.imagen = self.foto(**extra)
+            producto.save()
+        producto.refresh_from_db()
+        return producto
+
+    def test_genera_versiones_al_subir(self):
+        from django.core.files.storage import default_storage
+        from PIL import Image
+        from sisbar_config.imagenes import TAMANOS as LADOS
+
+        producto = self.producto_con_foto()
+        versiones = producto.imagen_versiones
+        self.assertEqual(versiones['origen'], producto.imagen.name)
+        for tamano, lado in LADOS.items():
+            entrada = versiones[tamano]
+            self.assertIn(versiones['huella'], entrada['webp'])
+            # La rotación del EXIF queda aplicada: 900x1200 vertical
+            self.assertEqual(max(entrada['ancho'], entrada['alto']), lado)
+            self.assertGreater(entrada['alto'], entrada['ancho'])
+            for formato, esperado in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+                with default_storage.open(entrada[formato]) as archivo, Image.open(archivo) as version:
+                    self.assertEqual(version.format, esperado)
+                    self.assertEqual(version.size, (entrada['ancho'], entrada['alto']))
+                    self.assertEqual(len(version.getexif()), 0)
+                    self.assertNotIn('icc_profile', version.info)
+
+    def test_original_sin_metadatos_y_acotado(self):
+        from django.core.files.storage import default_storage
+        from PIL import Image
+        from sisbar_config.imagenes import LADO_ORIGINAL
+
+        producto = self.producto_con_foto(ancho=3000, alto=1000)
+        with default_storage.open(producto.imagen.name) as archivo, Image.open(archivo) as original:
+            self.assertEqual(original.format, 'JPEG')
+            self.assertEqual(len(original.getexif()), 0)
+            # Rotación aplicada y lado mayor acotado
+            self.assertEqual(original.height, LADO_ORIGINAL)
+            self.assertLess(original.width, original.height)
+
+    def test_misma_imagen_mismos_nombres(self):
+        from sisbar_config.imagenes import generar_versiones
+        producto = self.producto_con_foto()
+        self.assertEqual(generar_versiones(producto.imagen.name), producto.imagen_versiones)
+
+    def test_etiqueta_imagen(self):
+        from django.template import Context, Template
+        plantilla = Template("{% load imagenes %}{% imagen producto 'mini' alt=producto.nombre class='me-3' %}")
+        producto = self.producto_con_foto()
+        html = plantilla.render(Context({'producto': producto}))
+        self.assertIn('<picture>', html)
+        self.assertIn(producto.imagen_versiones['mini']['webp'], html)
+        self.assertIn('loading="lazy"', html)
+        self.assertNotIn(producto.imagen.name, html)
+
+        # Imagen recién cambiada y aún sin procesar: se muestra el original
+        producto.imagen = 'productos/otra.jpg'
+        html = plantilla.render(Context({'producto': producto}))
+        self.assertNotIn('<picture>', html)
+        self.assertIn('productos/otra.jpg', html)
+
+        self.assertEqual(plantilla.render(Context({'producto': Producto(nombre='Sin foto')})), '')
+
+    def test_listado_usa_miniatura(self):
+        producto = self.producto_con_foto()
+        respuesta = self.client.get(reverse('inventario:listar_productos'), {'q': producto.codigo})
+        self.assertContains(respuesta, producto.imagen_versiones['mini']['webp'])
+
+    def test_comando_procesa_pendientes(self):
+        producto = self.producto_con_foto()
+        Producto.objects.filter(pk=producto.pk).update(imagen_versiones={})
+
+        call_command('procesar_imagenes', procesos=0, stdout=StringIO())
+        producto.refresh_from_db()
+        self.assertEqual(producto.imagen_versiones['origen'], producto.imagen.name)
+
+        salida = StringIO()
+        call_command('procesar_imagenes', procesos=0, stdout=salida)
+        self.assertIn('ya tienen sus versiones', salida.getvalue())
+
+    def test_comando_con_pool_de_procesos(self):
+        from django.core.files.storage import default_storage
+        ids = list(Producto.objects.order_by('id').values_list('id', flat=True)[:3])
+        for n, pk in enumerate(ids):
+            # Imágenes "antiguas": subidas antes de existir las versiones
+            nombre = default_storage.save(f'productos/antigua{n}.jpg', self.foto(ancho=400, alto=300))
+            Producto.objects.filter(pk=pk).update(imagen=nombre)
+
+        errores = StringIO()
+        call_command('procesar_imagenes', procesos=2, modelo='productos', stdout=StringIO(), stderr=errores)
+        self.assertEqual(errores.getvalue(), '')
+        for producto in Producto.objects.filter(pk__in=ids):
+            self.assertEqual(producto.imagen_versiones['origen'], producto.imagen.name)
+            tarjeta = producto.imagen_versiones['tarjeta']
+            self.assertEqual(max(tarjeta['ancho'], tarjeta['alto']), 320)
+
+
+class MediaTests(FuncionalTestCase):
+    """Archivos subidos servidos en producción con caché, rangos y precomprimidos"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.TemporaryDirectory()
+        self.ajustes = self.settings(MEDIA_ROOT=self.media.name, DEBUG=False)
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.media.cleanup()
+        super().tearDown()
+
+    def guardar(self, nombre, contenido):
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+        return default_storage.save(nombre, ContentFile(contenido))
+
+    def test_nombre_con_huella(self):
+        from sisbar_config.media import CON_HUELLA
+        nombre = self.guardar('productos/Foto.JPG', b'contenido')
+        self.assertRegex(nombre, CON_HUELLA)
+        self.assertTrue(nombre.endswith('.jpg'))
+        # Mismo contenido: mismo archivo, sin copias
+        self.assertEqual(self.guardar('productos/Foto.JPG', b'contenido'), nombre)
+        self.assertNotEqual(self.guardar('productos/Foto.JPG', b'otro'), nombre)
+        # Un nombre subido con forma de huella no se cree: ni se pisa el
+        # archivo que ya tiene ese nombre ni se guarda otro contenido bajo él
+        self.assertNotEqual(self.guardar(nombre, b'otro contenido'), nombre)
+        self.assertRegex(self.guardar('productos/x-0123456789abcdef.jpg', b'x'), r'-0123456789abcdef-[0-9a-f]{16}\.jpg$')
+
+    def test_cache_inmutable_y_304(self):
+        nombre = self.guardar('productos/foto.jpg', b'x' * 1000)
+        respuesta = self.client.get(f'/media/{nombre}')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(b''.join(respuesta.streaming_content), b'x' * 1000)
+        self.assertEqual(respuesta['Content-Type'], 'image/jpeg')
+        self.assertIn('immutable', respuesta['Cache-Control'])
+        self.assertIn('max-age=31536000', respuesta['Cache-Control'])
+
+        revalidada = self.client.get(f'/media/{nombre}', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(revalidada.status_code, 304)
+        revalidada = self.client.get(f'/media/{nombre}', HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified'])
+        self.assertEqual(revalidada.status_code, 304)
+
+    def test_sin_huella_cache_corta(self):
+        Path(self.media.name, 'antigua.png').write_bytes(b'png')
+        respuesta = self.client.get('/media/antigua.png')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotIn('immutable', respuesta['Cache-Control'])
+        self.assertIn('ETag', respuesta)
+
+    def test_rangos(self):
+        nombre = self.guardar('documentos/archivo.pdf', bytes(range(100)))
+        respuesta = self.client.get(f'/media/{nombre}', HTTP_RANGE='bytes=10-19')
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(respuesta['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(respuesta.streaming_content), bytes(range(10, 20)))
+
+        respuesta = self.client.get(f'/media/{nombre}', HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(respuesta.streaming_content), bytes(range(95, 100)))
+
+        respuesta = self.client.get(f'/media/{nombre}', HTTP_RANGE='bytes=500-')
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], 'bytes */100')
+
+        # If-Range con un ETag viejo: archivo completo
+        respuesta = self.client.get(f'/media/{nombre}', HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"viejo"')
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_variante_precomprimida(self):
+        import gzip
+        nombre = self.guardar('exportes/datos.csv', b'a,b\n' * 100)
+        Path(self.media.name, nombre + '.gz').write_bytes(gzip.compress(b'a,b\n' * 100))
+
+        respuesta = self.client.get(f'/media/{nombre}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(respuesta['Content-Type'], 'text/csv')
+        self.assertEqual(gzip.decompress(b''.join(respuesta.streaming_content)), b'a,b\n' * 100)
+
+        identidad = self.client.get(f'/media/{nombre}')
+        self.assertFalse(identidad.has_header('Content-Encoding'))
+        # Otros bytes, otro ETag: un caché no cruza las variantes
+        self.assertNotEqual(identidad['ETag'], respuesta['ETag'])
+        self.assertEqual(respuesta['Vary'], 'Accept-Encoding')
+        revalidada = self.client.get(f'/media/{nombre}', HTTP_IF_NONE_MATCH=respuesta['ETag'])
+        self.assertEqual(revalidada.status_code, 200)
+
+        # q=0 rechaza la codificación; el nombre no se busca como subcadena
+        for cabecera in ('gzip;q=0, deflate', 'x-gzip-no', 'br'):
+            respuesta = self.client.get(f'/media/{nombre}', HTTP_ACCEPT_ENCODING=cabecera)
+            self.assertFalse(respuesta.has_header('Content-Encoding'), cabecera)
+        respuesta = self.client.get(f'/media/{nombre}', HTTP_ACCEPT_ENCODING='*;q=0.5')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+
+    def test_rutas_invalidas(self):
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/%2E%2E/manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/no-existe.jpg').status_code, 404)
+        self.assertEqual(self.client.get('/media/').status_code, 404)
+
+    def test_x_accel_redirect(self):
+        nombre = self.guardar('productos/foto.jpg', b'jpg')
+        with self.settings(MEDIA_X_ACCEL_PREFIX='/_media/'):
+            respuesta = self.client.get(f'/media/{nombre}')
+        self.assertEqual(respuesta['X-Accel-Redirect'], f'/_media/{nombre}')
+        self.assertEqual(respuesta.content, b'')
+
+
+class FilasProductoTests(FuncionalTestCase):
+    """La lista de productos usa filas livianas con los mismos datos que el modelo"""
+
+    datos = MINIMO
+
+    def test_mismos_datos_que_el_modelo(self):
+        Producto.objects.filter(pk=Producto.objects.order_by('id').first().pk).update(
+            descripcion='palabra ' * 100, subcategoria=None, proveedor=None
+        )
+        consulta = Producto.objects.filter(activo=True).order_by('id')
+        filas = ProductoFila.listar(consulta)
+        modelos = list(consulta.select_related('categoria', 'subcategoria', 'proveedor'))
+        self.assertEqual(len(filas), len(modelos))
+        for fila, producto in zip(filas, modelos):
+            self.assertEqual((fila.id, fila.codigo, fila.cantidad, fila.precio_compra),
+                             (producto.id, producto.codigo, producto.cantidad, producto.precio_compra))
+            for metodo in ('get_estado_color', 'get_estado_icono', 'get_estado_display',
+                           'get_unidad_medida_display'):
+                self.assertEqual(getattr(fila, metodo)(), getattr(producto, metodo)())
+            self.assertEqual(fila.categoria.nombre, producto.categoria.nombre)
+            self.assertEqual(fila.proveedor and fila.proveedor.nombre, producto.proveedor and producto.proveedor.nombre)
+            self.assertEqual(fila.descripcion, producto.descripcion[:LARGO_DESCRIPCION])
+            self.assertFalse(fila.imagen)
+        self.assertIsNone(filas[0].subcategoria)
+
+        # Una sola instancia por categoría, compartida entre las filas
+        categorias = {fila.categoria.id: fila.categoria for fila in filas}
+        for fila in filas:
+            self.assertIs(fila.categoria, categorias[fila.categoria.id])
+        self.assertFalse(hasattr(filas[0], '__dict__'))
+
+    def test_menos_memoria_que_las_instancias(self):
+        import tracemalloc
+
+        consulta = Producto.objects.filter(activo=True)
+
+        def memoria(cargar):
+            tracemalloc.start()
+            filas = cargar()
+            usada = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            self.assertTrue(filas)
+            return usada
+
+        modelos = memoria(lambda: list(consulta.select_related('categoria', 'subcategoria', 'proveedor')))
+        filas = memoria(lambda: ProductoFila.listar(consulta))
+        self.assertLess(filas, modelos / 2)
+
+
+class CatalogoTests(FuncionalTestCase):
+    """La foto del catálogo responde lo mismo que las consultas y se mantiene al día"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        catalogo.descartar()
+        self.activos = Producto.objects.filter(activo=True)
+
+    def test_mismas_respuestas_que_las_consultas(self):
+        from django.db.models import Count, F
+
+        foto = catalogo.actual()
+        self.assertEqual(foto.contar(), self.activos.count())
+        esperado = dict(self.activos.values_list('estado').annotate(n=Count('id')))
+        self.assertEqual({e: n for e, n in foto.por_estado().items() if n}, esperado)
+        self.assertEqual(
+            foto.por_categoria(),
+            dict(self.activos.values_list('categoria_id').annotate(n=Count('id'))),
+        )
+        self.assertEqual(
+            foto.filtrar(bajo_minimo=True, estado__in=['POR_AGOTAR', 'AGOTADO']).contar(),
+            self.activos.filter(cantidad__lte=F('cantidad_minima'), estado__in=['POR_AGOTAR', 'AGOTADO']).count(),
+        )
+        categoria = self.activos.first().categoria_id
+        self.assertAlmostEqual(
+            foto.filtrar(categoria=categoria).suma('valor'),
+            sum(p.cantidad * float(p.precio_compra) for p in self.activos.filter(categoria_id=categoria)),
+            places=2,
+        )
+        self.assertEqual(
+            foto.filtrar(cantidad__gt=5).top('precio', 7),
+            list(self.activos.filter(cantidad__gt=5).order_by('-precio_compra', 'id').values_list('id', flat=True)[:7]),
+        )
+        self.assertEqual(
+            foto.top('cantidad', 5, mayores=False),
+            list(self.activos.order_by('cantidad', 'id').values_list('id', flat=True)[:5]),
+        )
+
+    def test_cambios_por_save_sin_reconstruir(self):
+        foto = catalogo.actual()
+        producto = self.activos.order_by('id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.cantidad = 0
+            producto.save()
+        with self.assertNumQueries(0):
+            self.assertIs(catalogo.actual(), foto)
+        self.assertIn(producto.id, foto.filtrar(cantidad=0, estado='AGOTADO').ids())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.activo = False
+            producto.save()
+        self.assertNotIn(producto.id, catalogo.actual().ids())
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.activo = True
+            producto.save()
+        self.assertIs(catalogo.actual(), foto)
+        self.assertEqual(foto.contar(), self.activos.count())
+        self.assertEqual(foto.ids(), sorted(foto.ids()))
+
+    def test_save_despues_de_otro_cambio_no_adopta_la_version(self):
+        from sisbar_config.cache import invalidar
+
+        foto = catalogo.actual()
+        # Otro worker (o un update() masivo) cambió el inventario...
+        self.activos.update(cantidad=0)
+        invalidar('inventario')
+        # ...y antes de que esta foto lo note se guarda un producto
+        producto = self.activos.order_by('id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.cantidad = 50
+            producto.save()
+        nueva = catalogo.actual()
+        self.assertIsNot(nueva, foto)
+        self.assertEqual(nueva.por_estado()['AGOTADO'], self.activos.count() - 1)
+
+    def test_dos_guardados_en_una_transaccion(self):
+        primero, segundo = self.activos.order_by('id')[:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.cantidad = 0
+            primero.save()
+            segundo.cantidad = 0
+            segundo.save()
+        nueva = catalogo.actual()
+        self.assertEqual(
+            set(nueva.filtrar(cantidad=0).ids()) & {primero.id, segundo.id}, {primero.id, segundo.id}
+        )
+        self.assertEqual(nueva.version, catalogo._version())
+
+    def test_cambios_sin_save_reconstruyen(self):
+        from sisbar_config.cache import invalidar
+
+        foto = catalogo.actual()
+        self.activos.update(cantidad=0)
+        invalidar('inventario')
+        nueva = catalogo.actual()
+        self.assertIsNot(nueva, foto)
+        self.assertEqual(nueva.por_estado()['AGOTADO'], self.activos.count())
+
+    def test_lista_de_productos_sin_consultas_de_estadisticas(self):
+        catalogo.actual()
+        respuesta = self.client.get(reverse('inventario:listar_productos'))
+        self.assertEqual(respuesta.context['stats']['total'], self.activos.count())
+        self.assertEqual(
+            respuesta.context['stats']['agotados'], self.activos.filter(estado='AGOTADO').count()
+        )
+
+
+class EstadoGeneradoTests(FuncionalTestCase):
+    """Producto.estado lo calcula la base: también con update() y bulk_update()"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        self.productos = Producto.objects.filter(activo=True).order_by('id')
+
+    def test_misma_regla_que_estado_para(self):
+        producto = self.productos.first()
+        for cantidad in (0, 1, producto.cantidad_minima, producto.cantidad_minima + 1, 500):
+            Producto.objects.filter(pk=producto.pk).update(cantidad=cantidad)
+            self.assertEqual(
+                Producto.objects.get(pk=producto.pk).estado, producto.estado_para(cantidad), cantidad
+            )
+
+    def test_update_masivo_sin_estados_viejos(self):
+        self.productos.update(cantidad=0)
+        self.assertFalse(self.productos.exclude(estado='AGOTADO').exists())
+        self.productos.update(cantidad=F('cantidad_minima'))
+        self.assertEqual(self.productos.filter(estado='POR_AGOTAR').count(), self.productos.count())
+
+    def test_bulk_update_y_save(self):
+        productos = list(self.productos[:3])
+        for producto in productos:
+            producto.cantidad = producto.cantidad_minima + 10
+        Producto.objects.bulk_update(productos, ['cantidad'])
+        self.assertEqual(
+            set(self.productos.filter(pk__in=[p.pk for p in productos]).values_list('estado', flat=True)),
+            {'DISPONIBLE'},
+        )
+
+        # Guardado completo: la instancia aplica la regla a los mismos valores, sin releer
+        producto = productos[0]
+        producto.cantidad = 0
+        producto.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(producto.estado, 'AGOTADO')
+        self.assertEqual(Producto.objects.get(pk=producto.pk).estado, 'AGOTADO')
+
+    def test_guardado_parcial_relee_el_estado(self):
+        producto = self.productos.first()
+        # Otro usuario subió el mínimo; esta instancia todavía tiene el viejo
+        Producto.objects.filter(pk=producto.pk).update(cantidad_minima=100)
+        producto.cantidad = 50
+        self.assertEqual(producto.estado_para(50), 'DISPONIBLE')
+        producto.save(update_fields=['cantidad'])
+        self.assertEqual(producto.estado, 'POR_AGOTAR')
+        self.assertEqual(Producto.objects.get(pk=producto.pk).estado, 'POR_AGOTAR')
+
+    def test_al_crear_viene_de_la_base(self):
+        base = self.productos.first()
+        nuevo = Producto.objects.create(
+            codigo='GEN-1', nombre='Generado', categoria=base.categoria, cantidad=2,
+            cantidad_minima=5, precio_compra=1000,
+        )
+        self.assertEqual(nuevo.estado, 'POR_AGOTAR')
+        self.assertEqual(nuevo.get_estado_display(), '🟡 Por Agotarse')
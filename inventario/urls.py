@@ -16,4 +16,9 @@ urlpatterns = [
     
     # AJAX
     path('buscar-ajax/', views.buscar_producto_ajax, name='buscar_producto_ajax'),
+    
+    # Escáner async (ASGI)
+    path('escaner/buscar/', views.escaner_buscar_view, name='escaner_buscar'),
+    path('escaner/descontar/', views.escaner_descontar_view, name='escaner_descontar'),
+    path('escaner/sincronizar/', views.escaner_sincronizar_view, name='escaner_sincronizar'),
 ]
@@ -0,0 +1,121 @@
+"""
+Valoración del inventario con costo promedio ponderado
+
+El dashboard mostraba Sum('precio_compra'), que ignora las cantidades, y la
+única alternativa correcta era recorrer toda la tabla multiplicando
+cantidad x precio. Ahora el valor se mantiene a medida que se registran
+movimientos:
+
+- Producto.costo_promedio: costo promedio ponderado. Cada ENTRADA con
+  costo lo recalcula: (stock x promedio + cantidad x costo) / stock nuevo.
+  Salidas, ajustes y devoluciones se valoran al promedio vigente.
+- Producto.valor_stock: cantidad x costo_promedio, se actualiza en save().
+- Movimiento.costo_unitario / valor / valor_stock: costo aplicado, valor
+  del movimiento y valor del producto después de él. Con eso el valor en
+  cualquier fecha pasada se consulta sin repetir movimientos (valor_en).
+- ValorCategoria: valor del stock activo por categoría. Producto.save()
+  le traslada la diferencia con un UPDATE ... SET valor = valor + x, así el
+  total se lee de unas pocas filas (valor_total) en vez de recorrer el
+  inventario.
+
+Si alguna vez se modifica la tabla de productos por fuera del ORM, el
+comando `recalcular_valoracion` reconstruye los totales.
+"""
+
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+
+from .models import Producto, ValorCategoria
+
+
+# ========== TOTALES POR CATEGORÍA ==========
+def _sumar(categoria_id, diferencia):
+    if categoria_id is None or not diferencia:
+        return
+    if ValorCategoria.objects.filter(pk=categoria_id).update(valor=F('valor') + diferencia):
+        return
+    try:
+        with transaction.atomic():
+            ValorCategoria.objects.create(categoria_id=categoria_id, valor=diferencia)
+    except IntegrityError:
+        # Otro proceso creó la fila entre medio
+        ValorCategoria.objects.filter(pk=categoria_id).update(valor=F('valor') + diferencia)
+
+
+def trasladar(anterior, nuevo):
+    """
+    Aplica a los totales el cambio de un producto: `anterior` y `nuevo`
+    son (categoría, valor que aporta). None = desconocido (campos diferidos):
+    se recalcula la categoría desde los productos.
+    """
+    if anterior is None or nuevo is None:
+        categoria = (nuevo or anterior or (None,))[0]
+        if categoria is not None:
+            recalcular([categoria])
+        return
+    (categoria_anterior, valor_anterior), (categoria, valor) = anterior, nuevo
+    if categoria_anterior == categoria:
+        _sumar(categoria, valor - valor_anterior)
+    else:
+        _sumar(categoria_anterior, -valor_anterior)
+        _sumar(categoria, valor)
+
+
+def al_borrar(sender, instance, **kwargs):
+    """post_delete de Producto: su valor sale del total de la categoría"""
+    trasladar(getattr(instance, '_valor_guardado', instance._valor_categoria()), (None, Decimal(0)))
+
+
+def recalcular(categorias=None):
+    """
+    Reconstruye los totales desde Producto.valor_stock (todas o algunas
+    categorías; `categorias` puede ser una lista de ids o un queryset de
+    ids) con tres consultas: suma, upsert y ceros para el resto
+    """
+    productos = Producto.objects.filter(activo=True)
+    existentes = ValorCategoria.objects.all()
+    if categorias is not None:
+        productos = productos.filter(categoria_id__in=categorias)
+        existentes = existentes.filter(pk__in=categorias)
+    totales = dict(
+        productos.values('categoria_id').annotate(total=Sum('valor_stock')).values_list('categoria_id', 'total')
+    )
+    ValorCategoria.objects.bulk_create(
+        [ValorCategoria(categoria_id=categoria_id, valor=total) for categoria_id, total in totales.items()],
+        update_conflicts=True,
+        unique_fields=['categoria'],
+        update_fields=['valor'],
+    )
+    existentes.exclude(pk__in=totales).exclude(valor=0).update(valor=0)
+    return totales
+
+
+# ========== LECTURAS ==========
+def valor_total():
+    """Valor de todo el stock activo (suma de las filas por categoría)"""
+    return ValorCategoria.objects.aggregate(total=Sum('valor'))['total'] or Decimal(0)
+
+
+async def avalor_total():
+    return (await ValorCategoria.objects.aaggregate(total=Sum('valor')))['total'] or Decimal(0)
+
+
+def valor_en(fecha, categoria=None):
+    """
+    Valor del stock al momento `fecha`: el valor_stock del último movimiento
+    valorado de cada producto hasta esa fecha. Los productos sin movimientos
+    valorados hasta entonces no suman.
+    """
+    from movimientos.models import Movimiento
+
+    ultimo = Movimiento.objects.filter(
+        producto=OuterRef('pk'), fecha__lte=fecha, valor_stock__isnull=False
+    ).order_by('-fecha', '-id').values('valor_stock')[:1]
+    productos = Producto.objects.all()
+    if categoria is not None:
+        productos = productos.filter(categoria=categoria)
+    return productos.annotate(valor_historico=Subquery(ultimo)).aggregate(
+        total=Sum('valor_historico')
+    )['total'] or Decimal(0)
@@ -1,14 +1,29 @@
+import json
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
 from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+from asgiref.sync import sync_to_async
 from .models import Producto
 from categorias.models import Categoria, Subcategoria
 from proveedores.models import Proveedor
 from movimientos.models import Movimiento, AlertaInventario
-from usuarios.views import registrar_actividad
+from usuarios.actividad import registrar_actividad
+from sisbar_config import cache as cache_sisbar
+from sisbar_config import eventos
+from sisbar_config.asincrono import es_asgi, login_requerido
+from sisbar_config.idempotencia import idempotente
+from sisbar_config.sqlite import escritura
+from .filas import ProductoFila
 from .forms import ProductoForm, DescontarProductoForm
+from .fracciones import consolidado, descontar as descontar_fraccion
+from .sincronizacion import MAXIMO_LOTE, aplicar_lote
+from .valoracion import trasladar
 
 
 @login_required
@@ -21,9 +36,7 @@ def listar_productos_view(request):
     estado = request.GET.get('estado')
     busqueda = request.GET.get('q', '')
     
-    productos = Producto.objects.filter(activo=True).select_related(
-        'categoria', 'subcategoria', 'proveedor'
-    )
+    productos = Producto.objects.filter(activo=True)
     
     # Aplicar filtros
     if categoria_id:
@@ -41,17 +54,22 @@ def listar_productos_view(request):
             Q(descripcion__icontains=busqueda)
         )
     
-    productos = productos.order_by('-fecha_creacion')
+    # Solo las columnas de la tabla, en filas livianas (inventario/filas.py)
+    productos = ProductoFila.listar(productos.order_by('-fecha_creacion'))
     
     # Obtener categorías para el filtro
     categorias = Categoria.objects.filter(activa=True)
     
-    # Estadísticas
+    # Estadísticas desde la foto del catálogo, sin consultar (NumPy se
+    # carga con la primera foto, no al importar las vistas)
+    from .catalogo import actual as catalogo
+    foto = catalogo()
+    estados = foto.por_estado()
     stats = {
-        'total': Producto.objects.filter(activo=True).count(),
-        'disponibles': Producto.objects.filter(activo=True, estado='DISPONIBLE').count(),
-        'por_agotar': Producto.objects.filter(activo=True, estado='POR_AGOTAR').count(),
-        'agotados': Producto.objects.filter(activo=True, estado='AGOTADO').count(),
+        'total': foto.contar(),
+        'disponibles': estados['DISPONIBLE'],
+        'por_agotar': estados['POR_AGOTAR'],
+        'agotados': estados['AGOTADO'],
     }
     
     context = {
@@ -67,6 +85,7 @@ def listar_productos_view(request):
 
 
 @login_required
+@idempotente
 def crear_producto_view(request):
     """
     Crear un nuevo producto
@@ -104,6 +123,7 @@ def crear_producto_view(request):
 
 
 @login_required
+@idempotente
 def editar_producto_view(request, producto_id):
     """
     Editar un producto existente
@@ -117,7 +137,9 @@ def editar_producto_view(request, producto_id):
     if request.method == 'POST':
         form = ProductoForm(request.POST, request.FILES, instance=producto)
         if form.is_valid():
-            form.save()
+            # Productos fraccionados: los descuentos pendientes primero
+            with consolidado(producto, conservar=form.changed_data):
+                form.save()
             
             # Registrar actividad
             registrar_actividad(
@@ -146,10 +168,13 @@ def ver_producto_view(request, producto_id):
     """
     Ver detalles de un producto
     """
-    producto = get_object_or_404(Producto, id=producto_id)
+    producto = get_object_or_404(
+        Producto.objects.select_related('categoria', 'subcategoria', 'proveedor', 'creado_por'),
+        id=producto_id
+    )
     
     # Obtener movimientos del producto
-    movimientos = producto.movimientos.order_by('-fecha')[:10]
+    movimientos = producto.movimientos.select_related('usuario').order_by('-fecha')[:10]
     
     context = {
         'producto': producto,
@@ -160,6 +185,7 @@ def ver_producto_view(request, producto_id):
 
 
 @login_required
+@idempotente
 def eliminar_producto_view(request, producto_id):
     """
     Eliminar (desactivar) un producto
@@ -190,6 +216,7 @@ def eliminar_producto_view(request, producto_id):
 
 
 @login_required
+@idempotente
 def descontar_producto_view(request):
     """
     Panel para descontar productos del inventario
@@ -213,7 +240,7 @@ def descontar_producto_view(request):
                 )
                 
                 # Descontar cantidad
-                producto.descontar_cantidad(cantidad, request.user)
+                producto.descontar_cantidad(cantidad, request.user, motivo)
                 
                 # Registrar actividad
                 registrar_actividad(
@@ -228,7 +255,7 @@ def descontar_producto_view(request):
                 
                 messages.success(
                     request,
-                    f'✅ Se descontaron {cantidad} unidades de {producto.nombre}. Stock actual: {producto.cantidad}'
+                    f'✅ Se descontaron {cantidad} unidades de {producto.nombre}. Stock actual: {producto.stock_actual()}'
                 )
                 
                 # Limpiar formulario
@@ -250,12 +277,28 @@ def descontar_producto_view(request):
     
     context = {
         'form': form,
-        'ultimos_movimientos': ultimos_movimientos
+        'ultimos_movimientos': ultimos_movimientos,
+        # Con el servidor ASGI el escáner consulta la versión async
+        'url_buscar': reverse('inventario:escaner_buscar' if es_asgi(request) else 'inventario:buscar_producto_ajax'),
     }
     
     return render(request, 'inventario/descontar_producto.html', context)
 
 
+def datos_escaner(producto):
+    """Datos de un producto que muestra el escáner (producto con su categoría)"""
+    return {
+        'id': producto.id,
+        'codigo': producto.codigo,
+        'nombre': producto.nombre,
+        'categoria': producto.categoria.nombre,
+        'cantidad': producto.cantidad,
+        'unidad_medida': producto.get_unidad_medida_display(),
+        'estado': producto.get_estado_display(),
+        'estado_color': producto.get_estado_color(),
+    }
+
+
 @login_required
 def buscar_producto_ajax(request):
     """
@@ -264,23 +307,14 @@ def buscar_producto_ajax(request):
     codigo = request.GET.get('codigo', '')
     
     try:
-        producto = Producto.objects.get(
+        producto = Producto.objects.select_related('categoria').get(
             Q(codigo=codigo) | Q(codigo_barras=codigo),
             activo=True
         )
         
         data = {
             'encontrado': True,
-            'producto': {
-                'id': producto.id,
-                'codigo': producto.codigo,
-                'nombre': producto.nombre,
-                'categoria': producto.categoria.nombre,
-                'cantidad': producto.cantidad,
-                'unidad_medida': producto.get_unidad_medida_display(),
-                'estado': producto.get_estado_display(),
-                'estado_color': producto.get_estado_color(),
-            }
+            'producto': datos_escaner(producto)
         }
     except Producto.DoesNotExist:
         data = {
@@ -288,4 +322,198 @@ def buscar_producto_ajax(request):
             'mensaje': 'Producto no encontrado'
         }
     
-    return JsonResponse(data)
\ No newline at end of file
+    return JsonResponse(data)
+
+
+# ========== ESCÁNER ASYNC (ASGI) ==========
+# Reintentos del descuento si otro cajero cambió el stock entre la lectura
+# y la escritura
+INTENTOS_DESCUENTO = 5
+
+
+def _aplicar_descuento(producto, anterior, costo_anterior, cantidad, usuario, motivo, valoracion, valor_anterior):
+    """
+    UPDATE condicionado a lo leído (cantidad, costo promedio y sin
+    fracciones), movimiento y valor de la categoría en una sola
+    transacción: quedan los tres o ninguno, aunque la petición se cancele o
+    el worker muera a mitad de camino. Devuelve False si otro cajero cambió
+    el stock, alguien revaloró el producto o lo fraccionó entre medio.
+    """
+    ahora = timezone.now()
+    nueva = anterior - cantidad
+    with escritura():
+        # El estado lo recalcula la base (columna generada)
+        actualizados = Producto.objects.filter(
+            pk=producto.pk, cantidad=anterior, costo_promedio=costo_anterior, fracciones=0,
+        ).update(
+            cantidad=nueva,
+            costo_promedio=producto.costo_promedio,
+            valor_stock=producto.valor_stock,
+            ultima_salida=ahora,
+            ultima_actualizacion=ahora,
+        )
+        if not actualizados:
+            return False
+        Movimiento.objects.create(
+            producto=producto,
+            tipo='SALIDA',
+            cantidad=cantidad,
+            usuario=usuario,
+            cantidad_anterior=anterior,
+            cantidad_nueva=nueva,
+            motivo=motivo,
+            **valoracion,
+        )
+        # update() no pasa por save(): el valor de la categoría se traslada a mano
+        trasladar(
+            (producto.categoria_id, valor_anterior),
+            (producto.categoria_id, producto.valor_stock),
+        )
+    return True
+
+
+@login_requerido
+async def escaner_buscar_view(request):
+    """
+    Versión async de buscar_producto_ajax: con workers ASGI la consulta no
+    ocupa un worker mientras espera a la base de datos
+    """
+    codigo = request.GET.get('codigo', '')
+    
+    try:
+        producto = await Producto.objects.select_related('categoria').aget(
+            Q(codigo=codigo) | Q(codigo_barras=codigo),
+            activo=True
+        )
+    except Producto.DoesNotExist:
+        return JsonResponse({'encontrado': False, 'mensaje': 'Producto no encontrado'})
+    
+    return JsonResponse({'encontrado': True, 'producto': datos_escaner(producto)})
+
+
+@login_requerido
+@require_POST
+@idempotente
+async def escaner_descontar_view(request):
+    """
+    Descuenta stock desde el escáner (async, responde JSON)
+    
+    El descuento es un UPDATE condicionado a la cantidad leída: si otro
+    cajero descontó el mismo producto entre medio no actualiza ninguna
+    fila y se vuelve a intentar, sin bloquear el producto mientras se
+    calcula. El UPDATE y su movimiento van en una misma transacción
+    (_aplicar_descuento). Los productos fraccionados descuentan de una de
+    sus fracciones (inventario/fracciones.py).
+    """
+    if not request.user.puede_gestionar_inventario():
+        return JsonResponse(
+            {'ok': False, 'mensaje': '❌ No tienes permisos para descontar productos.'}, status=403
+        )
+    
+    form = DescontarProductoForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'ok': False, 'errores': form.errors}, status=400)
+    codigo = form.cleaned_data['codigo']
+    cantidad = form.cleaned_data['cantidad']
+    motivo = form.cleaned_data['motivo']
+    
+    for _ in range(INTENTOS_DESCUENTO):
+        producto = await Producto.objects.select_related('categoria').filter(
+            Q(codigo=codigo) | Q(codigo_barras=codigo),
+            activo=True
+        ).afirst()
+        if producto is None:
+            return JsonResponse(
+                {'ok': False, 'mensaje': f'❌ No se encontró un producto con el código: {codigo}'}, status=404
+            )
+        if producto.fracciones:
+            break
+        if cantidad > producto.cantidad:
+            return JsonResponse(
+                {'ok': False, 'mensaje': f'❌ No hay suficiente stock. Disponible: {producto.cantidad}'}, status=409
+            )
+        
+        anterior = producto.cantidad
+        costo_anterior = producto.costo_promedio
+        nueva = anterior - cantidad
+        valor_anterior = producto.valor_stock
+        valoracion = producto.valorar(nueva)
+        if await sync_to_async(_aplicar_descuento)(
+            producto, anterior, costo_anterior, cantidad, request.user, motivo, valoracion, valor_anterior
+        ):
+            break
+    else:
+        return JsonResponse(
+            {'ok': False, 'mensaje': '❌ El stock cambió mientras se descontaba. Intenta de nuevo.'}, status=409
+        )
+    
+    if producto.fracciones:
+        try:
+            nueva = await sync_to_async(descontar_fraccion)(producto, cantidad, request.user, motivo)
+        except ValueError as e:
+            return JsonResponse({'ok': False, 'mensaje': f'❌ {e}'}, status=409)
+        producto.cantidad = nueva
+        producto.estado = producto.estado_para(nueva)
+    else:
+        producto.estado = producto.estado_para(nueva)
+        # update() no envía señales: caché y navegadores se actualizan a mano
+        # (publicar, no emitir: si el evento falla, el descuento ya hecho responde bien)
+        await cache_sisbar.ainvalidar('inventario')
+        await sync_to_async(eventos.publicar)('stock', producto.datos_evento())
+    
+    await sync_to_async(registrar_actividad)(
+        request.user,
+        'DESCONTAR',
+        f'Descontó {cantidad} unidades de {producto.nombre}',
+        request
+    )
+    
+    # Solo puede haber alertas nuevas si el producto dejó de estar disponible
+    if producto.estado != 'DISPONIBLE':
+        await sync_to_async(AlertaInventario.generar_alertas)()
+    
+    return JsonResponse({
+        'ok': True,
+        'mensaje': f'✅ Se descontaron {cantidad} unidades de {producto.nombre}. Stock actual: {nueva}',
+        'producto': datos_escaner(producto),
+    })
+
+
+# ========== SINCRONIZACIÓN DEL ESCÁNER ==========
+@login_required
+@require_POST
+def escaner_sincronizar_view(request):
+    """
+    Recibe la cola de movimientos que el escáner guardó sin conexión
+    
+    Cuerpo JSON: {"movimientos": [{"id": "<uuid>", "codigo": "...",
+    "cantidad": 2, "tipo": "SALIDA", "motivo": "...", "fecha": "<ISO>"}]}
+    Responde un resultado por ítem (ver inventario/sincronizacion.py).
+    """
+    if not request.user.puede_gestionar_inventario():
+        return JsonResponse(
+            {'ok': False, 'mensaje': '❌ No tienes permisos para descontar productos.'}, status=403
+        )
+    
+    try:
+        movimientos = json.loads(request.body)['movimientos']
+    except (ValueError, KeyError, TypeError):
+        movimientos = None
+    if not isinstance(movimientos, list):
+        return JsonResponse({'ok': False, 'mensaje': '❌ Se esperaba {"movimientos": [...]}'}, status=400)
+    if len(movimientos) > MAXIMO_LOTE:
+        return JsonResponse(
+            {'ok': False, 'mensaje': f'❌ Máximo {MAXIMO_LOTE} movimientos por envío'}, status=400
+        )
+    
+    resumen = aplicar_lote(movimientos, request.user)
+    
+    if resumen['aplicados']:
+        registrar_actividad(
+            request.user,
+            'DESCONTAR',
+            f'Sincronizó {resumen["aplicados"]} movimientos del escáner',
+            request
+        )
+    
+    return JsonResponse({'ok': True, **resumen})
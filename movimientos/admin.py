@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from .models import Movimiento, AlertaInventario
+from sisbar_config.cache import invalidar
 
 @admin.register(Movimiento)
 class MovimientoAdmin(admin.ModelAdmin):
@@ -143,11 +144,13 @@ class AlertaInventarioAdmin(admin.ModelAdmin):
             leida=True,
             fecha_lectura=timezone.now()
         )
+        invalidar('movimientos')
         self.message_user(request, f'{count} alerta(s) marcada(s) como leída(s).')
     marcar_leidas.short_description = "👁️ Marcar como leídas"
     
     def marcar_resueltas(self, request, queryset):
         count = queryset.update(resuelta=True)
+        invalidar('movimientos')
         self.message_user(request, f'{count} alerta(s) marcada(s) como resuelta(s).')
     marcar_resueltas.short_description = "✅ Marcar como resueltas"
     
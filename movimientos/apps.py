@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class MovimientosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'movimientos'
+
+    def ready(self):
+        import movimientos.signals
+        from sisbar_config.cache import invalidar_al_cambiar
+        from .models import Movimiento, AlertaInventario
+
+        # Se borran en cascada con su producto, que invalida 'inventario'
+        invalidar_al_cambiar(Movimiento, 'movimientos', al_eliminar=False)
+        invalidar_al_cambiar(AlertaInventario, 'movimientos', al_eliminar=False)
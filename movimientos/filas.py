@@ -0,0 +1,48 @@
+"""
+Filas livianas de las listas de movimientos y alertas (ver sisbar_config/filas.py)
+
+Solo las columnas que muestran movimientos/listar.html y
+movimientos/alertas.html, con los mismos nombres que en los modelos.
+"""
+
+from inventario.filas import EstadoFila
+from sisbar_config.filas import Fila
+from .models import ICONOS_TIPO, AlertaInventario, Movimiento
+
+
+ETIQUETAS_TIPO = dict(Movimiento.TIPOS)
+ETIQUETAS_TIPO_ALERTA = dict(AlertaInventario.TIPOS_ALERTA)
+
+
+class ProductoMovimientoFila(Fila):
+    __slots__ = ('id', 'codigo', 'nombre')
+    columnas = ('id', 'codigo', 'nombre')
+
+
+class UsuarioFila(Fila):
+    __slots__ = ('id', 'username')
+    columnas = ('id', 'username')
+
+
+class MovimientoFila(Fila):
+    __slots__ = (
+        'id', 'fecha', 'tipo', 'cantidad', 'cantidad_anterior', 'cantidad_nueva', 'motivo',
+        'producto', 'usuario',
+    )
+    columnas = ('id', 'fecha', 'tipo', 'cantidad', 'cantidad_anterior', 'cantidad_nueva', 'motivo')
+    relaciones = {'producto': ProductoMovimientoFila, 'usuario': UsuarioFila}
+
+    def get_tipo_display(self):
+        return ETIQUETAS_TIPO.get(self.tipo, self.tipo)
+
+    def get_tipo_icono(self):
+        return ICONOS_TIPO.get(self.tipo, '📦')
+
+
+class AlertaFila(Fila):
+    __slots__ = ('id', 'tipo', 'mensaje', 'fecha_generada', 'producto')
+    columnas = ('id', 'tipo', 'mensaje', 'fecha_generada')
+    relaciones = {'producto': EstadoFila}
+
+    def get_tipo_display(self):
+        return ETIQUETAS_TIPO_ALERTA.get(self.tipo, self.tipo)
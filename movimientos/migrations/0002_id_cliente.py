@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 00:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movimientos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimiento',
+            name='id_cliente',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True, verbose_name='ID del Escáner'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0 on 2026-10-19 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movimientos', '0002_id_cliente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimiento',
+            name='costo_unitario',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=12, null=True, verbose_name='Costo Unitario'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='valor',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='Valor del Movimiento'),
+        ),
+        migrations.AddField(
+            model_name='movimiento',
+            name='valor_stock',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='Valor del Stock Después'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0 on 2026-10-19 00:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_fracciones'),
+        ('movimientos', '0003_valoracion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movimiento',
+            name='consolidado',
+            field=models.BooleanField(default=True, verbose_name='Consolidado'),
+        ),
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(condition=models.Q(('consolidado', False)), fields=['producto'], name='movimiento_pendiente_idx'),
+        ),
+    ]
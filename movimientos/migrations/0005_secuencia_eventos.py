@@ -0,0 +1,33 @@
+# Generated by Django 5.0 on 2026-10-19 02:20
+
+import time
+
+from django.db import migrations, models
+
+
+def crear_fila(apps, schema_editor):
+    # Empieza en el reloj (ms), por encima de los números que daba la caché
+    SecuenciaEventos = apps.get_model('movimientos', 'SecuenciaEventos')
+    SecuenciaEventos.objects.create(pk=1, numero=time.time_ns() // 1_000_000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movimientos', '0004_fracciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaEventos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.BigIntegerField(default=0, verbose_name='Último Evento')),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Eventos',
+                'verbose_name_plural': 'Secuencia de Eventos',
+            },
+        ),
+        migrations.RunPython(crear_fila, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-19 02:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movimientos', '0005_secuencia_eventos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoVivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(max_length=20, verbose_name='Tipo')),
+                ('datos', models.JSONField(verbose_name='Datos')),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Fecha')),
+            ],
+            options={
+                'verbose_name': 'Evento en Vivo',
+                'verbose_name_plural': 'Eventos en Vivo',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.DeleteModel(
+            name='SecuenciaEventos',
+        ),
+    ]
@@ -2,6 +2,19 @@ from django.db import models
 from django.core.validators import MinValueValidator
 from inventario.models import Producto
 from usuarios.models import Usuario
+from django.urls import reverse
+from django.utils import timezone
+from sisbar_config import eventos
+from sisbar_config.cache import invalidar
+
+# Icono de cada tipo de movimiento (también lo usa movimientos/filas.py)
+ICONOS_TIPO = {
+    'ENTRADA': '📥',
+    'SALIDA': '📤',
+    'AJUSTE': '⚖️',
+    'DEVOLUCION': '↩️'
+}
+
 
 class Movimiento(models.Model):
     """
@@ -43,6 +56,32 @@ class Movimiento(models.Model):
         verbose_name='Cantidad Nueva'
     )
     
+    # Valoración (ver inventario/valoracion.py); vacíos en movimientos
+    # anteriores a la valoración con costo promedio
+    costo_unitario = models.DecimalField(
+        max_digits=12,
+        decimal_places=4,
+        null=True,
+        blank=True,
+        verbose_name='Costo Unitario'
+    )
+    
+    valor = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='Valor del Movimiento'
+    )
+    
+    valor_stock = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='Valor del Stock Después'
+    )
+    
     motivo = models.CharField(
         max_length=200,
         blank=True,
@@ -68,6 +107,23 @@ class Movimiento(models.Model):
         verbose_name='Fecha y Hora'
     )
     
+    # UUID que genera el escáner al registrar el movimiento sin conexión:
+    # reenviar el mismo lote nunca lo duplica (ver inventario/sincronizacion.py)
+    id_cliente = models.UUIDField(
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        verbose_name='ID del Escáner'
+    )
+    
+    # Descuentos de productos fraccionados: cantidad_anterior/nueva son una
+    # estimación hasta que la consolidación los encadena (inventario/fracciones.py)
+    consolidado = models.BooleanField(
+        default=True,
+        verbose_name='Consolidado'
+    )
+    
     class Meta:
         verbose_name = 'Movimiento'
         verbose_name_plural = 'Movimientos'
@@ -75,6 +131,12 @@ class Movimiento(models.Model):
         indexes = [
             models.Index(fields=['-fecha']),
             models.Index(fields=['producto', '-fecha']),
+            # Descuentos que esperan la consolidación
+            models.Index(
+                fields=['producto'],
+                name='movimiento_pendiente_idx',
+                condition=models.Q(consolidado=False),
+            ),
         ]
     
     def __str__(self):
@@ -82,13 +144,28 @@ class Movimiento(models.Model):
     
     def get_tipo_icono(self):
         """Retorna el icono según el tipo"""
-        iconos = {
-            'ENTRADA': '📥',
-            'SALIDA': '📤',
-            'AJUSTE': '⚖️',
-            'DEVOLUCION': '↩️'
+        return ICONOS_TIPO.get(self.tipo, '📦')
+    
+    def datos_evento(self):
+        """
+        Datos del evento 'movimiento' en vivo. Solo usa producto y usuario
+        si ya están cargados: emitir el evento no agrega consultas.
+        """
+        producto = self.producto if Movimiento.producto.is_cached(self) else None
+        usuario = self.usuario if Movimiento.usuario.is_cached(self) else None
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'tipo_display': self.get_tipo_display(),
+            'icono': self.get_tipo_icono(),
+            'cantidad': self.cantidad,
+            'cantidad_nueva': self.cantidad_nueva,
+            'producto_id': self.producto_id,
+            'producto': producto.nombre if producto else '',
+            'codigo': producto.codigo if producto else '',
+            'usuario': usuario.username if usuario else '',
+            'fecha': timezone.localtime(self.fecha).strftime('%d/%m/%Y %H:%M'),
         }
-        return iconos.get(self.tipo, '📦')
 
 
 class AlertaInventario(models.Model):
@@ -148,51 +225,85 @@ class AlertaInventario(models.Model):
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.producto.nombre}"
     
+    def get_color(self):
+        """Color de la alerta según su tipo"""
+        colores = {
+            'AGOTADO': 'danger',
+            'POR_AGOTAR': 'warning',
+        }
+        return colores.get(self.tipo, 'info')
+    
+    def datos_evento(self, nombre_producto=None):
+        """Datos del evento 'alerta' en vivo (nombre del producto si ya se conoce)"""
+        if nombre_producto is None and AlertaInventario.producto.is_cached(self):
+            nombre_producto = self.producto.nombre
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'tipo_display': self.get_tipo_display(),
+            'color': self.get_color(),
+            'mensaje': self.mensaje,
+            'producto_id': self.producto_id,
+            'producto': nombre_producto or '',
+            'url': reverse('inventario:ver_producto', args=[self.producto_id]),
+            'fecha': timezone.localtime(self.fecha_generada).strftime('%d/%m/%Y %H:%M'),
+        }
+    
     @staticmethod
     def generar_alertas():
         """
-        Genera alertas automáticas para productos agotados o por agotarse
+        Genera alertas automáticas para productos agotados o por agotarse.
+        Trabaja por conjuntos: el número de consultas no depende de cuántos
+        productos haya en inventario.
         """
-        from django.utils import timezone
-        
-        # Productos agotados
-        productos_agotados = Producto.objects.filter(
-            cantidad=0,
-            activo=True
+        criterios = (
+            ('AGOTADO', models.Q(cantidad=0),
+             'El producto {nombre} se ha agotado completamente.'),
+            ('POR_AGOTAR', models.Q(cantidad__lte=models.F('cantidad_minima'), cantidad__gt=0),
+             'El producto {nombre} está por agotarse. Stock actual: {cantidad}'),
         )
         
-        for producto in productos_agotados:
-            # Verificar si ya existe una alerta no resuelta
-            existe = AlertaInventario.objects.filter(
-                producto=producto,
-                tipo='AGOTADO',
+        creadas = 0
+        for tipo, filtro, mensaje in criterios:
+            # Productos sin una alerta no resuelta del mismo tipo
+            alerta_abierta = AlertaInventario.objects.filter(
+                producto=models.OuterRef('pk'),
+                tipo=tipo,
                 resuelta=False
-            ).exists()
+            )
+            productos = Producto.objects.filter(filtro, activo=True).exclude(
+                models.Exists(alerta_abierta)
+            ).values_list('id', 'nombre', 'cantidad')
             
-            if not existe:
-                AlertaInventario.objects.create(
-                    producto=producto,
-                    tipo='AGOTADO',
-                    mensaje=f"El producto {producto.nombre} se ha agotado completamente."
+            productos = list(productos)
+            alertas = AlertaInventario.objects.bulk_create([
+                AlertaInventario(
+                    producto_id=producto_id,
+                    tipo=tipo,
+                    mensaje=mensaje.format(nombre=nombre, cantidad=cantidad)
                 )
+                for producto_id, nombre, cantidad in productos
+            ])
+            creadas += len(alertas)
+            for alerta, (_, nombre, _) in zip(alertas, productos):
+                eventos.publicar('alerta', alerta.datos_evento(nombre))
         
-        # Productos por agotarse
-        productos_por_agotar = Producto.objects.filter(
-            cantidad__lte=models.F('cantidad_minima'),
-            cantidad__gt=0,
-            activo=True
-        )
-        
-        for producto in productos_por_agotar:
-            existe = AlertaInventario.objects.filter(
-                producto=producto,
-                tipo='POR_AGOTAR',
-                resuelta=False
-            ).exists()
-            
-            if not existe:
-                AlertaInventario.objects.create(
-                    producto=producto,
-                    tipo='POR_AGOTAR',
-                    mensaje=f"El producto {producto.nombre} está por agotarse. Stock actual: {producto.cantidad}"
-                )
\ No newline at end of file
+        # bulk_create no envía señales: invalidar la caché a mano
+        if creadas:
+            invalidar('movimientos')
+
+
+class EventoVivo(models.Model):
+    """
+    Diario de los eventos en vivo (sisbar_config/eventos.py). El id
+    autoincremental es el número del evento: cada uno se inserta en su
+    propia fila, sin bloquear un contador compartido con los demás escaneos.
+    """
+    tipo = models.CharField(max_length=20, verbose_name='Tipo')
+    datos = models.JSONField(verbose_name='Datos')
+    fecha = models.DateTimeField(default=timezone.now, db_index=True, verbose_name='Fecha')
+    
+    class Meta:
+        verbose_name = 'Evento en Vivo'
+        verbose_name_plural = 'Eventos en Vivo'
+        ordering = ['id']
@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from inventario.models import Producto
+from sisbar_config import eventos
+from .models import Movimiento, AlertaInventario
+
+
+# ========== EVENTOS EN VIVO (SSE) ==========
+# Campos de Producto que cambian lo que muestran el dashboard y las alertas
+CAMPOS_STOCK = {'cantidad', 'cantidad_minima', 'estado', 'activo'}
+
+
+@receiver(post_save, sender=Producto)
+def publicar_stock(sender, instance, update_fields=None, **kwargs):
+    # Guardados parciales que no tocan el stock (versiones de imagen, etc.)
+    if update_fields and not CAMPOS_STOCK & set(update_fields):
+        return
+    eventos.publicar('stock', instance.datos_evento())
+
+
+@receiver(post_save, sender=Movimiento)
+def publicar_movimiento(sender, instance, created, **kwargs):
+    if created:
+        eventos.publicar('movimiento', instance.datos_evento())
+
+
+@receiver(post_save, sender=AlertaInventario)
+def publicar_alerta(sender, instance, created, **kwargs):
+    if created:
+        eventos.publicar('alerta', instance.datos_evento())
@@ -1,3 +1,202 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.urls import reverse
 
-# Create your tests here.
+from sisbar_config.pruebas import FuncionalTestCase, MINIMO, RendimientoTestCase
+from inventario.models import Producto
+from .filas import AlertaFila, MovimientoFila
+from .models import AlertaInventario, Movimiento
+
+
+class MovimientosRendimientoTests(RendimientoTestCase):
+    """Presupuesto de consultas y tiempos de movimientos y alertas"""
+
+    def test_listar_movimientos(self):
+        self.medir_vista('listar_movimientos', reverse('movimientos:listar') + '?dias=7', 1)
+
+    def test_listar_alertas(self):
+        self.medir_vista('listar_alertas', reverse('movimientos:alertas'), 2)
+
+    def test_eventos(self):
+        # Sin ASGI: los eventos pendientes en una respuesta y reconexión
+        self.medir_vista('eventos', reverse('movimientos:eventos'), 2)
+
+
+class GenerarAlertasTests(FuncionalTestCase):
+    """generar_alertas trabaja por conjuntos y no duplica alertas abiertas"""
+
+    datos = MINIMO
+
+    def test_consultas_constantes_y_sin_duplicados(self):
+        Producto.objects.filter(activo=True).update(cantidad=0)
+        with self.assertNumQueries(3):
+            AlertaInventario.generar_alertas()
+        abiertas = AlertaInventario.objects.filter(resuelta=False, tipo='AGOTADO').count()
+        self.assertEqual(abiertas, Producto.objects.filter(activo=True).count())
+
+        with self.assertNumQueries(2):
+            AlertaInventario.generar_alertas()
+        self.assertEqual(AlertaInventario.objects.filter(resuelta=False, tipo='AGOTADO').count(), abiertas)
+
+
+class EventosEnVivoTests(FuncionalTestCase):
+    """Stock, movimientos y alertas se publican como Server-Sent Events"""
+
+    datos = MINIMO
+
+    def setUp(self):
+        super().setUp()
+        self.producto = Producto.objects.filter(activo=True).order_by('id').first()
+        self.url = reverse('movimientos:eventos')
+
+    def eventos_tras(self, funcion):
+        """Tipos de los eventos publicados al ejecutar `funcion` y confirmar"""
+        from sisbar_config import eventos
+        desde = eventos.ultimo()
+        with self.captureOnCommitCallbacks(execute=True):
+            funcion()
+        respuesta = self.client.get(self.url, {'desde': desde})
+        return [linea[7:] for linea in respuesta.content.decode().splitlines() if linea.startswith('event: ')]
+
+    def test_descontar_publica_stock_y_movimiento(self):
+        tipos = self.eventos_tras(lambda: self.producto.descontar_cantidad(1, self.admin))
+        self.assertEqual(tipos, ['stock', 'movimiento'])
+
+    def test_guardado_sin_stock_no_publica(self):
+        tipos = self.eventos_tras(lambda: self.producto.save(update_fields=['imagen_versiones']))
+        self.assertEqual(tipos, [])
+
+    def test_generar_alertas_publica(self):
+        Producto.objects.filter(pk=self.producto.pk).update(cantidad=0)
+        AlertaInventario.objects.filter(producto=self.producto).delete()
+        tipos = self.eventos_tras(AlertaInventario.generar_alertas)
+        self.assertIn('alerta', tipos)
+
+    def test_sondeo_wsgi(self):
+        import json
+        from sisbar_config import eventos
+        desde = eventos.ultimo()
+        numero = eventos.emitir('alerta', {'producto': 'Ron añejo'})
+
+        respuesta = self.client.get(self.url, {'desde': desde})
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        self.assertEqual(respuesta['Cache-Control'], 'no-cache')
+        cuerpo = respuesta.content.decode()
+        self.assertIn(f'id: {numero}\nevent: alerta\n', cuerpo)
+        datos = next(l for l in cuerpo.splitlines() if l.startswith('data: '))
+        self.assertEqual(json.loads(datos[6:]), {'producto': 'Ron añejo'})
+        self.assertTrue(cuerpo.startswith('retry: '))
+
+        # Last-Event-ID manda sobre ?desde=: nada nuevo, solo la marca
+        respuesta = self.client.get(self.url, {'desde': desde}, HTTP_LAST_EVENT_ID=str(numero))
+        self.assertNotIn('event:', respuesta.content.decode())
+        self.assertIn(f'id: {numero}', respuesta.content.decode())
+
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_numeros_de_la_base(self):
+        from sisbar_config import eventos
+        from .models import EventoVivo
+        primero = eventos.emitir('stock', {'id': 1})
+        segundo = eventos.emitir('stock', {'id': 2})
+        self.assertEqual(segundo, primero + 1)
+        self.assertEqual(EventoVivo.objects.latest('id').datos, {'id': 2})
+        self.assertEqual(eventos.ultimo(), segundo)
+
+    def test_sin_oyentes_no_guarda_eventos(self):
+        from django.core.cache import cache
+        from sisbar_config import eventos
+        from .models import EventoVivo
+        cache.delete(eventos.CLAVE_OYENTES)
+        eventos._oyentes.update(hasta=0.0, marcada=0.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.descontar_cantidad(1, self.admin)
+        self.assertFalse(EventoVivo.objects.exists())
+
+    def test_evento_fallido_no_tira_el_descuento(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from sisbar_config import eventos
+        eventos.ultimo()
+        anterior = self.producto.cantidad
+        with mock.patch.object(eventos, 'emitir', side_effect=OperationalError('database is locked')):
+            with self.assertLogs('django', 'ERROR'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.producto.descontar_cantidad(1, self.admin)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.cantidad, anterior - 1)
+
+    def test_espera_los_numeros_que_faltan(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from sisbar_config import eventos
+        from .models import EventoVivo
+        desde = eventos.emitir('stock', {'id': 1})
+        # desde + 1 todavía no confirmó (otra transacción); desde + 2 sí
+        siguiente = EventoVivo.objects.create(id=desde + 2, tipo='stock', datos={'id': 3})
+
+        self.assertEqual(async_to_sync(eventos.aleer)(desde), ([], desde))
+        # Pasada la espera, el número que falta es un id que no se usó
+        EventoVivo.objects.filter(pk=siguiente.pk).update(
+            fecha=timezone.now() - timedelta(seconds=eventos.ESPERA + 1)
+        )
+        nuevos, leido = async_to_sync(eventos.aleer)(desde)
+        self.assertEqual(([e['id'] for e in nuevos], leido), ([desde + 2], desde + 2))
+
+    def test_last_event_id_de_otro_diario(self):
+        from sisbar_config import eventos
+        numero = eventos.emitir('stock', {'id': 1})
+        # Números del contador anterior (milisegundos): se vuelve al último
+        self.assertEqual(async_to_sync(eventos.aleer)(1_760_000_000_000), ([], numero))
+
+    async def test_flujo_asgi_despierta_al_publicar(self):
+        import asyncio
+        from sisbar_config import eventos
+
+        with self.settings(EVENTOS_INTERVALO=30, EVENTOS_DURACION=60):
+            flujo = eventos.flujo(await sync_to_async(eventos.ultimo)())
+            self.assertTrue((await flujo.__anext__()).startswith('retry: '))
+            siguiente = asyncio.ensure_future(flujo.__anext__())
+            await asyncio.sleep(0.05)
+            # Emitido desde el hilo de las vistas síncronas (el que tiene la conexión de la prueba)
+            await sync_to_async(eventos.emitir)('stock', {'id': 1})
+            fragmento = await asyncio.wait_for(siguiente, timeout=5)
+            self.assertIn('event: stock', fragmento)
+            await flujo.aclose()
+        self.assertEqual(eventos._suscriptores, set())
+
+    async def test_flujo_por_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        with self.settings(EVENTOS_DURACION=0.2, EVENTOS_INTERVALO=0.05):
+            respuesta = await self.async_client.get(self.url)
+            self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+            cuerpo = ''.join([
+                parte.decode() async for parte in respuesta.streaming_content
+            ])
+        self.assertTrue(cuerpo.startswith('retry: 1000'))
+
+
+class FilasMovimientosTests(FuncionalTestCase):
+    """Las listas de movimientos y alertas usan filas livianas con los datos del modelo"""
+
+    datos = MINIMO
+
+    def test_movimientos(self):
+        consulta = Movimiento.objects.order_by('-fecha', 'id')[:50]
+        for fila, movimiento in zip(MovimientoFila.listar(consulta), consulta.select_related('producto', 'usuario')):
+            self.assertEqual((fila.id, fila.fecha, fila.cantidad_nueva), (movimiento.id, movimiento.fecha, movimiento.cantidad_nueva))
+            self.assertEqual(fila.get_tipo_display(), movimiento.get_tipo_display())
+            self.assertEqual(fila.get_tipo_icono(), movimiento.get_tipo_icono())
+            self.assertEqual(fila.producto.codigo, movimiento.producto.codigo)
+            self.assertEqual(fila.usuario and fila.usuario.username, movimiento.usuario and movimiento.usuario.username)
+
+    def test_alertas(self):
+        Producto.objects.filter(activo=True).update(cantidad=0)
+        AlertaInventario.generar_alertas()
+        consulta = AlertaInventario.objects.filter(resuelta=False).order_by('id')
+        filas = AlertaFila.listar(consulta)
+        self.assertTrue(filas)
+        for fila, alerta in zip(filas, consulta.select_related('producto')):
+            self.assertEqual(fila.get_tipo_display(), alerta.get_tipo_display())
+            self.assertEqual(fila.producto.get_estado_color(), alerta.producto.get_estado_color())
+        self.assertContains(self.client.get(reverse('movimientos:alertas')), filas[0].mensaje)
@@ -6,4 +6,5 @@ app_name = 'movimientos'
 urlpatterns = [
     path('', views.listar_movimientos_view, name='listar'),
     path('alertas/', views.listar_alertas_view, name='alertas'),
+    path('eventos/', views.eventos_view, name='eventos'),
 ]
\ No newline at end of file
@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
+from django.http import HttpResponse, StreamingHttpResponse
+from sisbar_config import eventos
+from sisbar_config.asincrono import es_asgi, login_requerido
+from .filas import AlertaFila, MovimientoFila
 from .models import Movimiento, AlertaInventario
 from datetime import timedelta
 from django.utils import timezone
@@ -12,9 +17,10 @@ def listar_movimientos_view(request):
     dias = int(request.GET.get('dias', 7))
     fecha_desde = timezone.now() - timedelta(days=dias)
     
-    movimientos = Movimiento.objects.filter(
+    # Solo las columnas de la tabla, en filas livianas (movimientos/filas.py)
+    movimientos = MovimientoFila.listar(Movimiento.objects.filter(
         fecha__gte=fecha_desde
-    ).select_related('producto', 'usuario').order_by('-fecha')
+    ).order_by('-fecha'))
     
     context = {
         'movimientos': movimientos,
@@ -26,11 +32,43 @@ def listar_movimientos_view(request):
 @login_required
 def listar_alertas_view(request):
     """Lista todas las alertas"""
-    alertas = AlertaInventario.objects.filter(
+    alertas = AlertaFila.listar(AlertaInventario.objects.filter(
         resuelta=False
-    ).select_related('producto').order_by('-fecha_generada')
+    ).order_by('-fecha_generada'))
     
     context = {
         'alertas': alertas,
+        # Las alertas nuevas llegan por eventos_view desde este punto
+        'eventos_desde': eventos.ultimo(),
     }
-    return render(request, 'movimientos/alertas.html', context)
\ No newline at end of file
+    return render(request, 'movimientos/alertas.html', context)
+
+
+@login_requerido
+async def eventos_view(request):
+    """
+    Stock, movimientos y alertas en vivo (Server-Sent Events)
+    
+    Con ASGI el flujo queda abierto y los eventos llegan al instante. Con
+    WSGI cada conexión ocuparía un worker, así que se entregan los eventos
+    pendientes y el navegador vuelve a conectarse a los pocos segundos
+    (EVENTOS_SONDEO_MS): sin recargar ni renderizar páginas completas.
+    """
+    # Al reconectarse el navegador envía Last-Event-ID; la primera vez, ?desde=
+    try:
+        desde = int(request.headers.get('Last-Event-ID') or request.GET.get('desde') or 0)
+    except ValueError:
+        desde = 0
+    
+    if es_asgi(request):
+        respuesta = StreamingHttpResponse(eventos.flujo(desde), content_type='text/event-stream')
+    else:
+        await eventos.aescuchar()
+        nuevos, hasta = await eventos.aleer(desde)
+        respuesta = HttpResponse(
+            eventos.lote(nuevos, hasta, settings.EVENTOS_SONDEO_MS), content_type='text/event-stream'
+        )
+    respuesta['Cache-Control'] = 'no-cache'
+    # nginx no debe acumular el flujo
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
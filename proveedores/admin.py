@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Proveedor
+from sisbar_config.cache import invalidar
 
 @admin.register(Proveedor)
 class ProveedorAdmin(admin.ModelAdmin):
@@ -38,10 +39,12 @@ class ProveedorAdmin(admin.ModelAdmin):
     
     def activar_proveedores(self, request, queryset):
         count = queryset.update(activo=True)
+        invalidar('proveedores')
         self.message_user(request, f'{count} proveedor(es) activado(s).')
     activar_proveedores.short_description = "✅ Activar proveedores"
     
     def desactivar_proveedores(self, request, queryset):
         count = queryset.update(activo=False)
+        invalidar('proveedores')
         self.message_user(request, f'{count} proveedor(es) desactivado(s).')
     desactivar_proveedores.short_description = "🚫 Desactivar proveedores"
\ No newline at end of file
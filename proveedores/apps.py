@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ProveedoresConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'proveedores'
+
+    def ready(self):
+        from sisbar_config.cache import invalidar_al_cambiar
+        from .models import Proveedor
+
+        invalidar_al_cambiar(Proveedor, 'proveedores')
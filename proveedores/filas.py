@@ -0,0 +1,16 @@
+"""
+Filas livianas de la lista de proveedores (ver sisbar_config/filas.py)
+
+Solo las columnas que muestra proveedores/listar.html; num_productos es
+la anotación de listar_proveedores_view.
+"""
+
+from sisbar_config.filas import Fila
+
+
+class ProveedorFila(Fila):
+    __slots__ = ('id', 'nombre', 'contacto', 'telefono', 'email', 'calificacion', 'num_productos')
+    columnas = ('id', 'nombre', 'contacto', 'telefono', 'email', 'calificacion', 'num_productos')
+
+    def estrellas(self):
+        return '⭐' * self.calificacion
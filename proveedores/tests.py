@@ -1,3 +1,51 @@
-from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from sisbar_config.pruebas import RendimientoTestCase
+from .models import Proveedor
+
+
+class ProveedoresRendimientoTests(RendimientoTestCase):
+    """Presupuesto de consultas y tiempos de proveedores"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.proveedor = Proveedor.objects.order_by('id').first()
+
+    def datos_proveedor(self, nombre, nit=None):
+        return {'nombre': nombre, 'nit': nit or f'NIT-{nombre}', 'calificacion': 4, 'ciudad': 'Bogotá'}
+
+    def test_listar(self):
+        respuesta = self.medir_vista('listar', reverse('proveedores:listar'), 1)
+        # Filas livianas (proveedores/filas.py) con los mismos datos que el modelo
+        fila = next(f for f in respuesta.context['proveedores'] if f.id == self.proveedor.id)
+        self.assertEqual(fila.estrellas(), self.proveedor.estrellas())
+        self.assertEqual(fila.num_productos, self.proveedor.total_productos())
+
+    def test_crear_get(self):
+        self.medir_vista('crear_get', reverse('proveedores:crear'), 0)
+
+    def test_crear_post(self):
+        contador = iter(range(100))
+        self.medir_vista(
+            'crear_post', reverse('proveedores:crear'), 2, metodo='post',
+            datos=lambda: self.datos_proveedor(f'Proveedor {next(contador)}'),
+        )
+
+    def test_ver(self):
+        self.medir_vista('ver', reverse('proveedores:ver', args=[self.proveedor.id]), 3)
+
+    def test_editar_get(self):
+        self.medir_vista('editar_get', reverse('proveedores:editar', args=[self.proveedor.id]), 1)
+
+    def test_editar_post(self):
+        url = reverse('proveedores:editar', args=[self.proveedor.id])
+        datos = self.datos_proveedor(self.proveedor.nombre, self.proveedor.nit)
+        self.medir_vista('editar_post', url, 3, metodo='post', datos=datos)
+
+    def test_eliminar_get(self):
+        self.medir_vista('eliminar_get', reverse('proveedores:eliminar', args=[self.proveedor.id]), 2)
+
+    def test_eliminar_post(self):
+        url = reverse('proveedores:eliminar', args=[self.proveedor.id])
+        self.medir_vista('eliminar_post', url, 3, metodo='post')
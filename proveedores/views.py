@@ -1,14 +1,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Count, Q
+from .filas import ProveedorFila
 from .models import Proveedor
-from usuarios.views import registrar_actividad
+from usuarios.actividad import registrar_actividad
 
 
 @login_required
 def listar_proveedores_view(request):
     """Lista todos los proveedores"""
-    proveedores = Proveedor.objects.filter(activo=True).order_by('nombre')
+    proveedores = ProveedorFila.listar(Proveedor.objects.filter(activo=True).annotate(
+        num_productos=Count('productos', filter=Q(productos__activo=True))
+    ).order_by('nombre'))
     
     context = {
         'proveedores': proveedores,
@@ -66,7 +70,7 @@ def crear_proveedor_view(request):
 def ver_proveedor_view(request, proveedor_id):
     """Ver detalles del proveedor"""
     proveedor = get_object_or_404(Proveedor, id=proveedor_id)
-    productos = proveedor.productos.filter(activo=True)[:10]
+    productos = proveedor.productos.filter(activo=True).select_related('categoria')[:10]
     
     context = {
         'proveedor': proveedor,
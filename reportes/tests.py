@@ -1,3 +1,146 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from django.utils.connection import ConnectionDoesNotExist
+
+from inventario.models import Producto
+from sisbar_config import replicas
+from sisbar_config.pruebas import FuncionalTestCase, MINIMO, RendimientoTestCase
+from sisbar_config.replicas import ReplicaMiddleware, lectura_replica
+from usuarios.models import Usuario
+
+
+class ReportesRendimientoTests(RendimientoTestCase):
+    """Presupuesto de consultas y tiempos de reportes y exportaciones"""
+
+    def test_reportes_home(self):
+        self.medir_vista('reportes_home', reverse('reportes:home'), 5)
+
+    def test_exportar_productos_excel(self):
+        self.medir_vista('exportar_productos_excel', reverse('reportes:exportar_productos_excel'), 2)
+
+    def test_exportar_productos_pdf(self):
+        self.medir_vista('exportar_productos_pdf', reverse('reportes:exportar_productos_pdf'), 5)
+
+    def test_exportar_movimientos_excel(self):
+        url = reverse('reportes:exportar_movimientos_excel') + '?dias=30'
+        self.medir_vista('exportar_movimientos_excel', url, 2)
+
+
+class ReplicaTests(FuncionalTestCase):
+    """Lecturas de reportes, dashboard y auditores desde la réplica"""
+
+    datos = MINIMO
+
+    def con_replica(self):
+        # En las pruebas no hay réplica: se simula que está configurada
+        return mock.patch.object(replicas, 'configurada', return_value=True)
+
+    def alias(self, metodo, usuario, vista=None):
+        """Base de la que lee `vista` en una petición que pasa por el middleware"""
+        def leer(request):
+            return HttpResponse(replicas.alias_lectura() or 'default')
+        request = getattr(RequestFactory(), metodo)('/')
+        request.user = usuario
+        return ReplicaMiddleware(vista(leer) if vista else leer)(request).content.decode()
+
+    def test_sin_replica(self):
+        with replicas.en_replica():
+            self.assertIsNone(replicas.alias_lectura())
+            self.assertEqual(router.db_for_read(Producto), 'default')
+        self.assertEqual(self.alias('get', self.admin, lectura_replica), 'default')
+
+    def test_router(self):
+        with self.con_replica():
+            self.assertEqual(router.db_for_read(Producto), 'default')
+            with replicas.en_replica():
+                self.assertEqual(router.db_for_read(Producto), 'replica')
+                self.assertEqual(router.db_for_write(Producto), 'default')
+                self.assertEqual(router.db_for_read(Session), 'default')
+                with transaction.atomic():
+                    self.assertEqual(router.db_for_read(Producto), 'default')
+            self.assertEqual(router.db_for_read(Producto), 'default')
+
+    def test_auditores_y_vistas_designadas(self):
+        auditor = Usuario.objects.create_user(
+            'auditor_replica', 'replica@sisbar.test', 'clave-segura-123', rol='AUDITOR', aprobado=True,
+        )
+        with self.con_replica():
+            self.assertEqual(self.alias('get', auditor), 'replica')
+            self.assertEqual(self.alias('get', self.admin), 'default')
+            self.assertEqual(self.alias('get', self.admin, lectura_replica), 'replica')
+
+            # Después de escribir, cada uno lee lo propio desde la principal
+            self.assertEqual(self.alias('post', auditor), 'default')
+            self.assertEqual(self.alias('get', auditor), 'default')
+            self.assertEqual(self.alias('get', self.admin, lectura_replica), 'replica')
+
+    def test_leer_lo_propio(self):
+        producto = Producto.objects.filter(activo=True, cantidad__gte=1).order_by('id').first()
+        url = reverse('reportes:exportar_productos_excel')
+        self.client.force_login(self.admin)
+        with self.con_replica():
+            self.client.post(reverse('inventario:descontar_producto'), {
+                'codigo': producto.codigo, 'cantidad': 1, 'motivo': 'Venta',
+            })
+            self.assertTrue(replicas.escribio_hace_poco(self.admin.pk))
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+            # Sin la marca la exportación busca la réplica (que acá no existe)
+            cache.delete(f'replica:escritura:{self.admin.pk}')
+            with self.assertRaises(ConnectionDoesNotExist):
+                self.client.get(url)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'sisbar_cache_pruebas',
+    }})
+    def test_con_cache_en_base_de_datos(self):
+        # Las lecturas de la caché no pasan por la réplica (ni vuelven a
+        # pedir la marca de "leer lo propio" sin fin)
+        call_command('createcachetable', verbosity=0)
+        with self.con_replica():
+            self.assertEqual(self.alias('get', self.admin, lectura_replica), 'replica')
+            replicas.marcar_escritura(self.admin.pk)
+            self.assertEqual(self.alias('get', self.admin, lectura_replica), 'default')
+            with replicas.en_replica():
+                self.assertEqual(router.db_for_read(Producto), 'replica')
+
+    def test_cache_separada_para_la_replica(self):
+        from sisbar_config import cache as cache_sisbar
+        obtener = lambda valor: cache_sisbar.obtener('prueba:replica', lambda: valor, espacios=('inventario',))
+        with self.con_replica():
+            # Un auditor llena la caché desde la réplica atrasada...
+            with replicas.en_replica():
+                self.assertEqual(obtener('atrasado'), 'atrasado')
+            # ...y quien escribió, que lee de la principal, no recibe ese valor
+            replicas.marcar_escritura(self.admin.pk)
+            with replicas.en_replica(self.admin.pk):
+                self.assertEqual(obtener('al dia'), 'al dia')
+            with replicas.en_replica():
+                self.assertEqual(obtener('otro'), 'atrasado')
+
+    async def test_aobtener_con_replica(self):
+        from sisbar_config import cache as cache_sisbar
+
+        async def calcular(valor):
+            return valor
+
+        with self.con_replica():
+            with replicas.en_replica():
+                self.assertEqual(await cache_sisbar.aobtener('prueba:areplica', lambda: calcular(1)), 1)
+            self.assertEqual(await cache_sisbar.aobtener('prueba:areplica', lambda: calcular(2)), 2)
+
+    async def test_por_asgi(self):
+        await self.async_client.aforce_login(self.admin)
+        with self.con_replica():
+            await self.async_client.post(reverse('inventario:escaner_descontar'), {'codigo': 'NO-EXISTE', 'cantidad': 1})
+            self.assertTrue(await sync_to_async(replicas.escribio_hace_poco)(self.admin.pk))
+            respuesta = await self.async_client.get(reverse('dashboard:datos'))
+        self.assertEqual(respuesta.status_code, 200)
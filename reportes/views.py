@@ -3,25 +3,42 @@ from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse
 from django.utils import timezone
 from datetime import timedelta
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from inventario.models import Producto
+from inventario import valoracion
 from categorias.models import Categoria
 from movimientos.models import Movimiento
-from usuarios.views import registrar_actividad
+from usuarios.actividad import registrar_actividad
+from sisbar_config import cache as cache_sisbar
+from sisbar_config.replicas import lectura_replica
+
+# openpyxl (con numpy) y reportlab se importan dentro de cada exportación:
+# cargarlos al arrancar costaba unos 300 ms en cada worker nuevo, y se usan
+# solo cuando alguien exporta (ver `manage.py auditar_imports`)
 
 
 @login_required
+@lectura_replica
 def reportes_home_view(request):
     """
     Página principal de reportes
     """
+    context = estadisticas_reportes()
+    
+    return render(request, 'reportes/home.html', context)
+
+
+def estadisticas_reportes(refrescar=False):
+    """Estadísticas de la página de reportes, cacheadas por día"""
+    return cache_sisbar.obtener(
+        'reportes:home',
+        _calcular_estadisticas_reportes,
+        espacios=('inventario', 'movimientos', 'categorias'),
+        partes=(timezone.now().date().isoformat(),),
+        refrescar=refrescar,
+    )
+
+
+def _calcular_estadisticas_reportes():
     # Estadísticas para mostrar en la página
     total_productos = Producto.objects.filter(activo=True).count()
     categorias_count = Categoria.objects.filter(activa=True).count()
@@ -30,20 +47,25 @@ def reportes_home_view(request):
     hace_30_dias = timezone.now() - timedelta(days=30)
     movimientos_mes = Movimiento.objects.filter(fecha__gte=hace_30_dias).count()
     
-    context = {
+    return {
         'total_productos': total_productos,
         'categorias_count': categorias_count,
         'movimientos_mes': movimientos_mes,
+        # Total acumulado y valor histórico guardado en los movimientos
+        'valor_inventario': valoracion.valor_total(),
+        'valor_hace_30_dias': valoracion.valor_en(hace_30_dias),
     }
-    
-    return render(request, 'reportes/home.html', context)
 
 
 @login_required
+@lectura_replica
 def exportar_productos_excel(request):
     """
     Exportar lista de productos a Excel
     """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+    
     # Crear libro de trabajo
     wb = Workbook()
     ws = wb.active
@@ -60,14 +82,14 @@ def exportar_productos_excel(request):
     )
     
     # Título
-    ws.merge_cells('A1:I1')
+    ws.merge_cells('A1:K1')
     titulo = ws['A1']
     titulo.value = "REPORTE DE INVENTARIO - SISBAR "
     titulo.font = Font(bold=True, size=16, color="667EEA")
     titulo.alignment = Alignment(horizontal='center', vertical='center')
     
     # Fecha de generación
-    ws.merge_cells('A2:I2')
+    ws.merge_cells('A2:K2')
     fecha = ws['A2']
     fecha.value = f"Generado el: {timezone.now().strftime('%d/%m/%Y %H:%M')}"
     fecha.alignment = Alignment(horizontal='center')
@@ -77,7 +99,7 @@ def exportar_productos_excel(request):
     
     # Encabezados
     headers = ['Código', 'Nombre', 'Categoría', 'Subcategoría', 'Cantidad', 
-               'Unidad', 'Estado', 'Precio', 'Proveedor']
+               'Unidad', 'Estado', 'Precio', 'Proveedor', 'Costo Promedio', 'Valor en Stock']
     ws.append(headers)
     
     # Estilo de encabezados
@@ -102,16 +124,18 @@ def exportar_productos_excel(request):
             producto.get_unidad_medida_display(),
             producto.get_estado_display(),
             float(producto.precio_compra),
-            producto.proveedor.nombre if producto.proveedor else 'N/A'
+            producto.proveedor.nombre if producto.proveedor else 'N/A',
+            float(producto.costo_vigente()),
+            float(producto.valor_stock),
         ])
     
     # Aplicar bordes a todas las celdas de datos
-    for row in ws.iter_rows(min_row=5, max_row=ws.max_row, min_col=1, max_col=9):
+    for row in ws.iter_rows(min_row=5, max_row=ws.max_row, min_col=1, max_col=11):
         for cell in row:
             cell.border = border
             if cell.column == 5:  # Cantidad
                 cell.alignment = Alignment(horizontal='center')
-            if cell.column == 8:  # Precio
+            if cell.column in (8, 10, 11):  # Precio, costo promedio y valor
                 cell.number_format = '$#,##0.00'
     
     # Ajustar anchos de columna
@@ -124,6 +148,8 @@ def exportar_productos_excel(request):
     ws.column_dimensions['G'].width = 15
     ws.column_dimensions['H'].width = 15
     ws.column_dimensions['I'].width = 25
+    ws.column_dimensions['J'].width = 16
+    ws.column_dimensions['K'].width = 18
     
     # Registrar actividad
     registrar_actividad(
@@ -144,10 +170,17 @@ def exportar_productos_excel(request):
 
 
 @login_required
+@lectura_replica
 def exportar_productos_pdf(request):
     """
     Exportar lista de productos a PDF
     """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib import colors
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+    
     # Crear documento
     response = HttpResponse(content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename=inventario_{timezone.now().strftime("%Y%m%d_%H%M%S")}.pdf'
@@ -181,7 +214,7 @@ def exportar_productos_pdf(request):
     # Datos de la tabla
     data = [['Código', 'Nombre', 'Categoría', 'Cantidad', 'Estado', 'Precio', 'proveedor']]
     
-    productos = Producto.objects.filter(activo=True).select_related('categoria')
+    productos = Producto.objects.filter(activo=True).select_related('categoria', 'proveedor')
     
     for p in productos:
         data.append([
@@ -266,10 +299,14 @@ def exportar_productos_pdf(request):
 
 
 @login_required
+@lectura_replica
 def exportar_movimientos_excel(request):
     """
     Exportar movimientos a Excel
     """
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, Alignment, PatternFill
+    
     # Obtener rango de fechas
     dias = int(request.GET.get('dias', 30))
     fecha_desde = timezone.now() - timedelta(days=dias)
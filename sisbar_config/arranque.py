@@ -0,0 +1,293 @@
+"""
+Costo de arranque de un worker
+
+En el plan gratuito de Render el servicio se duerme sin tráfico y cada
+despertar arranca workers nuevos: todo lo que se importa al cargar las
+vistas se paga antes de responder la primera petición. `medir()` arranca un
+proceso nuevo con `python -X importtime` que hace lo mismo que un worker de
+gunicorn (carga sisbar_config.wsgi y atiende una petición) y devuelve:
+
+- cuánto tardó cada etapa (aplicación y primera petición),
+- el costo de importación por paquete (suma del tiempo propio de sus
+  módulos) y los módulos más caros (tiempo acumulado),
+- qué módulo del proyecto importó primero cada paquete (y por medio de
+  qué módulo), para saber qué import conviene diferir.
+
+Lo usa el comando `auditar_imports`.
+
+Para el arranque en producción (sisbar_config/servidor.py):
+`compilar_plantillas()` y `abrir_conexiones()` calientan un worker antes de
+su primera petición, y `medir_servidor()` arranca gunicorn de verdad y mide
+el tiempo hasta el primer byte (comando `medir_arranque`).
+"""
+
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+
+# Lo que hace un worker de gunicorn: cargar la aplicación WSGI y atender la
+# primera petición (que importa las URLs, las vistas y las plantillas)
+SCRIPT = """
+import io, json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sisbar_config.settings')
+inicio = time.perf_counter()
+from sisbar_config.wsgi import application
+aplicacion = time.perf_counter()
+estado = []
+application({
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': 'localhost',
+    'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+}, lambda status, headers, *args: estado.append(int(status.split()[0])))
+fin = time.perf_counter()
+print(json.dumps({
+    'aplicacion_ms': round((aplicacion - inicio) * 1000, 1),
+    'primera_peticion_ms': round((fin - aplicacion) * 1000, 1),
+    'estado': estado[0],
+}))
+"""
+
+
+def paquetes_proyecto():
+    """Paquetes de primer nivel que son código de SISBAR"""
+    base = Path(settings.BASE_DIR).resolve()
+    propios = {
+        app.name.split('.')[0] for app in apps.get_app_configs()
+        if Path(app.path).resolve().is_relative_to(base)
+    }
+    return propios | {settings.ROOT_URLCONF.split('.')[0]}
+
+
+def arbol(lineas):
+    """
+    Nodos de la salida de -X importtime: dicts con módulo, tiempo propio y
+    acumulado (µs) y el índice del nodo que lo importó (None = raíz). Los
+    módulos se listan después de lo que importan, con dos espacios más de
+    sangría por nivel.
+    """
+    nodos = []
+    pendientes = defaultdict(list)   # profundidad -> hijos que esperan a su padre
+    for linea in lineas:
+        if not linea.startswith('import time:'):
+            continue
+        propio, acumulado, nombre = linea[len('import time:'):].split('|')
+        if not propio.strip().isdigit():
+            continue   # encabezado
+        profundidad = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        indice = len(nodos)
+        nodos.append({
+            'modulo': nombre.strip(),
+            'propio': int(propio),
+            'acumulado': int(acumulado),
+            'padre': None,
+        })
+        for hijo in pendientes.pop(profundidad + 1, []):
+            nodos[hijo]['padre'] = indice
+        pendientes[profundidad].append(indice)
+    return nodos
+
+
+def _paquete(modulo):
+    return modulo.split('.')[0]
+
+
+def _importador(nodos, indice, propios):
+    """Primer módulo del proyecto (o la raíz) en la cadena que importó el nodo"""
+    paquete = _paquete(nodos[indice]['modulo'])
+    padre = nodos[indice]['padre']
+    raiz = None
+    while padre is not None:
+        modulo = nodos[padre]['modulo']
+        if _paquete(modulo) in propios and _paquete(modulo) != paquete:
+            return modulo
+        raiz = modulo
+        padre = nodos[padre]['padre']
+    return raiz
+
+
+def resumir(nodos, propios, top=20):
+    """Costo por paquete y módulos más caros"""
+    por_paquete = defaultdict(lambda: {'us': 0, 'modulos': 0, 'importado_por': None, 'via': None})
+    for indice, nodo in enumerate(nodos):
+        paquete = _paquete(nodo['modulo'])
+        datos = por_paquete[paquete]
+        if not datos['modulos']:
+            # Los nodos salen en el orden en que terminan de importarse: el
+            # primero de cada paquete dice quién lo trajo
+            primero = indice
+            while nodos[primero]['padre'] is not None and _paquete(nodos[nodos[primero]['padre']]['modulo']) == paquete:
+                primero = nodos[primero]['padre']
+            datos['importado_por'] = _importador(nodos, primero, propios)
+            padre = nodos[primero]['padre']
+            datos['via'] = nodos[padre]['modulo'] if padre is not None else None
+        datos['us'] += nodo['propio']
+        datos['modulos'] += 1
+
+    paquetes = sorted(
+        (
+            {
+                'paquete': paquete,
+                'ms': round(datos['us'] / 1000, 1),
+                'modulos': datos['modulos'],
+                'proyecto': paquete in propios,
+                'biblioteca_estandar': paquete in sys.stdlib_module_names,
+                'importado_por': datos['importado_por'],
+                'via': datos['via'],
+            }
+            for paquete, datos in por_paquete.items()
+        ),
+        key=lambda p: -p['ms'],
+    )
+    caros = sorted(nodos, key=lambda n: -n['acumulado'])[:top]
+    return {
+        'imports_ms': round(sum(n['propio'] for n in nodos) / 1000, 1),
+        'modulos': len(nodos),
+        'paquetes': paquetes,
+        'modulos_caros': [{'modulo': n['modulo'], 'ms': round(n['acumulado'] / 1000, 1)} for n in caros],
+    }
+
+
+def medir(url, top=20):
+    """Arranca un worker en un proceso nuevo y devuelve las etapas y el resumen de imports"""
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT, url],
+        cwd=settings.BASE_DIR, capture_output=True, text=True, check=False,
+    )
+    if proceso.returncode:
+        raise RuntimeError(proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else 'sin salida')
+    etapas = json.loads(proceso.stdout.strip().splitlines()[-1])
+    return {**etapas, **resumir(arbol(proceso.stderr.splitlines()), paquetes_proyecto(), top)}
+
+
+def medir_check():
+    """Milisegundos de `manage.py check` en un proceso nuevo"""
+    inicio = time.perf_counter()
+    subprocess.run(
+        [sys.executable, 'manage.py', 'check'],
+        cwd=settings.BASE_DIR, capture_output=True, check=True,
+    )
+    return round((time.perf_counter() - inicio) * 1000, 1)
+
+
+# ========== CALENTAMIENTO ==========
+def compilar_plantillas():
+    """
+    Compila todas las plantillas de los DIRS de TEMPLATES (templates/) con
+    los loaders del motor: el cached loader las guarda y la primera
+    petición ya no las lee ni las parsea. Devuelve (compiladas, errores).
+    """
+    from django.template import TemplateSyntaxError, engines
+
+    compiladas, errores = 0, []
+    for motor in engines.all():
+        for directorio in getattr(motor, 'dirs', ()):
+            for ruta in sorted(Path(directorio).rglob('*.html')):
+                nombre = ruta.relative_to(directorio).as_posix()
+                try:
+                    motor.get_template(nombre)
+                except TemplateSyntaxError as e:
+                    errores.append((nombre, str(e)))
+                else:
+                    compiladas += 1
+    return compiladas, errores
+
+
+def abrir_conexiones():
+    """
+    Abre en este hilo las conexiones persistentes (CONN_MAX_AGE distinto de
+    0). Las que se cierran al terminar cada petición no sirve abrirlas antes.
+    """
+    abiertas = 0
+    for alias in connections:
+        if connections.settings[alias].get('CONN_MAX_AGE', 0) == 0:
+            continue
+        connections[alias].ensure_connection()
+        abiertas += 1
+    return abiertas
+
+
+# ========== TIEMPO HASTA EL PRIMER BYTE ==========
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def primer_byte(puerto, url, cookie='', espera=30):
+    """Milisegundos hasta recibir el estado y los encabezados, y el estado"""
+    conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=espera)
+    inicio = time.perf_counter()
+    try:
+        conexion.request('GET', url, headers={'Cookie': cookie} if cookie else {})
+        respuesta = conexion.getresponse()
+        ms = (time.perf_counter() - inicio) * 1000
+        respuesta.read()
+    finally:
+        conexion.close()
+    return round(ms, 1), respuesta.status
+
+
+def medir_servidor(urls, rapido=True, inactivo=0, cookie='', workers=0, espera=60):
+    """
+    Arranca gunicorn con sisbar_config.servidor (SISBAR_ARRANQUE_RAPIDO =
+    `rapido`) y mide, desde que se lanza el proceso, cuándo acepta
+    conexiones y cuándo llega el primer byte de la primera petición. Luego
+    el primer byte de cada URL en su primera visita y, después de
+    `inactivo` segundos sin tráfico, otra vez.
+    """
+    puerto = puerto_libre()
+    entorno = dict(os.environ, SISBAR_ARRANQUE_RAPIDO=str(rapido))
+    if workers:
+        entorno['WEB_CONCURRENCY'] = str(workers)
+    inicio = time.perf_counter()
+    servidor = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', 'sisbar_config.wsgi:application',
+            '--config', 'python:sisbar_config.servidor',
+            '--bind', f'127.0.0.1:{puerto}', '--log-level', 'warning',
+        ],
+        cwd=settings.BASE_DIR, env=entorno,
+    )
+    try:
+        limite = inicio + espera
+        while True:
+            if servidor.poll() is not None:
+                raise RuntimeError('gunicorn terminó antes de aceptar conexiones')
+            if time.perf_counter() > limite:
+                raise RuntimeError('gunicorn no respondió a tiempo')
+            try:
+                socket.create_connection(('127.0.0.1', puerto), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.02)
+        acepta = time.perf_counter()
+        primera, estado = primer_byte(puerto, urls[0], cookie, espera)
+        resultado = {
+            'rapido': rapido,
+            'acepta_ms': round((acepta - inicio) * 1000, 1),
+            'primer_byte_ms': round((time.perf_counter() - inicio) * 1000, 1),
+            'urls': [{'url': urls[0], 'estado': estado, 'primera_ms': primera}],
+        }
+        for url in urls[1:]:
+            ms, estado = primer_byte(puerto, url, cookie, espera)
+            resultado['urls'].append({'url': url, 'estado': estado, 'primera_ms': ms})
+        if inactivo:
+            time.sleep(inactivo)
+            for datos in resultado['urls']:
+                datos['tras_inactividad_ms'], _ = primer_byte(puerto, datos['url'], cookie, espera)
+        return resultado
+    finally:
+        servidor.send_signal(signal.SIGTERM)
+        servidor.wait(timeout=30)
@@ -0,0 +1,37 @@
+"""
+Apoyo para las vistas asíncronas (ASGI)
+
+Las consultas del escáner y los datos del dashboard son peticiones cortas
+que casi todo el tiempo esperan a la base de datos. Con workers ASGI
+(uvicorn, ver start.sh) las versiones async de esas vistas no ocupan un
+worker mientras esperan, así que no se quedan en cola detrás de una
+exportación lenta.
+
+Reglas para las vistas async de SISBAR:
+- El ORM se usa con sus métodos async (aget, afirst, aupdate, acreate,
+  aaggregate, async for). Lo que todavía es síncrono (registrar_actividad,
+  generar_alertas) se llama con sync_to_async.
+- request.user no se puede evaluar perezosamente dentro del event loop:
+  `login_requerido` lo carga antes con request.auser().
+"""
+
+from functools import wraps
+
+from django.contrib.auth.views import redirect_to_login
+from django.core.handlers.asgi import ASGIRequest
+
+
+def login_requerido(vista):
+    """login_required para vistas async (el de Django 5.0 solo envuelve vistas síncronas)"""
+    @wraps(vista)
+    async def envoltura(request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await vista(request, *args, **kwargs)
+    return envoltura
+
+
+def es_asgi(request):
+    """¿La petición llegó por el servidor ASGI?"""
+    return isinstance(request, ASGIRequest)
@@ -0,0 +1,175 @@
+"""
+Caché de SISBAR con espacios de nombres versionados
+
+Cada valor se guarda bajo un nombre y depende de uno o más espacios
+(inventario, movimientos, categorias, proveedores, usuarios). Cuando un
+modelo de un espacio cambia se incrementa su versión y todas las claves
+que dependen de él quedan obsoletas sin tener que borrarlas una por una.
+
+Uso en una vista:
+
+    from sisbar_config import cache as cache_sisbar
+
+    stats = cache_sisbar.obtener('reportes:home', calcular_stats, espacios=('inventario',))
+    categorias = cache_sisbar.lista('categorias:activas', queryset, espacios=('categorias',))
+
+En una vista async: `await cache_sisbar.aobtener(nombre, calcular_async, espacios=...)`.
+
+Las invalidaciones solo llegan a todos los workers si la caché es
+compartida (CACHE_BACKEND=archivo o bd): con la caché en memoria cada
+proceso tiene sus propias versiones y ve los cambios de los demás recién
+cuando vence el valor.
+
+Los valores calculados leyendo de la réplica (sisbar_config/replicas.py)
+van en claves propias, terminadas en @replica: la réplica puede no tener
+todavía la escritura que invalidó el espacio, y quien la hizo lee de la
+principal y no debe recibir ese valor atrasado.
+"""
+
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from .replicas import aalias_lectura, alias_lectura
+
+
+ESPACIOS = ('inventario', 'movimientos', 'categorias', 'proveedores', 'usuarios', 'permisos')
+
+_FALTA = object()
+
+# Backends que guardan en el propio proceso
+POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def compartida(alias='default'):
+    """True si los workers comparten la caché (y sus invalidaciones)"""
+    from django.conf import settings
+    return settings.CACHES[alias]['BACKEND'] not in POR_PROCESO
+
+
+def _clave_version(espacio):
+    return f'espacio:{espacio}'
+
+
+def versiones(espacios):
+    """
+    Versión actual de cada espacio (una sola ida a la caché).
+
+    La versión inicial se toma del reloj: si la caché descarta la clave de
+    versión, la nueva nunca coincide con una anterior.
+    """
+    claves = [_clave_version(e) for e in espacios]
+    actuales = cache.get_many(claves)
+    faltantes = {c: time.time_ns() // 1000 for c in claves if c not in actuales}
+    if faltantes:
+        for c, valor in faltantes.items():
+            cache.add(c, valor, timeout=None)
+        actuales.update(cache.get_many(list(faltantes)))
+    return [actuales.get(c, faltantes.get(c)) for c in claves]
+
+
+def _unir(nombre, espacios, numeros, partes, alias):
+    segmentos = [nombre]
+    segmentos += [f'{e}{v}' for e, v in zip(espacios, numeros)]
+    segmentos += [str(p) for p in partes]
+    if alias:
+        segmentos.append(f'@{alias}')
+    return ':'.join(segmentos)
+
+
+def clave(nombre, espacios=(), partes=()):
+    """
+    Clave completa: nombre, versión de cada espacio, partes variables y,
+    si se está leyendo de la réplica, la base
+    """
+    return _unir(nombre, espacios, versiones(espacios), partes, alias_lectura())
+
+
+def obtener(nombre, calcular, espacios=(), partes=(), timeout=None, refrescar=False):
+    """
+    Devuelve el valor cacheado o lo calcula y lo guarda.
+
+    `timeout=None` usa el TIMEOUT configurado en CACHES; `refrescar=True`
+    recalcula siempre (lo usa warm_caches).
+    """
+    k = clave(nombre, espacios, partes)
+    valor = _FALTA if refrescar else cache.get(k, _FALTA)
+    if valor is _FALTA:
+        valor = calcular()
+        if timeout is None:
+            cache.set(k, valor)
+        else:
+            cache.set(k, valor, timeout)
+    return valor
+
+
+def lista(nombre, queryset, espacios=(), partes=(), timeout=None, refrescar=False):
+    """Evalúa un queryset una sola vez y cachea la lista de objetos"""
+    return obtener(nombre, lambda: list(queryset), espacios, partes, timeout, refrescar)
+
+
+def invalidar(*espacios):
+    """Incrementa la versión de los espacios indicados"""
+    for espacio in espacios or ESPACIOS:
+        try:
+            cache.incr(_clave_version(espacio))
+        except ValueError:
+            # No había versión: la próxima lectura crea una nueva
+            pass
+
+
+def invalidar_al_cambiar(modelo, *espacios, al_eliminar=True):
+    """
+    Conecta post_save/post_delete del modelo para invalidar sus espacios.
+
+    Un receptor de post_delete impide el borrado rápido en cascada, así que
+    los modelos de alto volumen (movimientos) usan `al_eliminar=False` y se
+    invalidan por el espacio de su modelo padre.
+    """
+    def receptor(sender, **kwargs):
+        invalidar(*espacios)
+
+    uid = f'cache_sisbar:{modelo._meta.label}'
+    post_save.connect(receptor, sender=modelo, weak=False, dispatch_uid=uid)
+    if al_eliminar:
+        post_delete.connect(receptor, sender=modelo, weak=False, dispatch_uid=uid)
+
+
+# ========== API ASYNC (vistas ASGI) ==========
+async def aversiones(espacios):
+    """versiones() con la API async de la caché"""
+    claves = [_clave_version(e) for e in espacios]
+    actuales = await cache.aget_many(claves)
+    faltantes = {c: time.time_ns() // 1000 for c in claves if c not in actuales}
+    if faltantes:
+        for c, valor in faltantes.items():
+            await cache.aadd(c, valor, timeout=None)
+        actuales.update(await cache.aget_many(list(faltantes)))
+    return [actuales.get(c, faltantes.get(c)) for c in claves]
+
+
+async def aobtener(nombre, calcular, espacios=(), partes=(), timeout=None):
+    """obtener() para vistas async: `calcular` es una función async"""
+    k = _unir(nombre, espacios, await aversiones(espacios), partes, await aalias_lectura())
+
+    valor = await cache.aget(k, _FALTA)
+    if valor is _FALTA:
+        valor = await calcular()
+        if timeout is None:
+            await cache.aset(k, valor)
+        else:
+            await cache.aset(k, valor, timeout)
+    return valor
+
+
+async def ainvalidar(*espacios):
+    """invalidar() con la API async de la caché"""
+    for espacio in espacios or ESPACIOS:
+        try:
+            await cache.aincr(_clave_version(espacio))
+        except ValueError:
+            pass
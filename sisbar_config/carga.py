@@ -0,0 +1,171 @@
+"""
+Medición de la base de datos durante las simulaciones de carga
+
+`MedidorBD` se instala como envoltorio de ejecución (execute_wrapper) y
+registra cuánto tardan las escrituras, que es donde se acumula la espera
+por bloqueos, y cuántas fallan por base de datos bloqueada.
+
+Este módulo también sirve como configuración de gunicorn para los modos
+HTTP de `simular_carga`:
+
+    gunicorn sisbar_config.wsgi -c python:sisbar_config.carga
+    gunicorn sisbar_config.asgi -k uvicorn.workers.UvicornWorker -c python:sisbar_config.carga
+
+Cada worker guarda sus mediciones en SISBAR_CARGA_DIR al terminar.
+`MuestreoMemoria` registra el pico de memoria del servidor para comparar
+los dos modos con la misma memoria.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+
+from django.db import OperationalError
+
+
+ESCRITURAS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not valores:
+        return 0.0
+    indice = max(0, math.ceil(p / 100 * len(valores)) - 1)
+    return valores[indice]
+
+
+def es_bloqueo(error):
+    mensaje = str(error).lower()
+    return 'locked' in mensaje or 'deadlock' in mensaje or ('lock' in mensaje and 'timeout' in mensaje)
+
+
+class MedidorBD:
+    """Envoltorio de ejecución que acumula tiempos de escritura y bloqueos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.consultas = 0
+        self.escrituras = []
+        self.bloqueos = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        escritura = sql.lstrip()[:7].upper().startswith(ESCRITURAS)
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if es_bloqueo(e):
+                with self._lock:
+                    self.bloqueos += 1
+            raise
+        finally:
+            duracion = (time.perf_counter() - inicio) * 1000
+            with self._lock:
+                self.consultas += 1
+                if escritura:
+                    self.escrituras.append(duracion)
+
+    def exportar(self):
+        with self._lock:
+            return {
+                'consultas': self.consultas,
+                'escrituras': list(self.escrituras),
+                'bloqueos': self.bloqueos,
+            }
+
+    def combinar(self, datos):
+        with self._lock:
+            self.consultas += datos['consultas']
+            self.escrituras.extend(datos['escrituras'])
+            self.bloqueos += datos['bloqueos']
+
+    def resumen(self):
+        escrituras = sorted(self.escrituras)
+        return {
+            'consultas': self.consultas,
+            'escrituras': len(escrituras),
+            'bloqueos': self.bloqueos,
+            'espera_escritura_ms': {
+                'p50': round(percentil(escrituras, 50), 2),
+                'p95': round(percentil(escrituras, 95), 2),
+                'p99': round(percentil(escrituras, 99), 2),
+                'max': round(escrituras[-1], 2) if escrituras else 0.0,
+                'total': round(sum(escrituras), 2),
+            },
+        }
+
+
+# ========== MEMORIA DEL SERVIDOR ==========
+def memoria_arbol(pid):
+    """
+    RSS total en MB de un proceso y todos sus descendientes (master de
+    gunicorn y sus workers), leído de /proc. None fuera de Linux.
+    """
+    total, pendientes = 0, [pid]
+    try:
+        while pendientes:
+            actual = pendientes.pop()
+            with open(f'/proc/{actual}/status', encoding='utf-8') as f:
+                for linea in f:
+                    if linea.startswith('VmRSS:'):
+                        total += int(linea.split()[1])
+                        break
+            for hilo in os.listdir(f'/proc/{actual}/task'):
+                with open(f'/proc/{actual}/task/{hilo}/children', encoding='utf-8') as f:
+                    pendientes.extend(int(hijo) for hijo in f.read().split())
+    except (OSError, ValueError):
+        return None
+    return round(total / 1024, 1)
+
+
+class MuestreoMemoria(threading.Thread):
+    """Muestrea memoria_arbol(pid) en segundo plano y guarda el pico"""
+
+    def __init__(self, pid, intervalo=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.intervalo = intervalo
+        self.pico = None
+        self._fin = threading.Event()
+
+    def run(self):
+        while not self._fin.is_set():
+            actual = memoria_arbol(self.pid)
+            if actual is not None and (self.pico is None or actual > self.pico):
+                self.pico = actual
+            self._fin.wait(self.intervalo)
+
+    def detener(self):
+        self._fin.set()
+        self.join()
+        return self.pico
+
+
+# ========== HOOKS DE GUNICORN ==========
+_medidor = None
+
+
+def _instalar_medidor(sender, connection, **kwargs):
+    if _medidor not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medidor)
+
+
+def post_worker_init(worker):
+    global _medidor
+    from django.db.backends.signals import connection_created
+
+    # Con workers uvicorn el ORM corre en los hilos de sync_to_async, que
+    # tienen su propia conexión: se instala en cada conexión que se abre
+    _medidor = MedidorBD()
+    connection_created.connect(_instalar_medidor, weak=False)
+
+
+def worker_exit(server, worker):
+    directorio = os.environ.get('SISBAR_CARGA_DIR')
+    if not directorio or _medidor is None:
+        return
+    archivo = os.path.join(directorio, f'bd-{worker.pid}.json')
+    with open(archivo, 'w', encoding='utf-8') as f:
+        json.dump(_medidor.exportar(), f)
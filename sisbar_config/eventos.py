@@ -0,0 +1,239 @@
+"""
+Eventos en vivo para Server-Sent Events (stock, movimientos y alertas)
+
+Durante el servicio el personal recargaba el dashboard y las alertas a
+cada rato. Ahora las páginas abren un EventSource contra
+movimientos:eventos y reciben los cambios a medida que ocurren.
+
+Publicación:
+
+    eventos.publicar('stock', producto.datos_evento())   # al confirmar la transacción
+    eventos.emitir('alerta', datos)                        # inmediato
+
+Cada evento se guarda un rato (DURACION_DIARIO) en una fila de
+movimientos.EventoVivo, el "diario", y su id autoincremental es el número
+correlativo. Los flujos abiertos en el mismo proceso se despiertan al
+instante (pub/sub en memoria); los de otros workers leen el diario cada
+EVENTOS_INTERVALO segundos.
+
+Sin costo para los escaneos:
+
+- Numerar con el id de la fila no bloquea nada: antes cada guardado de
+  stock, movimiento o alerta incrementaba una misma fila contador y todas
+  las escrituras de stock hacían fila detrás de ella.
+- Si nadie está escuchando (ningún flujo ni página abierta hace
+  DURACION_DIARIO segundos; la marca vive en la caché, compartida entre
+  workers con CACHE_BACKEND=archivo o bd) publicar() no guarda nada.
+- publicar() corre después del commit con robust=True: si guardar el
+  evento falla ("database is locked", la caché) se registra en el log y el
+  descuento, que ya se confirmó, responde bien igual. Un 500 ahí hacía que
+  el cliente reintentara y descontara dos veces.
+
+Sin eventos perdidos: con PostgreSQL dos transacciones pueden confirmar sus
+ids fuera de orden. El lector no pasa de un número que falta mientras el
+evento siguiente sea reciente (ESPERA segundos): el que falta puede estar
+por confirmarse. Pasado ese tiempo es un id que no se usó y se saltea.
+
+El número correlativo es el `id` de SSE: al reconectarse el navegador
+envía Last-Event-ID y recibe lo que se perdió mientras tanto.
+"""
+
+import asyncio
+import json
+import threading
+import time
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+
+
+# Marca en la caché: alguien escuchó los eventos en los últimos DURACION_DIARIO segundos
+CLAVE_OYENTES = 'eventos:oyentes'
+
+# Segundos que un evento queda en el diario para reconexiones y otros workers
+DURACION_DIARIO = 300
+
+# Cada cuántos eventos se borran del diario los vencidos
+PODA = 500
+
+# Segundos que el lector espera un número que falta antes de saltearlo
+ESPERA = 5
+
+# Máximo de eventos que se entregan de una vez al reconectarse
+MAXIMO_PENDIENTES = 200
+
+# Comentario cada tanto para que proxies y balanceadores no corten el flujo
+LATIDO = 15
+
+# Flujos abiertos en este proceso: (event loop, asyncio.Event)
+_suscriptores = set()
+_lock = threading.Lock()
+
+# La marca de oyentes se consulta en la caché a lo sumo una vez por
+# segundo y se renueva a lo sumo una vez por LATIDO
+_oyentes = {'hasta': 0.0, 'hay': False, 'marcada': 0.0}
+
+
+def _diario():
+    from movimientos.models import EventoVivo
+
+    # Siempre de la principal: una réplica atrasada haría esperar números
+    return EventoVivo.objects.using(DEFAULT_DB_ALIAS)
+
+
+# ========== OYENTES ==========
+def _renovar():
+    """¿Hace falta volver a escribir la marca? Además la da por vista en este proceso"""
+    ahora = time.monotonic()
+    renovar = ahora >= _oyentes['marcada'] + LATIDO
+    _oyentes.update(hasta=ahora + 1, hay=True, marcada=ahora if renovar else _oyentes['marcada'])
+    return renovar
+
+
+def escuchar():
+    """Marca que hay alguien escuchando (una página o un flujo abierto)"""
+    if _renovar():
+        cache.set(CLAVE_OYENTES, True, DURACION_DIARIO)
+
+
+async def aescuchar():
+    if _renovar():
+        await cache.aset(CLAVE_OYENTES, True, DURACION_DIARIO)
+
+
+def hay_oyentes():
+    if _suscriptores:
+        return True
+    ahora = time.monotonic()
+    if ahora >= _oyentes['hasta']:
+        _oyentes.update(hasta=ahora + 1, hay=cache.get(CLAVE_OYENTES) is not None)
+    return _oyentes['hay']
+
+
+# ========== PUBLICAR ==========
+def publicar(tipo, datos):
+    """Emite el evento cuando se confirme la transacción actual, si alguien escucha"""
+    def emitir_si_escuchan():
+        if hay_oyentes():
+            emitir(tipo, datos)
+    transaction.on_commit(emitir_si_escuchan, robust=True)
+
+
+def emitir(tipo, datos):
+    """Guarda el evento en el diario y despierta los flujos de este proceso"""
+    numero = _diario().create(tipo=tipo, datos=datos).pk
+    if numero % PODA == 0:
+        _diario().filter(fecha__lt=timezone.now() - timedelta(seconds=DURACION_DIARIO)).delete()
+    _despertar()
+    return numero
+
+
+def _despertar():
+    with _lock:
+        suscriptores = list(_suscriptores)
+    for loop, evento in suscriptores:
+        try:
+            loop.call_soon_threadsafe(evento.set)
+        except RuntimeError:
+            # El loop ya se cerró: el flujo terminó sin darse de baja
+            with _lock:
+                _suscriptores.discard((loop, evento))
+
+
+# ========== LEER ==========
+def ultimo():
+    """
+    Número del último evento (0 si todavía no hay). Lo piden las páginas
+    que van a abrir el flujo: desde ahora hay alguien escuchando.
+    """
+    escuchar()
+    return _diario().order_by('-id').values_list('id', flat=True).first() or 0
+
+
+async def aleer(desde):
+    """
+    (eventos posteriores a `desde` que siguen en el diario, número hasta el
+    que se leyó)
+    """
+    filas = [
+        fila async for fila in
+        _diario().filter(id__gt=desde).order_by('id').values('id', 'tipo', 'datos', 'fecha')[:MAXIMO_PENDIENTES]
+    ]
+    if not filas:
+        # Sin novedades, o Last-Event-ID de otro diario (la base se recreó)
+        hasta = await _diario().order_by('-id').values_list('id', flat=True).afirst()
+        return [], min(desde, hasta or 0)
+
+    reciente = timezone.now() - timedelta(seconds=ESPERA)
+    nuevos = []
+    esperado = desde + 1
+    for fila in filas:
+        if fila['id'] != esperado and fila['fecha'] > reciente:
+            # Falta un número: puede ser una transacción que todavía no
+            # confirmó. Este y los siguientes se vuelven a leer la próxima
+            break
+        nuevos.append({'id': fila['id'], 'tipo': fila['tipo'], 'datos': fila['datos']})
+        esperado = fila['id'] + 1
+    return nuevos, nuevos[-1]['id'] if nuevos else desde
+
+
+# ========== FORMATO SSE ==========
+def formatear(evento):
+    datos = json.dumps(evento['datos'], ensure_ascii=False, separators=(',', ':'))
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+def marca(numero):
+    """
+    Solo `id`: el navegador actualiza su Last-Event-ID sin disparar ningún
+    evento, así una reconexión no repite lo ya entregado
+    """
+    return f'id: {numero}\n\n'
+
+
+def lote(eventos, hasta, reintento_ms):
+    """Respuesta completa para el modo sondeo (servidor WSGI)"""
+    partes = [f'retry: {reintento_ms}\n\n']
+    partes += [formatear(e) for e in eventos]
+    partes.append(marca(hasta))
+    return ''.join(partes)
+
+
+async def flujo(desde):
+    """
+    Flujo SSE de larga duración (servidor ASGI). Termina tras
+    EVENTOS_DURACION segundos y el navegador se reconecta solo.
+    """
+    loop = asyncio.get_running_loop()
+    despertador = asyncio.Event()
+    suscripcion = (loop, despertador)
+    with _lock:
+        _suscriptores.add(suscripcion)
+
+    intervalo = getattr(settings, 'EVENTOS_INTERVALO', 2)
+    fin = loop.time() + getattr(settings, 'EVENTOS_DURACION', 300)
+    proximo_latido = loop.time() + LATIDO
+    try:
+        await aescuchar()
+        yield f'retry: 1000\n\n{marca(desde)}'
+        while loop.time() < fin:
+            # Limpiar antes de leer: un evento emitido mientras tanto vuelve a despertar
+            despertador.clear()
+            nuevos, desde = await aleer(desde)
+            if nuevos:
+                yield ''.join(formatear(e) for e in nuevos)
+            try:
+                await asyncio.wait_for(despertador.wait(), timeout=min(intervalo, max(fin - loop.time(), 0)))
+            except asyncio.TimeoutError:
+                pass
+            if loop.time() >= proximo_latido:
+                proximo_latido = loop.time() + LATIDO
+                await aescuchar()
+                yield ': latido\n\n'
+    finally:
+        with _lock:
+            _suscriptores.discard(suscripcion)
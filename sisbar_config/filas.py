@@ -0,0 +1,94 @@
+"""
+Filas livianas para las páginas de listado
+
+Las listas de productos, movimientos, alertas y proveedores muestran unas
+pocas columnas, pero un queryset arma la instancia completa de cada fila
+(descripción, imagen, columnas de auditoría, un objeto relacionado por
+fila con select_related) y cada instancia lleva su __dict__ y su _state.
+Una Fila trae solo sus columnas con values_list() en una sola consulta y
+las guarda en __slots__:
+
+    class CategoriaFila(Fila):
+        __slots__ = ('id', 'nombre', 'color')
+        columnas = ('id', 'nombre', 'color')
+
+    class ProductoFila(Fila):
+        __slots__ = ('id', 'nombre', 'estado', 'categoria')
+        columnas = ('id', 'nombre', 'estado')
+        relaciones = {'categoria': CategoriaFila}
+
+        def get_estado_display(self):
+            return ETIQUETAS_ESTADO.get(self.estado, self.estado)
+
+    productos = ProductoFila.listar(Producto.objects.filter(activo=True))
+
+- `columnas`: nombres de campos o anotaciones del queryset; ('atributo',
+  'columna') para guardarlo con otro nombre y ('atributo', expresión)
+  para calcularlo en la consulta (solo en la fila principal).
+- `relaciones`: ForeignKey -> clase Fila; sus columnas entran en la misma
+  consulta (con LEFT JOIN si la relación es opcional). La primera columna
+  de la relacionada es su clave: cada objeto relacionado se arma una sola
+  vez y lo comparten todas las filas que lo nombran (None si la relación
+  está vacía).
+- Los métodos que usan las plantillas (get_X_display, colores, iconos)
+  se resuelven con tablas precalculadas, sin consultas.
+
+Las filas son de solo lectura para plantillas: no tienen save() ni
+relaciones inversas.
+"""
+
+
+class Fila:
+    """Base de las filas de proyección (ver el docstring del módulo)"""
+
+    __slots__ = ()
+    columnas = ()
+    relaciones = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._atributos = tuple(c if isinstance(c, str) else c[0] for c in cls.columnas)
+        cls._consulta = cls.lookups()
+
+    @classmethod
+    def lookups(cls, prefijo=''):
+        """Columnas de values_list(), relaciones incluidas"""
+        lista = []
+        for columna in cls.columnas:
+            columna = columna if isinstance(columna, str) else columna[1]
+            if not isinstance(columna, str) and prefijo:
+                raise TypeError(f'{cls.__name__}: las expresiones solo van en la fila principal')
+            lista.append(prefijo + columna if isinstance(columna, str) else columna)
+        for nombre, relacionada in cls.relaciones.items():
+            lista += relacionada.lookups(f'{prefijo}{nombre}__')
+        return lista
+
+    @classmethod
+    def listar(cls, consulta):
+        """Lista de filas con el orden y los filtros del queryset"""
+        compartidas = {}
+        return [cls._armar(valores, 0, compartidas)[0] for valores in consulta.values_list(*cls._consulta)]
+
+    @classmethod
+    def _armar(cls, valores, posicion, compartidas):
+        fila = object.__new__(cls)
+        for nombre in cls._atributos:
+            setattr(fila, nombre, valores[posicion])
+            posicion += 1
+        for nombre, relacionada in cls.relaciones.items():
+            objeto, posicion = relacionada._compartida(valores, posicion, compartidas)
+            setattr(fila, nombre, objeto)
+        return fila, posicion
+
+    @classmethod
+    def _compartida(cls, valores, posicion, compartidas):
+        clave = valores[posicion]
+        if clave is None:
+            return None, posicion + len(cls._consulta)
+        tabla = compartidas.setdefault(cls, {})
+        if clave not in tabla:
+            tabla[clave], _ = cls._armar(valores, posicion, compartidas)
+        return tabla[clave], posicion + len(cls._consulta)
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {getattr(self, "id", "")}>'
@@ -0,0 +1,212 @@
+"""
+Claves de idempotencia para las vistas que modifican stock
+
+Un doble clic o un reintento del navegador volvía a ejecutar el POST y
+dejaba movimientos duplicados que después se corregían a mano con ajustes.
+Ahora cada petición de escritura puede traer una clave:
+
+- Formularios: {% load idempotencia %}{% campo_idempotencia %} agrega un
+  campo oculto con una clave nueva cada vez que se dibuja el formulario.
+- Clientes JSON: cabecera `Idempotency-Key`.
+
+La vista se decora con @idempotente (debajo de login_required). La primera
+petición con una clave se ejecuta y su respuesta (estado, cabeceras
+principales y cuerpo) queda guardada IDEMPOTENCIA_DURACION segundos. Las
+repeticiones devuelven esa respuesta sin volver a ejecutar la vista, con la
+cabecera `Idempotent-Replayed: true`. Si la original todavía se está
+procesando (doble clic), la repetición responde 409 enseguida; en las
+vistas async, que no ocupan un worker mientras esperan, primero espera
+unos segundos su resultado. Reusar una clave con otros datos responde 422.
+Esos dos errores son JSON para los clientes JSON (escáner, fetch); a un
+formulario HTML se le responde como a cualquier formulario: redirección a
+la misma página con el aviso en `messages`.
+
+Las respuestas que dicen "intenta de nuevo" (409 por stock que cambió o
+petición en curso, 429, 5xx...) no se guardan: el reintento con la misma
+clave vuelve a ejecutar la vista.
+
+Las claves son por usuario y por ruta. Se guardan en la caché: con varios
+workers tiene que ser compartida (CACHE_BACKEND=archivo o bd), igual que
+los eventos en vivo. Las peticiones sin clave funcionan como siempre.
+"""
+
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+
+
+CAMPO = 'clave_idempotencia'
+CABECERA = 'Idempotency-Key'
+
+EN_CURSO = 'en-curso'
+
+# Si el worker muere a mitad de la petición, la clave se libera sola
+DURACION_EN_CURSO = 60
+
+# Segundos que una repetición async espera a que termine la petición original
+ESPERA = 10
+PAUSA = 0.1
+
+# Cabeceras que se guardan junto con el cuerpo
+CABECERAS = ('Content-Type', 'Location', 'Content-Disposition')
+
+# Estados transitorios: reintentar puede dar otro resultado
+TRANSITORIOS = (408, 409, 423, 425, 429)
+
+# Campos que cambian entre envíos del mismo formulario
+IGNORAR = ('csrfmiddlewaretoken',)
+
+
+def _duracion():
+    return getattr(settings, 'IDEMPOTENCIA_DURACION', 60 * 60 * 24)
+
+
+def _clave(request):
+    """Clave de caché de la petición, o None si no trae clave de idempotencia"""
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    clave = request.headers.get(CABECERA) or request.POST.get(CAMPO)
+    if not clave or len(clave) > 200:
+        return None
+    firma = hashlib.sha256(f'{request.path}\n{clave}'.encode()).hexdigest()[:32]
+    return f'idempotencia:{request.user.pk}:{firma}'
+
+
+def _huella(request):
+    """Huella de los datos enviados, para detectar una clave reusada con otros datos"""
+    if request.content_type in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        # El boundary del multipart cambia en cada envío: se compara el contenido
+        partes = sorted(
+            (campo, valor) for campo, valores in request.POST.lists() if campo not in IGNORAR
+            for valor in valores
+        )
+        partes += sorted(
+            (campo, archivo.name, archivo.size) for campo, archivos in request.FILES.lists()
+            for archivo in archivos
+        )
+        datos = repr(partes).encode()
+    else:
+        datos = request.body
+    return hashlib.sha256(datos).hexdigest()[:16]
+
+
+def _registro(respuesta, huella):
+    """Lo que se guarda de una respuesta (None si no se puede o no conviene guardar)"""
+    if respuesta.streaming or respuesta.status_code >= 500 or respuesta.status_code in TRANSITORIOS:
+        return None
+    return {
+        'huella': huella,
+        'estado': respuesta.status_code,
+        'cabeceras': {c: respuesta[c] for c in CABECERAS if respuesta.has_header(c)},
+        'cuerpo': respuesta.content,
+    }
+
+
+def _es_formulario(request):
+    """¿La petición es el envío de un formulario HTML (y no de un cliente JSON)?"""
+    return (
+        CABECERA not in request.headers
+        and request.content_type != 'application/json'
+        and request.headers.get('X-Requested-With') != 'XMLHttpRequest'
+        # fetch() manda cors/same-origin; el envío de un formulario, navigate
+        and request.headers.get('Sec-Fetch-Mode', 'navigate') == 'navigate'
+        and hasattr(request, '_messages')
+    )
+
+
+def _rechazar(request, mensaje, estado):
+    """Error del decorador: JSON para los clientes JSON, redirección con aviso para los formularios"""
+    if _es_formulario(request):
+        messages.warning(request, mensaje)
+        return HttpResponseRedirect(request.get_full_path())
+    return JsonResponse({'ok': False, 'mensaje': mensaje}, status=estado)
+
+
+def _reproducir(request, registro, huella):
+    if registro['huella'] != huella:
+        return _rechazar(
+            request, '❌ Esta solicitud ya se había enviado con otros datos. Revisa y vuelve a intentarlo.', 422
+        )
+    cabeceras = registro['cabeceras']
+    if 'Location' in cabeceras:
+        respuesta = HttpResponseRedirect(cabeceras['Location'])
+        respuesta.status_code = registro['estado']
+        respuesta.content = registro['cuerpo']
+    else:
+        respuesta = HttpResponse(registro['cuerpo'], status=registro['estado'])
+    for nombre, valor in cabeceras.items():
+        respuesta[nombre] = valor
+    respuesta['Idempotent-Replayed'] = 'true'
+    if 300 <= registro['estado'] < 400 and hasattr(request, '_messages'):
+        # El mensaje de la original ya se mostró (o se perdió con la conexión)
+        messages.info(request, 'ℹ️ Esta solicitud ya se había procesado; no se repitió.')
+    return respuesta
+
+
+def _en_curso(request):
+    return _rechazar(
+        request, '⏳ La solicitud todavía se está procesando. Revisa el resultado antes de repetirla.', 409
+    )
+
+
+def idempotente(vista):
+    """Decorador para vistas de escritura (síncronas o async)"""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura_async(request, *args, **kwargs):
+            clave = _clave(request)
+            if clave is None:
+                return await vista(request, *args, **kwargs)
+            huella = _huella(request)
+            limite = time.monotonic() + ESPERA
+            while not await cache.aadd(clave, EN_CURSO, DURACION_EN_CURSO):
+                registro = await cache.aget(clave)
+                if registro not in (None, EN_CURSO):
+                    return _reproducir(request, registro, huella)
+                if time.monotonic() >= limite:
+                    return _en_curso(request)
+                await asyncio.sleep(PAUSA)
+            try:
+                respuesta = await vista(request, *args, **kwargs)
+            except BaseException:
+                await cache.adelete(clave)
+                raise
+            registro = _registro(respuesta, huella)
+            if registro is None:
+                await cache.adelete(clave)
+            else:
+                await cache.aset(clave, registro, _duracion())
+            return respuesta
+        return envoltura_async
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        clave = _clave(request)
+        if clave is None:
+            return vista(request, *args, **kwargs)
+        huella = _huella(request)
+        if not cache.add(clave, EN_CURSO, DURACION_EN_CURSO):
+            # Esperar acá ocuparía un worker: el navegador reintenta
+            registro = cache.get(clave)
+            if registro not in (None, EN_CURSO):
+                return _reproducir(request, registro, huella)
+            return _en_curso(request)
+        try:
+            respuesta = vista(request, *args, **kwargs)
+        except BaseException:
+            cache.delete(clave)
+            raise
+        registro = _registro(respuesta, huella)
+        if registro is None:
+            cache.delete(clave)
+        else:
+            cache.set(clave, registro, _duracion())
+        return respuesta
+    return envoltura
@@ -0,0 +1,239 @@
+"""
+Versiones redimensionadas de las imágenes subidas (Pillow)
+
+Las fotos que suben los usuarios suelen ser de celular (4-8 MB) y las
+plantillas las mostraban a tamaño completo. Al subir una imagen se generan
+versiones acotadas en JPEG y WebP, sin metadatos (EXIF, GPS, perfiles) y con
+la orientación ya aplicada. Su nombre lleva la huella del contenido
+original, así que una imagen nueva nunca choca con una versión en caché.
+
+El original también es público (MEDIA_URL), así que no se guarda tal cual
+llegó: antes de escribirlo se vuelve a codificar sin metadatos, con la
+orientación aplicada y el lado mayor acotado a LADO_ORIGINAL. Ese archivo
+es la fuente para regenerar las versiones. Las rutas de las versiones se
+guardan en un JSONField del modelo:
+
+    {'origen': 'productos/foto.jpg', 'huella': '3f2a...',
+     'mini': {'ancho': 100, 'alto': 75, 'jpg': 'productos/versiones/foto-mini-3f2a....jpg',
+              'webp': 'productos/versiones/foto-mini-3f2a....webp'}, ...}
+
+Uso en el AppConfig.ready() de cada app:
+
+    procesar_al_guardar(Producto, 'imagen', 'imagen_versiones')
+
+y en las plantillas: {% load imagenes %} {% imagen producto 'mini' %}
+"""
+
+import hashlib
+import posixpath
+import re
+from io import BytesIO
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+
+from . import tareas
+
+
+# Lado mayor de cada versión, en píxeles
+TAMANOS = {
+    'mini': 100,      # listados (50 px en pantallas 2x)
+    'tarjeta': 320,   # miniaturas y avatares
+    'detalle': 800,   # vista de detalle
+}
+
+# extensión -> (formato de Pillow, opciones)
+FORMATOS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+CARPETA_VERSIONES = 'versiones'
+
+# Lado mayor del original que se guarda (las fotos de celular traen 4000 px)
+LADO_ORIGINAL = 2000
+
+# Formatos en los que se guarda el original (el resto pasa a JPEG o PNG)
+FORMATOS_ORIGINAL = {
+    'JPEG': ('jpg', {'quality': 88, 'optimize': True}),
+    'PNG': ('png', {'optimize': True}),
+    'WEBP': ('webp', {'quality': 88}),
+}
+
+# modelo -> (campo de imagen, campo con las versiones)
+_REGISTRO = {}
+
+
+def huella(contenido):
+    return hashlib.sha256(contenido).hexdigest()[:16]
+
+
+def _limpiar(imagen, con_alfa):
+    """Copia sin metadatos en RGB (o RGBA si el formato admite transparencia)"""
+    from PIL import Image
+
+    tiene_alfa = imagen.mode in ('RGBA', 'LA', 'PA') or (imagen.mode == 'P' and 'transparency' in imagen.info)
+    if tiene_alfa:
+        imagen = imagen.convert('RGBA')
+        if not con_alfa:
+            fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+            fondo.paste(imagen, mask=imagen.getchannel('A'))
+            imagen = fondo
+    elif imagen.mode != 'RGB':
+        imagen = imagen.convert('RGB')
+    limpia = Image.new(imagen.mode, imagen.size)
+    limpia.paste(imagen)
+    return limpia
+
+
+def limpiar_original(archivo):
+    """
+    La imagen subida vuelta a codificar: orientación aplicada, sin
+    metadatos y con el lado mayor acotado a LADO_ORIGINAL (ContentFile con
+    el mismo nombre base)
+    """
+    from PIL import Image, ImageOps
+
+    archivo.seek(0)
+    with Image.open(archivo) as subida:
+        subida.load()
+        formato = subida.format
+        imagen = ImageOps.exif_transpose(subida)
+    imagen.thumbnail((LADO_ORIGINAL, LADO_ORIGINAL), Image.LANCZOS)
+
+    if formato not in FORMATOS_ORIGINAL:
+        # GIF, BMP, TIFF...: PNG si tiene transparencia, si no JPEG
+        formato = 'PNG' if 'A' in imagen.mode or 'transparency' in imagen.info else 'JPEG'
+    extension, opciones = FORMATOS_ORIGINAL[formato]
+    salida = BytesIO()
+    _limpiar(imagen, con_alfa=formato != 'JPEG').save(salida, formato, **opciones)
+    raiz = posixpath.splitext(posixpath.basename(archivo.name))[0]
+    return ContentFile(salida.getvalue(), name=f'{raiz}.{extension}')
+
+
+def generar_versiones(nombre, storage=None):
+    """
+    Genera (o reutiliza) las versiones de la imagen guardada en `nombre` y
+    devuelve el diccionario que se guarda en el modelo.
+
+    Solo usa el storage y Pillow, así que se puede ejecutar en otro proceso
+    (ver el comando procesar_imagenes).
+    """
+    # Pillow se carga con la primera imagen, no al arrancar cada worker
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    with storage.open(nombre, 'rb') as archivo:
+        contenido = archivo.read()
+
+    firma = huella(contenido)
+    # Sin la huella del original: la de su contenido ya va en `firma`
+    base = re.sub(r'-[0-9a-f]{16}$', '', posixpath.splitext(posixpath.basename(nombre))[0])[:40]
+    carpeta = posixpath.join(posixpath.dirname(nombre), CARPETA_VERSIONES)
+    versiones = {'origen': nombre, 'huella': firma}
+
+    with Image.open(BytesIO(contenido)) as original:
+        original.load()
+        # Fotos de celular: aplicar la rotación de EXIF antes de descartarlo
+        imagen = ImageOps.exif_transpose(original)
+
+        for tamano, lado in TAMANOS.items():
+            reducida = imagen.copy()
+            reducida.thumbnail((lado, lado), Image.LANCZOS)
+            entrada = {'ancho': reducida.width, 'alto': reducida.height}
+
+            for extension, (formato, opciones) in FORMATOS.items():
+                salida = BytesIO()
+                _limpiar(reducida, con_alfa=formato == 'WEBP').save(salida, formato, **opciones)
+                # AlmacenamientoHuella agrega la huella de la versión y no
+                # guarda dos veces el mismo contenido
+                entrada[extension] = storage.save(
+                    f'{carpeta}/{base}-{tamano}-{firma}.{extension}', ContentFile(salida.getvalue())
+                )
+            versiones[tamano] = entrada
+
+    return versiones
+
+
+def campos_de(objeto):
+    """(campo de imagen, campo de versiones) registrados para el modelo del objeto"""
+    return _REGISTRO[objeto._meta.model]
+
+
+def pendiente(objeto):
+    """¿Las versiones guardadas no corresponden a la imagen actual?"""
+    campo, campo_versiones = campos_de(objeto)
+    archivo = getattr(objeto, campo)
+    versiones = getattr(objeto, campo_versiones) or {}
+    if not archivo:
+        return bool(versiones)
+    return versiones.get('origen') != archivo.name
+
+
+def actualizar_versiones(objeto, versiones):
+    """Guarda las versiones (save con update_fields: dispara las señales de caché)"""
+    _, campo_versiones = campos_de(objeto)
+    setattr(objeto, campo_versiones, versiones)
+    objeto.save(update_fields=[campo_versiones])
+
+
+def procesar_objeto(progreso, etiqueta, pk):
+    """Tarea: genera las versiones de la imagen actual de un objeto"""
+    modelo = apps.get_model(etiqueta)
+    objeto = modelo._base_manager.filter(pk=pk).first()
+    if objeto is None or not pendiente(objeto):
+        return
+    campo, _ = campos_de(objeto)
+    archivo = getattr(objeto, campo)
+    progreso.iniciar(total=1, mensaje=f'Procesando {archivo.name or "imagen eliminada"}')
+    actualizar_versiones(objeto, generar_versiones(archivo.name) if archivo else {})
+    progreso.avanzar()
+
+
+def procesar_al_guardar(modelo, campo, campo_versiones):
+    """
+    Registra el modelo y conecta pre_save y post_save: la imagen recién
+    subida se limpia antes de escribirse y sus versiones se generan en
+    segundo plano al confirmar la transacción. Mientras tanto las
+    plantillas muestran el original (ya limpio).
+    """
+    _REGISTRO[modelo] = (campo, campo_versiones)
+
+    def limpiar_al_subir(sender, instance, **kwargs):
+        archivo = getattr(instance, campo)
+        # Sin confirmar: un archivo subido que FileField.pre_save todavía no escribió
+        if archivo and not archivo._committed:
+            setattr(instance, campo, limpiar_original(archivo))
+
+    pre_save.connect(limpiar_al_subir, sender=modelo, weak=False, dispatch_uid=f'imagenes:limpiar:{modelo._meta.label}')
+
+    def receptor(sender, instance, **kwargs):
+        if pendiente(instance):
+            etiqueta, pk = modelo._meta.label, instance.pk
+            transaction.on_commit(lambda: tareas.encolar(
+                f'Versiones de imagen ({etiqueta})', procesar_objeto, etiqueta, pk
+            ))
+
+    post_save.connect(receptor, sender=modelo, weak=False, dispatch_uid=f'imagenes:{modelo._meta.label}')
+
+
+def version(objeto, tamano, formato='jpg'):
+    """Ruta de una versión en el storage, o None si aún no existe"""
+    _, campo_versiones = campos_de(objeto)
+    entrada = (getattr(objeto, campo_versiones) or {}).get(tamano) or {}
+    return entrada.get(formato)
+
+
+def iniciar_proceso(media_root):
+    """
+    Inicializador de los procesos hijos de procesar_imagenes: arrancan
+    limpios (spawn), así que configuran Django y usan el mismo MEDIA_ROOT.
+    Vive aquí porque este módulo se puede importar antes de django.setup().
+    """
+    import django
+    django.setup()
+    from django.conf import settings
+    settings.MEDIA_ROOT = media_root
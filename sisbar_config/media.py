@@ -0,0 +1,330 @@
+"""
+Archivos subidos (media) en producción
+
+Django solo servía MEDIA_URL con DEBUG activo. Este módulo tiene dos
+piezas:
+
+AlmacenamientoHuella
+    Storage de archivos locales que agrega al nombre la huella del
+    contenido (foto-3f2a9c0d1e2b4a5f.jpg). Un nombre identifica siempre el
+    mismo contenido, así que su URL nunca cambia de significado y se puede
+    cachear "para siempre". Subir el mismo archivo dos veces no lo duplica.
+    La huella se calcula siempre del contenido: un nombre subido que ya
+    parece tener huella no se cree.
+
+MediaMiddleware
+    Sirve MEDIA_URL antes de sesiones, autenticación y URLs, igual que
+    WhiteNoise con los estáticos:
+    - Cache-Control de un año e `immutable` para nombres con huella; los
+      nombres antiguos sin huella se cachean poco y se revalidan con
+      ETag / Last-Modified (304).
+    - Peticiones Range (un rango por petición) para descargas parciales.
+    - Variantes precomprimidas (.br / .gz junto al archivo) según
+      Accept-Encoding (con sus valores q), cada una con su propio ETag.
+    - Con MEDIA_X_ACCEL_PREFIX el archivo lo entrega nginx
+      (X-Accel-Redirect) y el worker solo calcula las cabeceras.
+
+El storage se elige en STORAGES['default'] (variable MEDIA_STORAGE). Si no
+es local (no implementa path()), el middleware lee por la API del storage;
+para storages remotos con su propia URL pública no interviene.
+"""
+
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# Los nombres con huella terminan en -<16 hex>.<extensión>
+CON_HUELLA = re.compile(r'-[0-9a-f]{16}\.[A-Za-z0-9]+$')
+
+UN_ANIO = 60 * 60 * 24 * 365
+
+# Variantes precomprimidas: (codificación, sufijo) en orden de preferencia
+PRECOMPRIMIDOS = (('br', '.br'), ('gzip', '.gz'))
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+def huella_archivo(contenido):
+    """sha256 (16 hex) de un File leído por bloques"""
+    digest = hashlib.sha256()
+    if hasattr(contenido, 'seek'):
+        contenido.seek(0)
+    for bloque in contenido.chunks():
+        digest.update(bloque)
+    if hasattr(contenido, 'seek'):
+        contenido.seek(0)
+    return digest.hexdigest()[:16]
+
+
+class AlmacenamientoHuella(FileSystemStorage):
+    """FileSystemStorage que pone la huella del contenido en el nombre"""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = ContentFile(content.read() if hasattr(content, 'read') else content, name=name)
+        # La huella sale del contenido aunque el nombre (que elige quien
+        # sube el archivo) ya termine en algo con forma de huella
+        raiz, extension = posixpath.splitext(name)
+        firma = huella_archivo(content)
+        if not raiz.endswith(f'-{firma}'):
+            raiz = f'{raiz}-{firma}'
+        name = f'{raiz}{extension.lower()}'
+        # Mismo nombre = mismo contenido: no guardar dos veces
+        name = self.generate_filename(name)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+# ========== SERVIR ==========
+class Recurso:
+    """Un archivo de media listo para responder (local o por la API del storage)"""
+
+    def __init__(self, storage, nombre):
+        self.storage = storage
+        self.nombre = nombre
+        try:
+            self.ruta = safe_join(storage.location, nombre) if hasattr(storage, 'location') else None
+        except Exception:
+            # safe_join rechaza rutas fuera de MEDIA_ROOT
+            raise FileNotFoundError(nombre)
+        if self.ruta is not None:
+            estado = os.stat(self.ruta)
+            if not os.path.isfile(self.ruta):
+                raise FileNotFoundError(nombre)
+            self.tamano = estado.st_size
+            self.modificado = int(estado.st_mtime)
+        else:
+            if '..' in nombre.split('/') or not storage.exists(nombre):
+                raise FileNotFoundError(nombre)
+            self.tamano = storage.size(nombre)
+            self.modificado = int(storage.get_modified_time(nombre).timestamp())
+
+    def etag(self, codificacion=None):
+        """ETag fuerte; cada codificación tiene el suyo (son otros bytes)"""
+        sufijo = f'-{codificacion}' if codificacion else ''
+        return f'"{self.tamano:x}-{self.modificado:x}{sufijo}"'
+
+    def abrir(self):
+        if self.ruta is not None:
+            return open(self.ruta, 'rb')
+        return self.storage.open(self.nombre, 'rb')
+
+    def variante(self, sufijo):
+        try:
+            return Recurso(self.storage, self.nombre + sufijo)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+
+def _leer_tramo(archivo, inicio, largo):
+    try:
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+    finally:
+        archivo.close()
+
+
+def _rango(cabecera, tamano):
+    """
+    (inicio, fin) del único rango pedido; None si no hay rango que aplicar y
+    False si no se puede satisfacer. Varios rangos se responden completos.
+    """
+    coincide = re.fullmatch(r'bytes=(\d*)-(\d*)', cabecera.strip())
+    if not coincide or coincide.groups() == ('', ''):
+        return None
+    inicio, fin = coincide.groups()
+    if inicio == '':
+        # Sufijo: los últimos N bytes
+        largo = int(fin)
+        if largo == 0:
+            return False
+        return max(tamano - largo, 0), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _aceptadas(cabecera):
+    """
+    Codificaciones de PRECOMPRIMIDOS que acepta el cliente, de la preferida
+    a la menos preferida según Accept-Encoding (q=0 significa "no")
+    """
+    valores = {}
+    for parte in cabecera.split(','):
+        token, *parametros = parte.split(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for parametro in parametros:
+            nombre, _, valor = parametro.partition('=')
+            if nombre.strip().lower() == 'q':
+                try:
+                    q = float(valor)
+                except ValueError:
+                    q = 0.0
+        valores[token] = q
+    comodin = valores.get('*', 0.0)
+    candidatas = [
+        (valores.get(codificacion, comodin), sufijo, codificacion)
+        for codificacion, sufijo in PRECOMPRIMIDOS
+    ]
+    # sorted es estable: a igual q manda el orden de PRECOMPRIMIDOS
+    return [(c, sufijo) for q, sufijo, c in sorted(candidatas, key=lambda x: -x[0]) if q > 0]
+
+
+def _cache_control(nombre):
+    if CON_HUELLA.search(nombre):
+        return f'public, max-age={UN_ANIO}, immutable'
+    return f'public, max-age={getattr(settings, "MEDIA_CACHE_SIN_HUELLA", 3600)}'
+
+
+def servir_media(request, nombre, storage=None):
+    """Respuesta para el archivo `nombre` relativo a MEDIA_ROOT"""
+    storage = storage or storages['default']
+    try:
+        recurso = Recurso(storage, nombre)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return HttpResponse(status=404)
+
+    tipo, _ = mimetypes.guess_type(nombre)
+
+    # Variante precomprimida aceptada por el cliente (los rangos, sobre el original)
+    entregar, codificacion = recurso, None
+    if 'Range' not in request.headers:
+        for nombre_codificacion, sufijo in _aceptadas(request.headers.get('Accept-Encoding', '')):
+            variante = recurso.variante(sufijo)
+            if variante is not None:
+                entregar, codificacion = variante, nombre_codificacion
+                break
+    etag = recurso.etag(codificacion)
+
+    cabeceras = {
+        'Cache-Control': _cache_control(nombre),
+        'ETag': etag,
+        'Last-Modified': http_date(recurso.modificado),
+        'Accept-Ranges': 'bytes',
+        'Vary': 'Accept-Encoding',
+        'X-Content-Type-Options': 'nosniff',
+    }
+
+    # Revalidación: 304 sin cuerpo
+    si_no_coincide = request.headers.get('If-None-Match')
+    if si_no_coincide:
+        if etag in [e.strip() for e in si_no_coincide.split(',')] or si_no_coincide.strip() == '*':
+            return _con_cabeceras(HttpResponseNotModified(), cabeceras)
+    else:
+        desde = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        if desde is not None and recurso.modificado <= desde:
+            return _con_cabeceras(HttpResponseNotModified(), cabeceras)
+
+    if request.method == 'HEAD':
+        respuesta = HttpResponse(content_type=tipo or 'application/octet-stream')
+        respuesta['Content-Length'] = entregar.tamano
+        if codificacion:
+            respuesta['Content-Encoding'] = codificacion
+        return _con_cabeceras(respuesta, cabeceras)
+
+    # Rango (If-Range: solo si el ETag sigue siendo el mismo)
+    rango = None
+    if 'Range' in request.headers:
+        si_rango = request.headers.get('If-Range')
+        if not si_rango or si_rango.strip() == etag:
+            rango = _rango(request.headers['Range'], recurso.tamano)
+    if rango is False:
+        respuesta = HttpResponse(status=416)
+        respuesta['Content-Range'] = f'bytes */{recurso.tamano}'
+        return _con_cabeceras(respuesta, cabeceras)
+    if rango:
+        inicio, fin = rango
+        respuesta = StreamingHttpResponse(
+            _leer_tramo(recurso.abrir(), inicio, fin - inicio + 1),
+            status=206,
+            content_type=tipo or 'application/octet-stream',
+        )
+        respuesta['Content-Length'] = fin - inicio + 1
+        respuesta['Content-Range'] = f'bytes {inicio}-{fin}/{recurso.tamano}'
+        return _con_cabeceras(respuesta, cabeceras)
+
+    prefijo = getattr(settings, 'MEDIA_X_ACCEL_PREFIX', '')
+    if prefijo and entregar.ruta is not None:
+        # nginx entrega el archivo; el worker queda libre de inmediato
+        respuesta = HttpResponse(content_type=tipo or 'application/octet-stream')
+        respuesta['X-Accel-Redirect'] = posixpath.join(prefijo, entregar.nombre)
+    else:
+        # FileResponse usa wsgi.file_wrapper (sendfile) cuando el servidor lo tiene
+        respuesta = FileResponse(entregar.abrir(), content_type=tipo or 'application/octet-stream')
+        respuesta['Content-Length'] = entregar.tamano
+    if codificacion:
+        respuesta['Content-Encoding'] = codificacion
+    return _con_cabeceras(respuesta, cabeceras)
+
+
+def _con_cabeceras(respuesta, cabeceras):
+    for nombre, valor in cabeceras.items():
+        respuesta[nombre] = valor
+    return respuesta
+
+
+class MediaMiddleware:
+    """
+    Sirve MEDIA_URL antes del resto del stack (sesión, autenticación,
+    resolución de URLs). Va justo después de WhiteNoise en MIDDLEWARE.
+
+    Funciona igual con WSGI y ASGI: con ASGI no obliga a Django a pasar
+    cada petición por un hilo solo para atravesar este middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+        url = settings.MEDIA_URL or ''
+        # Media en otro dominio (CDN, bucket): no es asunto de este proceso
+        activo = getattr(settings, 'MEDIA_SERVIR', True) and url.startswith('/')
+        self.prefijo = url if activo else None
+
+    def _nombre(self, request):
+        if self.prefijo and request.path_info.startswith(self.prefijo) and request.method in ('GET', 'HEAD'):
+            return request.path_info[len(self.prefijo):]
+        return None
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        nombre = self._nombre(request)
+        if nombre is not None:
+            return servir_media(request, nombre)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        nombre = self._nombre(request)
+        if nombre is not None:
+            # stat() y open() son E/S de disco: fuera del event loop
+            return await sync_to_async(servir_media, thread_sensitive=False)(request, nombre)
+        return await self.get_response(request)
@@ -0,0 +1,137 @@
+"""
+Paginación por cursor (keyset) y búsqueda por prefijo indexada
+
+A diferencia de OFFSET, el cursor guarda los valores de orden del último
+registro mostrado y la siguiente página empieza justo después: el costo de
+cualquier página es el mismo sin importar cuántos registros haya antes.
+"""
+
+import base64
+import json
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+
+class PaginaCursor:
+    """Una página de resultados con los cursores para moverse"""
+
+    def __init__(self, objetos, siguiente=None, anterior=None):
+        self.objetos = objetos
+        self.siguiente = siguiente
+        self.anterior = anterior
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def hay_otras(self):
+        return bool(self.siguiente or self.anterior)
+
+
+def codificar_cursor(objeto, orden):
+    valores = [getattr(objeto, campo.lstrip('-')) for campo in orden]
+    # isoformat conserva los microsegundos (DjangoJSONEncoder los recorta)
+    texto = json.dumps(valores, default=lambda v: v.isoformat() if hasattr(v, 'isoformat') else str(v))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, modelo, orden):
+    """Valores del cursor convertidos al tipo de cada campo; None si no es válido"""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        valores = json.loads(texto)
+        if not isinstance(valores, list) or len(valores) != len(orden):
+            return None
+        return [
+            modelo._meta.get_field(campo.lstrip('-')).to_python(valor)
+            for campo, valor in zip(orden, valores)
+        ]
+    except Exception:
+        return None
+
+
+def filtro_cursor(orden, valores, hacia_atras=False):
+    """
+    Registros estrictamente después (o antes) del cursor según el orden:
+    (a < x) OR (a = x AND b < y) ... para un orden descendente.
+    """
+    filtro = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        descendente = campo.startswith('-')
+        operador = 'lt' if descendente != hacia_atras else 'gt'
+        filtro |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+        iguales[nombre] = valor
+    return filtro
+
+
+def paginar_por_cursor(queryset, orden, despues=None, antes=None, por_pagina=25):
+    """
+    Devuelve una PaginaCursor. `orden` debe terminar en un campo único
+    (normalmente '-id') para que el cursor sea exacto.
+    """
+    modelo = queryset.model
+    valores_despues = decodificar_cursor(despues, modelo, orden) if despues else None
+    valores_antes = decodificar_cursor(antes, modelo, orden) if antes else None
+
+    if valores_antes:
+        invertido = [c[1:] if c.startswith('-') else f'-{c}' for c in orden]
+        filas = list(
+            queryset.filter(filtro_cursor(orden, valores_antes, hacia_atras=True))
+            .order_by(*invertido)[:por_pagina + 1]
+        )
+        hay_previas = len(filas) > por_pagina
+        objetos = filas[:por_pagina][::-1]
+        return PaginaCursor(
+            objetos,
+            siguiente=codificar_cursor(objetos[-1], orden) if objetos else None,
+            anterior=codificar_cursor(objetos[0], orden) if objetos and hay_previas else None,
+        )
+
+    if valores_despues:
+        queryset = queryset.filter(filtro_cursor(orden, valores_despues))
+    filas = list(queryset.order_by(*orden)[:por_pagina + 1])
+    objetos = filas[:por_pagina]
+    return PaginaCursor(
+        objetos,
+        siguiente=codificar_cursor(objetos[-1], orden) if len(filas) > por_pagina else None,
+        anterior=codificar_cursor(objetos[0], orden) if objetos and valores_despues else None,
+    )
+
+
+def filtro_prefijo(termino, *campos, using=None):
+    """
+    Búsqueda por prefijo sin distinguir mayúsculas que puede usar los
+    índices sobre Lower(campo).
+
+    - SQLite compara los textos byte a byte (BINARY): el rango [termino,
+      termino con la última letra incrementada) es exacto y es lo que
+      aprovecha el índice (su LIKE no distingue mayúsculas y no lo usa).
+    - PostgreSQL compara con la intercalación del idioma, que ignora la
+      puntuación: con el rango, 'juan.' o 'juan@' perderían resultados.
+      Ahí va solo el LIKE 'termino%', que usa los índices
+      text_pattern_ops (migración usuarios 0005).
+
+    Devuelve (alias, filtro) para usar con queryset.alias(**alias).filter(filtro).
+    """
+    termino = termino.strip().lower()
+    if not termino:
+        return {}, Q()
+    binaria = connections[using or DEFAULT_DB_ALIAS].vendor == 'sqlite'
+    tope = termino[:-1] + chr(ord(termino[-1]) + 1)
+    alias = {}
+    filtro = Q()
+    for campo in campos:
+        nombre = f'{campo}_minusculas'
+        alias[nombre] = Lower(campo)
+        condiciones = {f'{nombre}__startswith': termino}
+        if binaria:
+            condiciones.update({f'{nombre}__gte': termino, f'{nombre}__lt': tope})
+        filtro |= Q(**condiciones)
+    return alias, filtro
@@ -0,0 +1,228 @@
+"""
+Utilidades compartidas para las pruebas
+
+- FuncionalTestCase: pruebas de comportamiento. Un super administrador
+  autenticado y, si la clase lo pide con `datos`, un lote chico de datos
+  sintéticos (MINIMO). No mide tiempos.
+- RendimientoTestCase: presupuestos de consultas y tiempos de las vistas.
+  Cada vista se mide contra datos sembrados con `generar_datos` en tamaños
+  crecientes; se verifica que el número de consultas no supere el
+  presupuesto ni crezca con el volumen de datos, ni supere el de la línea
+  base guardada en `rendimiento_base.json` (toda vista medida tiene que
+  estar ahí). El tiempo se compara contra la línea base solo si se pide
+  (depende de la máquina).
+
+Variables de entorno:
+    SISBAR_COMPARAR_TIEMPOS=1     Falla si una vista supera la línea base
+    SISBAR_GUARDAR_TIEMPOS=1      Actualiza la línea base con lo medido
+    SISBAR_TOLERANCIA_TIEMPO=5    Factor permitido sobre la línea base
+
+Al guardar solo cambian las vistas nuevas, las que cambiaron su número de
+consultas y las que se alejaron de su tiempo más que la tolerancia: medir
+de nuevo no reescribe el archivo con el ruido de la máquina. Los cambios
+de la línea base van en su propio commit, no mezclados con código.
+"""
+
+import json
+import os
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from sisbar_config.cache import ESPACIOS, invalidar
+from usuarios.backends import UsuarioCacheadoBackend
+from usuarios.models import Usuario
+
+
+ARCHIVO_BASE = Path(__file__).resolve().parent / 'rendimiento_base.json'
+
+# Margen absoluto (ms) para que las vistas muy rápidas no fallen por ruido
+MARGEN_MS = 50
+
+# Lote chico para las pruebas de comportamiento que necesitan historial
+MINIMO = {'productos': 8, 'movimientos': 60, 'proveedores': 2, 'usuarios': 2}
+
+# Tamaños de datos: el primero se carga una vez por clase y los siguientes
+# se agregan dentro de cada prueba (se revierten al terminar)
+TAMANOS = (
+    {'productos': 30, 'movimientos': 300, 'proveedores': 5, 'usuarios': 4},
+    {'productos': 300, 'movimientos': 6000, 'proveedores': 40, 'usuarios': 30},
+)
+
+
+def sembrar(semilla, tamano):
+    """Carga un lote de datos sintéticos con el comando generar_datos"""
+    call_command('generar_datos', semilla=semilla, dias=30, forzar=True, stdout=StringIO(), **tamano)
+
+
+def tolerancia_tiempo():
+    return float(os.environ.get('SISBAR_TOLERANCIA_TIEMPO', 5))
+
+
+def cambio(anterior, medicion):
+    """¿La medición difiere de la línea base más que el ruido de la máquina?"""
+    if not anterior or anterior['consultas'] != medicion['consultas']:
+        return True
+    factor = tolerancia_tiempo()
+    return not anterior['ms'] / factor - MARGEN_MS <= medicion['ms'] <= anterior['ms'] * factor + MARGEN_MS
+
+
+def leer_linea_base():
+    if ARCHIVO_BASE.exists():
+        return json.loads(ARCHIVO_BASE.read_text(encoding='utf-8'))
+    return {}
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    TAREAS_SINCRONAS=True,
+    # La foto del catálogo revisa la versión del inventario en cada lectura
+    # (cada prueba vacía la caché y revierte sus datos)
+    CATALOGO_REVISAR=0,
+)
+class FuncionalTestCase(TestCase):
+    """
+    Caso base de las pruebas de comportamiento: un super administrador
+    autenticado y, con `datos`, ese lote sembrado una vez por clase
+    """
+
+    datos = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Usuario.objects.create_user(
+            username='admin_pruebas',
+            password='clave-segura-123',
+            email='admin@sisbar.test',
+            first_name='Admin',
+            last_name='Pruebas',
+            rol='SUPER_ADMIN',
+            aprobado=True,
+            notificado_aprobacion=True,
+            is_staff=True,
+            is_superuser=True,
+        )
+        if cls.datos:
+            sembrar(1, cls.datos)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+
+class RendimientoTestCase(FuncionalTestCase):
+    """
+    Caso base de las mediciones: un super administrador autenticado y el
+    primer tamaño de datos
+    """
+
+    datos = TAMANOS[0]
+    mediciones = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.mediciones = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.mediciones and os.environ.get('SISBAR_GUARDAR_TIEMPOS') == '1':
+            base = leer_linea_base()
+            base.update({
+                clave: medicion for clave, medicion in cls.mediciones.items()
+                if cambio(base.get(clave), medicion)
+            })
+            ARCHIVO_BASE.write_text(
+                json.dumps(base, indent=2, sort_keys=True, ensure_ascii=False) + '\n',
+                encoding='utf-8'
+            )
+        super().tearDownClass()
+
+    def _ejecutar(self, metodo, url, datos, content_type=None):
+        if callable(url):
+            url = url()
+        if callable(datos):
+            datos = datos()
+        peticion = getattr(self.client, metodo)
+        if content_type:
+            return peticion(url, datos, content_type=content_type)
+        return peticion(url, datos or {})
+
+    def medir_vista(self, nombre, url, presupuesto, metodo='get', datos=None, preparar=None,
+                    estados=(200, 302), content_type=None):
+        """
+        Mide la vista en cada tamaño de datos.
+
+        `url` y `datos` pueden ser funciones para crear objetos frescos en
+        cada medición (por ejemplo, vistas que eliminan registros);
+        `preparar` se ejecuta antes de cada petición, fuera de la medición.
+        Con `content_type` los datos se envían tal cual (por ejemplo, JSON).
+        """
+        if metodo == 'get':
+            # Calentamiento: compilar plantillas y resolver URLs
+            if preparar:
+                preparar()
+            self._ejecutar(metodo, url, datos, content_type)
+
+        consultas = []
+        tiempo_ms = 0
+        for i, tamano in enumerate(TAMANOS):
+            if i > 0:
+                sembrar(i + 1, tamano)
+            if preparar:
+                preparar()
+            # Datos siempre en frío para medir el costo real de la vista; la
+            # identidad va caliente (se mide aparte en usuarios.tests)
+            invalidar(*(e for e in ESPACIOS if e != 'permisos'))
+            self._calentar_identidad()
+            with CaptureQueriesContext(connection) as capturadas:
+                inicio = time.perf_counter()
+                respuesta = self._ejecutar(metodo, url, datos, content_type)
+                tiempo_ms = (time.perf_counter() - inicio) * 1000
+            self.assertIn(respuesta.status_code, estados, f'{nombre}: estado {respuesta.status_code}')
+            consultas.append(len(capturadas))
+
+        detalle = f'{nombre}: consultas por tamaño {consultas}'
+        self.assertLessEqual(max(consultas), presupuesto, f'{detalle} superan el presupuesto de {presupuesto}')
+        self.assertLessEqual(consultas[-1], consultas[0], f'{detalle} crecen con los datos')
+
+        clave = f'{self.__class__.__module__.split(".")[0]}.{nombre}'
+        self.mediciones[clave] = {'consultas': consultas[-1], 'ms': round(tiempo_ms, 2)}
+        self._comparar_consultas(clave, consultas[-1])
+        self._comparar_tiempo(clave, tiempo_ms)
+        return respuesta
+
+    def _comparar_consultas(self, clave, consultas):
+        if os.environ.get('SISBAR_GUARDAR_TIEMPOS') == '1':
+            return
+        base = leer_linea_base().get(clave)
+        self.assertIsNotNone(base, f'{clave}: falta en la línea base (medir con SISBAR_GUARDAR_TIEMPOS=1)')
+        self.assertLessEqual(
+            consultas, base['consultas'],
+            f'{clave}: {consultas} consultas superan las {base["consultas"]} de la línea base'
+        )
+
+    def _calentar_identidad(self):
+        usuario_id = self.client.session.get(SESSION_KEY)
+        if usuario_id:
+            UsuarioCacheadoBackend().get_user(usuario_id)
+
+    def _comparar_tiempo(self, clave, tiempo_ms):
+        if os.environ.get('SISBAR_COMPARAR_TIEMPOS') != '1' or os.environ.get('SISBAR_GUARDAR_TIEMPOS') == '1':
+            return
+        base = leer_linea_base().get(clave)
+        if not base:
+            return
+        tolerancia = tolerancia_tiempo()
+        limite = base['ms'] * tolerancia + MARGEN_MS
+        self.assertLessEqual(
+            tiempo_ms, limite,
+            f'{clave}: {tiempo_ms:.1f} ms supera la línea base de {base["ms"]} ms (límite {limite:.1f} ms)'
+        )
@@ -0,0 +1,233 @@
+"""
+Lecturas de reportes, dashboard y auditores desde una réplica
+
+Las exportaciones de reportes, las agregaciones del dashboard y la
+navegación de los auditores (que no pueden modificar nada) solo leen, pero
+compiten con los descuentos del escáner en la misma base de datos. Con
+DATABASE_REPLICA_URL configurada esas lecturas van a la réplica:
+
+- Vistas designadas: @lectura_replica (debajo de login_required; sirve
+  también para vistas async). Fuera de una vista (scripts, comandos):
+  `with en_replica(): ...`.
+- Auditores: sus peticiones GET/HEAD leen de la réplica (ReplicaMiddleware).
+- Las escrituras van siempre a la base principal y, dentro de una
+  transacción, las lecturas también (select_for_update, leer lo que se
+  acaba de escribir). Las sesiones se leen siempre de la principal.
+- Leer lo propio: la réplica puede ir unos segundos atrasada. Después de
+  una petición POST/PUT/PATCH/DELETE el usuario lee de la principal durante
+  REPLICA_PEGAJOSA segundos, así ve enseguida lo que acaba de cambiar. La
+  marca se guarda en la caché: con varios workers tiene que ser compartida
+  (CACHE_BACKEND=archivo o bd), igual que los eventos en vivo; settings.py
+  no acepta réplica con la caché en memoria fuera de DEBUG.
+- Lo que se calcula leyendo de la réplica se cachea aparte (la clave lleva
+  la base, sisbar_config/cache.py): si no, un auditor podía volver a
+  llenar la caché con datos atrasados justo después de una invalidación y
+  quien escribió los leía de ahí, aunque él lea de la principal.
+
+Sin DATABASE_REPLICA_URL todo lee de la base principal como siempre.
+
+Para probarlo en local con dos SQLite (la copia hace de réplica atrasada:
+lo que se escriba después solo lo ve en los reportes quien lo escribió,
+mientras le dure la marca):
+
+    cp db.sqlite3 replica.sqlite3
+    DATABASE_REPLICA_URL=sqlite:///replica.sqlite3 python manage.py runserver
+
+Con PostgreSQL, DATABASE_REPLICA_URL apunta a un standby de streaming
+replication. Las migraciones se corren solo sobre la base principal.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+REPLICA = 'replica'
+
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+# Apps que siempre se leen de la principal: una sesión recién creada
+# todavía puede no estar en la réplica. La caché en base de datos
+# (CACHE_BACKEND=bd, la de producción) también: el router la consulta para
+# la marca de "leer lo propio", y si sus lecturas pasaran por el router
+# volverían a pedir la marca sin fin
+SOLO_PRINCIPAL = ('sessions', 'django_cache')
+
+
+def configurada():
+    """¿Hay una réplica en DATABASES?"""
+    return REPLICA in settings.DATABASES
+
+
+# ========== LEER LO PROPIO ==========
+def _clave(usuario_id):
+    return f'replica:escritura:{usuario_id}'
+
+
+def marcar_escritura(usuario_id):
+    """El usuario acaba de escribir: lee de la principal un rato"""
+    if usuario_id is not None:
+        cache.set(_clave(usuario_id), True, getattr(settings, 'REPLICA_PEGAJOSA', 10))
+
+
+def escribio_hace_poco(usuario_id):
+    return usuario_id is not None and cache.get(_clave(usuario_id)) is not None
+
+
+# ========== ESTADO DE LA PETICIÓN ==========
+class _Lectura:
+    """Si la petición (o el bloque) en curso puede leer de la réplica"""
+
+    def __init__(self, usuario_id=None):
+        self.usuario_id = usuario_id
+        self._principal = None
+
+    def principal(self):
+        # Se consulta la caché recién cuando hace falta, una vez por petición
+        if self._principal is None:
+            self._principal = escribio_hace_poco(self.usuario_id)
+        return self._principal
+
+
+_lectura = ContextVar('sisbar_lectura_replica', default=None)
+
+
+def _en_transaccion():
+    # Las transacciones que TestCase abre alrededor de cada prueba no cuentan
+    return any(
+        not getattr(bloque, '_from_testcase', False)
+        for bloque in connections[DEFAULT_DB_ALIAS].atomic_blocks
+    )
+
+
+def alias_lectura(model=None):
+    """Base de la que se lee en este momento: REPLICA o None (la principal)"""
+    estado = _lectura.get()
+    if estado is None or not configurada():
+        return None
+    if model is not None and model._meta.app_label in SOLO_PRINCIPAL:
+        return None
+    if _en_transaccion() or estado.principal():
+        return None
+    return REPLICA
+
+
+async def aalias_lectura():
+    """alias_lectura() desde el event loop: la marca se consulta con la API async de la caché"""
+    estado = _lectura.get()
+    if estado is not None and estado._principal is None and configurada():
+        estado._principal = (
+            estado.usuario_id is not None and await cache.aget(_clave(estado.usuario_id)) is not None
+        )
+    return alias_lectura()
+
+
+@contextmanager
+def en_replica(usuario_id=None):
+    """
+    Las lecturas del bloque van a la réplica (si hay). Con `usuario_id`,
+    no si ese usuario escribió hace poco.
+    """
+    token = _lectura.set(_Lectura(usuario_id))
+    try:
+        yield
+    finally:
+        _lectura.reset(token)
+
+
+def _usuario_id(request):
+    usuario = getattr(request, 'user', None)
+    return usuario.pk if usuario is not None and usuario.is_authenticated else None
+
+
+def lectura_replica(vista):
+    """Decorador: la vista solo lee, sus consultas pueden ir a la réplica"""
+    if iscoroutinefunction(vista):
+        @wraps(vista)
+        async def envoltura_async(request, *args, **kwargs):
+            with en_replica(_usuario_id(request)):
+                return await vista(request, *args, **kwargs)
+        return envoltura_async
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        with en_replica(_usuario_id(request)):
+            return vista(request, *args, **kwargs)
+    return envoltura
+
+
+# ========== ROUTER ==========
+class RouterReplica:
+    """DATABASE_ROUTERS: lecturas designadas a la réplica, el resto a la principal"""
+
+    def db_for_read(self, model, **hints):
+        # Explícito: un objeto leído de la réplica no arrastra sus relaciones allá
+        return alias_lectura(model) or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las dos bases tienen los mismos datos
+        return True
+
+
+# ========== MIDDLEWARE ==========
+class ReplicaMiddleware:
+    """
+    Va después de AuthenticationMiddleware. Manda a la réplica las lecturas
+    de los auditores y marca a quien escribe para que lea lo propio. Sin
+    réplica configurada no hace nada.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _es_auditor(request, usuario):
+        return (
+            request.method in METODOS_LECTURA
+            and usuario.is_authenticated
+            and getattr(usuario, 'rol', None) == 'AUDITOR'
+        )
+
+    def __call__(self, request):
+        if self.es_async:
+            return self.__acall__(request)
+        if not configurada():
+            return self.get_response(request)
+
+        if self._es_auditor(request, request.user):
+            with en_replica(request.user.pk):
+                respuesta = self.get_response(request)
+        else:
+            respuesta = self.get_response(request)
+        if request.method not in METODOS_LECTURA:
+            marcar_escritura(_usuario_id(request))
+        return respuesta
+
+    async def __acall__(self, request):
+        if not configurada():
+            return await self.get_response(request)
+
+        # request.user no se puede evaluar perezosamente en el event loop
+        request.user = await request.auser()
+        if self._es_auditor(request, request.user):
+            with en_replica(request.user.pk):
+                respuesta = await self.get_response(request)
+        else:
+            respuesta = await self.get_response(request)
+        if request.method not in METODOS_LECTURA and request.user.is_authenticated:
+            await cache.aset(_clave(request.user.pk), True, getattr(settings, 'REPLICA_PEGAJOSA', 10))
+        return respuesta
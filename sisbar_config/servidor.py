@@ -0,0 +1,137 @@
+"""
+Configuración de gunicorn para producción (la usa start.sh)
+
+    gunicorn sisbar_config.wsgi:application -c python:sisbar_config.servidor
+
+En el plan gratuito de Render el servicio se duerme sin tráfico y la
+primera petición al despertar paga la carga de la aplicación, la
+compilación de las plantillas y una conexión TLS nueva a PostgreSQL. Con
+SISBAR_ARRANQUE_RAPIDO (activado por defecto):
+
+- preload_app: el master importa la aplicación una sola vez y los workers
+  nacen con un fork ya cargados (en vez de importar todo cada uno, los
+  tres a la vez en una CPU compartida). Un worker reciclado por
+  max_requests arranca al instante.
+- Antes de forkear, el master compila todas las plantillas del proyecto
+  con el cached loader: los workers las heredan compiladas.
+- Cada worker, antes de aceptar peticiones, abre sus conexiones a la base
+  de datos (una por hilo con workers gthread). Solo sirve con conexiones
+  persistentes (CONN_MAX_AGE > 0, como en Render con wsgi).
+
+Workers: WEB_CONCURRENCY o 2 × CPUs + 1, hasta SISBAR_WORKERS_MAX (cada
+worker ocupa memoria y el plan gratuito tiene 512 MB). Las CPUs salen de
+la cuota del contenedor, no de la máquina. Hilos por worker: SISBAR_HILOS
+o 2 × CPUs (con más de uno gunicorn usa workers gthread). Cada worker se
+recicla después de SISBAR_MAX_PETICIONES peticiones (± 10 %, para que no
+se reinicien todos juntos).
+
+Para medir el tiempo hasta el primer byte: `python manage.py medir_arranque`.
+"""
+
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+import decouple
+
+
+# gunicorn toma como opción cualquier variable del módulo con nombre de
+# opción (`config` es una): decouple se usa con el nombre del módulo
+ARRANQUE_RAPIDO = decouple.config('SISBAR_ARRANQUE_RAPIDO', default=True, cast=bool)
+
+# Segundos que un worker gthread espera a que cada hilo abra su conexión
+ESPERA_HILOS = 10
+
+
+def cpus_disponibles(cgroup='/sys/fs/cgroup/cpu.max'):
+    """CPUs que puede usar el proceso: afinidad y cuota del cgroup (contenedor)"""
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    try:
+        cuota, periodo = Path(cgroup).read_text().split()[:2]
+        if cuota != 'max':
+            cpus = min(cpus, math.ceil(int(cuota) / int(periodo)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def calcular_workers(cpus, maximo):
+    return max(1, min(2 * cpus + 1, maximo))
+
+
+_cpus = cpus_disponibles()
+
+# ========== CONFIGURACIÓN ==========
+workers = decouple.config('WEB_CONCURRENCY', default=0, cast=int) or calcular_workers(
+    _cpus, decouple.config('SISBAR_WORKERS_MAX', default=4, cast=int)
+)
+threads = decouple.config('SISBAR_HILOS', default=2 * _cpus, cast=int)
+max_requests = decouple.config('SISBAR_MAX_PETICIONES', default=1000, cast=int)
+max_requests_jitter = max_requests // 10
+preload_app = ARRANQUE_RAPIDO
+
+
+# ========== HOOKS ==========
+def when_ready(server):
+    """Master, antes de crear los workers"""
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+    from sisbar_config import arranque
+
+    inicio = time.perf_counter()
+    compiladas, errores = arranque.compilar_plantillas()
+    server.log.info(
+        'Plantillas compiladas antes del fork: %s en %.0f ms', compiladas, (time.perf_counter() - inicio) * 1000
+    )
+    for nombre, error in errores:
+        server.log.warning('No se pudo compilar %s: %s', nombre, error)
+    # Un socket abierto en el master lo compartirían todos los workers
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    """Worker, antes de aceptar peticiones"""
+    if not ARRANQUE_RAPIDO:
+        return
+    from sisbar_config import arranque
+
+    inicio = time.perf_counter()
+    # Con preload_app ya vienen compiladas del master
+    compiladas, _ = arranque.compilar_plantillas()
+    pool = getattr(worker, 'tpool', None)
+    if pool is not None:
+        conexiones = calentar_hilos(pool, worker.cfg.threads)
+    else:
+        conexiones = arranque.abrir_conexiones()
+    worker.log.info(
+        'Worker %s listo: %s plantillas, %s conexiones en %.0f ms',
+        worker.pid, compiladas, conexiones, (time.perf_counter() - inicio) * 1000,
+    )
+
+
+def calentar_hilos(pool, hilos):
+    """
+    Las conexiones de Django son por hilo: abre una en cada hilo del pool
+    del worker gthread. La barrera mantiene ocupado a cada hilo hasta que
+    todos abrieron la suya, así el pool crea los `hilos` y no reutiliza uno.
+    """
+    from sisbar_config import arranque
+
+    barrera = threading.Barrier(hilos)
+
+    def abrir():
+        abiertas = arranque.abrir_conexiones()
+        try:
+            barrera.wait(ESPERA_HILOS)
+        except threading.BrokenBarrierError:
+            pass
+        return abiertas
+
+    futuros = [pool.submit(abrir) for _ in range(hilos)]
+    return sum(futuro.result() for futuro in futuros)
@@ -8,6 +8,7 @@ from pathlib import Path
 from decouple import config
 import os
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 
 # Build paths inside the project
@@ -55,11 +56,13 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Para archivos estáticos
+    'sisbar_config.media.MediaMiddleware',  # Archivos subidos (media)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'sisbar_config.replicas.ReplicaMiddleware',  # Lecturas desde la réplica
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,11 +82,20 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'django.template.context_processors.media',
             ],
+            'libraries': {
+                'imagenes': 'sisbar_config.templatetags.imagenes',
+                'idempotencia': 'sisbar_config.templatetags.idempotencia',
+            },
         },
     },
 ]
 
 WSGI_APPLICATION = 'sisbar_config.wsgi.application'
+ASGI_APPLICATION = 'sisbar_config.asgi.application'
+
+# Servidor de producción (ver start.sh): wsgi (gunicorn con workers síncronos)
+# o asgi (gunicorn con workers uvicorn, para las vistas async del escáner)
+SISBAR_SERVIDOR = config('SISBAR_SERVIDOR', default='wsgi')
 
 # -------------------------
 # BASE DE DATOS PARA LOCAL + RENDER
@@ -97,19 +109,138 @@ if IS_RENDER:
     DATABASES = {
         'default': dj_database_url.config(
             default=config('DATABASE_URL'),
-            conn_max_age=600,
+            # Con ASGI cada petición puede usar otro hilo: sin conexiones persistentes
+            conn_max_age=0 if SISBAR_SERVIDOR == 'asgi' else 600,
             ssl_require=True
         )
     }
 else:
-    # Local usa SQLite como antes
+    # Local usa SQLite como antes, con el perfil para varios cajeros a la vez
+    # (WAL, espera por bloqueos, BEGIN IMMEDIATE; ver sisbar_config/sqlite).
+    # SQLITE_PERFIL=False vuelve al backend de Django sin ajustes
+    SQLITE_PERFIL = config('SQLITE_PERFIL', default=True, cast=bool)
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': 'sisbar_config.sqlite' if SQLITE_PERFIL else 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # timeout: segundos que una escritura espera a que se libere la base
+            'OPTIONS': {'timeout': config('SQLITE_ESPERA', default=20, cast=int)} if SQLITE_PERFIL else {},
+            'TEST': {'NAME': BASE_DIR / 'test_sisbar.sqlite3'} if SQLITE_PERFIL else {},
         }
     }
 
+# Réplica de solo lectura para reportes, dashboard y auditores (ver
+# sisbar_config/replicas.py). Vacía = todo se lee de la base principal.
+# REPLICA_PEGAJOSA: segundos que quien escribió sigue leyendo de la principal
+DATABASE_REPLICA_URL = config('DATABASE_REPLICA_URL', default='')
+REPLICA_PEGAJOSA = config('REPLICA_PEGAJOSA', default=10, cast=int)
+
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = {
+        **dj_database_url.parse(
+            DATABASE_REPLICA_URL,
+            conn_max_age=DATABASES['default'].get('CONN_MAX_AGE', 0),
+            ssl_require=DATABASE_REPLICA_URL.startswith('postgres'),
+        ),
+        # En las pruebas la réplica es la misma base de prueba
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['sisbar_config.replicas.RouterReplica']
+
+# -------------------------
+# CACHÉ
+# -------------------------
+# CACHE_BACKEND: memoria (por proceso), archivo (compartida en el servidor)
+# o bd (tabla compartida entre servidores; requiere `createcachetable`).
+# Con varios workers hace falta una compartida: las invalidaciones por
+# espacio (sisbar_config/cache.py) no salen del proceso con memoria.
+CACHE_BACKEND = config('CACHE_BACKEND', default='memoria')
+
+BACKENDS_CACHE = {
+    'memoria': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sisbar',
+    },
+    'archivo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / '.cache')),
+    },
+    'bd': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': config('CACHE_LOCATION', default='sisbar_cache'),
+    },
+}
+
+if CACHE_BACKEND not in BACKENDS_CACHE:
+    raise ImproperlyConfigured(
+        f"CACHE_BACKEND='{CACHE_BACKEND}' no es válido. Opciones: {', '.join(BACKENDS_CACHE)}"
+    )
+
+CACHES = {
+    'default': {
+        **BACKENDS_CACHE[CACHE_BACKEND],
+        'TIMEOUT': config('CACHE_TIMEOUT', default=300, cast=int),
+        'KEY_PREFIX': 'sisbar',
+        # Subir CACHE_VERSION descarta toda la caché (por ejemplo, al cambiar
+        # la forma de los datos guardados)
+        'VERSION': config('CACHE_VERSION', default=1, cast=int),
+        'OPTIONS': {
+            'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=5000, cast=int),
+        },
+    }
+}
+
+# Con réplica, la marca de "leer lo propio" (sisbar_config/replicas.py) vive
+# en la caché: en memoria cada worker tendría la suya y quien escribe podría
+# leer de la réplica atrasada en el siguiente worker
+if DATABASE_REPLICA_URL and CACHE_BACKEND == 'memoria' and not DEBUG:
+    raise ImproperlyConfigured(
+        'DATABASE_REPLICA_URL requiere una caché compartida: CACHE_BACKEND=archivo o bd'
+    )
+
+# -------------------------
+# TAREAS EN SEGUNDO PLANO
+# -------------------------
+# Ver sisbar_config/tareas.py. TAREAS_SINCRONAS=True las corre dentro de la
+# petición (útil para depurar); TAREAS_HILOS cuántas corren a la vez por proceso
+TAREAS_SINCRONAS = config('TAREAS_SINCRONAS', default=False, cast=bool)
+TAREAS_HILOS = config('TAREAS_HILOS', default=1, cast=int)
+
+# -------------------------
+# EVENTOS EN VIVO (SSE)
+# -------------------------
+# Ver sisbar_config/eventos.py. Con ASGI el flujo dura EVENTOS_DURACION
+# segundos y revisa los eventos de otros workers cada EVENTOS_INTERVALO;
+# con WSGI el navegador vuelve a consultar cada EVENTOS_SONDEO_MS
+EVENTOS_DURACION = config('EVENTOS_DURACION', default=300, cast=int)
+EVENTOS_INTERVALO = config('EVENTOS_INTERVALO', default=2, cast=float)
+EVENTOS_SONDEO_MS = config('EVENTOS_SONDEO_MS', default=5000, cast=int)
+
+# -------------------------
+# IDEMPOTENCIA
+# -------------------------
+# Ver sisbar_config/idempotencia.py: segundos que se recuerda la respuesta
+# de cada clave (entre workers requiere CACHE_BACKEND=archivo o bd)
+IDEMPOTENCIA_DURACION = config('IDEMPOTENCIA_DURACION', default=86400, cast=int)
+
+# -------------------------
+# STOCK FRACCIONADO
+# -------------------------
+# Ver inventario/fracciones.py: segundos entre el primer descuento pendiente
+# de un producto fraccionado y su consolidación en segundo plano (0 = solo
+# con `manage.py consolidar_stock`)
+FRACCIONES_CONSOLIDAR_CADA = config('FRACCIONES_CONSOLIDAR_CADA', default=30, cast=int)
+
+# -------------------------
+# FOTO DEL CATÁLOGO
+# -------------------------
+# Ver inventario/catalogo.py: segundos entre revisiones de la versión del
+# inventario en la caché (cambios de otros workers o sin save()) y segundos
+# hasta reconstruir la foto entera
+CATALOGO_REVISAR = config('CATALOGO_REVISAR', default=1, cast=float)
+CATALOGO_VIGENCIA = config('CATALOGO_VIGENCIA', default=300, cast=int)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -139,12 +270,29 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'static']
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 
 # Media files (uploads)
-MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_URL = config('MEDIA_URL', default='/media/')
+MEDIA_ROOT = Path(config('MEDIA_ROOT', default=str(BASE_DIR / 'media')))
+
+# Archivos subidos con la huella del contenido en el nombre (ver
+# sisbar_config/media.py). MEDIA_STORAGE permite cambiarlo por otro storage.
+STORAGES = {
+    'default': {
+        'BACKEND': config('MEDIA_STORAGE', default='sisbar_config.media.AlmacenamientoHuella'),
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# MediaMiddleware sirve MEDIA_URL también en producción. Los nombres sin
+# huella (subidos antes) se cachean MEDIA_CACHE_SIN_HUELLA segundos; con
+# MEDIA_X_ACCEL_PREFIX (por ejemplo /_media/) los entrega nginx.
+MEDIA_SERVIR = config('MEDIA_SERVIR', default=True, cast=bool)
+MEDIA_CACHE_SIN_HUELLA = config('MEDIA_CACHE_SIN_HUELLA', default=3600, cast=int)
+MEDIA_X_ACCEL_PREFIX = config('MEDIA_X_ACCEL_PREFIX', default='')
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -152,6 +300,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Modelo de usuario personalizado
 AUTH_USER_MODEL = 'usuarios.Usuario'
 
+# Usuario y permisos de la sesión cacheados (ver usuarios/backends.py).
+# ModelBackend queda para las sesiones iniciadas antes de este backend.
+AUTHENTICATION_BACKENDS = [
+    'usuarios.backends.UsuarioCacheadoBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Segundos que vale la identidad cacheada si la caché es por proceso
+# (CACHE_BACKEND=memoria): los otros workers no se enteran de los cambios
+IDENTIDAD_DURACION_LOCAL = config('IDENTIDAD_DURACION_LOCAL', default=5, cast=int)
+
+# Sesiones leídas desde la caché y respaldadas en la base de datos
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
 # Crispy Forms
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
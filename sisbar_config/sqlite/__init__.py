@@ -0,0 +1,107 @@
+"""
+Perfil de SQLite para varios cajeros a la vez
+
+Los bares chicos corren con SQLite local. Con el backend de Django tal cual
+(journal DELETE, fsync en cada commit, 5 segundos de espera) los escaneos
+simultáneos terminaban en "database is locked":
+
+- En modo journal DELETE un lector bloquea al escritor y viceversa.
+- Una transacción que empieza leyendo (BEGIN común, diferido) y después
+  escribe tiene que pasar a escritura a mitad de camino; si otra conexión
+  escribe en ese momento SQLite no espera: falla enseguida con
+  "database is locked", sin importar el timeout.
+
+El backend `sisbar_config.sqlite` (ENGINE en settings.py, SQLITE_PERFIL)
+aplica al abrir cada conexión los PRAGMA de `base.PRAGMAS`: WAL (lectores
+y escritor no se bloquean), synchronous=NORMAL (sin fsync en cada commit;
+con WAL no arriesga la integridad), caché de páginas y mmap más grandes y
+temporales en memoria. OPTIONS['timeout'] es la espera por bloqueos
+(busy timeout) y OPTIONS['pragmas'] permite cambiar cualquiera de los
+PRAGMA.
+
+Las escrituras de stock usan `escritura()` en vez de transaction.atomic():
+en SQLite abren la transacción con BEGIN IMMEDIATE, que toma el lock de
+escritura al empezar. Así la transacción espera su turno (busy timeout) en
+vez de fallar al pasar de lectura a escritura. Con otros backends es un
+atomic() común.
+
+Cada escritura() abierta es un `Bloque`: sirve para saber si lo que se
+bloqueó adentro sigue bloqueado (Producto._marcar_bloqueada) sin mirar
+estructuras internas de Django. Un bloque vale mientras está abierto; al
+terminar bien dentro de otra escritura() pasa a valer lo que valga esa
+(su savepoint se confirma con ella) y al deshacerse deja de valer.
+"""
+
+from contextlib import contextmanager
+
+from django.db import transaction
+
+
+class Bloque:
+    """Una escritura() en curso"""
+
+    def __init__(self):
+        self.abierto = True
+        # Escritura exterior que lo contiene después de terminar bien
+        self.absorbido = None
+
+    def vigente(self):
+        """¿Lo hecho dentro del bloque sigue en una transacción sin confirmar ni deshacer?"""
+        bloque = self
+        while bloque is not None:
+            if bloque.abierto:
+                return True
+            bloque = bloque.absorbido
+        return False
+
+
+def _bloques(conexion):
+    if not hasattr(conexion, 'bloques_escritura'):
+        conexion.bloques_escritura = []
+    return conexion.bloques_escritura
+
+
+def bloque_actual(using=None):
+    """La escritura() más interna abierta en la conexión, o None"""
+    bloques = _bloques(transaction.get_connection(using))
+    return bloques[-1] if bloques else None
+
+
+@contextmanager
+def escritura(using=None):
+    """
+    transaction.atomic() para escrituras de stock: con el backend de SISBAR
+    sobre SQLite empieza con BEGIN IMMEDIATE. Dentro de otra transacción es
+    un savepoint, como atomic().
+    """
+    conexion = transaction.get_connection(using)
+    bloques = _bloques(conexion)
+    bloque = Bloque()
+    bloques.append(bloque)
+    try:
+        with _atomica(conexion, using):
+            yield
+    finally:
+        bloques.remove(bloque)
+        bloque.abierto = False
+    if bloques:
+        bloque.absorbido = bloques[-1]
+
+
+@contextmanager
+def _atomica(conexion, using):
+    if not hasattr(conexion, 'inmediata'):
+        with transaction.atomic(using=using):
+            yield
+        return
+
+    anterior = conexion.inmediata
+    conexion.inmediata = True
+    try:
+        with transaction.atomic(using=using):
+            # Solo el BEGIN de este bloque; las transacciones que se abran
+            # después (on_commit, por ejemplo) vuelven a ser las de siempre
+            conexion.inmediata = anterior
+            yield
+    finally:
+        conexion.inmediata = anterior
@@ -0,0 +1,46 @@
+"""Backend SQLite con el perfil de SISBAR (ver sisbar_config/sqlite/__init__.py)"""
+
+from django.db.backends.sqlite3 import base
+
+
+PRAGMAS = {
+    # Lectores y escritor no se bloquean entre sí
+    'journal_mode': 'WAL',
+    # fsync en los checkpoints del WAL, no en cada commit
+    'synchronous': 'NORMAL',
+    # Caché de páginas por conexión en KiB (negativo) y lecturas por mmap
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # escritura() la activa para el próximo BEGIN
+        self.inmediata = False
+
+    def pragmas(self):
+        return {**PRAGMAS, **self.settings_dict['OPTIONS'].get('pragmas', {})}
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conexion = super().get_new_connection(conn_params)
+        for nombre, valor in self.pragmas().items():
+            # Las bases en memoria (pruebas) no tienen archivo de WAL
+            if nombre == 'journal_mode' and self.is_in_memory_db():
+                continue
+            conexion.execute(f'PRAGMA {nombre} = {valor}')
+        return conexion
+
+    def _start_transaction_under_autocommit(self):
+        if self.inmediata:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        else:
+            super()._start_transaction_under_autocommit()
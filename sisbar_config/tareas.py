@@ -0,0 +1,136 @@
+"""
+Tareas en segundo plano con progreso consultable
+
+Para trabajos largos que no deben bloquear la petición (por ejemplo, borrar
+definitivamente cientos de productos con todos sus movimientos). La tarea
+corre en un hilo del mismo proceso y publica su avance en la caché, desde
+donde la vista de estado lo lee.
+
+Uso:
+
+    from sisbar_config import tareas
+
+    def purgar(progreso, ids):
+        progreso.iniciar(total=len(ids))
+        for lote in ...:
+            ...
+            progreso.avanzar(len(lote))
+
+    tarea_id = tareas.encolar('Purgar productos', purgar, ids)
+    tareas.estado(tarea_id)   # {'estado': 'EN_CURSO', 'hechos': 200, 'total': 1000, ...}
+
+Con CACHE_BACKEND=memoria el progreso solo se ve desde el worker que lanzó
+la tarea; con archivo o bd se ve desde cualquiera. TAREAS_SINCRONAS=True
+ejecuta la tarea dentro de la petición (lo usan las pruebas).
+"""
+
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# El progreso de una tarea terminada se conserva un día
+DURACION_ESTADO = 60 * 60 * 24
+
+_ejecutor = None
+
+
+def _clave(tarea_id):
+    return f'tarea:{tarea_id}'
+
+
+def _obtener_ejecutor():
+    global _ejecutor
+    if _ejecutor is None:
+        # Un solo hilo por defecto: las tareas pesadas van en fila y no
+        # compiten entre sí por la base de datos
+        _ejecutor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'TAREAS_HILOS', 1),
+            thread_name_prefix='sisbar-tarea',
+        )
+    return _ejecutor
+
+
+class Progreso:
+    """Avance de una tarea, guardado en la caché en cada cambio"""
+
+    def __init__(self, tarea_id, nombre):
+        self.datos = {
+            'id': tarea_id,
+            'nombre': nombre,
+            'estado': 'PENDIENTE',
+            'hechos': 0,
+            'total': None,
+            'omitidos': 0,
+            'mensaje': '',
+            'creada': timezone.now().isoformat(),
+            'terminada': None,
+        }
+
+    def _guardar(self):
+        cache.set(_clave(self.datos['id']), self.datos, DURACION_ESTADO)
+
+    def iniciar(self, total=None, mensaje=''):
+        self.datos.update(estado='EN_CURSO', total=total, mensaje=mensaje)
+        self._guardar()
+
+    def avanzar(self, cantidad=1, mensaje=None, omitidos=0):
+        self.datos['hechos'] += cantidad
+        self.datos['omitidos'] += omitidos
+        if mensaje is not None:
+            self.datos['mensaje'] = mensaje
+        self._guardar()
+
+    def terminar(self, mensaje=None):
+        self.datos.update(estado='TERMINADA', terminada=timezone.now().isoformat())
+        if mensaje is not None:
+            self.datos['mensaje'] = mensaje
+        self._guardar()
+
+    def fallar(self, mensaje):
+        self.datos.update(estado='FALLIDA', mensaje=mensaje, terminada=timezone.now().isoformat())
+        self._guardar()
+
+
+def _ejecutar(progreso, funcion, args, kwargs, en_hilo):
+    try:
+        funcion(progreso, *args, **kwargs)
+        if progreso.datos['estado'] not in ('TERMINADA', 'FALLIDA'):
+            progreso.terminar()
+    except Exception as e:
+        logger.exception('La tarea %s falló', progreso.datos['nombre'])
+        progreso.fallar(str(e))
+    finally:
+        if en_hilo:
+            # El hilo abrió sus propias conexiones: no dejarlas colgadas
+            connections.close_all()
+
+
+def encolar(nombre, funcion, *args, **kwargs):
+    """
+    Programa `funcion(progreso, *args, **kwargs)` y devuelve el id de la tarea.
+
+    La función recibe un Progreso para informar su avance; si termina sin
+    llamar a `terminar()` la tarea se marca terminada igual.
+    """
+    tarea_id = uuid.uuid4().hex
+    progreso = Progreso(tarea_id, nombre)
+    progreso._guardar()
+
+    if getattr(settings, 'TAREAS_SINCRONAS', False):
+        _ejecutar(progreso, funcion, args, kwargs, en_hilo=False)
+    else:
+        _obtener_ejecutor().submit(_ejecutar, progreso, funcion, args, kwargs, True)
+    return tarea_id
+
+
+def estado(tarea_id):
+    """Progreso de la tarea como diccionario, o None si no existe o expiró"""
+    return cache.get(_clave(tarea_id))
@@ -0,0 +1,23 @@
+"""
+Campo oculto con la clave de idempotencia (ver sisbar_config/idempotencia.py)
+
+    <form method="post">
+        {% csrf_token %}
+        {% load idempotencia %}{% campo_idempotencia %}
+"""
+
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from sisbar_config.idempotencia import CAMPO
+
+
+register = template.Library()
+
+
+@register.simple_tag
+def campo_idempotencia():
+    """Una clave nueva cada vez que se dibuja el formulario"""
+    return format_html('<input type="hidden" name="{}" value="{}">', CAMPO, uuid.uuid4())
@@ -0,0 +1,60 @@
+"""
+Etiquetas para mostrar las versiones de una imagen (ver sisbar_config/imagenes.py)
+
+    {% load imagenes %}
+    {% imagen producto 'mini' class="me-3" width="50" height="50" %}
+    <img src="{{ producto|imagen_url:'detalle' }}">
+"""
+
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from sisbar_config import imagenes
+
+
+register = template.Library()
+
+
+def _archivo(objeto):
+    campo, _ = imagenes.campos_de(objeto)
+    return getattr(objeto, campo)
+
+
+@register.filter
+def imagen_url(objeto, tamano='detalle'):
+    """URL de la versión JPEG; el original si todavía no se procesó"""
+    archivo = _archivo(objeto)
+    if not archivo:
+        return ''
+    ruta = None if imagenes.pendiente(objeto) else imagenes.version(objeto, tamano)
+    return default_storage.url(ruta) if ruta else archivo.url
+
+
+@register.simple_tag
+def imagen(objeto, tamano='detalle', alt='', **atributos):
+    """
+    <picture> con la versión WebP y la JPEG de respaldo, con ancho y alto
+    reales para que el navegador reserve el espacio. Vacío si no hay imagen.
+    """
+    archivo = _archivo(objeto)
+    if not archivo:
+        return ''
+    atributos.setdefault('loading', 'lazy')
+    atributos.setdefault('decoding', 'async')
+    extras = format_html_join(' ', '{}="{}"', sorted(atributos.items()))
+
+    if imagenes.pendiente(objeto) or not imagenes.version(objeto, tamano):
+        return format_html('<img src="{}" alt="{}" {}>', archivo.url, alt, extras)
+
+    _, campo_versiones = imagenes.campos_de(objeto)
+    entrada = getattr(objeto, campo_versiones)[tamano]
+    if 'width' not in atributos and 'height' not in atributos:
+        extras = format_html('width="{}" height="{}" {}', entrada['ancho'], entrada['alto'], extras)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}"><img src="{}" alt="{}" {}></picture>',
+        default_storage.url(entrada['webp']),
+        default_storage.url(entrada['jpg']),
+        alt,
+        extras,
+    )
@@ -25,9 +25,8 @@ urlpatterns = [
     path('reportes/', include('reportes.urls')),
 ]
 
-# Media & Static
+# Static (media lo sirve sisbar_config.media.MediaMiddleware)
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
 
 # Admin style
@@ -0,0 +1,17 @@
+#!/usr/bin/env bash
+# Arranque del servidor en Render
+#   SISBAR_SERVIDOR=wsgi  gunicorn con workers síncronos (por defecto)
+#   SISBAR_SERVIDOR=asgi  gunicorn con workers uvicorn: las vistas async del
+#                         escáner y del dashboard no esperan detrás de las
+#                         exportaciones
+# Workers, hilos, reciclado y arranque rápido (preload_app, plantillas
+# compiladas y conexiones abiertas antes de la primera petición) en
+# sisbar_config/servidor.py. WEB_CONCURRENCY sigue fijando los workers.
+set -o errexit
+
+if [ "${SISBAR_SERVIDOR:-wsgi}" = "asgi" ]; then
+    exec gunicorn sisbar_config.asgi:application --worker-class uvicorn.workers.UvicornWorker \
+        --config python:sisbar_config.servidor
+else
+    exec gunicorn sisbar_config.wsgi:application --config python:sisbar_config.servidor
+fi
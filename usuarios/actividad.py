@@ -0,0 +1,31 @@
+"""
+Historial de actividad de los usuarios
+
+Todas las apps registran lo que hace cada usuario; antes lo importaban
+desde usuarios.views, que de paso cargaba formularios, correos y los
+modelos de inventario, categorías y proveedores. Este módulo solo depende
+del modelo HistorialActividad.
+"""
+
+from .models import HistorialActividad
+
+
+def get_client_ip(request):
+    """Obtiene la IP del cliente"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
+
+
+def registrar_actividad(usuario, tipo, descripcion, request=None):
+    """Registra una actividad del usuario"""
+    ip = get_client_ip(request) if request else None
+    HistorialActividad.objects.create(
+        usuario=usuario,
+        tipo=tipo,
+        descripcion=descripcion,
+        ip_address=ip
+    )
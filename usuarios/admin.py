@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import Usuario, HistorialActividad
+from sisbar_config.cache import invalidar
+from .aprobacion import aprobar_usuarios
+from .backends import olvidar_identidad
 
 @admin.register(Usuario)
 class UsuarioAdmin(BaseUserAdmin):
@@ -45,17 +48,17 @@ class UsuarioAdmin(BaseUserAdmin):
     actions = ['aprobar_usuarios', 'desactivar_usuarios']
     
     def aprobar_usuarios(self, request, queryset):
-        """Acción para aprobar múltiples usuarios"""
-        count = 0
-        for usuario in queryset.filter(aprobado=False):
-            usuario.aprobar_usuario(request.user)
-            count += 1
+        """Acción para aprobar múltiples usuarios (un UPDATE; correos en segundo plano)"""
+        count = aprobar_usuarios(queryset, request.user)
         self.message_user(request, f'{count} usuario(s) aprobado(s) exitosamente.')
     aprobar_usuarios.short_description = "✅ Aprobar usuarios seleccionados"
     
     def desactivar_usuarios(self, request, queryset):
         """Acción para desactivar múltiples usuarios"""
+        ids = list(queryset.values_list('id', flat=True))
         count = queryset.update(is_active=False)
+        invalidar('usuarios')
+        olvidar_identidad(*ids)
         self.message_user(request, f'{count} usuario(s) desactivado(s).')
     desactivar_usuarios.short_description = "🚫 Desactivar usuarios seleccionados"
 
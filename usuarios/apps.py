@@ -6,3 +6,9 @@ class UsuariosConfig(AppConfig):
 
     def ready(self):
         import usuarios.signals
+        from sisbar_config.cache import invalidar_al_cambiar
+        from sisbar_config.imagenes import procesar_al_guardar
+        from .models import Usuario
+
+        invalidar_al_cambiar(Usuario, 'usuarios')
+        procesar_al_guardar(Usuario, 'foto_perfil', 'foto_versiones')
@@ -0,0 +1,122 @@
+"""
+Aprobación de usuarios en lote con notificaciones diferidas
+
+Aprobar es un solo UPDATE. Los correos de aprobación nunca salen desde la
+petición: se programan como una tarea en segundo plano
+(sisbar_config/tareas.py) cuando la transacción se confirma, y la tarea
+los envía todos por una misma conexión SMTP.
+
+`notificado_aprobacion` marca la transición explícita "aprobado, falta
+avisar" -> "avisado": solo pasa a True para los usuarios cuyo correo salió
+bien. Antes de enviar, la tarea reclama los pendientes con un UPDATE ...
+WHERE notificado_aprobacion=False (`notificacion_reclamada`): si otro
+worker ya los tomó no los vuelve a enviar. Un reclamo que no terminó (el
+worker murió) vence a los RECLAMO_VENCE.
+
+Los que fallan quedan pendientes y libres: `python manage.py
+notificar_aprobaciones` (en cron, o con --cada como proceso aparte) los
+vuelve a intentar.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from sisbar_config import tareas
+from sisbar_config.cache import invalidar
+from .backends import olvidar_identidad
+from .emails import enviar_email_aprobacion
+from .models import Usuario
+
+
+logger = logging.getLogger(__name__)
+
+# Después de esto un envío sin terminar se puede volver a reclamar
+RECLAMO_VENCE = timedelta(minutes=15)
+
+
+def aprobar_usuarios(queryset, aprobador):
+    """
+    Aprueba los usuarios pendientes del queryset con un solo UPDATE y
+    programa sus correos de aprobación. Devuelve cuántos se aprobaron.
+    """
+    ids = list(queryset.filter(aprobado=False).values_list('pk', flat=True))
+    if not ids:
+        return 0
+
+    aprobados = Usuario.objects.filter(pk__in=ids, aprobado=False).update(
+        aprobado=True,
+        fecha_aprobacion=timezone.now(),
+        aprobado_por=aprobador,
+        notificado_aprobacion=False,
+    )
+    invalidar('usuarios')
+    olvidar_identidad(*ids)
+    programar_notificaciones(ids)
+    return aprobados
+
+
+def programar_notificaciones(ids):
+    """Encola una sola tarea de correos para estos usuarios al confirmar la transacción"""
+    ids = list(ids)
+    if ids:
+        transaction.on_commit(
+            lambda: tareas.encolar('Notificar aprobaciones', notificar_aprobaciones, ids)
+        )
+
+
+def reclamar(ids=None):
+    """
+    Reclama los correos pendientes (de `ids`, o todos) con un solo UPDATE;
+    devuelve la marca con que quedaron los que tomó esta llamada
+    """
+    marca = timezone.now()
+    pendientes = Usuario.objects.filter(aprobado=True, notificado_aprobacion=False).filter(
+        Q(notificacion_reclamada__isnull=True) | Q(notificacion_reclamada__lt=marca - RECLAMO_VENCE)
+    )
+    if ids is not None:
+        pendientes = pendientes.filter(pk__in=ids)
+    pendientes.update(notificacion_reclamada=marca)
+    return marca
+
+
+def notificar_aprobaciones(progreso, ids=None):
+    """Tarea: envía los correos de aprobación pendientes de estos usuarios (o de todos)"""
+    marca = reclamar(ids)
+    reclamados = Usuario.objects.filter(notificacion_reclamada=marca, notificado_aprobacion=False)
+    pendientes = list(reclamados.select_related('aprobado_por'))
+    progreso.iniciar(total=len(pendientes), mensaje=f'Enviando {len(pendientes)} correos de aprobación...')
+    if not pendientes:
+        return
+
+    # Aprobador por defecto si nadie quedó registrado
+    superusuario = None
+    if any(u.aprobado_por is None for u in pendientes):
+        superusuario = Usuario.objects.filter(is_superuser=True).order_by('id').first()
+
+    enviados = []
+    conexion = get_connection()
+    try:
+        conexion.open()
+        for usuario in pendientes:
+            if enviar_email_aprobacion(usuario, usuario.aprobado_por or superusuario, conexion=conexion):
+                enviados.append(usuario.pk)
+                progreso.avanzar()
+            else:
+                progreso.avanzar(0, omitidos=1)
+    finally:
+        conexion.close()
+        # La transición explícita: solo los que recibieron su correo. Los
+        # demás se liberan para el próximo intento
+        reclamados.filter(pk__in=enviados).update(notificado_aprobacion=True, notificacion_reclamada=None)
+        reclamados.update(notificacion_reclamada=None)
+        olvidar_identidad(*enviados)
+
+    fallidos = len(pendientes) - len(enviados)
+    if fallidos:
+        logger.warning('%s correos de aprobación no se pudieron enviar', fallidos)
+    progreso.terminar(f'{len(enviados)} correos de aprobación enviados')
@@ -0,0 +1,114 @@
+"""
+Backend de autenticación con identidad cacheada
+
+En cada petición autenticada Django carga el usuario de la sesión y, al
+revisar permisos, consulta los permisos propios y los de sus grupos. Este
+backend guarda el usuario junto con su conjunto de permisos ya calculado,
+así que con la caché caliente la autenticación no toca la base de datos.
+
+La identidad de un usuario se olvida cuando se guarda o elimina, cuando
+cambian sus grupos o permisos (ver usuarios/signals.py). Los cambios en
+grupos o permisos que afectan a muchos usuarios invalidan el espacio
+'permisos' completo.
+
+Ese olvido solo llega a todos los workers con una caché compartida
+(CACHE_BACKEND=archivo o bd). Con la caché en memoria de cada proceso la
+identidad dura IDENTIDAD_DURACION_LOCAL segundos (5 por defecto): un
+usuario desactivado o con menos permisos deja de valer en los otros
+workers en ese plazo y no en los 5 minutos de CACHE_TIMEOUT. Además cada
+lectura desde la caché vuelve a aplicar user_can_authenticate().
+
+En la caché no va la instancia sino sus campos sin la contraseña (su hash
+no sale de la base), los hashes de sesión que la verifican y los permisos.
+Quien necesite la contraseña (cambiarla, por ejemplo) la lee de la base
+como un campo diferido.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.fields.files import FieldFile
+
+from sisbar_config import cache as cache_sisbar
+
+
+def clave_identidad(usuario_id):
+    return cache_sisbar.clave('auth:usuario', espacios=('permisos',), partes=(usuario_id,))
+
+
+def duracion_identidad():
+    """Segundos que vale la identidad cacheada (None = el de la caché)"""
+    if cache_sisbar.compartida():
+        return None
+    return getattr(settings, 'IDENTIDAD_DURACION_LOCAL', 5)
+
+
+def olvidar_identidad(*usuarios_ids):
+    """Descarta la identidad cacheada de los usuarios indicados"""
+    if usuarios_ids:
+        cache.delete_many([clave_identidad(usuario_id) for usuario_id in usuarios_ids])
+
+
+# Campos que nunca se guardan en la caché
+EXCLUIDOS = ('password',)
+
+# Permisos que ModelBackend calcula y deja en la instancia
+PERMISOS = ('_user_perm_cache', '_group_perm_cache', '_perm_cache')
+
+
+def _a_cache(usuario):
+    """Lo que se guarda de un usuario: campos sin la contraseña, hashes de sesión y permisos"""
+    campos = {}
+    for campo in usuario._meta.concrete_fields:
+        if campo.attname in EXCLUIDOS:
+            continue
+        valor = getattr(usuario, campo.attname)
+        campos[campo.attname] = valor.name if isinstance(valor, FieldFile) else valor
+    return {
+        'campos': campos,
+        'hashes_sesion': (usuario.get_session_auth_hash(), list(usuario.get_session_auth_fallback_hash())),
+        'permisos': {atributo: getattr(usuario, atributo) for atributo in PERMISOS},
+    }
+
+
+def _desde_cache(modelo, datos):
+    # Como una instancia leída con .defer('password')
+    campos = datos['campos']
+    usuario = modelo.from_db(DEFAULT_DB_ALIAS, list(campos), list(campos.values()))
+    usuario._hashes_sesion = datos['hashes_sesion']
+    for atributo, valor in datos['permisos'].items():
+        setattr(usuario, atributo, valor)
+    return usuario
+
+
+class UsuarioCacheadoBackend(ModelBackend):
+    """ModelBackend que cachea el usuario de la sesión con sus permisos"""
+
+    def get_user(self, user_id):
+        clave = clave_identidad(user_id)
+        datos = cache.get(clave)
+        if datos is not None:
+            usuario = _desde_cache(self._modelo(), datos)
+        else:
+            usuario = super().get_user(user_id)
+            if usuario is None:
+                return None
+            # Llena _user_perm_cache, _group_perm_cache y _perm_cache
+            self.get_all_permissions(usuario)
+            duracion = duracion_identidad()
+            if duracion is None:
+                cache.set(clave, _a_cache(usuario))
+            else:
+                cache.set(clave, _a_cache(usuario), duracion)
+        return usuario if self.user_can_authenticate(usuario) else None
+
+    async def aget_user(self, user_id):
+        # Desde Django 5.2 ModelBackend.aget_user consulta la base sin pasar por get_user
+        return await sync_to_async(self.get_user)(user_id)
+
+    @staticmethod
+    def _modelo():
+        from django.contrib.auth import get_user_model
+        return get_user_model()
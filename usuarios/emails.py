@@ -122,9 +122,10 @@ def enviar_email_registro(usuario):
         return False
 
 
-def enviar_email_aprobacion(usuario, aprobado_por):
+def enviar_email_aprobacion(usuario, aprobado_por, conexion=None):
     """
-    Envía un correo cuando un administrador aprueba la cuenta
+    Envía un correo cuando un administrador aprueba la cuenta.
+    `conexion` permite reutilizar una conexión SMTP abierta para varios envíos.
     """
     asunto = '✅ Tu cuenta en SISBAR ha sido aprobada'
     
@@ -235,7 +236,8 @@ def enviar_email_aprobacion(usuario, aprobado_por):
             asunto,
             mensaje_texto,
             settings.DEFAULT_FROM_EMAIL,
-            [usuario.email]
+            [usuario.email],
+            connection=conexion
         )
         email.attach_alternative(mensaje_html, "text/html")
         email.send()
@@ -0,0 +1,43 @@
+"""
+Vuelve a intentar los correos de aprobación que no salieron
+
+Uso:
+    python manage.py notificar_aprobaciones
+    python manage.py notificar_aprobaciones --cada 300
+
+Aprobar programa los correos en segundo plano (usuarios/aprobacion.py). Si
+el servidor de correo falla, esos usuarios quedan aprobados y sin avisar;
+este comando los reclama y los envía. Se puede correr en cron o, con
+--cada, como proceso aparte. Nunca envía dos veces el mismo correo aunque
+corra a la vez que la tarea de una aprobación.
+"""
+
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+
+from sisbar_config.tareas import Progreso
+from usuarios.aprobacion import notificar_aprobaciones
+
+
+class Command(BaseCommand):
+    help = 'Envía los correos de aprobación pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cada', type=float, default=0,
+                            help='Repetir cada estos segundos hasta Ctrl+C (0 = una sola vez)')
+
+    def handle(self, *args, **options):
+        while True:
+            progreso = Progreso(uuid.uuid4().hex, 'Notificar aprobaciones')
+            notificar_aprobaciones(progreso)
+            datos = progreso.datos
+            if datos['total'] or not options['cada']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {datos['hechos']} correos de aprobación enviados"
+                    + (f" ({datos['omitidos']} fallaron)" if datos['omitidos'] else '')
+                ))
+            if not options['cada']:
+                return
+            time.sleep(options['cada'])
@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-18 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0003_indices_busqueda_usuarios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='foto_versiones',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Versiones de la Foto'),
+        ),
+    ]
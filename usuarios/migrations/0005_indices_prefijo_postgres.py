@@ -0,0 +1,46 @@
+# Generated by Django 5.0 on 2026-10-19 14:05
+
+from django.db import migrations
+
+
+# Campo -> índice para LIKE 'prefijo%' sobre LOWER(campo)
+INDICES = (
+    ('username', 'usuario_username_prefijo_idx'),
+    ('email', 'usuario_email_prefijo_idx'),
+    ('documento', 'usuario_documento_prefijo_idx'),
+    ('first_name', 'usuario_nombre_prefijo_idx'),
+    ('last_name', 'usuario_apellido_prefijo_idx'),
+)
+
+
+def crear_indices(apps, schema_editor):
+    """
+    Solo en PostgreSQL: con la intercalación del idioma un índice normal no
+    sirve para LIKE 'prefijo%'; text_pattern_ops compara carácter a carácter.
+    En SQLite el prefijo usa los índices Lower(campo) con un rango.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    tabla = apps.get_model('usuarios', 'Usuario')._meta.db_table
+    for campo, nombre in INDICES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{nombre}" ON "{tabla}" (LOWER("{campo}") text_pattern_ops)'
+        )
+
+
+def quitar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, nombre in INDICES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{nombre}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0004_versiones_imagen'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, quitar_indices),
+    ]
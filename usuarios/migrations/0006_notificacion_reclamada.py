@@ -0,0 +1,18 @@
+# Generated by Django 5.0 on 2026-10-19 02:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0005_indices_prefijo_postgres'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usuario',
+            name='notificacion_reclamada',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Envío de aprobación en curso desde'),
+        ),
+    ]
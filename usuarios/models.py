@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 
 class Usuario(AbstractUser):
@@ -43,6 +44,14 @@ class Usuario(AbstractUser):
         verbose_name='Foto de Perfil'
     )
     
+    # Versiones redimensionadas de la foto (sisbar_config/imagenes.py)
+    foto_versiones = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Versiones de la Foto'
+    )
+    
     aprobado = models.BooleanField(
         default=False,
         verbose_name='Cuenta Aprobada',
@@ -68,6 +77,13 @@ class Usuario(AbstractUser):
     default=False,
     verbose_name='Correo de aprobación enviado'
     )
+    # Quién está enviando el correo (usuarios/aprobacion.py): evita que dos
+    # workers lo manden a la vez
+    notificacion_reclamada = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Envío de aprobación en curso desde'
+    )
     modo_oscuro = models.BooleanField(
         default=False,
         verbose_name='Modo Oscuro Activado'
@@ -84,6 +100,16 @@ class Usuario(AbstractUser):
         verbose_name = 'Usuario'
         verbose_name_plural = 'Usuarios'
         ordering = ['-date_joined']
+        indexes = [
+            # Paginación por cursor de gestionar_usuarios_view
+            models.Index(fields=['-date_joined', '-id'], name='usuario_registro_idx'),
+            # Búsqueda por prefijo sin distinguir mayúsculas
+            models.Index(Lower('username'), name='usuario_username_lower_idx'),
+            models.Index(Lower('email'), name='usuario_email_lower_idx'),
+            models.Index(Lower('documento'), name='usuario_documento_lower_idx'),
+            models.Index(Lower('first_name'), name='usuario_nombre_lower_idx'),
+            models.Index(Lower('last_name'), name='usuario_apellido_lower_idx'),
+        ]
         permissions = [
             ('puede_aprobar_usuarios', 'Puede aprobar nuevos usuarios'),
             ('puede_ver_reportes', 'Puede ver reportes completos'),
@@ -93,6 +119,25 @@ class Usuario(AbstractUser):
     def __str__(self):
         return f"{self.get_full_name()} ({self.get_rol_display()})"
     
+    # La identidad cacheada (usuarios/backends.py) no trae la contraseña:
+    # trae sus hashes de sesión ya calculados. Si la contraseña se carga o
+    # se cambia, los hashes salen de ella como siempre.
+    def _hashes_cacheados(self):
+        if 'password' in self.__dict__:
+            return None
+        return getattr(self, '_hashes_sesion', None)
+    
+    def get_session_auth_hash(self):
+        hashes = self._hashes_cacheados()
+        return hashes[0] if hashes else super().get_session_auth_hash()
+    
+    def get_session_auth_fallback_hash(self):
+        hashes = self._hashes_cacheados()
+        if hashes:
+            yield from hashes[1]
+        else:
+            yield from super().get_session_auth_fallback_hash()
+    
     def aprobar_usuario(self, aprobador):
         """Aprobar un usuario pendiente"""
         self.aprobado = True
@@ -0,0 +1,197 @@
+"""
+Operaciones en lote sobre la papelera (registros desactivados)
+
+Restaurar es un solo UPDATE. Borrar definitivamente corre como tarea en
+segundo plano (sisbar_config/tareas.py) y avanza por bloques: primero borra
+en lotes pequeños las filas que dependen de cada bloque (movimientos,
+alertas, historial...), cada lote en su propia transacción, y al final el
+bloque mismo. Así ninguna transacción bloquea las tablas el tiempo que
+tomaría borrar de una vez todo el historial de cientos de productos, y los
+descuentos por escáner siguen entrando entre lote y lote.
+
+Cada lote vuelve a leer y bloquea, en su misma transacción, los registros
+que siguen en la papelera, y solo borra dependientes de esos. Un registro
+restaurado a mitad de la purga deja de purgarse en el lote siguiente; lo
+que ya se había borrado de su historial no vuelve, y el resultado de la
+tarea lo informa.
+
+La tarea corre en un hilo del worker: si el worker se recicla
+(max_requests de gunicorn) o se reinicia, la purga queda a medias y no se
+reintenta sola. Cada paso borra solo lo que todavía existe, así que
+volver a lanzarla sobre la misma selección continúa donde quedó.
+"""
+
+import logging
+
+from django.db import models
+from django.db.models import Exists, OuterRef, Q
+
+from categorias.models import Categoria
+from inventario.models import Producto
+from inventario.valoracion import recalcular
+from proveedores.models import Proveedor
+from sisbar_config.cache import invalidar
+from sisbar_config.sqlite import escritura
+from .backends import olvidar_identidad
+from .models import Usuario
+
+
+logger = logging.getLogger(__name__)
+
+# Registros principales por bloque y filas dependientes por lote
+BLOQUE_OBJETOS = 50
+LOTE_FILAS = 1000
+
+
+class Seccion:
+    """Un tipo de registro de la papelera"""
+
+    def __init__(self, modelo, campo_activo, espacios, etiqueta):
+        self.modelo = modelo
+        self.campo_activo = campo_activo
+        self.espacios = espacios
+        self.etiqueta = etiqueta
+
+    def inactivos(self):
+        return self.modelo.objects.filter(**{self.campo_activo: False})
+
+    def seleccion(self, ids=None):
+        """Inactivos, limitados a `ids` si se indican (None = todos)"""
+        queryset = self.inactivos()
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        return queryset
+
+    def bloquear(self, ids):
+        """
+        Dentro de una transacción: los `ids` que siguen inactivos, con sus
+        filas bloqueadas hasta el commit (SELECT ... FOR UPDATE; en SQLite
+        ya lo hace el BEGIN IMMEDIATE de escritura()).
+        """
+        return list(self.seleccion(ids).select_for_update().values_list('pk', flat=True))
+
+    def relaciones(self, on_delete):
+        """FKs de otros modelos hacia este con la regla de borrado indicada"""
+        return [
+            rel for rel in self.modelo._meta.related_objects
+            if rel.one_to_many and rel.on_delete is on_delete
+        ]
+
+    def protegidos(self):
+        """Filtro de los registros que no se pueden borrar (FK con PROTECT)"""
+        filtro = Q()
+        for rel in self.relaciones(models.PROTECT):
+            filtro |= Q(Exists(rel.related_model._base_manager.filter(**{rel.field.name: OuterRef('pk')})))
+        return filtro
+
+
+SECCIONES = {
+    'productos': Seccion(Producto, 'activo', ('inventario', 'movimientos'), 'productos'),
+    'categorias': Seccion(Categoria, 'activa', ('categorias', 'inventario'), 'categorías'),
+    'proveedores': Seccion(Proveedor, 'activo', ('proveedores', 'inventario'), 'proveedores'),
+    'usuarios': Seccion(Usuario, 'is_active', ('usuarios', 'inventario', 'movimientos'), 'usuarios'),
+}
+
+
+def _despues_de_cambiar(seccion, ids):
+    invalidar(*seccion.espacios)
+    if seccion.modelo is Usuario:
+        olvidar_identidad(*ids)
+
+
+def restaurar_lote(nombre, ids=None):
+    """Reactiva los registros seleccionados con un solo UPDATE; devuelve cuántos"""
+    seccion = SECCIONES[nombre]
+    pks = list(seccion.seleccion(ids).values_list('pk', flat=True))
+    if pks:
+        seccion.modelo.objects.filter(pk__in=pks).update(**{seccion.campo_activo: True})
+        if seccion.modelo is Producto:
+            # El UPDATE masivo no pasa por save(): su valor vuelve a contar en la categoría
+            recalcular(Producto.objects.filter(pk__in=pks).values('categoria_id'))
+        _despues_de_cambiar(seccion, pks)
+    return len(pks)
+
+
+def purgar_bloque(seccion, ids, tamano=LOTE_FILAS):
+    """
+    Borra definitivamente `ids`, una transacción por vuelta. Cada vuelta
+    bloquea los registros que siguen inactivos y, solo para esos, borra
+    (CASCADE) o desvincula (SET_NULL) hasta `tamano` filas de cada tabla
+    que los referencia; la vuelta que ya no encuentra filas borra los
+    registros mismos.
+
+    Devuelve los ids borrados (los restaurados en el camino quedan fuera).
+    """
+    pasos = [(rel, True) for rel in seccion.relaciones(models.CASCADE)]
+    pasos += [(rel, False) for rel in seccion.relaciones(models.SET_NULL)]
+    vivos = list(ids)
+    while vivos:
+        with escritura():
+            vivos = seccion.bloquear(vivos)
+            pendientes = False
+            for rel, borrar in pasos:
+                manager = rel.related_model._base_manager
+                pks = list(
+                    manager.filter(**{f'{rel.field.name}__in': vivos}).values_list('pk', flat=True)[:tamano]
+                )
+                if not pks:
+                    continue
+                pendientes = True
+                if borrar:
+                    manager.filter(pk__in=pks).delete()
+                else:
+                    manager.filter(pk__in=pks).update(**{rel.field.name: None})
+            if not pendientes:
+                seccion.seleccion(vivos).delete()
+                return vivos
+    return vivos
+
+
+def purgar_lote(progreso, nombre, ids=None, bloque=BLOQUE_OBJETOS, lote=LOTE_FILAS):
+    """
+    Tarea: borra definitivamente los registros seleccionados.
+
+    Los que tienen dependencias protegidas (una categoría con productos) se
+    omiten. Un registro restaurado mientras la tarea corre no se borra y se
+    cuenta aparte. Repetirla sobre la misma selección es seguro: continúa
+    una purga que quedó a medias.
+    """
+    seccion = SECCIONES[nombre]
+    queryset = seccion.seleccion(ids)
+    protegidos = seccion.protegidos()
+    omitidos = 0
+    if protegidos:
+        omitidos = queryset.filter(protegidos).count()
+        queryset = queryset.exclude(protegidos)
+
+    pks = list(queryset.order_by('pk').values_list('pk', flat=True))
+    progreso.iniciar(total=len(pks), mensaje=f'Eliminando {len(pks)} {seccion.etiqueta}...')
+    if omitidos:
+        progreso.avanzar(0, omitidos=omitidos)
+
+    eliminados = []
+    restaurados = []
+    for i in range(0, len(pks), bloque):
+        # Volver a filtrar: pudieron restaurarse o borrarse desde que empezó la tarea
+        ids_bloque = list(seccion.seleccion(pks[i:i + bloque]).values_list('pk', flat=True))
+        vivos = purgar_bloque(seccion, ids_bloque, lote)
+        eliminados += vivos
+        faltan = set(ids_bloque) - set(vivos)
+        if faltan:
+            # Los que siguen existiendo se restauraron a mitad de la purga
+            restaurados += seccion.modelo._base_manager.filter(pk__in=faltan).values_list('pk', flat=True)
+        progreso.avanzar(
+            len(vivos),
+            omitidos=min(bloque, len(pks) - i) - len(vivos),
+        )
+
+    _despues_de_cambiar(seccion, eliminados)
+    mensaje = f'Eliminación definitiva: {len(eliminados)} {seccion.etiqueta}'
+    if progreso.datos['omitidos']:
+        mensaje += f' ({progreso.datos["omitidos"]} omitidos)'
+    if restaurados:
+        # Pueden haber perdido parte de su historial antes de la restauración
+        logger.warning('Restaurados durante la purga de %s: %s', seccion.etiqueta, restaurados)
+        mensaje += f'. ⚠️ {len(restaurados)} restaurados durante la purga; revisa su historial'
+    progreso.terminar(mensaje)
+    return len(eliminados)
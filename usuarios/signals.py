@@ -1,8 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from sisbar_config.cache import invalidar
+from .backends import olvidar_identidad
 from .models import Usuario
-from .emails import enviar_email_registro, enviar_email_aprobacion, enviar_email_alerta_admin
+from .aprobacion import programar_notificaciones
+from .emails import enviar_email_registro, enviar_email_alerta_admin
 
 
 @receiver(post_save, sender=Usuario)
@@ -16,23 +19,40 @@ def gestionar_correos_usuario(sender, instance, created, **kwargs):
         enviar_email_alerta_admin(instance)
 
     else:
-        # Usuario aprobado
+        # Usuario aprobado: el correo sale en segundo plano (usuarios/aprobacion.py),
+        # que también marca notificado_aprobacion cuando se envía
         if instance.aprobado and not instance.notificado_aprobacion:
+            programar_notificaciones([instance.pk])
 
-            aprobador = instance.aprobado_por
 
-            # Si ningún aprobador fue asignado, escoger un superusuario
-            if aprobador is None:
-                User = get_user_model()
-                aprobador = User.objects.filter(is_superuser=True).first()
+# ========== IDENTIDAD CACHEADA ==========
+@receiver([post_save, post_delete], sender=Usuario)
+def olvidar_usuario(sender, instance, **kwargs):
+    """El usuario cambió: su próxima petición vuelve a cargarlo"""
+    olvidar_identidad(instance.pk)
 
-            # Enviar correo
-            enviar_email_aprobacion(instance, aprobador)
 
-            # Marcar que ya se envió
-            instance.notificado_aprobacion = True
+@receiver(m2m_changed, sender=Usuario.groups.through)
+@receiver(m2m_changed, sender=Usuario.user_permissions.through)
+def olvidar_por_grupos_o_permisos(sender, instance, action, reverse, pk_set, **kwargs):
+    """Cambios en los grupos o permisos directos de usuarios"""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        olvidar_identidad(instance.pk)
+    else:
+        # Desde el grupo/permiso: puede afectar a muchos usuarios
+        invalidar('permisos')
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidar_permisos_grupo(sender, action, **kwargs):
+    """Los permisos de un grupo cambiaron (editar_grupo_view, admin)"""
+    if action.startswith('post_'):
+        invalidar('permisos')
+
 
-            # Importante: evitar que el post_save genere loop infinito
-            Usuario.objects.filter(pk=instance.pk).update(
-                notificado_aprobacion=True
-            )
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=Permission)
+def invalidar_grupos_y_permisos(sender, **kwargs):
+    invalidar('permisos')
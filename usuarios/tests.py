@@ -1,3 +1,840 @@
-from django.test import TestCase
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from sisbar_config.paginacion import filtro_prefijo
+from sisbar_config.pruebas import FuncionalTestCase, MINIMO, RendimientoTestCase
+from categorias.models import Categoria
+from inventario.models import Producto
+from proveedores.models import Proveedor
+from .models import Usuario
+
+
+class FabricasMixin:
+    """Registros temporales con nombres únicos para las pruebas"""
+
+    def setUp(self):
+        super().setUp()
+        self.secuencia = count()
+
+    def nuevo_usuario(self, **extra):
+        n = next(self.secuencia)
+        datos = {'username': f'temporal{n}', 'email': f'temporal{n}@sisbar.test', 'documento': f'T{n}'}
+        datos.update(extra)
+        return Usuario.objects.create(**datos)
+
+    def nuevo_producto(self, **extra):
+        n = next(self.secuencia)
+        return Producto.objects.create(
+            codigo=f'TMP-{n}', nombre=f'Temporal {n}',
+            categoria=Categoria.objects.order_by('id').first(), **extra
+        )
+
+    def nueva_categoria(self, **extra):
+        return Categoria.objects.create(nombre=f'Temporal {next(self.secuencia)}', **extra)
+
+    def nuevo_proveedor(self, **extra):
+        n = next(self.secuencia)
+        return Proveedor.objects.create(nombre=f'Temporal {n}', nit=f'TMP-{n}', **extra)
+
+
+class UsuariosRendimientoTests(FabricasMixin, RendimientoTestCase):
+    """Presupuesto de consultas y tiempos de usuarios, grupos y papelera"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        permisos = Permission.objects.filter(content_type__app_label='inventario')
+        for nombre in ('Cajeros', 'Bodega'):
+            Group.objects.create(name=nombre).permissions.set(permisos)
+        cls.grupo = Group.objects.get(name='Cajeros')
+        # El Super Administrador no se puede editar desde la gestión de usuarios
+        cls.empleado = Usuario.objects.exclude(rol='SUPER_ADMIN').order_by('id').first()
+
+    def anonimo(self):
+        self.client.logout()
+
+    # ========== AUTENTICACIÓN ==========
+    def test_registro_get(self):
+        self.medir_vista('registro_get', reverse('usuarios:registro'), 0, preparar=self.anonimo)
+
+    def test_registro_post(self):
+        def datos():
+            n = next(self.secuencia)
+            return {
+                'username': f'nuevo{n}', 'email': f'nuevo{n}@sisbar.test', 'first_name': 'Nuevo',
+                'last_name': 'Empleado', 'documento': f'N{n}', 'rol': 'EMPLEADO',
+                'password1': 'Cl4ve-Segura-99', 'password2': 'Cl4ve-Segura-99',
+            }
+        self.medir_vista('registro_post', reverse('usuarios:registro'), 9, metodo='post',
+                         datos=datos, preparar=self.anonimo)
+
+    def test_login_get(self):
+        self.medir_vista('login_get', reverse('usuarios:login'), 0, preparar=self.anonimo)
+
+    def test_login_post(self):
+        datos = {'username': 'admin_pruebas', 'password': 'clave-segura-123'}
+        self.medir_vista('login_post', reverse('usuarios:login'), 12, metodo='post',
+                         datos=datos, preparar=self.anonimo)
+
+    def test_logout(self):
+        self.medir_vista('logout', reverse('usuarios:logout'), 3,
+                         preparar=lambda: self.client.force_login(self.admin))
+
+    # ========== PERFIL ==========
+    def test_perfil_get(self):
+        self.medir_vista('perfil_get', reverse('usuarios:perfil'), 1)
+
+    def test_perfil_post(self):
+        datos = {'first_name': 'Admin', 'last_name': 'Pruebas', 'email': 'admin@sisbar.test', 'telefono': '300'}
+        self.medir_vista('perfil_post', reverse('usuarios:perfil'), 2, metodo='post', datos=datos)
+
+    def test_cambiar_password_get(self):
+        self.medir_vista('cambiar_password_get', reverse('usuarios:cambiar_password'), 0)
+
+    def test_cambiar_password_post(self):
+        def preparar():
+            self.admin.set_password('clave-segura-123')
+            self.admin.save()
+            self.client.force_login(self.admin)
+        datos = {
+            'old_password': 'clave-segura-123',
+            'new_password1': 'Otra-Clave-456', 'new_password2': 'Otra-Clave-456',
+        }
+        # +1: la identidad cacheada no trae la contraseña, se lee para verificarla
+        self.medir_vista('cambiar_password_post', reverse('usuarios:cambiar_password'), 12,
+                         metodo='post', datos=datos, preparar=preparar)
+
+    # ========== GESTIÓN DE USUARIOS ==========
+    def test_gestionar_usuarios(self):
+        self.medir_vista('gestionar_usuarios', reverse('usuarios:gestionar_usuarios'), 2)
+
+    def test_gestionar_usuarios_busqueda(self):
+        url = reverse('usuarios:gestionar_usuarios') + '?filtro=activos&q=s1'
+        self.medir_vista('gestionar_usuarios_busqueda', url, 2)
+
+    def test_aprobar_usuario_get(self):
+        url = reverse('usuarios:aprobar_usuario', args=[self.empleado.id])
+        self.medir_vista('aprobar_usuario_get', url, 1)
+
+    def test_aprobar_usuario_post(self):
+        url = lambda: reverse('usuarios:aprobar_usuario', args=[self.nuevo_usuario().id])
+        self.medir_vista('aprobar_usuario_post', url, 6, metodo='post',
+                         datos={'rol': 'EMPLEADO', 'aprobado': 'on'})
+
+    def test_toggle_usuario(self):
+        url = reverse('usuarios:toggle_usuario', args=[self.empleado.id])
+        self.medir_vista('toggle_usuario', url, 3)
+
+    def test_detalle_usuario(self):
+        url = reverse('usuarios:detalle_usuario', args=[self.empleado.id])
+        self.medir_vista('detalle_usuario', url, 5)
+
+    def test_editar_usuario_completo_get(self):
+        url = reverse('usuarios:editar_usuario_completo', args=[self.empleado.id])
+        self.medir_vista('editar_usuario_completo_get', url, 5)
+
+    def test_editar_usuario_completo_post(self):
+        url = reverse('usuarios:editar_usuario_completo', args=[self.empleado.id])
+        datos = {
+            'first_name': 'Emp', 'last_name': 'Leado', 'email': 'empleado@sisbar.test',
+            'documento': self.empleado.documento, 'rol': 'EMPLEADO', 'is_active': 'on',
+            'aprobado': 'on', 'grupos': [self.grupo.id],
+        }
+        self.medir_vista('editar_usuario_completo_post', url, 7, metodo='post', datos=datos)
+
+    def test_resetear_password_get(self):
+        url = reverse('usuarios:resetear_password', args=[self.empleado.id])
+        self.medir_vista('resetear_password_get', url, 1)
+
+    def test_resetear_password_post(self):
+        url = reverse('usuarios:resetear_password', args=[self.empleado.id])
+        self.medir_vista('resetear_password_post', url, 3, metodo='post',
+                         datos={'nueva_password': 'Nueva-Clave-789'})
+
+    def test_eliminar_usuario_get(self):
+        url = reverse('usuarios:eliminar_usuario', args=[self.empleado.id])
+        self.medir_vista('eliminar_usuario_get', url, 1)
+
+    def test_eliminar_usuario_post(self):
+        url = lambda: reverse('usuarios:eliminar_usuario', args=[self.nuevo_usuario().id])
+        self.medir_vista('eliminar_usuario_post', url, 5, metodo='post')
+
+    # ========== GRUPOS ==========
+    def test_gestionar_grupos(self):
+        self.medir_vista('gestionar_grupos', reverse('usuarios:gestionar_grupos'), 4)
+
+    def test_crear_grupo_get(self):
+        self.medir_vista('crear_grupo_get', reverse('usuarios:crear_grupo'), 1)
+
+    def test_crear_grupo_post(self):
+        permisos = list(Permission.objects.values_list('id', flat=True)[:5])
+        self.medir_vista(
+            'crear_grupo_post', reverse('usuarios:crear_grupo'), 6, metodo='post',
+            datos=lambda: {'nombre': f'Grupo {next(self.secuencia)}', 'permisos': permisos},
+        )
+
+    def test_editar_grupo_get(self):
+        self.medir_vista('editar_grupo_get', reverse('usuarios:editar_grupo', args=[self.grupo.id]), 6)
+
+    def test_editar_grupo_post(self):
+        permisos = list(Permission.objects.values_list('id', flat=True)[:5])
+        url = reverse('usuarios:editar_grupo', args=[self.grupo.id])
+        self.medir_vista('editar_grupo_post', url, 7, metodo='post',
+                         datos={'nombre': 'Cajeros', 'permisos': permisos})
+
+    def test_eliminar_grupo(self):
+        url = lambda: reverse(
+            'usuarios:eliminar_grupo', args=[Group.objects.create(name=f'Grupo {next(self.secuencia)}').id]
+        )
+        self.medir_vista('eliminar_grupo', url, 9, metodo='post')
+
+    # ========== PAPELERA ==========
+    def test_panel_eliminados(self):
+        Producto.objects.filter(id__in=Producto.objects.order_by('id').values('id')[:10]).update(activo=False)
+        self.medir_vista('panel_eliminados', reverse('usuarios:panel_eliminados'), 1)
+
+    def test_papelera_seccion(self):
+        Producto.objects.filter(id__in=Producto.objects.order_by('id').values('id')[:30]).update(activo=False)
+        self.medir_vista('papelera_seccion', reverse('usuarios:papelera_seccion', args=['productos']), 1)
+
+    def test_restaurar_producto(self):
+        url = lambda: reverse('usuarios:restaurar_producto', args=[self.nuevo_producto(activo=False).id])
+        # Total de la categoría contra la fila bloqueada: +3 (SAVEPOINT, SELECT ... FOR UPDATE, RELEASE)
+        self.medir_vista('restaurar_producto', url, 7, metodo='post')
+
+    def test_restaurar_categoria(self):
+        url = lambda: reverse('usuarios:restaurar_categoria', args=[self.nueva_categoria(activa=False).id])
+        self.medir_vista('restaurar_categoria', url, 3, metodo='post')
+
+    def test_restaurar_proveedor(self):
+        url = lambda: reverse('usuarios:restaurar_proveedor', args=[self.nuevo_proveedor(activo=False).id])
+        self.medir_vista('restaurar_proveedor', url, 3, metodo='post')
+
+    def test_restaurar_usuario(self):
+        url = lambda: reverse('usuarios:restaurar_usuario', args=[self.nuevo_usuario(is_active=False).id])
+        self.medir_vista('restaurar_usuario', url, 4, metodo='post')
+
+    def test_eliminar_producto_definitivo(self):
+        url = lambda: reverse('usuarios:eliminar_producto_definitivo', args=[self.nuevo_producto(activo=False).id])
+        # Incluye el SELECT ... FOR UPDATE que protege al producto de una restauración
+        self.medir_vista('eliminar_producto_definitivo', url, 16, metodo='post')
+
+    def test_eliminar_categoria_definitivo(self):
+        url = lambda: reverse('usuarios:eliminar_categoria_definitivo', args=[self.nueva_categoria(activa=False).id])
+        self.medir_vista('eliminar_categoria_definitivo', url, 6, metodo='post')
+
+    def test_eliminar_proveedor_definitivo(self):
+        url = lambda: reverse('usuarios:eliminar_proveedor_definitivo', args=[self.nuevo_proveedor(activo=False).id])
+        self.medir_vista('eliminar_proveedor_definitivo', url, 4, metodo='post')
+
+    def test_eliminar_usuario_definitivo(self):
+        url = lambda: reverse('usuarios:eliminar_usuario_definitivo', args=[self.nuevo_usuario(is_active=False).id])
+        self.medir_vista('eliminar_usuario_definitivo', url, 11, metodo='post')
+
+    def test_desactivar_producto(self):
+        url = lambda: reverse('usuarios:desactivar_producto', args=[self.nuevo_producto().id])
+        # Total de la categoría contra la fila bloqueada: +3 (SAVEPOINT, SELECT ... FOR UPDATE, RELEASE)
+        self.medir_vista('desactivar_producto', url, 8, metodo='post')
+
+    def test_desactivar_categoria(self):
+        url = lambda: reverse('usuarios:desactivar_categoria', args=[self.nueva_categoria().id])
+        self.medir_vista('desactivar_categoria', url, 5, metodo='post')
+
+    def test_desactivar_proveedor(self):
+        url = lambda: reverse('usuarios:desactivar_proveedor', args=[self.nuevo_proveedor().id])
+        self.medir_vista('desactivar_proveedor', url, 4, metodo='post')
+
+    def test_desactivar_usuario(self):
+        url = lambda: reverse('usuarios:desactivar_usuario', args=[self.nuevo_usuario().id])
+        self.medir_vista('desactivar_usuario', url, 5, metodo='post')
+
+    def test_restaurar_lote_consultas(self):
+        seleccion = {}
+
+        def preparar():
+            seleccion['ids'] = [self.nuevo_producto(activo=False).id for _ in range(5)]
+
+        self.medir_vista('papelera_restaurar_lote', reverse('usuarios:papelera_restaurar_lote', args=['productos']),
+                         6, metodo='post', datos=lambda: seleccion, preparar=preparar)
+
+    def test_purgar_lote_consultas(self):
+        seleccion = {}
+
+        def preparar():
+            seleccion['ids'] = [self.nuevo_producto(activo=False).id for _ in range(5)]
+
+        # Con TAREAS_SINCRONAS el borrado corre dentro de la petición
+        self.medir_vista('papelera_purgar_lote', reverse('usuarios:papelera_purgar_lote', args=['productos']),
+                         14, metodo='post', datos=lambda: seleccion, preparar=preparar, estados=(202,))
+
+    def test_tarea_estado(self):
+        from sisbar_config import tareas
+        tarea_id = tareas.encolar('Tarea de prueba', lambda progreso: None)
+        self.medir_vista('tarea_estado', reverse('usuarios:tarea_estado', args=[tarea_id]), 0)
+
+    def test_aprobar_lote_consultas(self):
+        seleccion = {}
+
+        def preparar():
+            seleccion['ids'] = [self.nuevo_usuario(aprobado=False).id for _ in range(10)]
+
+        self.medir_vista('aprobar_usuarios_lote', reverse('usuarios:aprobar_usuarios_lote'), 3,
+                         metodo='post', datos=lambda: seleccion, preparar=preparar)
+
+
+class IdentidadCacheadaTests(FuncionalTestCase):
+    """Con la caché caliente, autenticar una petición no consulta la base de datos"""
+
+    TABLAS_AUTH = ('django_session', 'usuarios_usuario', 'auth_permission', 'auth_group')
+
+    def consultas_auth(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            self.client.get(reverse('inventario:buscar_producto_ajax'), {'codigo': 'no-existe'})
+        return [q['sql'] for q in capturadas if any(t in q['sql'] for t in self.TABLAS_AUTH)]
+
+    def test_cero_consultas_en_caliente(self):
+        self.assertTrue(self.consultas_auth())
+        self.assertEqual(self.consultas_auth(), [])
+        usuario = self.client.get(reverse('inventario:buscar_producto_ajax')).wsgi_request.user
+        with self.assertNumQueries(0):
+            self.assertTrue(usuario.has_perm('inventario.change_producto'))
+
+    def test_guardar_usuario_invalida(self):
+        self.consultas_auth()
+        self.admin.first_name = 'Renombrado'
+        self.admin.save()
+        self.assertTrue(self.consultas_auth())
+        usuario = self.client.get(reverse('usuarios:perfil')).wsgi_request.user
+        self.assertEqual(usuario.first_name, 'Renombrado')
+
+    def test_permisos_de_grupo_invalidan(self):
+        empleado = Usuario.objects.create_user(
+            'cajero_grupo', password='clave-segura-123', documento='G-1',
+            aprobado=True, notificado_aprobacion=True,
+        )
+        grupo = Group.objects.create(name='Cajeros')
+        empleado.groups.add(grupo)
+        self.client.force_login(empleado)
+        usuario = self.client.get(reverse('usuarios:perfil')).wsgi_request.user
+        self.assertFalse(usuario.has_perm('inventario.change_producto'))
+
+        grupo.permissions.add(Permission.objects.get(codename='change_producto'))
+        usuario = self.client.get(reverse('usuarios:perfil')).wsgi_request.user
+        self.assertTrue(usuario.has_perm('inventario.change_producto'))
+
+
+    def test_usuario_desactivado_en_otro_worker(self):
+        from django.core.cache import cache
+        from .backends import UsuarioCacheadoBackend, clave_identidad
+        self.consultas_auth()
+        # Otro worker desactivó al usuario y esta caché no se enteró
+        cacheado = cache.get(clave_identidad(self.admin.id))
+        cacheado['campos']['is_active'] = False
+        cache.set(clave_identidad(self.admin.id), cacheado)
+        self.assertIsNone(UsuarioCacheadoBackend().get_user(self.admin.id))
+
+    def test_sin_contrasena_en_la_cache(self):
+        from django.core.cache import cache
+        from .backends import clave_identidad
+        self.consultas_auth()
+        cacheado = cache.get(clave_identidad(self.admin.id))
+        self.assertNotIn('password', cacheado['campos'])
+        self.assertNotIn(self.admin.password, repr(cacheado))
+        # La sesión sigue valiendo con la identidad cacheada
+        self.assertEqual(self.consultas_auth(), [])
+        self.assertTrue(self.client.get(reverse('usuarios:perfil')).wsgi_request.user.is_authenticated)
+
+    def test_cambiar_contrasena_con_identidad_cacheada(self):
+        self.admin.set_password('clave-vieja-123')
+        self.admin.save()
+        self.client.force_login(self.admin)
+        self.consultas_auth()
+        self.client.post(reverse('usuarios:cambiar_password'), {
+            'old_password': 'clave-vieja-123',
+            'new_password1': 'Clave-Nueva-456!', 'new_password2': 'Clave-Nueva-456!',
+        })
+        self.admin.refresh_from_db()
+        self.assertTrue(self.admin.check_password('Clave-Nueva-456!'))
+        # La sesión quedó con el hash de la contraseña nueva
+        self.assertTrue(self.client.get(reverse('usuarios:perfil')).wsgi_request.user.is_authenticated)
+
+    def test_aget_user_usa_la_cache(self):
+        from asgiref.sync import async_to_sync
+        from .backends import UsuarioCacheadoBackend
+        backend = UsuarioCacheadoBackend()
+        backend.get_user(self.admin.id)
+        with self.assertNumQueries(0):
+            usuario = async_to_sync(backend.aget_user)(self.admin.id)
+        self.assertEqual(usuario.pk, self.admin.pk)
+
+    def test_duracion_con_cache_por_proceso(self):
+        from unittest import mock
+        from django.core.cache import cache
+        from django.test import override_settings
+        from .backends import UsuarioCacheadoBackend
+        with override_settings(IDENTIDAD_DURACION_LOCAL=3), mock.patch.object(cache, 'set') as guardar:
+            UsuarioCacheadoBackend().get_user(self.admin.id)
+        self.assertEqual(guardar.call_args.args[2], 3)
+        with mock.patch('sisbar_config.cache.compartida', return_value=True), \
+                mock.patch.object(cache, 'set') as guardar:
+            UsuarioCacheadoBackend().get_user(self.admin.id)
+        self.assertEqual(len(guardar.call_args.args), 2)
+
+
+class GestionarUsuariosPaginacionTests(FuncionalTestCase):
+    """Paginación por cursor y búsqueda por prefijo de la gestión de usuarios"""
+
+    # Más de una página de usuarios
+    datos = dict(MINIMO, usuarios=30)
+
+    def recorrer(self, **parametros):
+        url = reverse('usuarios:gestionar_usuarios')
+        vistos, paginas = [], []
+        respuesta = self.client.get(url, parametros)
+        while True:
+            pagina = respuesta.context['pagina']
+            paginas.append(pagina)
+            vistos += [u.id for u in pagina]
+            if not pagina.siguiente:
+                return vistos, paginas
+            respuesta = self.client.get(url, dict(parametros, despues=pagina.siguiente))
+
+    def test_recorre_todos_sin_repetir(self):
+        vistos, paginas = self.recorrer()
+        esperados = list(Usuario.objects.order_by('-date_joined', '-id').values_list('id', flat=True))
+        self.assertGreater(len(paginas), 1)
+        self.assertEqual(vistos, esperados)
+
+        # Volver desde la segunda página devuelve la primera
+        respuesta = self.client.get(reverse('usuarios:gestionar_usuarios'), {'antes': paginas[1].anterior})
+        self.assertEqual([u.id for u in respuesta.context['pagina']], [u.id for u in paginas[0]])
+        self.assertIsNone(respuesta.context['pagina'].anterior)
+
+    def test_busqueda_por_prefijo(self):
+        usuario = Usuario.objects.exclude(documento__isnull=True).order_by('id').last()
+        prefijo = usuario.username[:4]
+        vistos, _ = self.recorrer(q=prefijo.upper())
+        self.assertIn(usuario.id, vistos)
+        for u in Usuario.objects.filter(id__in=vistos):
+            campos = (u.username, u.email, u.documento or '', u.first_name, u.last_name)
+            self.assertTrue(any(c.lower().startswith(prefijo.lower()) for c in campos))
+
+        vistos, _ = self.recorrer(q=usuario.documento)
+        self.assertIn(usuario.id, vistos)
+        # Un fragmento intermedio del documento no es un prefijo
+        self.assertNotIn(usuario.id, self.recorrer(q=usuario.documento[3:])[0])
+
+    def test_prefijo_terminado_en_puntuacion(self):
+        usuario = Usuario.objects.filter(rol='EMPLEADO').first()
+        usuario.username = 'juan.perez'
+        usuario.email = 'juan@sisbar.test'
+        usuario.save(update_fields=['username', 'email'])
+        for prefijo in ('juan.', 'JUAN@'):
+            self.assertIn(usuario.id, self.recorrer(q=prefijo)[0])
+
+    def test_prefijo_sin_rango_fuera_de_sqlite(self):
+        # Con intercalaciones de idioma el rango pierde 'juan.perez'; solo va el LIKE
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            _, filtro = filtro_prefijo('Juan.', 'username')
+        self.assertEqual(filtro.children, [('username_minusculas__startswith', 'juan.')])
+        _, filtro = filtro_prefijo('Juan.', 'username')
+        self.assertIn(('username_minusculas__lt', 'juan/'), filtro.children)
+
+    def test_cursor_invalido_muestra_primera_pagina(self):
+        respuesta = self.client.get(reverse('usuarios:gestionar_usuarios'), {'despues': 'no-es-un-cursor'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIsNone(respuesta.context['pagina'].anterior)
+
+
+class PapeleraPaginadaTests(FuncionalTestCase):
+    """La papelera carga cada sección por páginas y cuenta todo en una consulta"""
+
+    # 60 productos inactivos: tres páginas
+    datos = dict(MINIMO, productos=70, usuarios=6)
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Producto.objects.filter(id__in=Producto.objects.order_by('id').values('id')[:60]).update(activo=False)
+        Usuario.objects.filter(rol='EMPLEADO').update(is_active=False)
+
+    def recorrer(self, seccion):
+        url = reverse('usuarios:papelera_seccion', args=[seccion])
+        vistos, paginas = [], 0
+        datos = self.client.get(url).json()
+        while True:
+            paginas += 1
+            vistos += [item['id'] for item in datos['items']]
+            if not datos['siguiente']:
+                return vistos, paginas
+            datos = self.client.get(url, {'despues': datos['siguiente']}).json()
+
+    def test_recorre_productos_inactivos_sin_repetir(self):
+        vistos, paginas = self.recorrer('productos')
+        esperados = list(
+            Producto.objects.filter(activo=False).order_by('-fecha_creacion', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(len(esperados), 60)
+        self.assertEqual(paginas, 3)
+        self.assertEqual(vistos, esperados)
+
+    def test_cada_seccion_trae_acciones(self):
+        for seccion in ('productos', 'categorias', 'proveedores', 'usuarios'):
+            datos = self.client.get(reverse('usuarios:papelera_seccion', args=[seccion])).json()
+            self.assertEqual(datos['seccion'], seccion)
+            for item in datos['items']:
+                self.assertIn('/restaurar/', item['restaurar'])
+                self.assertIn('/borrar-definitivo/', item['borrar'])
+
+    def test_totales_en_una_consulta(self):
+        from usuarios.views import contar_papelera
+        with CaptureQueriesContext(connection) as capturadas:
+            totales = contar_papelera()
+        self.assertEqual(len(capturadas), 1)
+        self.assertEqual(totales, {
+            'productos': Producto.objects.filter(activo=False).count(),
+            'categorias': Categoria.objects.filter(activa=False).count(),
+            'proveedores': Proveedor.objects.filter(activo=False).count(),
+            'usuarios': Usuario.objects.filter(is_active=False).count(),
+        })
+        self.assertEqual(totales['productos'], 60)
+
+    def test_panel_no_carga_filas(self):
+        respuesta = self.client.get(reverse('usuarios:panel_eliminados'))
+        self.assertEqual(respuesta.context['totales']['productos'], 60)
+        self.assertNotContains(respuesta, '/eliminados/producto/')
+
+    def test_seccion_desconocida(self):
+        respuesta = self.client.get(reverse('usuarios:papelera_seccion', args=['pedidos']))
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_solo_admins(self):
+        empleado = Usuario.objects.filter(rol='EMPLEADO', aprobado=True).first()
+        empleado.is_active = True
+        empleado.save()
+        self.client.force_login(empleado)
+        respuesta = self.client.get(reverse('usuarios:papelera_seccion', args=['productos']))
+        self.assertEqual(respuesta.status_code, 302)
+
+
+class PapeleraLoteTests(FabricasMixin, FuncionalTestCase):
+    """Restaurar y borrar definitivamente en lote desde la papelera"""
+
+    datos = MINIMO
+
+    def inactivar_productos_con_historial(self, cantidad):
+        ids = list(
+            Producto.objects.filter(movimientos__isnull=False).distinct().order_by('id').values_list('id', flat=True)[:cantidad]
+        )
+        Producto.objects.filter(id__in=ids).update(activo=False)
+        return ids
+
+    def test_restaurar_lote(self):
+        ids = [self.nuevo_producto(activo=False).id for _ in range(3)]
+        otro = self.nuevo_producto(activo=False)
+        respuesta = self.client.post(
+            reverse('usuarios:papelera_restaurar_lote', args=['productos']), {'ids': ids}
+        )
+        self.assertEqual(respuesta.json()['restaurados'], 3)
+        self.assertEqual(Producto.objects.filter(id__in=ids, activo=True).count(), 3)
+        otro.refresh_from_db()
+        self.assertFalse(otro.activo)
+
+    def test_restaurar_usuarios_olvida_identidad(self):
+        from .backends import clave_identidad
+        from django.core.cache import cache
+        usuario = self.nuevo_usuario(is_active=False)
+        cache.set(clave_identidad(usuario.id), usuario)
+        self.client.post(reverse('usuarios:papelera_restaurar_lote', args=['usuarios']), {'ids': [usuario.id]})
+        self.assertIsNone(cache.get(clave_identidad(usuario.id)))
+
+    def test_sin_seleccion(self):
+        respuesta = self.client.post(reverse('usuarios:papelera_purgar_lote', args=['productos']))
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_purgar_productos_por_lotes(self):
+        from movimientos.models import Movimiento
+        from sisbar_config.tareas import Progreso
+        from . import papelera
+
+        ids = self.inactivar_productos_con_historial(5)
+        movimientos = Movimiento.objects.filter(producto_id__in=ids).count()
+        activo = Producto.objects.filter(activo=True).first()
+        progreso = Progreso('prueba', 'Purgar productos')
+        with CaptureQueriesContext(connection) as capturadas:
+            eliminados = papelera.purgar_lote(progreso, 'productos', ids + [activo.id], bloque=2, lote=3)
+
+        self.assertEqual(eliminados, 5)
+        self.assertFalse(Producto.objects.filter(id__in=ids).exists())
+        self.assertFalse(Movimiento.objects.filter(producto_id__in=ids).exists())
+        self.assertTrue(Producto.objects.filter(id=activo.id).exists())
+        self.assertEqual(progreso.datos['estado'], 'TERMINADA')
+        self.assertEqual((progreso.datos['hechos'], progreso.datos['total']), (5, 5))
+        # Los movimientos se borran de a 3 por DELETE
+        deletes = [q for q in capturadas if q['sql'].startswith('DELETE FROM "movimientos_movimiento"')]
+        self.assertGreaterEqual(len(deletes), -(-movimientos // 3))
+
+    def test_restaurado_durante_la_purga_se_conserva(self):
+        from movimientos.models import Movimiento
+        from sisbar_config.tareas import Progreso
+        from . import papelera
+
+        ids = self.inactivar_productos_con_historial(3)
+        seccion = papelera.SECCIONES['productos']
+        bloquear = seccion.bloquear
+        llamadas = count()
+
+        def restaurar_a_mitad(pks):
+            # Tras el primer lote de movimientos alguien restaura el primer producto
+            if next(llamadas) == 1:
+                papelera.restaurar_lote('productos', [ids[0]])
+            return bloquear(pks)
+
+        progreso = Progreso('prueba', 'Purgar productos')
+        with mock.patch.object(seccion, 'bloquear', side_effect=restaurar_a_mitad), \
+                self.assertLogs('usuarios.papelera', 'WARNING'):
+            eliminados = papelera.purgar_lote(progreso, 'productos', ids, bloque=3, lote=1)
+
+        self.assertEqual(eliminados, 2)
+        self.assertTrue(Producto.objects.filter(id=ids[0], activo=True).exists())
+        self.assertFalse(Producto.objects.filter(id__in=ids[1:]).exists())
+        self.assertFalse(Movimiento.objects.filter(producto_id__in=ids[1:]).exists())
+        self.assertEqual(progreso.datos['omitidos'], 1)
+        self.assertIn('1 restaurados durante la purga', progreso.datos['mensaje'])
+
+    def test_purga_interrumpida_se_puede_repetir(self):
+        from movimientos.models import Movimiento
+        from sisbar_config.tareas import Progreso
+        from . import papelera
+
+        ids = self.inactivar_productos_con_historial(4)
+        purgar = papelera.purgar_bloque
+        bloques = count()
+
+        def cortar(*args, **kwargs):
+            # El worker se recicla en el segundo bloque
+            if next(bloques) == 1:
+                raise RuntimeError('worker reciclado')
+            return purgar(*args, **kwargs)
+
+        with mock.patch.object(papelera, 'purgar_bloque', side_effect=cortar):
+            with self.assertRaises(RuntimeError):
+                papelera.purgar_lote(Progreso('prueba', 'Purgar'), 'productos', ids, bloque=2)
+        self.assertEqual(Producto.objects.filter(id__in=ids).count(), 2)
+
+        self.assertEqual(papelera.purgar_lote(Progreso('prueba', 'Purgar'), 'productos', ids, bloque=2), 2)
+        self.assertFalse(Producto.objects.filter(id__in=ids).exists())
+        self.assertFalse(Movimiento.objects.filter(producto_id__in=ids).exists())
+
+    def test_purgar_vista_y_progreso(self):
+        ids = self.inactivar_productos_con_historial(3)
+        respuesta = self.client.post(reverse('usuarios:papelera_purgar_lote', args=['productos']), {'ids': ids})
+        self.assertEqual(respuesta.status_code, 202)
+        tarea = self.client.get(respuesta.json()['estado']).json()
+        self.assertEqual(tarea['estado'], 'TERMINADA')
+        self.assertEqual(tarea['hechos'], 3)
+        self.assertFalse(Producto.objects.filter(id__in=ids).exists())
+
+    def test_purgar_todos(self):
+        self.inactivar_productos_con_historial(4)
+        respuesta = self.client.post(reverse('usuarios:papelera_purgar_lote', args=['productos']), {'todos': '1'})
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertFalse(Producto.objects.filter(activo=False).exists())
+
+    def test_categorias_con_productos_se_omiten(self):
+        vacia = self.nueva_categoria(activa=False)
+        con_productos = Producto.objects.first().categoria
+        Categoria.objects.filter(id=con_productos.id).update(activa=False)
+        respuesta = self.client.post(
+            reverse('usuarios:papelera_purgar_lote', args=['categorias']), {'ids': [vacia.id, con_productos.id]}
+        )
+        tarea = self.client.get(respuesta.json()['estado']).json()
+        self.assertEqual((tarea['hechos'], tarea['omitidos']), (1, 1))
+        self.assertFalse(Categoria.objects.filter(id=vacia.id).exists())
+        self.assertTrue(Categoria.objects.filter(id=con_productos.id).exists())
+
+    def test_purgar_usuarios_conserva_movimientos(self):
+        from movimientos.models import Movimiento
+        from .models import HistorialActividad
+        movimiento = Movimiento.objects.exclude(usuario=None).first()
+        usuario = movimiento.usuario
+        if usuario.id == self.admin.id:
+            self.skipTest('El movimiento es del admin de pruebas')
+        HistorialActividad.objects.create(usuario=usuario, tipo='LOGIN', descripcion='Ingreso')
+        Usuario.objects.filter(id=usuario.id).update(is_active=False)
+
+        self.client.post(reverse('usuarios:papelera_purgar_lote', args=['usuarios']), {'ids': [usuario.id]})
+        self.assertFalse(Usuario.objects.filter(id=usuario.id).exists())
+        self.assertFalse(HistorialActividad.objects.filter(usuario_id=usuario.id).exists())
+        movimiento.refresh_from_db()
+        self.assertIsNone(movimiento.usuario_id)
+
+    def test_tarea_desconocida(self):
+        respuesta = self.client.get(reverse('usuarios:tarea_estado', args=['no-existe']))
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class TareasSegundoPlanoTests(FuncionalTestCase):
+    """Las tareas corren en un hilo y publican su progreso"""
+
+    def esperar(self, tarea_id):
+        import time
+        from sisbar_config import tareas
+        for _ in range(200):
+            estado = tareas.estado(tarea_id)
+            if estado['estado'] in ('TERMINADA', 'FALLIDA'):
+                return estado
+            time.sleep(0.01)
+        self.fail('La tarea no terminó')
+
+    def test_tarea_en_hilo(self):
+        from django.test import override_settings
+        from sisbar_config import tareas
+
+        def contar(progreso, total):
+            progreso.iniciar(total=total)
+            for _ in range(total):
+                progreso.avanzar()
+
+        with override_settings(TAREAS_SINCRONAS=False):
+            estado = self.esperar(tareas.encolar('Contar', contar, 4))
+        self.assertEqual(estado['estado'], 'TERMINADA')
+        self.assertEqual(estado['hechos'], 4)
+
+    def test_tarea_fallida(self):
+        from sisbar_config import tareas
+
+        def fallar(progreso):
+            raise ValueError('sin datos')
+
+        with self.assertLogs('sisbar_config.tareas', level='ERROR'):
+            estado = tareas.estado(tareas.encolar('Fallar', fallar))
+        self.assertEqual((estado['estado'], estado['mensaje']), ('FALLIDA', 'sin datos'))
+
+
+class AprobacionLoteTests(FabricasMixin, FuncionalTestCase):
+    """Aprobar en lote: un UPDATE y correos fuera de la petición"""
+
+    def pendientes(self, cantidad):
+        return [
+            self.nuevo_usuario(first_name=f'Nuevo {n}', aprobado=False).id
+            for n in range(cantidad)
+        ]
+
+    def test_un_update_y_sin_correos_en_la_peticion(self):
+        from django.core import mail
+        ids = self.pendientes(40)
+        mail.outbox = []
+
+        with self.captureOnCommitCallbacks(execute=False) as programadas:
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = self.client.post(reverse('usuarios:aprobar_usuarios_lote'), {'ids': ids})
+        self.assertEqual(respuesta.status_code, 302)
+        updates = [q for q in capturadas if q['sql'].startswith('UPDATE "usuarios_usuario"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(len(programadas), 1)
+        self.assertEqual(Usuario.objects.filter(id__in=ids, aprobado=True, notificado_aprobacion=False).count(), 40)
+
+        # La tarea envía todo y marca la transición
+        for programada in programadas:
+            programada()
+        self.assertEqual(len(mail.outbox), 40)
+        self.assertEqual(Usuario.objects.filter(id__in=ids, notificado_aprobacion=True).count(), 40)
+        self.assertTrue(all(u.aprobado_por_id == self.admin.id for u in Usuario.objects.filter(id__in=ids)))
+
+    def test_aprobar_todos_los_pendientes(self):
+        ids = self.pendientes(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('usuarios:aprobar_usuarios_lote'), {'todos': '1'})
+        self.assertFalse(Usuario.objects.filter(aprobado=False).exists())
+        self.assertEqual(Usuario.objects.filter(id__in=ids, notificado_aprobacion=True).count(), 3)
+
+    def test_correo_fallido_queda_pendiente(self):
+        from unittest import mock
+        ids = self.pendientes(3)
+        fallido = Usuario.objects.get(id=ids[1])
+        enviar = mock.Mock(side_effect=lambda usuario, *a, **k: usuario.pk != fallido.pk)
+        with mock.patch('usuarios.aprobacion.enviar_email_aprobacion', enviar), \
+                self.assertLogs('usuarios.aprobacion', level='WARNING'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('usuarios:aprobar_usuarios_lote'), {'ids': ids})
+        self.assertEqual(enviar.call_count, 3)
+        self.assertEqual(
+            set(Usuario.objects.filter(id__in=ids, notificado_aprobacion=False).values_list('id', flat=True)),
+            {fallido.id},
+        )
+
+    def test_fallidos_se_reintentan_con_el_comando(self):
+        from io import StringIO
+        from django.core import mail
+        from django.core.management import call_command
+        ids = self.pendientes(2)
+        with mock.patch('usuarios.aprobacion.enviar_email_aprobacion', return_value=False), \
+                self.assertLogs('usuarios.aprobacion', level='WARNING'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('usuarios:aprobar_usuarios_lote'), {'ids': ids})
+        mail.outbox = []
+
+        salida = StringIO()
+        call_command('notificar_aprobaciones', stdout=salida)
+        self.assertIn('2 correos', salida.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Usuario.objects.filter(id__in=ids, notificado_aprobacion=True).count(), 2)
+
+    def test_reclamados_por_otro_no_se_envian(self):
+        from datetime import timedelta
+        from django.core import mail
+        from django.utils import timezone
+        from sisbar_config.tareas import Progreso
+        from .aprobacion import RECLAMO_VENCE, notificar_aprobaciones, reclamar
+        ids = self.pendientes(3)
+        with self.captureOnCommitCallbacks(execute=False):
+            self.client.post(reverse('usuarios:aprobar_usuarios_lote'), {'ids': ids})
+        mail.outbox = []
+
+        # Otro worker los reclamó y todavía los está enviando
+        reclamar(ids[:2])
+        notificar_aprobaciones(Progreso('prueba', 'Notificar'), ids)
+        self.assertEqual([m.to for m in mail.outbox], [[Usuario.objects.get(id=ids[2]).email]])
+
+        # Si ese worker murió, el reclamo vence y se vuelven a enviar
+        Usuario.objects.filter(id__in=ids[:2]).update(
+            notificacion_reclamada=timezone.now() - RECLAMO_VENCE - timedelta(seconds=1)
+        )
+        notificar_aprobaciones(Progreso('prueba', 'Notificar'), ids)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(Usuario.objects.filter(id__in=ids, notificado_aprobacion=False).exists())
+
+    def test_aprobar_individual_no_envia_en_la_peticion(self):
+        from django.core import mail
+        usuario = Usuario.objects.get(id=self.pendientes(1)[0])
+        mail.outbox = []
+        with self.captureOnCommitCallbacks(execute=False) as programadas:
+            self.client.post(reverse('usuarios:aprobar_usuario', args=[usuario.id]),
+                             {'rol': 'EMPLEADO', 'aprobado': 'on', 'is_active': 'on'})
+        self.assertEqual(mail.outbox, [])
+        for programada in programadas:
+            programada()
+        self.assertEqual(len(mail.outbox), 1)
+        usuario.refresh_from_db()
+        self.assertTrue(usuario.notificado_aprobacion)
+
+    def test_accion_admin(self):
+        from unittest import mock
+        from django.contrib.admin.sites import site
+        from django.test import RequestFactory
+        ids = self.pendientes(4)
+        peticion = RequestFactory().post('/')
+        peticion.user = self.admin
+        admin_usuarios = site._registry[Usuario]
+        with mock.patch.object(admin_usuarios, 'message_user'):
+            with CaptureQueriesContext(connection) as capturadas:
+                admin_usuarios.aprobar_usuarios(peticion, Usuario.objects.filter(id__in=ids))
+        self.assertEqual(len([q for q in capturadas if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(Usuario.objects.filter(id__in=ids, aprobado=True).count(), 4)
@@ -16,10 +16,15 @@ urlpatterns = [
     # Gestión de usuarios (solo admins)
     path('gestionar/', views.gestionar_usuarios_view, name='gestionar_usuarios'),
     path('aprobar/<int:usuario_id>/', views.aprobar_usuario_view, name='aprobar_usuario'),
+    path('aprobar/lote/', views.aprobar_usuarios_lote, name='aprobar_usuarios_lote'),
     path('toggle/<int:usuario_id>/', views.toggle_usuario_view, name='toggle_usuario'),
     path("detalle/<int:usuario_id>/", views.detalle_usuario, name="detalle_usuario"),
     # PANEL ELIMINADOS (solo admins)
     path('eliminados/', views.panel_eliminados_view, name='panel_eliminados'),
+    path('eliminados/seccion/<slug:seccion>/', views.papelera_seccion_view, name='papelera_seccion'),
+    path('eliminados/seccion/<slug:seccion>/restaurar/', views.papelera_restaurar_lote, name='papelera_restaurar_lote'),
+    path('eliminados/seccion/<slug:seccion>/borrar-definitivo/', views.papelera_purgar_lote, name='papelera_purgar_lote'),
+    path('tareas/<str:tarea_id>/', views.tarea_estado_view, name='tarea_estado'),
     # Productos
     path('eliminados/producto/restaurar/<int:producto_id>/', views.restaurar_producto, name='restaurar_producto'),
     path('eliminados/producto/borrar-definitivo/<int:producto_id>/', views.eliminar_producto_definitivo, name='eliminar_producto_definitivo'),
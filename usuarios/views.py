@@ -4,10 +4,12 @@ from django.contrib.auth import login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Q
+from django.db.models import Count, Q
 from django.views.decorators.http import require_POST
 from django.urls import reverse
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, Http404, JsonResponse
+from django.db import connection
+from django.contrib.humanize.templatetags.humanize import naturaltime
 
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import Group, Permission
@@ -20,6 +22,10 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 
 from .models import Usuario, HistorialActividad
+from .actividad import get_client_ip, registrar_actividad  # antes vivían aquí
+from sisbar_config import tareas
+from sisbar_config.paginacion import filtro_prefijo, paginar_por_cursor
+from . import papelera
 from .forms import (
     RegistroUsuarioForm, 
     LoginForm, 
@@ -27,34 +33,14 @@ from .forms import (
     CambiarPasswordForm,
     AprobarUsuarioForm
 )
-from .emails import enviar_email_registro, enviar_email_aprobacion, enviar_email_alerta_admin
+from .aprobacion import aprobar_usuarios
+from .emails import enviar_email_registro, enviar_email_alerta_admin
 from inventario.models import Producto
 from categorias.models import Categoria
 from proveedores.models import Proveedor
 
 
 # ========== FUNCIONES AUXILIARES ==========
-def get_client_ip(request):
-    """Obtiene la IP del cliente"""
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
-
-
-def registrar_actividad(usuario, tipo, descripcion, request=None):
-    """Registra una actividad del usuario"""
-    ip = get_client_ip(request) if request else None
-    HistorialActividad.objects.create(
-        usuario=usuario,
-        tipo=tipo,
-        descripcion=descripcion,
-        ip_address=ip
-    )
-
-
 def es_admin(user):
     """Verifica si el usuario es administrador"""
     return user.rol in ['SUPER_ADMIN', 'ADMIN']
@@ -228,6 +214,10 @@ def cambiar_password_view(request):
 
 
 # ========== GESTIÓN DE USUARIOS (ADMIN) ==========
+USUARIOS_POR_PAGINA = 25
+ORDEN_USUARIOS = ('-date_joined', '-id')
+
+
 @login_required
 @user_passes_test(es_admin)
 def gestionar_usuarios_view(request):
@@ -237,8 +227,6 @@ def gestionar_usuarios_view(request):
     
     usuarios = Usuario.objects.all()
     
-
-
     if filtro == 'pendientes':
         usuarios = usuarios.filter(aprobado=False)
     elif filtro == 'aprobados':
@@ -248,31 +236,33 @@ def gestionar_usuarios_view(request):
     elif filtro == 'inactivos':
         usuarios = usuarios.filter(is_active=False)
     
-
-
-
+    # Búsqueda por prefijo sobre índices Lower(campo)
     if busqueda:
-        usuarios = usuarios.filter(
-            Q(username__icontains=busqueda) |
-            Q(first_name__icontains=busqueda) |
-            Q(last_name__icontains=busqueda) |
-            Q(email__icontains=busqueda) |
-            Q(documento__icontains=busqueda)
+        alias, coincide = filtro_prefijo(
+            busqueda, 'username', 'email', 'documento', 'first_name', 'last_name', using=usuarios.db
         )
+        usuarios = usuarios.alias(**alias).filter(coincide)
+    
+    # Paginación por cursor: el costo no depende de cuántos usuarios haya
+    pagina = paginar_por_cursor(
+        usuarios,
+        ORDEN_USUARIOS,
+        despues=request.GET.get('despues'),
+        antes=request.GET.get('antes'),
+        por_pagina=USUARIOS_POR_PAGINA,
+    )
     
-    usuarios = usuarios.order_by('-date_joined')
-    
-
-
-    stats = {
-        'total': Usuario.objects.count(),
-        'pendientes': Usuario.objects.filter(aprobado=False).count(),
-        'aprobados': Usuario.objects.filter(aprobado=True).count(),
-        'activos': Usuario.objects.filter(is_active=True).count(),
-    }
+    # Todas las estadísticas en una sola consulta
+    stats = Usuario.objects.aggregate(
+        total=Count('id'),
+        pendientes=Count('id', filter=Q(aprobado=False)),
+        aprobados=Count('id', filter=Q(aprobado=True)),
+        activos=Count('id', filter=Q(is_active=True)),
+    )
     
     context = {
-        'usuarios': usuarios,
+        'usuarios': pagina,
+        'pagina': pagina,
         'stats': stats,
         'filtro': filtro,
         'busqueda': busqueda
@@ -293,13 +283,10 @@ def aprobar_usuario_view(request, usuario_id):
             if usuario.aprobado and not usuario.fecha_aprobacion:
                 usuario.fecha_aprobacion = timezone.now()
                 usuario.aprobado_por = request.user
+            # El correo de aprobación se programa en segundo plano (usuarios/signals.py)
             usuario.save()
-            
-
 
             if usuario.aprobado:
-                enviar_email_aprobacion(usuario, request.user)
-                
                 registrar_actividad(
                     request.user,
                     'EDITAR',
@@ -325,6 +312,36 @@ def aprobar_usuario_view(request, usuario_id):
     return render(request, 'usuarios/aprobar_usuario.html', context)
 
 
+@login_required
+@user_passes_test(es_admin)
+@require_POST
+def aprobar_usuarios_lote(request):
+    """
+    Aprueba varios usuarios pendientes de una vez (ids seleccionados o
+    todos=1 para todos los pendientes). Los correos salen en segundo plano.
+    """
+    pendientes = Usuario.objects.filter(aprobado=False)
+    if request.POST.get('todos') != '1':
+        ids = [int(i) for i in request.POST.getlist('ids') if i.isdigit()]
+        if not ids:
+            messages.warning(request, 'No se seleccionó ningún usuario.')
+            return redirect('usuarios:gestionar_usuarios')
+        pendientes = pendientes.filter(id__in=ids)
+
+    aprobados = aprobar_usuarios(pendientes, request.user)
+    registrar_actividad(
+        request.user,
+        'EDITAR',
+        f'Aprobó {aprobados} cuentas de usuario en lote',
+        request
+    )
+    messages.success(
+        request,
+        f'✅ {aprobados} usuario(s) aprobado(s). Los correos de aprobación se están enviando.'
+    )
+    return redirect('usuarios:gestionar_usuarios')
+
+
 @login_required
 @user_passes_test(es_admin)
 def toggle_usuario_view(request, usuario_id):
@@ -395,8 +412,8 @@ def editar_usuario_completo_view(request, usuario_id):
         usuario_editar.is_active = request.POST.get('is_active') == 'on'
 
         if not usuario_editar.aprobado and request.POST.get('aprobado') == 'on':
+            # El correo se programa en segundo plano al guardar (usuarios/signals.py)
             usuario_editar.aprobar_usuario(request.user)
-            enviar_email_aprobacion(usuario_editar, request.user)
         else:
             usuario_editar.aprobado = request.POST.get('aprobado') == 'on'
 
@@ -649,30 +666,177 @@ def detalle_usuario(request, usuario_id):
 @login_required
 @user_passes_test(es_admin)
 def panel_eliminados_view(request):
-    """Página central para que los admins vean items eliminados (soft-deleted)"""
-    productos_inactivos = Producto.objects.filter(activo=False).order_by('-fecha_creacion')
-    productos_activos = Producto.objects.filter(activo=True).order_by('-fecha_creacion')[:8]
+    """
+    Página central para que los admins vean items eliminados (soft-deleted).
 
-    categorias_inactivas = Categoria.objects.filter(activa=False).order_by('-fecha_creacion')
-    categorias_activas = Categoria.objects.filter(activa=True).order_by('nombre')[:8]
+    Solo se renderiza el esqueleto con los totales; cada sección se carga
+    bajo demanda y por páginas desde papelera_seccion_view.
+    """
+    context = {
+        'totales': contar_papelera(),
+        'por_pagina': PAPELERA_POR_PAGINA,
+    }
+    return render(request, 'usuarios/panel_eliminados.html', context)
 
-    proveedores_inactivos = Proveedor.objects.filter(activo=False).order_by('-fecha_registro')
-    proveedores_activos = Proveedor.objects.filter(activo=True).order_by('nombre')[:8]
 
-    usuarios_inactivos = Usuario.objects.filter(is_active=False).order_by('-date_joined')
-    usuarios_activos = Usuario.objects.filter(is_active=True).order_by('-date_joined')[:8]
+# ========== PAPELERA: SECCIONES PAGINADAS ==========
+PAPELERA_POR_PAGINA = 25
 
-    context = {
-        'productos_inactivos': productos_inactivos,
-        'productos_activos_preview': productos_activos,
-        'categorias_inactivas': categorias_inactivas,
-        'categorias_activas_preview': categorias_activas,
-        'proveedores_inactivos': proveedores_inactivos,
-        'proveedores_activos_preview': proveedores_activos,
-        'usuarios_inactivos': usuarios_inactivos,
-        'usuarios_activos_preview': usuarios_activos,
+
+def _fila_producto(p):
+    return {
+        'id': p.id,
+        'titulo': p.nombre,
+        'detalle': p.codigo,
+        'fecha': naturaltime(p.fecha_creacion),
+        'restaurar': reverse('usuarios:restaurar_producto', args=[p.id]),
+        'borrar': reverse('usuarios:eliminar_producto_definitivo', args=[p.id]),
     }
-    return render(request, 'usuarios/panel_eliminados.html', context)
+
+
+def _fila_categoria(c):
+    return {
+        'id': c.id,
+        'titulo': c.nombre,
+        'detalle': c.slug,
+        'restaurar': reverse('usuarios:restaurar_categoria', args=[c.id]),
+        'borrar': reverse('usuarios:eliminar_categoria_definitivo', args=[c.id]),
+    }
+
+
+def _fila_proveedor(prov):
+    return {
+        'id': prov.id,
+        'titulo': prov.nombre,
+        'detalle': prov.nit,
+        'restaurar': reverse('usuarios:restaurar_proveedor', args=[prov.id]),
+        'borrar': reverse('usuarios:eliminar_proveedor_definitivo', args=[prov.id]),
+    }
+
+
+def _fila_usuario(u):
+    return {
+        'id': u.id,
+        'titulo': u.get_full_name() or u.username,
+        'detalle': f'@{u.username}',
+        'restaurar': reverse('usuarios:restaurar_usuario', args=[u.id]),
+        'borrar': reverse('usuarios:eliminar_usuario_definitivo', args=[u.id]),
+    }
+
+
+# sección -> (orden del cursor, columnas, serializador); los registros
+# inactivos de cada sección salen de usuarios/papelera.py
+SECCIONES_PAPELERA = {
+    'productos': (('-fecha_creacion', '-id'), ('id', 'nombre', 'codigo', 'fecha_creacion'), _fila_producto),
+    'categorias': (('-fecha_creacion', '-id'), ('id', 'nombre', 'slug', 'fecha_creacion'), _fila_categoria),
+    'proveedores': (('-fecha_registro', '-id'), ('id', 'nombre', 'nit', 'fecha_registro'), _fila_proveedor),
+    'usuarios': (
+        ('-date_joined', '-id'),
+        ('id', 'username', 'first_name', 'last_name', 'date_joined'),
+        _fila_usuario,
+    ),
+}
+
+
+def contar_papelera():
+    """Totales de cada sección de la papelera en una sola consulta"""
+    columnas, parametros = [], []
+    for nombre in SECCIONES_PAPELERA:
+        sql, params = papelera.SECCIONES[nombre].inactivos().order_by().values('pk').query.sql_with_params()
+        columnas.append(f'(SELECT COUNT(*) FROM ({sql}) AS {nombre}_ids) AS {nombre}')
+        parametros += params
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT ' + ', '.join(columnas), parametros)
+        fila = cursor.fetchone()
+    return dict(zip(SECCIONES_PAPELERA, fila))
+
+
+@login_required
+@user_passes_test(es_admin)
+def papelera_seccion_view(request, seccion):
+    """Una página de una sección de la papelera en JSON (?despues=<cursor>)"""
+    if seccion not in SECCIONES_PAPELERA:
+        raise Http404('Sección de papelera desconocida')
+    orden, columnas, serializar = SECCIONES_PAPELERA[seccion]
+
+    pagina = paginar_por_cursor(
+        papelera.SECCIONES[seccion].inactivos().only(*columnas),
+        orden,
+        despues=request.GET.get('despues'),
+        por_pagina=PAPELERA_POR_PAGINA,
+    )
+    return JsonResponse({
+        'seccion': seccion,
+        'items': [serializar(obj) for obj in pagina],
+        'siguiente': pagina.siguiente,
+    })
+
+
+def _ids_seleccionados(request):
+    """IDs enviados en `ids`; None si se pidió la sección completa (todos=1)"""
+    if request.POST.get('todos') == '1':
+        return None
+    return [int(i) for i in request.POST.getlist('ids') if i.isdigit()]
+
+
+@login_required
+@user_passes_test(es_admin)
+@require_POST
+def papelera_restaurar_lote(request, seccion):
+    """Restaura varios registros de una sección con un solo UPDATE"""
+    if seccion not in papelera.SECCIONES:
+        raise Http404('Sección de papelera desconocida')
+    ids = _ids_seleccionados(request)
+    if ids == []:
+        return JsonResponse({'error': 'No se seleccionó ningún registro.'}, status=400)
+
+    restaurados = papelera.restaurar_lote(seccion, ids)
+    registrar_actividad(
+        request.user,
+        'EDITAR',
+        f'Restauró {restaurados} {papelera.SECCIONES[seccion].etiqueta} desde la papelera',
+        request
+    )
+    return JsonResponse({'seccion': seccion, 'restaurados': restaurados})
+
+
+@login_required
+@user_passes_test(es_admin)
+@require_POST
+def papelera_purgar_lote(request, seccion):
+    """
+    Programa el borrado definitivo de varios registros en segundo plano.
+    Responde 202 con la URL para consultar el progreso.
+    """
+    if seccion not in papelera.SECCIONES:
+        raise Http404('Sección de papelera desconocida')
+    ids = _ids_seleccionados(request)
+    if ids == []:
+        return JsonResponse({'error': 'No se seleccionó ningún registro.'}, status=400)
+
+    etiqueta = papelera.SECCIONES[seccion].etiqueta
+    tarea_id = tareas.encolar(f'Purgar {etiqueta}', papelera.purgar_lote, seccion, ids)
+    registrar_actividad(
+        request.user,
+        'ELIMINAR',
+        f'Programó el borrado definitivo de {"todos los" if ids is None else len(ids)} {etiqueta} de la papelera',
+        request
+    )
+    return JsonResponse({
+        'seccion': seccion,
+        'tarea': tarea_id,
+        'estado': reverse('usuarios:tarea_estado', args=[tarea_id]),
+    }, status=202)
+
+
+@login_required
+@user_passes_test(es_admin)
+def tarea_estado_view(request, tarea_id):
+    """Progreso de una tarea en segundo plano (JSON)"""
+    progreso = tareas.estado(tarea_id)
+    if progreso is None:
+        raise Http404('La tarea no existe o ya expiró')
+    return JsonResponse(progreso)
 
 
 # ========== RESTAURAR ==========
@@ -722,10 +886,10 @@ def restaurar_usuario(request, usuario_id):
 @user_passes_test(es_admin)
 @require_POST
 def eliminar_producto_definitivo(request, producto_id):
-    p = get_object_or_404(Producto, id=producto_id)
-    nombre = str(p)
-    p.delete()
-    messages.success(request, f'Producto "{nombre}" eliminado permanentemente.')
+    # Su historial de movimientos puede ser largo: se borra por lotes en segundo plano
+    p = get_object_or_404(Producto, id=producto_id, activo=False)
+    tareas.encolar(f'Purgar producto {p.codigo}', papelera.purgar_lote, 'productos', [p.id])
+    messages.success(request, f'Producto "{p}" en proceso de eliminación permanente.')
     return redirect(request.META.get('HTTP_REFERER', 'usuarios:panel_eliminados'))
 
 @login_required
@@ -777,7 +941,7 @@ def desactivar_producto(request, producto_id):
     )
     
     messages.warning(request, f'Producto "{p.nombre}" movido a papelera.')
-    return redirect(request.META.get('HTTP_REFERER', 'inventario:lista_productos'))
+    return redirect(request.META.get('HTTP_REFERER', 'inventario:listar_productos'))
 
 
 @login_required
@@ -790,7 +954,7 @@ def desactivar_categoria(request, categoria_id):
     productos_asociados = Producto.objects.filter(categoria=c, activo=True).count()
     if productos_asociados > 0:
         messages.error(request, f'No se puede eliminar. La categoría "{c.nombre}" tiene {productos_asociados} productos activos.')
-        return redirect(request.META.get('HTTP_REFERER', 'categorias:lista'))
+        return redirect(request.META.get('HTTP_REFERER', 'categorias:listar'))
     
     c.activa = False
     c.save()
@@ -803,7 +967,7 @@ def desactivar_categoria(request, categoria_id):
     )
     
     messages.warning(request, f'Categoría "{c.nombre}" movida a papelera.')
-    return redirect(request.META.get('HTTP_REFERER', 'categorias:lista'))
+    return redirect(request.META.get('HTTP_REFERER', 'categorias:listar'))
 
 
 @login_required
@@ -823,7 +987,7 @@ def desactivar_proveedor(request, proveedor_id):
     )
     
     messages.warning(request, f'Proveedor "{prov.nombre}" movido a papelera.')
-    return redirect(request.META.get('HTTP_REFERER', 'proveedores:lista'))
+    return redirect(request.META.get('HTTP_REFERER', 'proveedores:listar'))
 
 
 @login_required